@@ -0,0 +1,174 @@
+# bench/frame_decode.py
+# 对比帧预处理的两条路径在 720p / 1080p 输入下的延迟和内存流量:
+#   baseline : 全尺寸 imdecode(IMREAD_COLOR) + 每帧新建 blob 的 cv2.dnn.blobFromImage
+#   reduced  : 按网络输入缩小解码 (frame_codec.decode_image) + 复用预分配 blob (yolo_backend.BlobBuffer)
+# 内存流量给出两种口径：tracemalloc 统计的 Python 侧新分配字节（解码输出、blob），
+# 以及按图像尺寸计算的各阶段写入字节（含 OpenCV 内部的缩放中间图，tracemalloc 看不到）。
+# 指定 --weights 时再跑一次 YOLO，检查缩小解码后映射回原图坐标的检测框与全尺寸解码的一致性。
+#
+# 用法（在项目根目录执行）:
+#   python -m bench.frame_decode --sizes 1280x720 1920x1080 --input-size 416
+#   python -m bench.frame_decode --images data/obj/a.jpg data/obj/b.jpg --weights config/yolov4-tiny_obj_best.weights
+
+import argparse
+import json
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from bench.frame_transport import synthetic_frame
+from services.frame_codec import decode_image
+from services.yolo_backend import BlobBuffer, OpenCVYolo, make_blob
+from services.yolo_decode import decode_yolo_outputs
+
+NUM_CLASSES = 5
+
+
+def latency_ms(fn, repeat):
+    fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    samples = np.asarray(samples) * 1000.0
+    return {"mean": float(samples.mean()), "p50": float(np.percentile(samples, 50)),
+            "p95": float(np.percentile(samples, 95))}
+
+
+def allocated_bytes(fn, repeat):
+    """每次调用新分配的字节数（tracemalloc 峰值，numpy 数组计入，OpenCV 内部 Mat 不计入）"""
+    fn()
+    total = 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        fn()
+        total += tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return total // repeat
+
+
+def stage_bytes(decoded_shape, input_size, reuse_blob):
+    """按尺寸估算每帧各阶段写入的字节数"""
+    h, w = decoded_shape[:2]
+    decoded = h * w * 3
+    resized = input_size * input_size * 3
+    blob = input_size * input_size * 3 * 4
+    return {
+        "decoded": decoded,
+        "resized": resized if (h, w) != (input_size, input_size) else 0,
+        "blob": blob,
+        "new_allocations": decoded + (0 if reuse_blob else resized + blob),
+    }
+
+
+def compare_boxes(backend, jpeg, input_size, min_side):
+    """全尺寸解码与缩小解码（框映射回原图）的检测结果对比：标志一致率和同类框的平均 IoU"""
+    full, _ = decode_image(jpeg)
+    reduced, source_size = decode_image(jpeg, min_side)
+    H, W = full.shape[:2]
+    h, w = reduced.shape[:2]
+    a = decode_yolo_outputs(backend.forward(make_blob([full], input_size)), W, H, NUM_CLASSES)
+    b = decode_yolo_outputs(backend.forward(make_blob([reduced], input_size)), w, h, NUM_CLASSES)
+    sx, sy = source_size[0] / w, source_size[1] / h
+    ious = []
+    for i in b.keep:
+        x, y, bw, bh = b.boxes[i]
+        box = np.array([x * sx, y * sy, (x + bw) * sx, (y + bh) * sy])
+        best = 0.0
+        for j in a.keep:
+            if a.class_ids[j] != b.class_ids[i]:
+                continue
+            X, Y, BW, BH = a.boxes[j]
+            ix = max(0.0, min(box[2], X + BW) - max(box[0], X))
+            iy = max(0.0, min(box[3], Y + BH) - max(box[1], Y))
+            inter = ix * iy
+            union = (box[2] - box[0]) * (box[3] - box[1]) + BW * BH - inter
+            best = max(best, inter / union if union > 0 else 0.0)
+        ious.append(best)
+    return bool(np.array_equal(a.present, b.present)), ious
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Full vs reduced JPEG decode and blob reuse benchmark")
+    parser.add_argument("--sizes", nargs="+", default=["1280x720", "1920x1080"])
+    parser.add_argument("--images", nargs="*", default=[], help="real JPEG files to use instead of synthetic frames")
+    parser.add_argument("--input-size", type=int, default=416)
+    parser.add_argument("--min-scale", type=float, default=1.0, help="same as FRAME_DECODE_MIN_SCALE")
+    parser.add_argument("--quality", type=int, default=80)
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--weights", help="YOLO weights; when given, compare detections of both paths")
+    args = parser.parse_args(argv)
+
+    inputs = []
+    for path in args.images:
+        with open(path, "rb") as f:
+            inputs.append((path, np.frombuffer(f.read(), np.uint8)))
+    if not inputs:
+        for size in args.sizes:
+            width, height = map(int, size.split("x"))
+            frame = synthetic_frame(width, height)
+            jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, args.quality])[1]
+            inputs.append((size, np.frombuffer(jpeg.tobytes(), np.uint8)))
+
+    S = args.input_size
+    min_side = int(S * args.min_scale)
+    buffer = BlobBuffer()
+    backend = OpenCVYolo("config/yolov4-tiny_obj.cfg", args.weights) if args.weights else None
+
+    report = {"input_size": S, "min_side": min_side, "inputs": {}}
+    for name, jpeg in inputs:
+        full, source_size = decode_image(jpeg)
+        reduced, _ = decode_image(jpeg, min_side)
+
+        def baseline():
+            image, _ = decode_image(jpeg)
+            return cv2.dnn.blobFromImage(image, 1 / 255.0, (S, S), swapRB=True, crop=False)
+
+        def optimized():
+            image, _ = decode_image(jpeg, min_side)
+            return buffer.fill([image], S)
+
+        assert np.array_equal(buffer.fill([reduced], S), make_blob([reduced], S))
+        entry = {
+            "source": f"{source_size[0]}x{source_size[1]}",
+            "jpeg_bytes": len(jpeg),
+            "decoded": f"{reduced.shape[1]}x{reduced.shape[0]}",
+            "latency_ms": {
+                "decode_full": latency_ms(lambda: decode_image(jpeg), args.repeat),
+                "decode_reduced": latency_ms(lambda: decode_image(jpeg, min_side), args.repeat),
+                "blob_from_image": latency_ms(
+                    lambda: cv2.dnn.blobFromImage(full, 1 / 255.0, (S, S), swapRB=True, crop=False), args.repeat),
+                "blob_buffer_full": latency_ms(lambda: buffer.fill([full], S), args.repeat),
+                "blob_buffer_reduced": latency_ms(lambda: buffer.fill([reduced], S), args.repeat),
+                "baseline_total": latency_ms(baseline, args.repeat),
+                "reduced_total": latency_ms(optimized, args.repeat),
+            },
+            "allocated_bytes": {
+                "baseline_total": allocated_bytes(baseline, min(args.repeat, 20)),
+                "reduced_total": allocated_bytes(optimized, min(args.repeat, 20)),
+            },
+            "stage_bytes": {
+                "baseline": stage_bytes(full.shape, S, reuse_blob=False),
+                "reduced": stage_bytes(reduced.shape, S, reuse_blob=True),
+            },
+        }
+        latency = entry["latency_ms"]
+        entry["speedup"] = latency["baseline_total"]["p50"] / latency["reduced_total"]["p50"]
+        if backend is not None:
+            same_flags, ious = compare_boxes(backend, jpeg, S, min_side)
+            entry["detections"] = {"same_present_flags": same_flags, "boxes": len(ious),
+                                   "mean_iou": float(np.mean(ious)) if ious else None}
+        report["inputs"][name] = entry
+        print(f"{name:<12} {entry['source']} -> {entry['decoded']:<9} "
+              f"baseline p50={latency['baseline_total']['p50']:.2f}ms "
+              f"reduced p50={latency['reduced_total']['p50']:.2f}ms ({entry['speedup']:.1f}x)  "
+              f"alloc {entry['allocated_bytes']['baseline_total'] / 1e6:.1f}MB -> "
+              f"{entry['allocated_bytes']['reduced_total'] / 1e6:.1f}MB")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# bench/frame_transport.py
+# 对比两种 WebSocket 帧格式的线上字节数和服务端每帧 CPU 耗时:
+#   json   : {"username": ..., "image": "data:image/jpeg;base64,..."}（旧前端）
+#   binary : 12 字节帧头 + 原始 JPEG（services/frame_codec.py）
+#
+# 用法（在项目根目录执行）:
+#   python -m bench.frame_transport --width 640 --height 480 --quality 70
+
+import argparse
+import base64
+import json
+import time
+
+import cv2
+import numpy as np
+
+from services.frame_codec import FRAME_HEADER, decode_binary_frame, decode_ws_message, parse_binary_frame
+
+
+def synthetic_frame(width, height, seed=0):
+    """带噪声的渐变图，JPEG 压缩率接近真实摄像头画面"""
+    rng = np.random.default_rng(seed)
+    gx = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    gy = np.linspace(0, 255, height, dtype=np.float32)[:, None, None]
+    base = (gx * 0.6 + gy * 0.4) * np.ones((1, 1, 3), dtype=np.float32)
+    noise = rng.normal(0, 12, size=(height, width, 3))
+    return np.clip(base + noise, 0, 255).astype(np.uint8)
+
+
+def cpu_us(fn, repeat):
+    fn()
+    started = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - started) / repeat * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="WebSocket frame transport benchmark")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--quality", type=int, default=70)
+    parser.add_argument("--repeat", type=int, default=300)
+    args = parser.parse_args(argv)
+
+    frame = synthetic_frame(args.width, args.height)
+    jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, args.quality])[1].tobytes()
+
+    json_message = json.dumps({
+        "username": "bench",
+        "image": "data:image/jpeg;base64," + base64.b64encode(jpeg).decode("ascii"),
+    })
+    binary_message = FRAME_HEADER.pack(1, 123.456) + jpeg
+
+    def json_unwrap():
+        img_data = json.loads(json_message)["image"].split("base64,")[1]
+        return np.frombuffer(base64.b64decode(img_data), np.uint8)
+
+    report = {
+        "frame": f"{args.width}x{args.height}",
+        "jpeg_bytes": len(jpeg),
+        "json_wire_bytes": len(json_message.encode("utf-8")),
+        "binary_wire_bytes": len(binary_message),
+        # 只统计拿到 JPEG 字节之前的开销（JSON 解析 + 切分 + Base64 解码 / 帧头解析）
+        "json_unwrap_cpu_us": cpu_us(json_unwrap, args.repeat),
+        "binary_unwrap_cpu_us": cpu_us(lambda: parse_binary_frame(binary_message), args.repeat),
+        # 含 JPEG 解码的完整耗时
+        "json_total_cpu_us": cpu_us(lambda: decode_ws_message(json_message), args.repeat),
+        "binary_total_cpu_us": cpu_us(lambda: decode_binary_frame(binary_message), args.repeat),
+    }
+    report["wire_bytes_saved_pct"] = 100.0 * (1 - report["binary_wire_bytes"] / report["json_wire_bytes"])
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
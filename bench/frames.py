@@ -0,0 +1,94 @@
+# bench/frames.py
+# 基准测试用的驾驶员帧流：合成画面或录制的视频 / 图片目录，预先编码为 JPEG，
+# 客户端发送时不再消耗编码 CPU。
+
+import glob
+import os
+from typing import List
+
+import cv2
+import numpy as np
+
+
+def synthetic_driver_frames(count: int, width: int = 640, height: int = 480, fps: float = 15.0,
+                            seed: int = 0) -> List[np.ndarray]:
+    """
+    合成的驾驶员画面：噪声背景上的人脸椭圆，每 3 秒左右眨一次眼，
+    中段有一段持续闭眼和两次打哈欠（张嘴），同一 seed 生成的序列完全相同。
+    """
+    rng = np.random.default_rng(seed)
+    background = np.clip(rng.normal(90, 25, size=(height, width, 3)), 0, 255).astype(np.uint8)
+    cx, cy = width // 2, height // 2
+    face_w, face_h = width // 6, height // 3
+    frames = []
+    for i in range(count):
+        t = i / fps
+        frame = background.copy()
+        # 轻微的头部晃动
+        dx = int(6 * np.sin(t * 0.7))
+        dy = int(4 * np.sin(t * 1.3))
+        center = (cx + dx, cy + dy)
+        cv2.ellipse(frame, center, (face_w, face_h), 0, 0, 360, (150, 175, 215), -1)
+        phase = t % 30.0
+        eyes_closed = (t % 3.0) < 0.15 or 12.0 <= phase < 15.0
+        yawning = 20.0 <= phase < 22.5 or 25.0 <= phase < 27.0
+        for side in (-1, 1):
+            eye = (center[0] + side * face_w // 2, center[1] - face_h // 4)
+            if eyes_closed:
+                cv2.line(frame, (eye[0] - 18, eye[1]), (eye[0] + 18, eye[1]), (40, 40, 40), 3)
+            else:
+                cv2.ellipse(frame, eye, (18, 10), 0, 0, 360, (255, 255, 255), -1)
+                cv2.circle(frame, eye, 6, (30, 30, 30), -1)
+        mouth = (center[0], center[1] + face_h // 2)
+        cv2.ellipse(frame, mouth, (30, 28 if yawning else 6), 0, 0, 360, (40, 30, 120), -1)
+        frames.append(frame)
+    return frames
+
+
+def recorded_frames(source: str, count: int, width: int = 0, height: int = 0) -> List[np.ndarray]:
+    """从视频文件或图片目录读取最多 count 帧（count<=0 表示全部），可选缩放到 width x height"""
+    frames = []
+    if os.path.isdir(source):
+        paths = sorted(p for ext in ("*.jpg", "*.jpeg", "*.png")
+                       for p in glob.glob(os.path.join(source, ext)))
+        for path in paths:
+            if 0 < count <= len(frames):
+                break
+            frame = cv2.imread(path, cv2.IMREAD_COLOR)
+            if frame is not None:
+                frames.append(frame)
+    else:
+        capture = cv2.VideoCapture(source)
+        while count <= 0 or len(frames) < count:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            frames.append(frame)
+        capture.release()
+    if not frames:
+        raise ValueError(f"no frames could be read from {source}")
+    if width and height:
+        frames = [cv2.resize(f, (width, height)) for f in frames]
+    return frames
+
+
+def encode_jpeg(frames: List[np.ndarray], quality: int = 80) -> List[bytes]:
+    params = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+    return [cv2.imencode(".jpg", f, params)[1].tobytes() for f in frames]
+
+
+def load_stream(source: str = "synthetic", count: int = 300, width: int = 640, height: int = 480,
+                fps: float = 15.0, seed: int = 0, quality: int = 80):
+    """返回 (原始帧列表, JPEG 列表, 描述)，source 为 "synthetic" 或视频文件 / 图片目录路径"""
+    if source == "synthetic":
+        frames = synthetic_driver_frames(count, width, height, fps, seed)
+        description = {"source": "synthetic", "frames": count, "width": width, "height": height,
+                       "fps": fps, "seed": seed}
+    else:
+        frames = recorded_frames(source, count, width, height)
+        h, w = frames[0].shape[:2]
+        description = {"source": os.path.abspath(source), "frames": len(frames), "width": w, "height": h}
+    description["jpeg_quality"] = quality
+    jpegs = encode_jpeg(frames, quality)
+    description["avg_jpeg_bytes"] = int(sum(map(len, jpegs)) / len(jpegs))
+    return frames, jpegs, description
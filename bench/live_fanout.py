@@ -0,0 +1,122 @@
+# bench/live_fanout.py
+# 监控端实时推送 (services/live_hub.py) 的扇出压测，不经过网络：
+#   --publishers 个线程模拟推理线程，以合计 --rate 条/秒对 --drivers 个驾驶员随机发布等级变化 / High 事件；
+#   --subscribers 个订阅者中有 --slow 个完全不读取（卡住的仪表盘），其余每 min_interval 取一批。
+# 报告发布端每次 publish() 的耗时（推理路径上的开销）、各订阅者收到的事件数、合并数，
+# 以及卡住的订阅者待发送表的最大长度（应不超过 --max-pending）。
+#
+# 用法（在项目根目录执行）:
+#   python -m bench.live_fanout --drivers 500 --events 200000 --subscribers 20 --slow 5
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+
+import numpy as np
+
+from services.live_hub import LiveEvent, LiveHub
+
+LEVELS = ("Low", "Medium", "High")
+
+
+def publisher(hub, drivers, events, rate, seed, samples):
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    for i in range(events):
+        if rate and i % 100 == 0:
+            # 按速率发布，每 100 条补一次睡眠
+            delay = started + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        username = f"driver{rng.randrange(drivers)}"
+        now = time.time()
+        if rng.random() < 0.05:
+            event = LiveEvent("high", username, ts=now)
+        else:
+            event = LiveEvent("state", username, rng.choice(LEVELS), None, now, now)
+        t0 = time.perf_counter()
+        hub.publish(event)
+        if i % 16 == 0:
+            samples.append(time.perf_counter() - t0)
+
+
+async def reader(subscription, received, stop):
+    while not stop.is_set():
+        try:
+            batch = await asyncio.wait_for(subscription.next_batch(), timeout=0.5)
+        except asyncio.TimeoutError:
+            continue
+        received.append(len(batch))
+
+
+async def run(args):
+    hub = LiveHub(max_queued=args.queue, max_pending=args.max_pending, min_interval=args.interval,
+                  max_drivers=args.drivers)
+    await hub.start()
+    subscriptions = [hub.subscribe() for _ in range(args.subscribers)]
+    stop = asyncio.Event()
+    received = [[] for _ in subscriptions]
+    readers = [asyncio.create_task(reader(s, received[i], stop))
+               for i, s in enumerate(subscriptions) if i >= args.slow]
+    max_slow_pending = 0
+    samples = []
+    per_thread = args.events // args.publishers
+    threads = [threading.Thread(target=publisher,
+                                args=(hub, args.drivers, per_thread, args.rate / args.publishers, i, samples))
+               for i in range(args.publishers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    while any(thread.is_alive() for thread in threads):
+        await asyncio.sleep(0.05)
+        for s in subscriptions[:args.slow]:
+            max_slow_pending = max(max_slow_pending, s.stats()["pending"])
+    publish_seconds = time.perf_counter() - started
+    # 等待分发和最后一批推送
+    await asyncio.sleep(args.interval * 2 + 0.5)
+    stop.set()
+    await asyncio.gather(*readers)
+    await hub.stop()
+
+    samples = np.asarray(samples) * 1e6
+    stats = hub.stats()
+    fast = [s.stats() for s in subscriptions[args.slow:]]
+    return {
+        "events": stats["published"],
+        "dropped_in_queue": stats["dropped"],
+        "publish_seconds": publish_seconds,
+        "publish_us": {"mean": float(samples.mean()), "p99": float(np.percentile(samples, 99)),
+                       "max": float(samples.max())},
+        "fast_subscribers": {
+            "delivered_mean": float(np.mean([s["delivered"] for s in fast])) if fast else 0.0,
+            "coalesced_mean": float(np.mean([s["coalesced"] for s in fast])) if fast else 0.0,
+            "batches_mean": float(np.mean([len(r) for r in received[args.slow:]])) if fast else 0.0,
+        },
+        "slow_subscribers": {
+            "max_pending": max_slow_pending,
+            "limit": args.max_pending,
+            "evicted": sum(s.stats()["evicted"] for s in subscriptions[:args.slow]),
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Live feed fan-out benchmark")
+    parser.add_argument("--drivers", type=int, default=500)
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--publishers", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=20000, help="total events per second, 0 = unthrottled")
+    parser.add_argument("--subscribers", type=int, default=20)
+    parser.add_argument("--slow", type=int, default=5, help="subscribers that never read")
+    parser.add_argument("--interval", type=float, default=0.5, help="same as LIVE_MIN_INTERVAL")
+    parser.add_argument("--max-pending", type=int, default=1024, help="same as LIVE_SUBSCRIBER_MAX_PENDING")
+    parser.add_argument("--queue", type=int, default=10000, help="same as LIVE_QUEUE_SIZE")
+    args = parser.parse_args(argv)
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
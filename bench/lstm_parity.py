@@ -0,0 +1,76 @@
+# bench/lstm_parity.py
+# 校验 LSTM 推理后端与原始 SavedModel (model.predict) 的输出是否一致。
+#
+# 用法（在项目根目录执行）:
+#   python -m bench.lstm_parity --backend function --samples 200
+#
+# 输入窗口取值与线上一致：每个元素是 5 帧内闭眼/张嘴的帧数 (0~5)。
+# function 后端的单样本调用要求逐位一致；批量调用只要求判定结果一致（批量矩阵乘法的累加顺序不同，
+# 末位可能有 1ulp 的差异），两者的最大误差都会打印出来。
+
+import argparse
+import sys
+
+import numpy as np
+
+from services.lstm_backend import create_backend
+
+HEADS = {
+    # 名称: (模型目录, 输入维度)
+    "fatigue": ("./model_dense300", 400),
+    "eye": ("./model_eye", 6),
+    "yawn": ("./model_yawn4", 10),
+}
+
+
+def _decisions(head, outputs):
+    if head == "fatigue":
+        return np.argmax(outputs, axis=-1)
+    return outputs >= 0.5
+
+
+def check_head(head, backend_kind, samples, rng):
+    import tensorflow as tf
+    path, dim = HEADS[head]
+    model = tf.keras.models.load_model(path)
+    backend = create_backend(backend_kind, model, dim)
+    windows = rng.integers(0, 6, size=(samples, 1, dim)).astype(np.float32)
+    windows[0] = 0.0  # 低疲劳重置后的全零窗口
+
+    expected = np.concatenate([model.predict(w[None], verbose=0) for w in windows], axis=0)
+    single = np.concatenate([backend.predict(w[None]) for w in windows], axis=0)
+    batched = backend.predict(windows)
+
+    report = {
+        "head": head,
+        "single_bit_identical": bool(np.array_equal(expected, single)),
+        "single_max_abs_diff": float(np.max(np.abs(expected - single))),
+        "batched_max_abs_diff": float(np.max(np.abs(expected - batched))),
+        "batched_decisions_identical": bool(np.array_equal(_decisions(head, expected),
+                                                           _decisions(head, batched))),
+    }
+    # TFLite 使用自己的算子实现，只要求判定结果一致
+    single_ok = report["single_bit_identical"] if backend_kind == "function" else bool(
+        np.array_equal(_decisions(head, expected), _decisions(head, single)))
+    report["ok"] = single_ok and report["batched_decisions_identical"]
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LSTM backend parity check")
+    parser.add_argument("--backend", default="function", choices=["function", "tflite"])
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    failed = False
+    for head in HEADS:
+        report = check_head(head, args.backend, args.samples, rng)
+        print(report)
+        failed |= not report["ok"]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
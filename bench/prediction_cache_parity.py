@@ -0,0 +1,103 @@
+# bench/prediction_cache_parity.py
+# 校验 LSTM 预测缓存 (services/prediction_cache.py) 与直接调用模型的输出逐位一致，并报告命中率。
+#   eye        : 输出表的每一行与单样本 backend.predict 比较（默认全部 46656 种输入）；
+#   yawn/fatigue: 用模拟驾驶的计数序列生成滑动窗口，经 PredictionLRU 的输出与每次都调用模型的输出比较。
+#
+# 用法（在项目根目录执行）:
+#   python -m bench.prediction_cache_parity --backend function
+#   python -m bench.prediction_cache_parity --backend tflite --eye-samples 5000 --steps 20000
+
+import argparse
+import sys
+
+import numpy as np
+
+from services.lstm_backend import load_backend
+from services.prediction_cache import EyeLookupTable, PredictionLRU, all_windows, pack_window
+
+EYE = ("./model_eye", 6)
+LRU_HEADS = {
+    # 名称: (模型目录, 输入维度, 每步推入的计数个数)
+    "yawn": ("./model_yawn4", 10, 1),
+    "fatigue": ("./model_dense300", 400, 2),
+}
+
+
+def check_eye(backend_kind, samples, build_batch, rng):
+    path, dim = EYE
+    backend = load_backend(backend_kind, path, dim)
+    table = EyeLookupTable(backend, EyeLookupTable.build(backend, batch_size=build_batch))
+    windows = all_windows(dim)
+    indices = np.arange(len(windows)) if samples <= 0 else rng.choice(len(windows), samples, replace=False)
+    expected = np.concatenate([backend.predict(windows[i][None]) for i in indices], axis=0)
+    got = np.concatenate([table.predict(windows[i][None]) for i in indices], axis=0)
+    batched = table.predict(windows[indices])
+    # 非整数输入回退到模型
+    odd = np.full((1, 1, dim), 0.5, dtype=np.float32)
+    return {
+        "head": "eye",
+        "checked": int(len(indices)),
+        "bit_identical": bool(np.array_equal(expected, got) and np.array_equal(expected, batched)),
+        "max_abs_diff": float(np.max(np.abs(expected - got))),
+        "fallback_identical": bool(np.array_equal(table.predict(odd), backend.predict(odd))),
+        "stats": table.stats(),
+    }
+
+
+def simulated_counts(steps, rng):
+    """5 帧内闭眼 / 张嘴帧数：大部分为 0，偶尔出现持续数步的闭眼 / 打哈欠"""
+    counts = np.zeros(steps, dtype=np.float32)
+    t = 0
+    while t < steps:
+        t += int(rng.exponential(40))
+        length = int(rng.integers(1, 8))
+        counts[t:t + length] = rng.integers(1, 6, size=len(counts[t:t + length]))
+        t += length
+    return counts
+
+
+def check_lru(head, backend_kind, steps, cache_size, rng):
+    path, dim, per_step = LRU_HEADS[head]
+    backend = load_backend(backend_kind, path, dim)
+    cache = PredictionLRU(head, cache_size)
+    stream = np.stack([simulated_counts(steps, rng) for _ in range(per_step)], axis=1).reshape(-1)
+    window = np.zeros(dim, dtype=np.float32)
+    mismatches, max_diff = 0, 0.0
+    for t in range(steps):
+        window = np.concatenate([window[per_step:], stream[t * per_step:(t + 1) * per_step]])
+        input_arr = window.reshape(1, 1, dim)
+        expected = backend.predict(input_arr)
+        key = pack_window(input_arr)
+        got = cache.get(key)
+        if got is None:
+            got = backend.predict(input_arr)
+            cache.put(key, got)
+        if not np.array_equal(expected, got):
+            mismatches += 1
+            max_diff = max(max_diff, float(np.max(np.abs(expected - got))))
+    return {"head": head, "checked": steps, "bit_identical": mismatches == 0, "mismatches": mismatches,
+            "max_abs_diff": max_diff, "stats": cache.stats()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prediction cache parity and hit-rate check")
+    parser.add_argument("--backend", default="function", choices=["function", "tflite"])
+    parser.add_argument("--eye-samples", type=int, default=0, help="table rows to check, 0 = all")
+    parser.add_argument("--build-batch", type=int, default=1, help="same as LSTM_EYE_TABLE_BUILD_BATCH")
+    parser.add_argument("--steps", type=int, default=5000, help="simulated 5-frame steps for yawn/fatigue")
+    parser.add_argument("--cache-size", type=int, default=4096)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    reports = [check_eye(args.backend, args.eye_samples, args.build_batch, rng)]
+    reports += [check_lru(head, args.backend, args.steps, args.cache_size, rng) for head in LRU_HEADS]
+    failed = False
+    for report in reports:
+        print(report)
+        failed |= not report["bit_identical"] or not report.get("fallback_identical", True)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
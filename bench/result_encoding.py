@@ -0,0 +1,117 @@
+# bench/result_encoding.py
+# 对比逐帧检测结果各种响应编码 (services/result_codec.py) 的每帧字节数和服务端编码 CPU 耗时。
+# 输入为模拟驾驶的结果序列：状态大多数帧不变、偶尔切换，每帧 3~4 个检测框（人脸、双眼、嘴），
+# 框坐标带 --jitter 像素的抖动（0 表示画面静止，delta 模式下检测框也不再重复发送）。
+#   json          : 旧格式，与 Starlette send_json 相同（默认）
+#   orjson        : 同样的结构，orjson 序列化
+#   *_compact     : 短键名 + 等级下标 + 检测框整数数组
+#   *_delta       : compact 且只发送变化的部分（仅 WebSocket）
+# 未安装 orjson / msgpack 时跳过对应的编码。
+#
+# 用法（在项目根目录执行）:
+#   python -m bench.result_encoding --frames 3000 --jitter 2
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from services.result_codec import EncodingUnavailable, ResultEncoder
+
+LABELS = ["mouth_opened", "mouth_closed", "eyes_open", "eyes_closed", "face"]
+VARIANTS = [
+    # 名称: (encoding, compact, delta)
+    ("json", ("json", False, False)),
+    ("orjson", ("orjson", False, False)),
+    ("json_compact", ("json", True, False)),
+    ("orjson_compact", ("orjson", True, False)),
+    ("msgpack_compact", ("msgpack", True, False)),
+    ("orjson_delta", ("orjson", True, True)),
+    ("msgpack_delta", ("msgpack", True, True)),
+]
+
+
+def simulated_results(frames, jitter, seed=0, fps=15.0):
+    """模拟 640x480 画面下的结果序列，带 seq / client_ts（二进制帧客户端）"""
+    rng = np.random.default_rng(seed)
+    base = {"face": [220, 120, 200, 240], "eye_l": [260, 190, 40, 20], "eye_r": [340, 190, 40, 20],
+            "mouth": [290, 290, 60, 30]}
+    level, eye_closed, yawn, since = "Low", False, False, 0.0
+    results = []
+    for i in range(frames):
+        t = i / fps
+        if rng.random() < 0.01:
+            level = str(rng.choice(["Low", "Medium", "High"]))
+            since = t
+        if rng.random() < 0.03:
+            eye_closed = not eye_closed
+        yawn = bool(rng.random() < 0.02) or (yawn and rng.random() < 0.8)
+
+        def box(key):
+            offset = rng.integers(-jitter, jitter + 1, size=4) if jitter else np.zeros(4, dtype=int)
+            return (np.asarray(base[key]) + offset).tolist()
+
+        def conf():
+            return float(rng.uniform(0.6, 0.99))
+
+        eye_label = "eyes_closed" if eye_closed else "eyes_open"
+        boxes = [{"class": "face", "confidence": conf(), "box": box("face")},
+                 {"class": eye_label, "confidence": conf(), "box": box("eye_l")},
+                 {"class": eye_label, "confidence": conf(), "box": box("eye_r")},
+                 {"class": "mouth_opened" if yawn else "mouth_closed", "confidence": conf(), "box": box("mouth")}]
+        if jitter == 0:
+            # 画面静止时置信度也不变
+            for item in boxes:
+                item["confidence"] = 0.9
+        results.append({
+            "fatigue_level": "Initializing" if i < 200 else level,
+            "eye_closure": eye_closed,
+            "yawn_detected": yawn,
+            "current_state_duration": t - since,
+            "detection_boxes": boxes,
+            "seq": i,
+            "client_ts": 1.7e12 + t * 1000.0,
+        })
+    return results
+
+
+def measure(results, encoding, compact, delta, repeat):
+    sizes = []
+    encoder = ResultEncoder(encoding, compact, delta, LABELS, header=True)
+    for result in results:
+        payload = encoder.encode(result)
+        sizes.append(len(payload.encode("utf-8") if isinstance(payload, str) else payload))
+    started = time.process_time()
+    for _ in range(repeat):
+        encoder = ResultEncoder(encoding, compact, delta, LABELS, header=True)
+        for result in results:
+            encoder.encode(result)
+    cpu = (time.process_time() - started) / (repeat * len(results))
+    sizes = np.asarray(sizes)
+    return {"bytes_per_frame": float(sizes.mean()), "max_bytes": int(sizes.max()),
+            "total_kib": float(sizes.sum() / 1024.0), "encode_cpu_us": cpu * 1e6}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-frame result encoding benchmark")
+    parser.add_argument("--frames", type=int, default=3000)
+    parser.add_argument("--jitter", type=int, default=2, help="box jitter in pixels, 0 = static scene")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    results = simulated_results(args.frames, args.jitter)
+    report = {"frames": args.frames, "jitter": args.jitter, "variants": {}, "skipped": {}}
+    for name, (encoding, compact, delta) in VARIANTS:
+        try:
+            report["variants"][name] = measure(results, encoding, compact, delta, args.repeat)
+        except EncodingUnavailable as e:
+            report["skipped"][name] = str(e)
+    baseline = report["variants"]["json"]["bytes_per_frame"]
+    for stats in report["variants"].values():
+        stats["bytes_saved_pct"] = 100.0 * (1 - stats["bytes_per_frame"] / baseline)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# bench/roi_tracking.py
+# 自适应 ROI 跟踪模式的精度 / 帧率评估。
+# 以“每帧全图 416x416 检测”为基准，统计自适应模式下闭眼 / 张嘴标志逐帧的一致率，
+# 以及送入 LSTM 的 5 帧计数窗口的一致率，同时报告两种模式的帧率。
+#
+# 用法（在项目根目录执行）:
+#   python -m bench.roi_tracking clip1.mp4 clip2.mp4 \
+#       --weights config/yolov4-tiny_obj_best.weights --roi-input-size 256
+
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+
+from services.roi_tracker import RoiTracker, offset_detections
+from services.yolo_decode import decode_yolo_outputs
+
+CLASS_MOUTH_OPENED, CLASS_EYES_CLOSED, CLASS_FACE = 0, 3, 4
+NUM_CLASSES = 5
+
+
+class Detector:
+    def __init__(self, weights):
+        self.net = cv2.dnn.readNetFromDarknet("config/yolov4-tiny_obj.cfg", weights)
+        names = self.net.getLayerNames()
+        self.layers = [names[i - 1] for i in np.asarray(self.net.getUnconnectedOutLayers()).reshape(-1)]
+
+    def __call__(self, frame, input_size=416):
+        H, W = frame.shape[:2]
+        self.net.setInput(cv2.dnn.blobFromImage(frame, 1 / 255.0, (input_size, input_size), swapRB=True, crop=False))
+        return decode_yolo_outputs(self.net.forward(self.layers), W, H, NUM_CLASSES)
+
+
+def read_frames(path, limit):
+    capture = cv2.VideoCapture(path)
+    frames = []
+    while limit <= 0 or len(frames) < limit:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        frames.append(frame)
+    capture.release()
+    return frames
+
+
+def flags(dets):
+    return bool(dets.present[CLASS_EYES_CLOSED]), bool(dets.present[CLASS_MOUTH_OPENED])
+
+
+def run_full(detector, frames):
+    started = time.perf_counter()
+    result = [flags(detector(frame)) for frame in frames]
+    return result, time.perf_counter() - started
+
+
+def run_adaptive(detector, frames, args):
+    tracker = RoiTracker(CLASS_FACE, min_interval=args.min_interval, max_interval=args.max_interval,
+                         margin=args.margin)
+    result = []
+    started = time.perf_counter()
+    for frame in frames:
+        roi = tracker.plan(frame)
+        if roi is None:
+            dets = detector(frame)
+            tracker.observe_full(frame, dets)
+        else:
+            x0, y0, x1, y1 = roi
+            dets = offset_detections(detector(frame[y0:y1, x0:x1], args.roi_input_size), x0, y0)
+            tracker.observe_roi(dets)
+        result.append(flags(dets))
+    return result, time.perf_counter() - started, tracker.stats()
+
+
+def window_counts(frame_flags):
+    """与 update_buffer 相同：每 5 帧累计一次闭眼 / 张嘴帧数"""
+    arr = np.asarray(frame_flags, dtype=np.int32)
+    usable = len(arr) // 5 * 5
+    return arr[:usable].reshape(-1, 5, 2).sum(axis=1)
+
+
+def evaluate_clip(detector, path, args):
+    frames = read_frames(path, args.max_frames)
+    if not frames:
+        return {"clip": path, "error": "no frames decoded"}
+    baseline, full_seconds = run_full(detector, frames)
+    adaptive, adaptive_seconds, tracker_stats = run_adaptive(detector, frames, args)
+    base_arr, adapt_arr = np.asarray(baseline), np.asarray(adaptive)
+    base_win, adapt_win = window_counts(baseline), window_counts(adaptive)
+    return {
+        "clip": path,
+        "frames": len(frames),
+        "full_fps": len(frames) / full_seconds,
+        "adaptive_fps": len(frames) / adaptive_seconds,
+        "eyes_closed_frame_agreement": float((base_arr[:, 0] == adapt_arr[:, 0]).mean()),
+        "mouth_opened_frame_agreement": float((base_arr[:, 1] == adapt_arr[:, 1]).mean()),
+        "window_exact_agreement": float((base_win == adapt_win).all(axis=1).mean()) if len(base_win) else None,
+        "window_mean_abs_count_error": float(np.abs(base_win - adapt_win).mean()) if len(base_win) else None,
+        "tracker": tracker_stats,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Adaptive ROI tracking accuracy vs fps")
+    parser.add_argument("clips", nargs="+", help="recorded driver video files")
+    parser.add_argument("--weights", default="config/yolov4-tiny_obj_best.weights")
+    parser.add_argument("--roi-input-size", type=int, default=256)
+    parser.add_argument("--min-interval", type=int, default=2)
+    parser.add_argument("--max-interval", type=int, default=10)
+    parser.add_argument("--margin", type=float, default=0.25)
+    parser.add_argument("--max-frames", type=int, default=0, help="0 means the whole clip")
+    args = parser.parse_args(argv)
+
+    detector = Detector(args.weights)
+    reports = [evaluate_clip(detector, clip, args) for clip in args.clips]
+    print(json.dumps(reports, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,566 @@
+# bench/suite.py
+# 可复现的端到端基准套件，输出可跨提交对比的 JSON 报告。
+#
+# - 端到端：在子进程中启动完整服务（数据库换成本地 SQLite 替身，无需 MySQL），
+#   模拟 N 个 /ws/{username} 客户端和 M 个 /detect_fatigue/ 调用方按固定帧率发送驾驶员画面，
+#   统计每帧延迟 p50/p95/p99、吞吐、被拒绝/出错的帧数、服务进程（含推理工作进程）的内存 RSS，
+#   并从 /metrics 读取服务端各阶段的平均耗时；
+# - 微基准：在本进程中加载模型，分别计时 detect、三个 predict_* 和 process_image。
+#
+# 帧流为合成画面（固定 seed）或录制的视频 / 图片目录，CPU-only 的 Linux 机器即可离线运行。
+#
+# 用法（在项目根目录执行）:
+#   python -m bench.suite                                   # 默认场景，报告写入 data/bench/
+#   python -m bench.suite --scenario 1:0 --scenario 4:2 --duration 60 --fps 15
+#   python -m bench.suite --source clip.mp4 --set INFERENCE_WORKERS=2 --compare data/bench/old.json
+# --scenario 为 "WebSocket 客户端数:HTTP 调用方数"；--set 覆盖 config.Settings 中的配置项，
+# 对服务进程和微基准同时生效。
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import re
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from itertools import cycle
+from typing import Dict, List
+
+import numpy as np
+
+from bench.frames import load_stream
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# ---------------- 配置覆盖 ----------------
+
+def _coerce(current, raw: str):
+    if isinstance(current, bool):
+        return raw.strip().lower() in ("1", "true", "yes", "on")
+    if isinstance(current, int):
+        return int(raw)
+    if isinstance(current, float):
+        return float(raw)
+    return raw
+
+
+def apply_overrides(pairs: List[str]) -> Dict[str, object]:
+    """把 KEY=VALUE 形式的覆盖项写入 settings，按原配置项的类型转换"""
+    from config.config import settings
+    applied = {}
+    for pair in pairs:
+        key, sep, raw = pair.partition("=")
+        if not sep or not hasattr(settings, key):
+            raise SystemExit(f"unknown setting override '{pair}'")
+        value = _coerce(getattr(settings, key), raw)
+        setattr(settings, key, value)
+        applied[key] = value
+    return applied
+
+
+# ---------------- 服务进程 ----------------
+
+def serve(args):
+    """子进程入口：应用覆盖项后以 uvicorn 启动 main:app"""
+    apply_overrides(args.set)
+    import uvicorn
+    from main import app
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _children(pid: int) -> List[int]:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return children
+
+
+def process_tree_rss(pid: int) -> int:
+    """pid 及其全部子孙进程的 RSS 之和（字节），读取 /proc，仅支持 Linux"""
+    total = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            continue
+        stack.extend(_children(current))
+    return total
+
+
+class Server:
+
+    def __init__(self, overrides: List[str], workdir: str):
+        self.port = _free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        # 每次运行使用全新的 SQLite 数据库和落盘文件，结果互不影响
+        self.overrides = [
+            "DB_BACKEND=sqlite",
+            f"DB_SQLITE_PATH={os.path.join(workdir, 'bench.sqlite3')}",
+            f"EVENT_WRITER_SPILL_PATH={os.path.join(workdir, 'spill.jsonl')}",
+            f"SESSION_SNAPSHOT_PATH={os.path.join(workdir, 'snapshots.sqlite3')}",
+            "LOG_LEVEL=WARNING",
+        ] + list(overrides)
+        self.process = None
+        self.startup_seconds = None
+
+    def start(self, timeout: float):
+        import httpx
+        command = [sys.executable, "-m", "bench.suite", "--serve", "--port", str(self.port)]
+        for pair in self.overrides:
+            command += ["--set", pair]
+        started = time.perf_counter()
+        self.process = subprocess.Popen(command, cwd=PROJECT_ROOT)
+        deadline = started + timeout
+        while time.perf_counter() < deadline:
+            if self.process.poll() is not None:
+                raise SystemExit(f"benchmark server exited with code {self.process.returncode}")
+            try:
+                health = httpx.get(f"{self.base_url}/api/v4/health", timeout=2.0).json()
+                if health.get("status") == "ok":
+                    self.startup_seconds = time.perf_counter() - started
+                    return
+                if health.get("status") == "degraded":
+                    raise SystemExit(f"models failed to load: {health}")
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.5)
+        self.stop()
+        raise SystemExit(f"benchmark server was not ready after {timeout:.0f}s")
+
+    def rss(self) -> int:
+        return process_tree_rss(self.process.pid)
+
+    def scrape_metrics(self) -> str:
+        import httpx
+        try:
+            return httpx.get(f"{self.base_url}/metrics", timeout=5.0).text
+        except httpx.HTTPError:
+            return ""
+
+    def stop(self):
+        if self.process is None or self.process.poll() is not None:
+            return
+        # SIGINT 让 uvicorn 走完 lifespan 关闭流程
+        self.process.send_signal(signal.SIGINT)
+        try:
+            self.process.wait(30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+# ---------------- 统计 ----------------
+
+def summarize(samples_seconds: List[float]) -> Dict[str, float]:
+    if not samples_seconds:
+        return {"n": 0}
+    ms = np.asarray(samples_seconds, dtype=np.float64) * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "n": int(ms.size),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+class ClientStats:
+    """一类客户端在计时窗口内（预热之后）的结果"""
+
+    def __init__(self, warmup_until: float):
+        self.warmup_until = warmup_until
+        self.latencies: List[float] = []
+        self.busy = 0
+        self.loading = 0
+        self.errors = 0
+
+    def record(self, sent: float, done: float, outcome: str):
+        if sent < self.warmup_until:
+            return
+        if outcome == "ok":
+            self.latencies.append(done - sent)
+        elif outcome == "busy":
+            self.busy += 1
+        elif outcome == "loading":
+            self.loading += 1
+        else:
+            self.errors += 1
+
+    def report(self, duration: float) -> Dict[str, object]:
+        report = summarize(self.latencies)
+        report.update({
+            "throughput_fps": round(len(self.latencies) / duration, 3),
+            "busy": self.busy,
+            "loading": self.loading,
+            "errors": self.errors,
+        })
+        return report
+
+
+def _pace(next_at: float, interval: float) -> float:
+    """返回下一帧的发送时间；落后时不补发，从当前时刻重新计时"""
+    if not interval:
+        return time.perf_counter()
+    next_at += interval
+    return max(next_at, time.perf_counter())
+
+
+async def ws_client(url: str, jpegs: List[bytes], offset: int, fps: float, stop_at: float,
+                    stats: ClientStats, timeout: float):
+    import websockets
+    from services.frame_codec import FRAME_HEADER
+    interval = 1.0 / fps if fps > 0 else 0.0
+    try:
+        async with websockets.connect(url, max_size=None, open_timeout=timeout) as ws:
+            seq = 0
+            next_at = time.perf_counter()
+            while next_at < stop_at:
+                await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+                jpeg = jpegs[(offset + seq) % len(jpegs)]
+                sent = time.perf_counter()
+                try:
+                    await ws.send(FRAME_HEADER.pack(seq, time.time() * 1000.0) + jpeg)
+                    reply = json.loads(await asyncio.wait_for(ws.recv(), timeout))
+                    outcome = "busy" if reply.get("busy") else "loading" if reply.get("loading") else \
+                        "error" if reply.get("error") else "ok"
+                except asyncio.TimeoutError:
+                    outcome = "error"
+                stats.record(sent, time.perf_counter(), outcome)
+                seq += 1
+                next_at = _pace(next_at, interval)
+    except (OSError, asyncio.TimeoutError, websockets.WebSocketException):
+        stats.record(time.perf_counter(), time.perf_counter(), "error")
+
+
+async def post_client(client, url: str, username: str, jpegs: List[bytes], offset: int, fps: float,
+                      stop_at: float, stats: ClientStats):
+    import httpx
+    interval = 1.0 / fps if fps > 0 else 0.0
+    bodies = [json.dumps({
+        "username": username,
+        "image": "data:image/jpeg;base64," + base64.b64encode(jpeg).decode("ascii"),
+    }) for jpeg in jpegs]
+    seq = 0
+    next_at = time.perf_counter()
+    while next_at < stop_at:
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+        body = bodies[(offset + seq) % len(bodies)]
+        sent = time.perf_counter()
+        try:
+            response = await client.post(url, content=body, headers={"Content-Type": "application/json"})
+            if response.status_code == 200:
+                outcome = "ok"
+            elif response.status_code == 503:
+                outcome = "loading" if "加载" in response.text else "busy"
+            else:
+                outcome = "error"
+        except httpx.HTTPError:
+            outcome = "error"
+        stats.record(sent, time.perf_counter(), outcome)
+        seq += 1
+        next_at = _pace(next_at, interval)
+
+
+async def _sample_rss(server: Server, stop: asyncio.Event, peaks: List[int]):
+    while not stop.is_set():
+        peaks.append(server.rss())
+        try:
+            await asyncio.wait_for(stop.wait(), 0.5)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_scenario(server: Server, index: int, ws_clients: int, post_clients: int,
+                       jpegs: List[bytes], args) -> Dict[str, object]:
+    import httpx
+    started = time.perf_counter()
+    warmup_until = started + args.warmup
+    stop_at = warmup_until + args.duration
+    ws_stats, post_stats = ClientStats(warmup_until), ClientStats(warmup_until)
+    ws_base = server.base_url.replace("http://", "ws://")
+    stop_sampling = asyncio.Event()
+    rss_samples: List[int] = []
+    sampler = asyncio.create_task(_sample_rss(server, stop_sampling, rss_samples))
+    stride = max(1, len(jpegs) // max(1, ws_clients + post_clients))
+    async with httpx.AsyncClient(timeout=args.request_timeout) as client:
+        tasks = [ws_client(f"{ws_base}/api/v4/ws/bench-{index}-ws-{i}", jpegs, i * stride, args.fps,
+                           stop_at, ws_stats, args.request_timeout)
+                 for i in range(ws_clients)]
+        tasks += [post_client(client, f"{server.base_url}/api/v4/detect_fatigue/", f"bench-{index}-post-{i}",
+                              jpegs, (ws_clients + i) * stride, args.fps, stop_at, post_stats)
+                  for i in range(post_clients)]
+        await asyncio.gather(*tasks)
+    stop_sampling.set()
+    await sampler
+    total = ClientStats(warmup_until)
+    for stats in (ws_stats, post_stats):
+        total.latencies += stats.latencies
+        total.busy += stats.busy
+        total.loading += stats.loading
+        total.errors += stats.errors
+    return {
+        "name": f"ws={ws_clients},post={post_clients}",
+        "ws_clients": ws_clients,
+        "post_clients": post_clients,
+        "ws": ws_stats.report(args.duration) if ws_clients else None,
+        "post": post_stats.report(args.duration) if post_clients else None,
+        "total": total.report(args.duration),
+        "rss_peak_mb": round(max(rss_samples, default=0) / 2 ** 20, 1),
+    }
+
+
+_SAMPLE = re.compile(r'^(fatigue_(?:stage|frame)_seconds)_(sum|count)\{?([^}]*)\}? (\S+)$')
+
+
+def server_stage_means(metrics_text: str) -> Dict[str, float]:
+    """从 /metrics 中汇总各阶段（含各工作进程）的平均耗时（毫秒）"""
+    sums: Dict[str, float] = {}
+    counts: Dict[str, float] = {}
+    for line in metrics_text.splitlines():
+        match = _SAMPLE.match(line)
+        if not match:
+            continue
+        name, kind, labels, value = match.groups()
+        stage = re.search(r'stage="([^"]+)"', labels)
+        key = stage.group(1) if stage else "frame"
+        target = sums if kind == "sum" else counts
+        target[key] = target.get(key, 0.0) + float(value)
+    return {key: round(sums[key] / counts[key] * 1000.0, 3) for key in sums if counts.get(key)}
+
+
+def run_e2e(jpegs: List[bytes], args) -> Dict[str, object]:
+    with tempfile.TemporaryDirectory(prefix="fatigue-bench-") as workdir:
+        server = Server(args.set, workdir)
+        server.start(args.startup_timeout)
+        try:
+            idle_rss = server.rss()
+            scenarios = []
+            for index, scenario in enumerate(args.scenario):
+                ws_clients, _, post_clients = scenario.partition(":")
+                result = asyncio.run(run_scenario(server, index, int(ws_clients), int(post_clients or 0),
+                                                  jpegs, args))
+                print(f"[e2e] {result['name']}: {json.dumps(result['total'], ensure_ascii=False)}")
+                scenarios.append(result)
+            metrics_text = server.scrape_metrics()
+            end_rss = server.rss()
+        finally:
+            server.stop()
+    return {
+        "server": {
+            "startup_seconds": round(server.startup_seconds, 3),
+            "rss_idle_mb": round(idle_rss / 2 ** 20, 1),
+            "rss_end_mb": round(end_rss / 2 ** 20, 1),
+        },
+        "scenarios": scenarios,
+        # 全部场景累计的服务端各阶段平均耗时
+        "server_stage_mean_ms": server_stage_means(metrics_text),
+    }
+
+
+# ---------------- 微基准 ----------------
+
+def _time_calls(fn, iterations: int, warmup: int) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    report = summarize(samples)
+    report["ops_per_sec"] = round(len(samples) / sum(samples), 3) if sum(samples) else 0.0
+    return report
+
+
+def run_micro(frames: List[np.ndarray], args) -> Dict[str, object]:
+    from fastapi import BackgroundTasks
+    from config.config import settings
+    from db import database
+    from routers import fatigue_api as fa
+    from services.worker_pool import RecordCollector
+
+    # 只测单次调用本身，不经过跨会话微批；事件不写库
+    settings.LSTM_BATCH_ENABLED = False
+    database.event_writer = RecordCollector()
+    started = time.perf_counter()
+    fa.models.load_all()
+    if not fa.models.ready():
+        raise SystemExit(f"models failed to load: {fa.models.status()}")
+    load_seconds = time.perf_counter() - started
+
+    rng = np.random.default_rng(args.seed)
+    fatigue_window = rng.integers(0, 6, fa.LAG_VAL * 2).astype(np.float32)
+    eye_window = rng.integers(0, 6, fa.EYE_LAG_VAL).astype(np.float32)
+    yawn_window = rng.integers(0, 6, fa.YAWN_LAG_VAL).astype(np.float32)
+    detect_frames = cycle(frames)
+    process_frames = cycle(frames)
+
+    def detect():
+        frame = next(detect_frames)
+        H, W = frame.shape[:2]
+        fa.detect(frame, W, H)
+
+    # process_image 使用已填满窗口的会话，每 5 帧触发一次三个 LSTM 头
+    username = "bench-micro"
+    buffer = fa.sessions.get(username).buffer
+    for ring in (buffer.lstm_input, buffer.eye_input, buffer.yawn_input):
+        while len(ring) < ring.capacity:
+            ring.push(0)
+
+    def process_image():
+        fa.process_image(next(process_frames), BackgroundTasks(), username)
+        database.event_writer.drain()
+
+    iterations, warmup = args.iterations, args.micro_warmup
+    return {
+        "model_load_seconds": round(load_seconds, 3),
+        "detect": _time_calls(detect, iterations, warmup),
+        "predict_fatigue": _time_calls(lambda: fa.predict_fatigue(fatigue_window, fa.LAG_VAL), iterations, warmup),
+        "predict_eye_closure": _time_calls(lambda: fa.predict_eye_closure(eye_window, fa.EYE_LAG_VAL),
+                                           iterations, warmup),
+        "predict_yawn": _time_calls(lambda: fa.predict_yawn(yawn_window, fa.YAWN_LAG_VAL), iterations, warmup),
+        "process_image": _time_calls(process_image, iterations, warmup),
+    }
+
+
+# ---------------- 报告 ----------------
+
+def _git(*command) -> str:
+    try:
+        return subprocess.run(["git", *command], cwd=PROJECT_ROOT, capture_output=True, text=True,
+                              timeout=30).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def _flatten(report, prefix="") -> Dict[str, float]:
+    flat = {}
+    if isinstance(report, dict):
+        for key, value in report.items():
+            flat.update(_flatten(value, f"{prefix}{key}."))
+    elif isinstance(report, list):
+        for item in report:
+            name = item.get("name") if isinstance(item, dict) else None
+            if name:
+                flat.update(_flatten(item, f"{prefix}{name}."))
+    elif isinstance(report, (int, float)) and not isinstance(report, bool):
+        flat[prefix.rstrip(".")] = float(report)
+    return flat
+
+
+def compare(old: Dict, new: Dict) -> List[str]:
+    """逐项对比两份报告中的延迟 / 吞吐 / 内存指标"""
+    old_flat, new_flat = _flatten(old), _flatten(new)
+    tracked = ("_ms", "fps", "ops_per_sec", "_mb", "_seconds")
+    lines = [f"{'metric':<60} {'old':>12} {'new':>12} {'change':>9}"]
+    for key in sorted(set(old_flat) & set(new_flat)):
+        if not key.startswith(("e2e.", "micro.")) or not any(part.endswith(tracked) for part in key.split(".")):
+            continue
+        before, after = old_flat[key], new_flat[key]
+        change = f"{(after - before) / before * 100.0:+.1f}%" if before else "n/a"
+        lines.append(f"{key:<60} {before:>12.3f} {after:>12.3f} {change:>9}")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end and micro benchmark suite")
+    parser.add_argument("--source", default="synthetic",
+                        help='"synthetic", or a recorded video file / directory of images')
+    parser.add_argument("--frames", type=int, default=300, help="frames in the stream (0 = whole recording)")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--quality", type=int, default=80, help="JPEG quality of the stream")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scenario", action="append",
+                        help='"WS_CLIENTS:POST_CLIENTS", repeatable (default: 1:0 and 4:2)')
+    parser.add_argument("--fps", type=float, default=15.0, help="frames per second per client (0 = closed loop)")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds before each scenario")
+    parser.add_argument("--request-timeout", type=float, default=30.0)
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--iterations", type=int, default=200, help="timed calls per micro benchmark")
+    parser.add_argument("--micro-warmup", type=int, default=10)
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="override a config.Settings value, repeatable")
+    parser.add_argument("--skip-e2e", action="store_true")
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--output", help="report path (default: data/bench/report-<commit>-<time>.json)")
+    parser.add_argument("--compare", help="previous report to diff against")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve(args)
+        return
+    args.scenario = args.scenario or ["1:0", "4:2"]
+    os.chdir(PROJECT_ROOT)
+    overrides = apply_overrides(args.set)
+    frames, jpegs, stream = load_stream(args.source, args.frames, args.width, args.height,
+                                        args.fps or 15.0, args.seed, args.quality)
+    commit = _git("rev-parse", "--short", "HEAD")
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": commit,
+            "git_dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "overrides": overrides,
+            "stream": stream,
+            "fps_per_client": args.fps,
+            "duration_seconds": args.duration,
+            "warmup_seconds": args.warmup,
+            "iterations": args.iterations,
+        },
+    }
+    if not args.skip_e2e:
+        report["e2e"] = run_e2e(jpegs, args)
+    if not args.skip_micro:
+        report["micro"] = run_micro(frames, args)
+
+    output = args.output or os.path.join(
+        "data", "bench", f"report-{commit or 'nogit'}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"report written to {output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print("\n".join(compare(json.load(f), report)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# bench/ws_load.py
+# 长连接与普通接口混合负载：大量 /ws/{username} 连接持续推流的同时，若干调用方反复请求登录、个人信息、
+# 疲劳记录和统计接口，检查流式连接不占用数据库连接池——小连接池下普通接口不应出现 503（数据库繁忙）。
+#
+# 服务在子进程中启动（SQLite 替身数据库，见 bench/suite.py），默认连接池上限 4、关闭用户缓存，
+# 使每个普通请求都真正借用一次连接。报告包括：
+#   - WebSocket：建立成功 / 坚持到结束的连接数，逐帧结果（ok / busy / error）；
+#   - 普通接口：各接口延迟 p50/p95/p99 和状态码分布；
+#   - 连接池：/metrics 中的借用等待时间、借用超时次数。
+#
+# 用法（在项目根目录执行）:
+#   python -m bench.ws_load --sockets 120 --api-clients 8 --duration 30
+#   python -m bench.ws_load --sockets 200 --fps 0.2 --set DB_POOL_MAXSIZE=2
+
+import argparse
+import asyncio
+import json
+import re
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List
+
+from bench.frames import load_stream
+from bench.suite import Server, summarize
+
+PASSWORD = "bench-password"
+
+
+class SocketStats:
+
+    def __init__(self):
+        self.connected = 0
+        self.held = 0  # 一直保持到计时结束的连接数
+        self.frames = Counter()
+        self.latencies: List[float] = []
+
+    def report(self) -> Dict[str, object]:
+        return {"connected": self.connected, "held_to_end": self.held,
+                "frames": dict(self.frames), "frame_latency": summarize(self.latencies)}
+
+
+async def socket_client(url: str, jpegs: List[bytes], offset: int, fps: float, stop_at: float,
+                        stats: SocketStats, timeout: float):
+    import websockets
+    from services.frame_codec import FRAME_HEADER
+    interval = 1.0 / fps if fps > 0 else 0.0
+    try:
+        async with websockets.connect(url, max_size=None, open_timeout=timeout) as ws:
+            stats.connected += 1
+            seq = 0
+            while time.perf_counter() < stop_at:
+                if not interval:
+                    # 只保持连接，不发帧
+                    await asyncio.sleep(min(1.0, max(0.0, stop_at - time.perf_counter())))
+                    await ws.ping()
+                    continue
+                # 各连接错开发送时间，避免所有帧同时到达
+                await asyncio.sleep(interval if seq else interval * (offset % 97) / 97)
+                sent = time.perf_counter()
+                try:
+                    await ws.send(FRAME_HEADER.pack(seq, time.time() * 1000.0) + jpegs[(offset + seq) % len(jpegs)])
+                    reply = json.loads(await asyncio.wait_for(ws.recv(), timeout))
+                    outcome = "busy" if reply.get("busy") else "error" if reply.get("error") else "ok"
+                except asyncio.TimeoutError:
+                    outcome = "timeout"
+                if outcome == "ok":
+                    stats.latencies.append(time.perf_counter() - sent)
+                stats.frames[outcome] += 1
+                seq += 1
+            stats.held += 1
+    except (OSError, asyncio.TimeoutError, websockets.WebSocketException):
+        stats.frames["disconnected"] += 1
+
+
+def api_requests(username: str) -> List[tuple]:
+    """普通接口调用序列：(名称, 方法, 路径, JSON 请求体)"""
+    return [
+        ("login", "POST", "/api/v1/login", {"username": username, "password": PASSWORD, "role": "驾驶员"}),
+        ("userinfo", "POST", "/api/v2/userinfo", {"username": username}),
+        ("fatigue", "GET", f"/api/v2/fatigue?username={username}&limit=50", None),
+        ("fleet", "GET", "/api/v5/analytics/fleet", None),
+    ]
+
+
+async def api_client(client, base_url: str, username: str, stop_at: float,
+                     latencies: Dict[str, List[float]], codes: Dict[str, Counter]):
+    import httpx
+    requests = api_requests(username)
+    i = 0
+    while time.perf_counter() < stop_at:
+        name, method, path, body = requests[i % len(requests)]
+        sent = time.perf_counter()
+        try:
+            response = await client.request(method, base_url + path, json=body)
+            code = str(response.status_code)
+        except httpx.HTTPError:
+            code = "error"
+        latencies.setdefault(name, []).append(time.perf_counter() - sent)
+        codes.setdefault(name, Counter())[code] += 1
+        i += 1
+
+
+async def register_users(client, base_url: str, usernames: List[str]):
+    for username in usernames:
+        response = await client.post(base_url + "/api/v1/register", json={
+            "username": username, "password": PASSWORD, "confirm_password": PASSWORD, "carnumber": username})
+        response.raise_for_status()
+        if response.json().get("code") != 201:
+            raise SystemExit(f"failed to register {username}: {response.text}")
+
+
+_POOL_SAMPLE = re.compile(r'^(fatigue_db_pool_(?:wait_seconds_sum|wait_seconds_count|acquire_timeouts_total|'
+                          r'connections\{state="max"\}))\s+(\S+)$')
+
+
+def pool_metrics(metrics_text: str) -> Dict[str, float]:
+    values = {}
+    for line in metrics_text.splitlines():
+        match = _POOL_SAMPLE.match(line)
+        if match:
+            values[match.group(1)] = float(match.group(2))
+    count = values.get("fatigue_db_pool_wait_seconds_count", 0.0)
+    return {
+        "max_connections": values.get('fatigue_db_pool_connections{state="max"}'),
+        "acquisitions": int(count),
+        "mean_wait_ms": round(values.get("fatigue_db_pool_wait_seconds_sum", 0.0) / count * 1000.0, 3) if count else 0.0,
+        "acquire_timeouts": int(values.get("fatigue_db_pool_acquire_timeouts_total", 0.0)),
+    }
+
+
+async def run(server: Server, jpegs: List[bytes], args) -> Dict[str, object]:
+    import httpx
+    limits = httpx.Limits(max_connections=args.api_clients + 4)
+    async with httpx.AsyncClient(timeout=args.request_timeout, limits=limits) as client:
+        api_users = [f"bench-api-{i}" for i in range(args.api_clients)]
+        await register_users(client, server.base_url, api_users)
+
+        ws_base = server.base_url.replace("http://", "ws://")
+        sockets = SocketStats()
+        socket_stop = time.perf_counter() + args.ramp + args.duration
+        tasks = []
+        for i in range(args.sockets):
+            tasks.append(asyncio.create_task(socket_client(
+                f"{ws_base}/api/v4/ws/bench-ws-{i}", jpegs, i, args.fps, socket_stop, sockets, args.request_timeout)))
+            await asyncio.sleep(args.ramp / max(1, args.sockets))
+        print(f"[ws_load] {sockets.connected}/{args.sockets} sockets open, starting API traffic")
+
+        latencies: Dict[str, List[float]] = {}
+        codes: Dict[str, Counter] = {}
+        api_stop = time.perf_counter() + args.duration
+        await asyncio.gather(*(api_client(client, server.base_url, username, api_stop, latencies, codes)
+                               for username in api_users))
+        await asyncio.gather(*tasks)
+    return {
+        "sockets": sockets.report(),
+        "api": {name: {**summarize(latencies[name]), "status": dict(codes[name])} for name in latencies},
+        "api_failures": sum(n for counter in codes.values() for code, n in counter.items() if not code.startswith("2")),
+        "db_pool": pool_metrics(server.scrape_metrics()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Many WebSocket streams alongside regular API traffic on a small DB pool")
+    parser.add_argument("--sockets", type=int, default=120)
+    parser.add_argument("--fps", type=float, default=0.5, help="frames per second per socket, 0 = connect only")
+    parser.add_argument("--api-clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of API traffic")
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds to open all sockets")
+    parser.add_argument("--frames", type=int, default=60)
+    parser.add_argument("--width", type=int, default=320)
+    parser.add_argument("--height", type=int, default=240)
+    parser.add_argument("--request-timeout", type=float, default=30.0)
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="override a config.Settings value in the server process")
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args(argv)
+
+    _, jpegs, _ = load_stream("synthetic", args.frames, args.width, args.height)
+    overrides = ["DB_POOL_MINSIZE=1", "DB_POOL_MAXSIZE=4", "CACHE_ENABLED=false"] + args.set
+    with tempfile.TemporaryDirectory(prefix="fatigue-ws-load-") as workdir:
+        server = Server(overrides, workdir)
+        server.start(args.startup_timeout)
+        try:
+            report = asyncio.run(run(server, jpegs, args))
+        finally:
+            server.stop()
+    report["settings"] = {"sockets": args.sockets, "fps": args.fps, "api_clients": args.api_clients,
+                          "duration": args.duration, "overrides": overrides}
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+# bench/yolo_eval.py
+# YOLO 推理变体的精度 / 延迟对比（校准与选型用）。
+# 在 config/test.txt 的标注图片上计算各类别 AP@0.5 和 mAP，以及疲劳判断实际使用的
+# 逐帧“闭眼 / 张嘴是否出现”标志 (Detections.present) 的准确率，同时报告单帧延迟（前向 + 解码）。
+#
+# 用法（在项目根目录执行）:
+#   python -m bench.yolo_eval --image-root data/obj \
+#       --variants opencv:416 opencv:320 opencv:256 opencv_int8:416 opencv_int8:320
+#   python -m bench.yolo_eval --variants onnx:416 --onnx config/yolov4-tiny_obj.int8.onnx
+#   python -m bench.yolo_eval --quantize-onnx yolov4-tiny_obj.onnx config/yolov4-tiny_obj.int8.onnx
+#
+# 标注为 darknet 格式：与图片同名的 .txt，每行 "类别 cx cy w h"（相对坐标）。
+# INT8 变体用 --calib-list（默认训练集 config/train.txt）中的图片校准，不使用测试集。
+
+import argparse
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+from services.yolo_backend import create_backend, make_blob, quantize_onnx, read_image_list
+from services.yolo_decode import decode_yolo_outputs
+
+CLASS_MOUTH_OPENED, CLASS_EYES_CLOSED = 0, 3
+CFG = "config/yolov4-tiny_obj.cfg"
+
+
+def load_labels(image_path, W, H):
+    """返回 (n, 5) 数组：类别, x1, y1, x2, y2（像素）"""
+    label_path = os.path.splitext(image_path)[0] + ".txt"
+    if not os.path.exists(label_path):
+        return np.zeros((0, 5))
+    rows = np.loadtxt(label_path, ndmin=2)
+    if rows.size == 0:
+        return np.zeros((0, 5))
+    cls, cx, cy, w, h = rows.T
+    return np.stack([cls, (cx - w / 2) * W, (cy - h / 2) * H, (cx + w / 2) * W, (cy + h / 2) * H], axis=1)
+
+
+def iou(box, boxes):
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-9)
+
+
+def average_precision(predictions, ground_truth, num_classes, iou_threshold=0.5):
+    """
+    VOC 全点插值 AP。predictions: [(图片下标, 类别, 置信度, x1, y1, x2, y2)]，
+    ground_truth: 每张图片一个 load_labels 数组。返回 {类别: AP}，没有标注的类别不计入。
+    """
+    result = {}
+    for c in range(num_classes):
+        gts = {i: gt[gt[:, 0] == c, 1:] for i, gt in enumerate(ground_truth)}
+        total = sum(len(g) for g in gts.values())
+        if total == 0:
+            continue
+        preds = sorted((p for p in predictions if p[1] == c), key=lambda p: -p[2])
+        matched = {i: np.zeros(len(g), dtype=bool) for i, g in gts.items()}
+        tp = np.zeros(len(preds))
+        for k, (image, _, _, *box) in enumerate(preds):
+            gt = gts[image]
+            if len(gt) == 0:
+                continue
+            overlaps = iou(np.asarray(box), gt)
+            best = int(overlaps.argmax())
+            if overlaps[best] >= iou_threshold and not matched[image][best]:
+                matched[image][best] = True
+                tp[k] = 1
+        if len(preds) == 0:
+            result[c] = 0.0
+            continue
+        cum_tp = np.cumsum(tp)
+        recall = cum_tp / total
+        precision = cum_tp / np.arange(1, len(preds) + 1)
+        mrec = np.concatenate([[0.0], recall, [1.0]])
+        mpre = np.concatenate([[0.0], precision, [0.0]])
+        mpre = np.maximum.accumulate(mpre[::-1])[::-1]
+        changed = np.where(mrec[1:] != mrec[:-1])[0]
+        result[c] = float(np.sum((mrec[changed + 1] - mrec[changed]) * mpre[changed + 1]))
+    return result
+
+
+def presence_scores(predicted, actual):
+    """逐帧标志的准确率、精确率、召回率"""
+    predicted, actual = np.asarray(predicted), np.asarray(actual)
+    tp = int(np.sum(predicted & actual))
+    fp = int(np.sum(predicted & ~actual))
+    fn = int(np.sum(~predicted & actual))
+    return {
+        "accuracy": float(np.mean(predicted == actual)) if len(actual) else 0.0,
+        "precision": tp / (tp + fp) if tp + fp else 0.0,
+        "recall": tp / (tp + fn) if tp + fn else 0.0,
+    }
+
+
+def evaluate(backend, images, ground_truth, input_size, num_classes, warmup):
+    for _ in range(warmup):
+        backend.forward(make_blob([images[0]], input_size))
+    latencies, predictions = [], []
+    eyes_pred, mouth_pred = [], []
+    for index, image in enumerate(images):
+        H, W = image.shape[:2]
+        started = time.perf_counter()
+        outputs = backend.forward(make_blob([image], input_size))
+        # 计时部分与实时接口一致：前向 + 默认阈值的解码 / NMS
+        detections = decode_yolo_outputs(outputs, W, H, num_classes)
+        latencies.append(time.perf_counter() - started)
+        eyes_pred.append(bool(detections.present[CLASS_EYES_CLOSED]))
+        mouth_pred.append(bool(detections.present[CLASS_MOUTH_OPENED]))
+        # mAP 需要完整的 PR 曲线，用很低的阈值重新解码
+        full = decode_yolo_outputs(outputs, W, H, num_classes, conf_threshold=0.005, score_threshold=0.005)
+        for i in full.keep:
+            x, y, w, h = full.boxes[i]
+            predictions.append((index, int(full.class_ids[i]), float(full.confidences[i]), x, y, x + w, y + h))
+    ap = average_precision(predictions, ground_truth, num_classes)
+    eyes_true = [bool(np.any(gt[:, 0] == CLASS_EYES_CLOSED)) for gt in ground_truth]
+    mouth_true = [bool(np.any(gt[:, 0] == CLASS_MOUTH_OPENED)) for gt in ground_truth]
+    latencies_ms = np.asarray(latencies) * 1000.0
+    return {
+        "mAP50": float(np.mean(list(ap.values()))) if ap else 0.0,
+        "ap50": {str(c): v for c, v in ap.items()},
+        "eyes_closed": presence_scores(eyes_pred, eyes_true),
+        "mouth_opened": presence_scores(mouth_pred, mouth_true),
+        "latency_ms": {
+            "mean": float(latencies_ms.mean()),
+            "p50": float(np.percentile(latencies_ms, 50)),
+            "p95": float(np.percentile(latencies_ms, 95)),
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare YOLO backends: mAP on labelled images and per-frame latency")
+    parser.add_argument("--variants", nargs="+", default=["opencv:416", "opencv:320", "opencv:256",
+                                                          "opencv_int8:416", "opencv_int8:320"],
+                        help="backend:input_size, backend in opencv / opencv_int8 / onnx")
+    parser.add_argument("--weights", default="config/yolov4-tiny_obj_best.weights")
+    parser.add_argument("--test-list", default="config/test.txt")
+    parser.add_argument("--calib-list", default="config/train.txt")
+    parser.add_argument("--image-root", default="data/obj",
+                        help="directory to look up list entries by file name when their paths do not exist")
+    parser.add_argument("--calib-images", type=int, default=32)
+    parser.add_argument("--dnn-backend", default="default")
+    parser.add_argument("--dnn-target", default="cpu")
+    parser.add_argument("--onnx", default="config/yolov4-tiny_obj.int8.onnx")
+    parser.add_argument("--limit", type=int, default=0, help="evaluate at most this many test images")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--quantize-onnx", nargs=2, metavar=("FP32_ONNX", "INT8_ONNX"),
+                        help="quantize an exported FP32 ONNX model with the calibration images and exit")
+    parser.add_argument("--out", help="write the JSON report here (default data/bench/yolo-eval-<time>.json)")
+    args = parser.parse_args(argv)
+
+    if args.quantize_onnx:
+        size = int(args.variants[0].split(":")[1]) if ":" in args.variants[0] else 416
+        quantize_onnx(args.quantize_onnx[0], args.quantize_onnx[1], args.calib_list, args.image_root,
+                      args.calib_images, size)
+        print(f"wrote {args.quantize_onnx[1]}")
+        return
+
+    num_classes = len(open("config/obj.names").read().strip().split("\n"))
+    paths = read_image_list(args.test_list, args.image_root)
+    if args.limit > 0:
+        paths = paths[:args.limit]
+    if not paths:
+        raise SystemExit(f"no test images found from {args.test_list} (set --image-root)")
+    images, ground_truth = [], []
+    for path in paths:
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is None:
+            continue
+        images.append(image)
+        ground_truth.append(load_labels(path, image.shape[1], image.shape[0]))
+    print(f"{len(images)} test images, {sum(len(g) for g in ground_truth)} labelled boxes")
+
+    report = {"test_images": len(images), "variants": {}}
+    for variant in args.variants:
+        kind, _, size = variant.partition(":")
+        input_size = int(size or 416)
+        backend = create_backend(kind, CFG, args.weights, input_size=input_size,
+                                 dnn_backend=args.dnn_backend, dnn_target=args.dnn_target,
+                                 onnx_path=args.onnx, calibration_list=args.calib_list,
+                                 image_root=args.image_root, calibration_images=args.calib_images)
+        result = evaluate(backend, images, ground_truth, input_size, num_classes, args.warmup)
+        result["backend"] = backend.description
+        report["variants"][variant] = result
+        print(f"{variant:<18} mAP50={result['mAP50']:.3f}  "
+              f"eyes_closed acc={result['eyes_closed']['accuracy']:.3f} "
+              f"rec={result['eyes_closed']['recall']:.3f}  "
+              f"mouth_opened acc={result['mouth_opened']['accuracy']:.3f} "
+              f"rec={result['mouth_opened']['recall']:.3f}  "
+              f"latency p50={result['latency_ms']['p50']:.1f}ms p95={result['latency_ms']['p95']:.1f}ms")
+
+    out = args.out or os.path.join("data", "bench", f"yolo-eval-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"report written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,165 @@
+import os
+
+
+def _parse_env(kind, raw: str):
+    if kind is bool:
+        return raw.strip().lower() in ("1", "true", "yes", "on")
+    return kind(raw)
+
+
 class Settings:
+    """
+    以下为默认值；启动时同名环境变量会覆盖对应配置，按注解的类型转换，
+    例如 DB_POOL_MAXSIZE=50 INFERENCE_WORKERS=2 uvicorn main:app
+    """
     DB_HOST: str = "127.0.0.1"
     DB_PORT: int = 3306
     DB_USER: str = "root"
     DB_PASSWORD: str = "123456" # 请替换为您的MySQL密码
     DB_NAME: str = "pilaojiashi"
+    # 连接池：最少/最多连接数；等待空闲连接的最长秒数（超时返回 503）；
+    # 连接使用超过多少秒后重建（避开 MySQL wait_timeout 断开的连接，-1 表示不回收）
+    DB_POOL_MINSIZE: int = 2
+    DB_POOL_MAXSIZE: int = 20
+    DB_POOL_ACQUIRE_TIMEOUT: float = 5.0
+    DB_POOL_RECYCLE: int = 3600
+    DB_CONNECT_TIMEOUT: float = 10.0
+    # 数据库后端："mysql"，或 "sqlite"（本地 SQLite 替身，见 db/sqlite_pool.py，用于离线基准测试）
+    DB_BACKEND: str = "mysql"
+    DB_SQLITE_PATH: str = "data/fatigue.sqlite3"
+
+    # users / userinfo 查询的读穿透缓存（见 db/user_cache.py）：条目存活秒数、进程内最多条目数；
+    # 后端 "memory" 为进程内缓存，多工作进程部署时用 "redis" 共享缓存，修改后所有进程立即失效
+    CACHE_ENABLED: bool = True
+    CACHE_BACKEND: str = "memory"
+    CACHE_TTL: float = 300.0
+    CACHE_MAX_ENTRIES: int = 10000
+    CACHE_REDIS_URL: str = "redis://127.0.0.1:6379/0"
+
+    # 疲劳事件批量写入：攒够多少条或隔多少秒写一次；内存中最多缓存的条数，
+    # 超出或数据库长时间不可用时写入本地落盘文件，数据库恢复后自动补写
+    EVENT_WRITER_BATCH_SIZE: int = 100
+    EVENT_WRITER_FLUSH_INTERVAL: float = 1.0
+    EVENT_WRITER_MAX_BUFFERED: int = 10000
+    EVENT_WRITER_SPILL_PATH: str = "data/fatigue_spill.jsonl"
+    # 同一疲劳等级持续时，每隔多少秒把已累计的时长写入统计表（会话被清除时最多丢失这么久）
+    STATE_SPAN_CHECKPOINT_INTERVAL: float = 60.0
+
+    # 驾驶员会话空闲多久(秒)后被清除
+    SESSION_IDLE_TTL: float = 600.0
+    # 单进程内最多同时保留的会话数，超出后按最近最少使用淘汰没有活动连接的会话（有连接的会话不淘汰）
+    SESSION_MAX_COUNT: int = 256
+    # 会话快照：特征窗口、确认计数器和当前状态每 5 帧记录一次，后台每 FLUSH_INTERVAL 秒批量写入本地 SQLite 文件。
+    # 断线重连、会话被清除或服务重启后，SESSION_SNAPSHOT_TTL 秒内新建的会话从快照恢复，预测立即继续
+    SESSION_SNAPSHOT_ENABLED: bool = True
+    SESSION_SNAPSHOT_PATH: str = "data/session_snapshots.sqlite3"
+    SESSION_SNAPSHOT_TTL: float = 900.0
+    SESSION_SNAPSHOT_FLUSH_INTERVAL: float = 1.0
+
+    # 监控端实时推送 (/api/v4/live，见 services/live_hub.py)：发布队列上限；每个订阅者最多合并保留的待发送事件数，
+    # 以及两次推送的最小间隔（秒，订阅时只能调大）。按分组订阅时分组取 userinfo 的 LIVE_GROUP_FIELD 列，
+    # 查询结果缓存 LIVE_GROUP_TTL 秒
+    LIVE_QUEUE_SIZE: int = 10000
+    LIVE_SUBSCRIBER_MAX_PENDING: int = 1024
+    LIVE_MIN_INTERVAL: float = 0.5
+    LIVE_GROUP_FIELD: str = "work"
+    LIVE_GROUP_TTL: float = 300.0
+
+    # YOLO 推理后端（见 services/yolo_backend.py）："opencv"、"opencv_int8"（OpenCV 训练后 INT8 量化）
+    # 或 "onnx"（onnxruntime 运行 YOLO_ONNX_PATH）；输入尺寸须为 32 的倍数，越小越快、小目标越容易漏检。
+    # YOLO_DNN_BACKEND 可选 default/opencv/inference_engine/cuda，
+    # YOLO_DNN_TARGET 可选 cpu/cpu_fp16/opencl/opencl_fp16/cuda/cuda_fp16。
+    # INT8 量化的校准图片取自 YOLO_CALIBRATION_LIST，列表中的路径不存在时到 YOLO_IMAGE_ROOT 下按文件名查找。
+    # 选哪个变体请先用 python -m bench.yolo_eval 对比 mAP 和延迟
+    YOLO_BACKEND: str = "opencv"
+    YOLO_INPUT_SIZE: int = 416
+    YOLO_DNN_BACKEND: str = "default"
+    YOLO_DNN_TARGET: str = "cpu"
+    YOLO_ONNX_PATH: str = "config/yolov4-tiny_obj.int8.onnx"
+    YOLO_CALIBRATION_LIST: str = "config/train.txt"
+    YOLO_IMAGE_ROOT: str = "data/obj"
+    YOLO_CALIBRATION_IMAGES: int = 32
+
+    # 源图远大于网络输入时，JPEG 直接按 1/2、1/4、1/8 缩小解码，只要缩小后短边仍不小于
+    # YOLO_INPUT_SIZE * FRAME_DECODE_MIN_SCALE；返回的检测框仍是原图坐标。对比见 python -m bench.frame_decode
+    FRAME_DECODE_REDUCED: bool = True
+    FRAME_DECODE_MIN_SCALE: float = 1.0
+
+    # YOLO 跨会话微批：单批最多帧数，以及第一帧最多等待多少毫秒凑批
+    YOLO_BATCH_ENABLED: bool = True
+    YOLO_BATCH_MAX_SIZE: int = 8
+    YOLO_BATCH_MAX_WAIT_MS: float = 5.0
+
+    # 推理执行器：线程数、最多同时在途的帧数（超出即丢帧/返回503），
+    # 以及可选的预加载模型的进程池大小（0 表示不启用）
+    INFERENCE_THREADS: int = 4
+    INFERENCE_MAX_PENDING: int = 32
+    INFERENCE_PROCESS_WORKERS: int = 0
+
+    # 多进程推理工作池：工作进程数（0 表示在 API 进程内推理）。每个工作进程各加载一份模型，
+    # 驾驶员会话固定在一个工作进程上，帧经共享内存槽位传递。启用后 INFERENCE_PROCESS_WORKERS 不再使用
+    INFERENCE_WORKERS: int = 0
+    INFERENCE_WORKER_POLICY: str = "least_sessions"  # 新会话的分配策略："least_sessions" 或 "hash"
+    INFERENCE_WORKER_SLOTS: int = 4  # 每个工作进程的共享内存槽位数，即最多同时在途的帧数
+    INFERENCE_WORKER_SLOT_BYTES: int = 1280 * 720 * 3  # 单个槽位大小，更大的帧直接随消息发送
+    INFERENCE_WORKER_HEALTH_INTERVAL: float = 2.0
+    INFERENCE_WORKER_TIMEOUT: float = 15.0  # 超过该时间无响应即重启
+    INFERENCE_WORKER_STARTUP_TIMEOUT: float = 300.0  # 加载模型允许的最长时间
+
+    # LSTM 推理后端："function"(固定签名的 tf.function) 或 "tflite"
+    LSTM_BACKEND: str = "function"
+    # LSTM 跨会话微批
+    LSTM_BATCH_ENABLED: bool = True
+    LSTM_BATCH_MAX_SIZE: int = 32
+    LSTM_BATCH_MAX_WAIT_MS: float = 2.0
+    # LSTM 预测缓存（见 services/prediction_cache.py）：闭眼头启动时预先算出全部 6^6 种输入的输出表，
+    # 构建批大小为 1 时与单样本调用逐位一致；打哈欠 / 疲劳头按窗口缓存最近的输出，条目数为 0 表示关闭
+    LSTM_EYE_TABLE_ENABLED: bool = True
+    LSTM_EYE_TABLE_BUILD_BATCH: int = 1
+    LSTM_PREDICTION_CACHE_SIZE: int = 4096
+
+    # 模型在后台并发加载的线程数（设为1即逐个加载）
+    MODEL_LOAD_WORKERS: int = 4
+    # LSTM 推理产物（追踪好的 SavedModel / 转换好的 .tflite）的磁盘缓存，模型文件变化后自动失效
+    MODEL_CACHE_ENABLED: bool = True
+    MODEL_CACHE_DIR: str = "data/model_cache"
+
+    # 自适应检测模式：每 K 帧做一次全图检测，中间帧跟踪人脸框并只在 ROI 上检测。
+    # K 在 [ROI_MIN_INTERVAL, ROI_MAX_INTERVAL] 间随人脸置信度和运动幅度调整
+    ROI_TRACKING_ENABLED: bool = False
+    ROI_MIN_INTERVAL: int = 2
+    ROI_MAX_INTERVAL: int = 10
+    ROI_INPUT_SIZE: int = 256  # 必须是32的倍数
+    ROI_MARGIN: float = 0.25
+    ROI_MOTION_THRESHOLD: float = 0.15
+    ROI_MIN_TRACK_SCORE: float = 0.5
+    ROI_MIN_FACE_CONFIDENCE: float = 0.6
+
+    # 离线视频批处理 (services/offline_video.py)：抽帧帧率（0 为源帧率）、YOLO 每批帧数、
+    # 一次推理的 LSTM 窗口数上限；API 任务只能处理 OFFLINE_VIDEO_DIR 下的文件，
+    # 同时运行的任务数，以及任务结果 JSON 的保存目录
+    OFFLINE_VIDEO_SAMPLE_FPS: float = 0.0
+    OFFLINE_YOLO_BATCH_SIZE: int = 16
+    OFFLINE_LSTM_MAX_CHUNK: int = 512
+    OFFLINE_VIDEO_DIR: str = "data/videos"
+    OFFLINE_VIDEO_MAX_JOBS: int = 1
+    OFFLINE_VIDEO_RESULT_DIR: str = "data/video_jobs"
+
+    # 日志：级别、格式（"text" 为 key=value，"json" 为每行一个 JSON），
+    # 以及限流——同一条日志每 LOG_RATE_LIMIT_INTERVAL 秒最多输出 LOG_RATE_LIMIT_BURST 条（0 表示不限流）
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "text"
+    LOG_RATE_LIMIT_INTERVAL: float = 10.0
+    LOG_RATE_LIMIT_BURST: int = 5
+
+    # /metrics 指标接口（Prometheus 文本格式）
+    METRICS_ENABLED: bool = True
+
+    def __init__(self):
+        for name, kind in type(self).__annotations__.items():
+            raw = os.environ.get(name)
+            if raw is not None:
+                setattr(self, name, _parse_env(kind, raw))
+
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
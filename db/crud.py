@@ -1,7 +1,12 @@
 # db/crud.py
+import base64
 from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
 import aiomysql
 from entity.schemas import FatigueCreate  # 从同级目录的schemas导入
+from services.log import get_logger
+
+log = get_logger(__name__)
 
 
 async def create_fatigue_record(db: aiomysql.Connection, fatigue: FatigueCreate):
@@ -18,12 +23,141 @@ async def create_fatigue_record(db: aiomysql.Connection, fatigue: FatigueCreate)
         async with db.cursor() as cursor:
             await cursor.execute(query, args)
         # autocommit=True 在连接池创建时已设置，此处无需手动commit
-        print(f"Successfully inserted record for user '{fatigue.username}' at {fatigue.event_time}")
+        log.debug("fatigue_record_inserted", username=fatigue.username, event_time=fatigue.event_time)
         return True
     except Exception as e:
-        print(f"Error inserting fatigue record into database: {e}")
+        log.error("fatigue_record_insert_failed", username=fatigue.username, error=str(e))
         return False
 
+
+async def create_fatigue_records(db: aiomysql.Connection, records: List[FatigueCreate]) -> int:
+    """
+    批量写入疲劳记录，executemany 会被合并为一条多行 INSERT。
+    与 create_fatigue_record 不同，这里不吞掉异常，由调用方决定重试或落盘。
+
+    :param db: 数据库连接对象
+    :param records: 疲劳记录列表
+    :return: 写入的行数
+    """
+    if not records:
+        return 0
+    query = "INSERT INTO fatigue (username, status, time) VALUES (%s, %s, %s)"
+    args = [(r.username, r.status, r.event_time) for r in records]
+    async with db.cursor() as cursor:
+        await cursor.executemany(query, args)
+    return len(args)
+
+
+# ---------------- 疲劳记录查询（键集分页） ----------------
+
+# 允许投影的列；id 和 time 同时作为分页游标，查询时总会带上
+FATIGUE_COLUMNS = ("id", "username", "status", "time")
+
+
+def encode_fatigue_cursor(row: Dict[str, Any]) -> str:
+    """把一页最后一行的 (time, id) 编码为不透明的游标字符串"""
+    raw = f"{row['time'].isoformat()}|{row['id']}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_fatigue_cursor(cursor: str) -> Tuple[datetime, int]:
+    """解析游标，格式不正确时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        time_part, id_part = raw.rsplit("|", 1)
+        return datetime.fromisoformat(time_part), int(id_part)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"invalid cursor: {cursor!r}") from e
+
+
+def build_fatigue_query(columns: Sequence[str], username: Optional[str] = None,
+                        statuses: Optional[Sequence[str]] = None, start: Optional[datetime] = None,
+                        end: Optional[datetime] = None, after: Optional[Tuple[datetime, int]] = None,
+                        limit: Optional[int] = None) -> Tuple[str, list]:
+    """
+    构造按时间倒序的疲劳记录查询。
+
+    按 (time, id) 做键集分页：下一页从上一页最后一行之后继续，不使用 OFFSET，
+    翻到多深都只扫描一页的数据。带 username 时走 (username, time) 组合索引
+    （InnoDB 二级索引隐含主键 id，排序无需 filesort）。
+
+    :param columns: 要返回的列，必须是 FATIGUE_COLUMNS 的子集
+    :param after: 上一页最后一行的 (time, id)，为 None 时从最新一条开始
+    :param limit: 最多返回的行数，None 表示不限
+    """
+    unknown = set(columns) - set(FATIGUE_COLUMNS)
+    if unknown:
+        raise ValueError(f"unknown columns: {sorted(unknown)}")
+    selected = [c for c in FATIGUE_COLUMNS if c in columns or c in ("id", "time")]
+
+    where, args = [], []
+    if username:
+        where.append("`username` = %s")
+        args.append(username)
+    if statuses:
+        where.append("`status` IN (" + ", ".join(["%s"] * len(statuses)) + ")")
+        args.extend(statuses)
+    if start is not None:
+        where.append("`time` >= %s")
+        args.append(start)
+    if end is not None:
+        where.append("`time` <= %s")
+        args.append(end)
+    if after is not None:
+        # 展开写法比行构造器 (time, id) < (%s, %s) 更稳定地走索引范围扫描
+        where.append("(`time` < %s OR (`time` = %s AND `id` < %s))")
+        args.extend([after[0], after[0], after[1]])
+
+    query = "SELECT " + ", ".join(f"`{c}`" for c in selected) + " FROM `fatigue`"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += " ORDER BY `time` DESC, `id` DESC"
+    if limit is not None:
+        query += " LIMIT %s"
+        args.append(limit)
+    return query, args
+
+
+def _project(row: Dict[str, Any], columns: Sequence[str]) -> Dict[str, Any]:
+    return {c: row[c] for c in columns}
+
+
+async def query_fatigue_page(db: aiomysql.Connection, columns: Sequence[str], limit: int,
+                             **filters) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    查询一页疲劳记录。
+
+    :return: (当前页的行, 下一页游标)，没有下一页时游标为 None
+    """
+    # 多取一行用来判断是否还有下一页
+    query, args = build_fatigue_query(columns, limit=limit + 1, **filters)
+    async with db.cursor(aiomysql.DictCursor) as cursor:
+        await cursor.execute(query, args)
+        rows = await cursor.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_fatigue_cursor(rows[-1])
+    return [_project(row, columns) for row in rows], next_cursor
+
+
+async def stream_fatigue_records(db: aiomysql.Connection, columns: Sequence[str],
+                                 limit: Optional[int] = None, chunk_size: int = 500,
+                                 **filters) -> AsyncIterator[Dict[str, Any]]:
+    """
+    用服务端游标 (SSDictCursor) 逐批读取疲劳记录，结果集不会整体加载到内存。
+    迭代结束前连接一直被占用，调用方应尽快消费。
+    """
+    query, args = build_fatigue_query(columns, limit=limit, **filters)
+    async with db.cursor(aiomysql.SSDictCursor) as cursor:
+        await cursor.execute(query, args)
+        while True:
+            rows = await cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield _project(row, columns)
+
 #
 # async def ensure_fatigue_table_exists(db: aiomysql.Connection):
 #     """
@@ -2,44 +2,124 @@
 # database.py: 数据库连接模块
 # =======================================================================
 # 负责数据库连接的整个生命周期管理。
+# 路由只在实际执行查询时通过 acquire() 借用连接，用完立即归还，
+# 等待连接的时间、超时次数和连接池占用情况见 /metrics。
 
+import asyncio
+import time
 import aiomysql
+from contextlib import asynccontextmanager
 from typing import Optional, AsyncGenerator
 from fastapi import HTTPException, FastAPI
 from config.config import settings
+from db import sqlite_pool
+from db.event_writer import FatigueEventWriter
+from services import metrics
+from services.log import get_logger
+
+log = get_logger(__name__)
+
+pool_wait_seconds = metrics.registry.histogram(
+    "fatigue_db_pool_wait_seconds", "Time spent waiting for a free database connection in seconds")
+pool_acquire_timeouts = metrics.registry.counter(
+    "fatigue_db_pool_acquire_timeouts_total", "Requests rejected because no database connection became free in time")
 
 # 全局变量，用于存储数据库连接池
-db_pool: Optional[aiomysql.Pool] = None
+db_pool: Optional[aiomysql.Pool] = None  # DB_BACKEND="sqlite" 时为 sqlite_pool.SQLitePool
 
-async def lifespan(app: FastAPI):
-    """
-    FastAPI 应用的生命周期函数。
-    在应用启动时创建连接池，在应用关闭时安全地关闭它。
-    """
-    print("应用启动，正在创建数据库连接池...")
-    global db_pool
-    db_pool = await aiomysql.create_pool(
+# 疲劳事件异步批量写入器，随连接池一起启动和关闭
+event_writer = FatigueEventWriter(
+    lambda: db_pool,
+    batch_size=settings.EVENT_WRITER_BATCH_SIZE,
+    flush_interval=settings.EVENT_WRITER_FLUSH_INTERVAL,
+    max_buffered=settings.EVENT_WRITER_MAX_BUFFERED,
+    spill_path=settings.EVENT_WRITER_SPILL_PATH,
+)
+
+async def create_pool(minsize: int = None, maxsize: int = None):
+    """按配置创建连接池（MySQL 或 SQLite 替身），应用和命令行工具共用"""
+    minsize = settings.DB_POOL_MINSIZE if minsize is None else minsize
+    maxsize = settings.DB_POOL_MAXSIZE if maxsize is None else maxsize
+    if settings.DB_BACKEND == "sqlite":
+        return await sqlite_pool.create_pool(settings.DB_SQLITE_PATH, maxsize=maxsize)
+    return await aiomysql.create_pool(
         host=settings.DB_HOST,
         port=settings.DB_PORT,
         user=settings.DB_USER,
         password=settings.DB_PASSWORD,
         db=settings.DB_NAME,
-        autocommit=True
+        autocommit=True,
+        minsize=minsize,
+        maxsize=maxsize,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        connect_timeout=settings.DB_CONNECT_TIMEOUT,
     )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    FastAPI 应用的生命周期函数。
+    在应用启动时创建连接池，在应用关闭时安全地关闭它。
+    """
+    log.info("应用启动，正在创建数据库连接池...")
+    global db_pool
+    db_pool = await create_pool()
+    await event_writer.start()
     yield
-    print("应用关闭，正在关闭数据库连接池...")
+    log.info("应用关闭，正在写入剩余的疲劳事件...")
+    await event_writer.stop()
+    log.info("应用关闭，正在关闭数据库连接池...")
     if db_pool:
         db_pool.close()
         await db_pool.wait_closed()
 
 
-async def get_db_connection() -> AsyncGenerator[aiomysql.Connection, None]:
+@asynccontextmanager
+async def acquire() -> AsyncGenerator[aiomysql.Connection, None]:
     """
-    一个依赖项 (Dependency)，为每个请求提供一个数据库连接。
+    从连接池借用一个连接，退出 async with 时立即归还。
+    等待超过 DB_POOL_ACQUIRE_TIMEOUT 秒仍没有空闲连接时返回 503，而不是让请求无限排队。
     """
-    if not db_pool:
+    pool = db_pool
+    if not pool:
         raise HTTPException(status_code=503, detail="数据库服务不可用")
+    started = time.perf_counter()
+    try:
+        conn = await asyncio.wait_for(pool.acquire(), settings.DB_POOL_ACQUIRE_TIMEOUT)
+    except asyncio.TimeoutError:
+        pool_acquire_timeouts.inc()
+        log.warning("db_pool_exhausted", maxsize=pool.maxsize, timeout=settings.DB_POOL_ACQUIRE_TIMEOUT)
+        raise HTTPException(status_code=503, detail="数据库繁忙，请稍后重试")
+    pool_wait_seconds.observe(time.perf_counter() - started)
+    try:
+        yield conn
+    finally:
+        released = pool.release(conn)
+        if released is not None:
+            await released
+
 
-    async with db_pool.acquire() as conn:
+async def get_db_connection() -> AsyncGenerator[aiomysql.Connection, None]:
+    """
+    一个依赖项 (Dependency)，为每个请求提供一个数据库连接。
+    连接会在整个请求期间被占用，新代码请在查询处直接使用 acquire()。
+    """
+    async with acquire() as conn:
         yield conn
 
+
+def _pool_connections():
+    pool = db_pool
+    if pool is None:
+        return {}
+    in_use = pool.size - pool.freesize
+    return {"in_use": in_use, "idle": pool.freesize, "max": pool.maxsize}
+
+
+metrics.registry.gauge(
+    "fatigue_db_pool_connections", "Database pool connections by state", ["state"]).set_function(_pool_connections)
+metrics.registry.gauge(
+    "fatigue_db_pool_utilization", "Share of the database pool's maximum size currently in use").set_function(
+    lambda: {} if db_pool is None else (db_pool.size - db_pool.freesize) / db_pool.maxsize)
+
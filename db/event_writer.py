@@ -0,0 +1,295 @@
+# =======================================================================
+# event_writer.py: 疲劳事件异步批量写入模块
+# =======================================================================
+# 推理线程只把事件放进内存队列，由后台协程按数量/时间阈值用多行 INSERT 批量写入，
+# 并在同一事务中增量更新统计预聚合表 (db/rollup.py)。
+# 队列中除了 High 疲劳事件，还有各疲劳等级的持续时长 (FatigueStateSpan)，后者只计入预聚合表。
+# 数据库不可用时按指数退避重试；内存队列超过上限或应用关闭时仍未写入的事件
+# 追加到本地落盘文件 (JSON Lines)，数据库恢复后自动补写。
+
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Deque, List, Optional, Union
+
+import aiomysql
+
+from db import crud, rollup
+from entity.schemas import FatigueCreate, FatigueStateSpan
+from services.log import get_logger
+from services.metrics import stage_seconds
+
+log = get_logger(__name__)
+_db_write_seconds = stage_seconds.labels("db_write")
+
+Record = Union[FatigueCreate, FatigueStateSpan]
+
+
+def _to_line(record: Record) -> str:
+    if isinstance(record, FatigueStateSpan):
+        row = {
+            "kind": "span",
+            "username": record.username,
+            "status": record.status,
+            "start_time": record.start_time.isoformat(),
+            "end_time": record.end_time.isoformat(),
+        }
+    else:
+        row = {
+            "username": record.username,
+            "status": record.status,
+            "event_time": record.event_time.isoformat(),
+        }
+    return json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def _from_line(row: dict) -> Record:
+    if row.get("kind") == "span":
+        return FatigueStateSpan(
+            username=row["username"],
+            status=row["status"],
+            start_time=datetime.fromisoformat(row["start_time"]),
+            end_time=datetime.fromisoformat(row["end_time"]),
+        )
+    return FatigueCreate(
+        username=row["username"],
+        status=row["status"],
+        event_time=datetime.fromisoformat(row["event_time"]),
+    )
+
+
+class FatigueEventWriter:
+
+    def __init__(self, pool_getter: Callable[[], Optional[aiomysql.Pool]], batch_size: int = 100,
+                 flush_interval: float = 1.0, max_buffered: int = 10000,
+                 spill_path: str = "data/fatigue_spill.jsonl", max_backoff: float = 30.0):
+        self._pool_getter = pool_getter
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self.spill_path = spill_path
+        self.max_backoff = max_backoff
+        self._queue: Deque[Record] = deque()
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._backoff = 0.0
+        self.written = 0
+        self.spans_written = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.spill_errors = 0
+        self.bad_lines = 0
+        self.failed_flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._flush_ms_total = 0.0
+        self._flushes = 0
+
+    # ---------------- 生产者（任意线程） ----------------
+
+    def enqueue(self, event: Record):
+        """非阻塞入队（疲劳事件或状态时长），可在事件循环或推理线程中调用"""
+        overflow = None
+        with self._lock:
+            self._queue.append(event)
+            if len(self._queue) > self.max_buffered:
+                overflow = self._queue.popleft()
+            depth = len(self._queue)
+        if overflow is not None:
+            self._spill([overflow])
+        if depth >= self.batch_size:
+            self._signal()
+
+    def _signal(self):
+        if self._loop is None or self._wake is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._wake.set)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+
+    # ---------------- 生命周期 ----------------
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # 关闭前尽量写完，写不进去的全部落盘
+        if not await self.flush(drain=True):
+            with self._lock:
+                remaining = list(self._queue)
+                self._queue.clear()
+            self._spill(remaining)
+
+    async def _run(self):
+        while True:
+            timeout = self._backoff or self.flush_interval
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                if await self.flush(drain=True):
+                    await self._replay_spill()
+            except Exception:
+                # 任何意外错误都不能让写入协程退出，否则之后的事件再也不会写库
+                log.exception("fatigue_writer_iteration_failed")
+
+    # ---------------- 消费者 ----------------
+
+    async def flush(self, drain: bool = False) -> bool:
+        """写入一批（drain=True 时写空队列），返回数据库是否可用"""
+        while True:
+            with self._lock:
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            if not batch:
+                return True
+            if not await self._write(batch):
+                with self._lock:
+                    # 放回队首，保持事件顺序；超出上限的部分落盘
+                    self._queue.extendleft(reversed(batch))
+                    overflow = []
+                    while len(self._queue) > self.max_buffered:
+                        overflow.append(self._queue.pop())
+                self._spill(list(reversed(overflow)))
+                return False
+            if not drain:
+                return True
+
+    async def _write(self, batch: List[Record]) -> bool:
+        pool = self._pool_getter()
+        if pool is None:
+            self._on_failure()
+            return False
+        events = [r for r in batch if isinstance(r, FatigueCreate)]
+        spans = [r for r in batch if isinstance(r, FatigueStateSpan)]
+        started = time.perf_counter()
+        try:
+            async with pool.acquire() as conn:
+                # 事件和预聚合在同一事务中提交，失败重试时不会重复累加
+                await conn.begin()
+                try:
+                    written = await crud.create_fatigue_records(conn, events)
+                    await rollup.apply_rollups(conn, events, spans)
+                    await conn.commit()
+                except Exception:
+                    await conn.rollback()
+                    raise
+        except Exception as e:
+            log.warning("fatigue_flush_failed", records=len(batch), error=str(e))
+            self._on_failure()
+            return False
+        elapsed = time.perf_counter() - started
+        _db_write_seconds.observe(elapsed)
+        elapsed_ms = elapsed * 1000.0
+        self._backoff = 0.0
+        self.written += written
+        self.spans_written += len(spans)
+        self._flushes += 1
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self._flush_ms_total += elapsed_ms
+        return True
+
+    def _on_failure(self):
+        self.failed_flushes += 1
+        self._backoff = min(self.max_backoff, max(self.flush_interval, self._backoff * 2))
+
+    # ---------------- 本地落盘 ----------------
+
+    def _spill(self, events: List[Record]):
+        if not events:
+            return
+        lines = "".join(_to_line(e) for e in events)
+        try:
+            with self._spill_lock:
+                directory = os.path.dirname(self.spill_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(self.spill_path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+        except OSError as e:
+            # 可能在推理线程的 enqueue() 中调用，磁盘错误只记录，不向上抛出
+            self.spill_errors += len(events)
+            log.error("fatigue_spill_failed", records=len(events), path=self.spill_path, error=str(e))
+            return
+        self.spilled += len(events)
+        log.warning("fatigue_records_spilled", records=len(events), path=self.spill_path)
+
+    async def _replay_spill(self):
+        replay_path = self.spill_path + ".replay"
+        with self._spill_lock:
+            # 先改名，补写期间新落盘的事件写入新文件，互不干扰；
+            # 上次没补完的 .replay 文件优先处理
+            if not os.path.exists(replay_path):
+                if not os.path.exists(self.spill_path):
+                    return
+                os.replace(self.spill_path, replay_path)
+        events = self._read_spill(replay_path)
+        for i in range(0, len(events), self.batch_size):
+            if not await self._write(events[i:i + self.batch_size]):
+                # 已写入的部分从文件中去掉，剩余的下次再补
+                with open(replay_path, "w", encoding="utf-8") as f:
+                    f.write("".join(_to_line(e) for e in events[i:]))
+                self.replayed += i
+                return
+        os.remove(replay_path)
+        self.replayed += len(events)
+
+    def _read_spill(self, path: str) -> List[Record]:
+        """逐行解析落盘文件；进程崩溃时可能留下写了一半的行，解析失败的行移到 .bad 文件，不影响其余事件"""
+        events, bad = [], []
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    events.append(_from_line(json.loads(line)))
+                except (ValueError, KeyError, TypeError):
+                    bad.append(line if line.endswith("\n") else line + "\n")
+        if bad:
+            self.bad_lines += len(bad)
+            log.warning("fatigue_spill_bad_lines", lines=len(bad), path=path + ".bad")
+            try:
+                with open(path + ".bad", "a", encoding="utf-8") as f:
+                    f.write("".join(bad))
+            except OSError as e:
+                log.error("fatigue_spill_bad_lines_lost", lines=len(bad), error=str(e))
+        return events
+
+    def stats(self):
+        with self._lock:
+            depth = len(self._queue)
+        return {
+            "queue_depth": depth,
+            "max_buffered": self.max_buffered,
+            "written": self.written,
+            "spans_written": self.spans_written,
+            "spilled": self.spilled,
+            "replayed": self.replayed,
+            "spill_errors": self.spill_errors,
+            "bad_spill_lines": self.bad_lines,
+            "failed_flushes": self.failed_flushes,
+            "backoff_seconds": self._backoff,
+            "last_flush_ms": self.last_flush_ms,
+            "max_flush_ms": self.max_flush_ms,
+            "avg_flush_ms": self._flush_ms_total / self._flushes if self._flushes else 0.0,
+        }
@@ -0,0 +1,113 @@
+# =======================================================================
+# migrate.py: 数据库结构迁移
+# =======================================================================
+# 按文件名顺序执行 db/migrations/*.sql，已执行过的版本记录在 schema_migrations 表中，
+# 重复运行只会执行新增的迁移。建索引等 DDL 在大表上耗时较长，因此不在应用启动时自动执行。
+# MySQL 的 CREATE INDEX 不支持 IF NOT EXISTS：执行前先查 information_schema，已存在的索引跳过，
+# 迁移中途失败（DDL 无法回滚）后修复问题直接重新运行即可。
+#
+# 用法（在项目根目录执行）:
+#   python -m db.migrate            # 执行所有未执行的迁移
+#   python -m db.migrate --status   # 只查看迁移状态
+
+import argparse
+import asyncio
+import os
+import re
+from typing import List, Optional, Tuple
+
+import aiomysql
+
+from config.config import settings
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+_CREATE_INDEX = re.compile(
+    r"^CREATE\s+(?:UNIQUE\s+)?INDEX\s+`?(\w+)`?\s+ON\s+`?(\w+)`?", re.IGNORECASE)
+
+
+def load_migrations() -> List[Tuple[str, List[str]]]:
+    """返回 [(版本号, [SQL 语句, ...]), ...]，版本号即文件名（不含扩展名）"""
+    migrations = []
+    for name in sorted(os.listdir(MIGRATIONS_DIR)):
+        if not name.endswith(".sql"):
+            continue
+        with open(os.path.join(MIGRATIONS_DIR, name), encoding="utf-8") as f:
+            lines = [line for line in f if not line.lstrip().startswith("--")]
+        statements = [stmt.strip() for stmt in "".join(lines).split(";") if stmt.strip()]
+        migrations.append((name[:-4], statements))
+    return migrations
+
+
+def created_index(statement: str) -> Optional[Tuple[str, str]]:
+    """CREATE INDEX 语句返回 (表名, 索引名)，其他语句返回 None"""
+    match = _CREATE_INDEX.match(statement)
+    return (match.group(2), match.group(1)) if match else None
+
+
+async def index_exists(cursor, table: str, index: str) -> bool:
+    await cursor.execute(
+        "SELECT 1 FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s LIMIT 1",
+        (table, index))
+    return await cursor.fetchone() is not None
+
+
+async def run_statement(cursor, statement: str) -> bool:
+    """执行一条迁移语句；要创建的索引已存在时跳过并返回 False"""
+    target = created_index(statement)
+    if target is not None and await index_exists(cursor, *target):
+        print(f"  索引 {target[1]} 已存在，跳过")
+        return False
+    await cursor.execute(statement)
+    return True
+
+
+async def applied_versions(cursor) -> set:
+    await cursor.execute(
+        "CREATE TABLE IF NOT EXISTS `schema_migrations` ("
+        " `version` VARCHAR(255) PRIMARY KEY,"
+        " `applied_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    )
+    await cursor.execute("SELECT `version` FROM `schema_migrations`")
+    return {row[0] for row in await cursor.fetchall()}
+
+
+async def migrate(status_only: bool = False):
+    conn = await aiomysql.connect(
+        host=settings.DB_HOST,
+        port=settings.DB_PORT,
+        user=settings.DB_USER,
+        password=settings.DB_PASSWORD,
+        db=settings.DB_NAME,
+        autocommit=True
+    )
+    try:
+        async with conn.cursor() as cursor:
+            done = await applied_versions(cursor)
+            for version, statements in load_migrations():
+                if version in done:
+                    print(f"[applied] {version}")
+                    continue
+                if status_only:
+                    print(f"[pending] {version}")
+                    continue
+                print(f"正在执行迁移 {version} ...")
+                # MySQL 的 DDL 会隐式提交，无法整体回滚；失败时修复后重新运行即可（已建好的索引会跳过）
+                for statement in statements:
+                    await run_statement(cursor, statement)
+                await cursor.execute("INSERT INTO `schema_migrations` (`version`) VALUES (%s)", (version,))
+                print(f"[applied] {version}")
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply pending SQL migrations")
+    parser.add_argument("--status", action="store_true", help="only list applied / pending migrations")
+    args = parser.parse_args(argv)
+    asyncio.run(migrate(status_only=args.status))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+-- 疲劳事件表（基线）。已有数据库中该表已存在，此处不做改动。
+CREATE TABLE IF NOT EXISTS `fatigue` (
+    `id`       INT AUTO_INCREMENT PRIMARY KEY,
+    `username` VARCHAR(255) NOT NULL,
+    `status`   VARCHAR(50)  NOT NULL,
+    `time`     DATETIME     NOT NULL
+);
@@ -0,0 +1,6 @@
+-- 按驾驶员 + 时间范围查询、按时间倒序键集分页时使用的组合索引。
+-- InnoDB 二级索引叶子节点隐含主键 id，因此 ORDER BY time DESC, id DESC 可直接按索引顺序读取。
+CREATE INDEX `idx_fatigue_username_time` ON `fatigue` (`username`, `time`);
+
+-- 不带 username 的全局时间范围查询使用
+CREATE INDEX `idx_fatigue_time` ON `fatigue` (`time`);
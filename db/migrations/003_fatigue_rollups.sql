@@ -0,0 +1,21 @@
+-- 疲劳统计预聚合表：按 (驾驶员, 时间桶, 等级) 累计事件数和处于该等级的秒数。
+-- 由事件写入器在写入 fatigue 的同一事务中增量更新，分析接口只读这两张表。
+CREATE TABLE IF NOT EXISTS `fatigue_rollup_hourly` (
+    `username` VARCHAR(255) NOT NULL,
+    `bucket`   DATETIME     NOT NULL,
+    `status`   VARCHAR(50)  NOT NULL,
+    `events`   INT UNSIGNED NOT NULL DEFAULT 0,
+    `seconds`  DOUBLE       NOT NULL DEFAULT 0,
+    PRIMARY KEY (`username`, `bucket`, `status`),
+    KEY `idx_rollup_hourly_bucket` (`bucket`)
+);
+
+CREATE TABLE IF NOT EXISTS `fatigue_rollup_daily` (
+    `username` VARCHAR(255) NOT NULL,
+    `bucket`   DATE         NOT NULL,
+    `status`   VARCHAR(50)  NOT NULL,
+    `events`   INT UNSIGNED NOT NULL DEFAULT 0,
+    `seconds`  DOUBLE       NOT NULL DEFAULT 0,
+    PRIMARY KEY (`username`, `bucket`, `status`),
+    KEY `idx_rollup_daily_bucket` (`bucket`)
+);
@@ -0,0 +1,230 @@
+# =======================================================================
+# rollup.py: 疲劳统计预聚合
+# =======================================================================
+# fatigue_rollup_hourly / fatigue_rollup_daily 两张表按 (驾驶员, 时间桶, 等级) 累计
+# 事件数 (events) 和处于该等级的秒数 (seconds)。事件写入器每次批量写入时在同一事务中
+# 增量更新这两张表，分析接口只查询预聚合表，耗时与时间桶数量相关，与 fatigue 表的行数无关。
+#
+# 对上线前已有的历史事件，可以一次性回填事件数（持续时长无法从事件表还原）:
+#   python -m db.rollup --rebuild-events --since 2024-01-01
+
+import argparse
+import asyncio
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import aiomysql
+
+from config.config import settings
+from entity.schemas import FatigueCreate, FatigueStateSpan
+
+HOURLY_TABLE = "fatigue_rollup_hourly"
+DAILY_TABLE = "fatigue_rollup_daily"
+FATIGUE_LEVELS = ("Low", "Medium", "High")
+
+_UPSERT = (
+    "INSERT INTO `{table}` (`username`, `bucket`, `status`, `events`, `seconds`) "
+    "VALUES (%s, %s, %s, %s, %s) "
+    "ON DUPLICATE KEY UPDATE `events` = `events` + VALUES(`events`), `seconds` = `seconds` + VALUES(`seconds`)"
+)
+
+
+def hour_floor(dt: datetime) -> datetime:
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+def hour_ceil(dt: datetime) -> datetime:
+    floor = hour_floor(dt)
+    return floor if floor == dt else floor + timedelta(hours=1)
+
+
+def day_floor(dt: datetime) -> datetime:
+    return datetime.combine(dt.date(), time())
+
+
+def day_ceil(dt: datetime) -> datetime:
+    floor = day_floor(dt)
+    return floor if floor == dt else floor + timedelta(days=1)
+
+
+# ---------------- 增量更新 ----------------
+
+def rollup_deltas(events: Iterable[FatigueCreate], spans: Iterable[FatigueStateSpan]) \
+        -> Dict[str, Dict[Tuple[str, Any, str], List[float]]]:
+    """把一批事件和状态时长合并为各时间桶的增量 {表名: {(username, bucket, status): [events, seconds]}}"""
+    hourly = defaultdict(lambda: [0, 0.0])
+    daily = defaultdict(lambda: [0, 0.0])
+    for event in events:
+        hourly[(event.username, hour_floor(event.event_time), event.status)][0] += 1
+        daily[(event.username, event.event_time.date(), event.status)][0] += 1
+    for span in spans:
+        # 跨整点的时长按小时拆开，分别计入对应的桶
+        t = span.start_time
+        while t < span.end_time:
+            bucket = hour_floor(t)
+            nxt = min(bucket + timedelta(hours=1), span.end_time)
+            seconds = (nxt - t).total_seconds()
+            hourly[(span.username, bucket, span.status)][1] += seconds
+            daily[(span.username, t.date(), span.status)][1] += seconds
+            t = nxt
+    return {HOURLY_TABLE: hourly, DAILY_TABLE: daily}
+
+
+async def apply_rollups(db: aiomysql.Connection, events: List[FatigueCreate],
+                        spans: List[FatigueStateSpan]) -> int:
+    """
+    把增量合并进预聚合表（多行 INSERT ... ON DUPLICATE KEY UPDATE）。
+    应与事件写入处于同一事务，避免重试时重复累加。
+
+    :return: 更新的桶数量
+    """
+    updated = 0
+    async with db.cursor() as cursor:
+        for table, deltas in rollup_deltas(events, spans).items():
+            if not deltas:
+                continue
+            # 按主键顺序写入，减少并发事务之间的锁冲突
+            args = sorted((u, b, s, ev, sec) for (u, b, s), (ev, sec) in deltas.items())
+            await cursor.executemany(_UPSERT.format(table=table), args)
+            updated += len(args)
+    return updated
+
+
+# ---------------- 查询 ----------------
+
+def split_range(start: Optional[datetime], end: Optional[datetime]) -> List[Tuple[str, Any, Any]]:
+    """
+    把任意时间范围拆成 [(表名, 桶下界, 桶上界), ...]（左闭右开，None 表示不限）：
+    首尾不足一天的部分查小时表，中间的整天查日表，扫描的行数只与桶的数量有关。
+    范围按小时对齐：start 向下取整，end 向上取整。
+    """
+    lo = hour_floor(start) if start is not None else None
+    hi = hour_ceil(end) if end is not None else None
+    if lo is not None and hi is not None and lo >= hi:
+        return []
+    first_day = day_ceil(lo) if lo is not None else None
+    last_day = day_floor(hi) if hi is not None else None
+    if first_day is not None and last_day is not None and first_day >= last_day:
+        return [(HOURLY_TABLE, lo, hi)]
+    parts = []
+    if lo is not None and lo < first_day:
+        parts.append((HOURLY_TABLE, lo, first_day))
+    parts.append((DAILY_TABLE,
+                  first_day.date() if first_day is not None else None,
+                  last_day.date() if last_day is not None else None))
+    if hi is not None and last_day < hi:
+        parts.append((HOURLY_TABLE, last_day, hi))
+    return parts
+
+
+def _bucket_where(username: Optional[str], lo, hi) -> Tuple[str, list]:
+    where, args = [], []
+    if username:
+        where.append("`username` = %s")
+        args.append(username)
+    if lo is not None:
+        where.append("`bucket` >= %s")
+        args.append(lo)
+    if hi is not None:
+        where.append("`bucket` < %s")
+        args.append(hi)
+    return (" WHERE " + " AND ".join(where)) if where else "", args
+
+
+async def driver_totals(db: aiomysql.Connection, start: Optional[datetime], end: Optional[datetime],
+                        username: Optional[str] = None) -> List[Dict[str, Any]]:
+    """各驾驶员在时间范围内每个等级的事件数和持续秒数 [{username, status, events, seconds}, ...]"""
+    parts = split_range(start, end)
+    if not parts:
+        return []
+    selects, args = [], []
+    for table, lo, hi in parts:
+        where, part_args = _bucket_where(username, lo, hi)
+        selects.append(f"SELECT `username`, `status`, `events`, `seconds` FROM `{table}`{where}")
+        args.extend(part_args)
+    query = ("SELECT `username`, `status`, SUM(`events`) AS `events`, SUM(`seconds`) AS `seconds` FROM ("
+             + " UNION ALL ".join(selects) + ") AS `r` GROUP BY `username`, `status`")
+    async with db.cursor(aiomysql.DictCursor) as cursor:
+        await cursor.execute(query, args)
+        return await cursor.fetchall()
+
+
+async def time_series(db: aiomysql.Connection, start: Optional[datetime], end: Optional[datetime],
+                      granularity: str = "hour", username: Optional[str] = None) -> List[Dict[str, Any]]:
+    """按小时/天分桶的事件数和持续秒数 [{bucket, status, events, seconds}, ...]，不指定 username 时为全车队汇总"""
+    if granularity == "hour":
+        table = HOURLY_TABLE
+        lo = hour_floor(start) if start is not None else None
+        hi = hour_ceil(end) if end is not None else None
+    else:
+        table = DAILY_TABLE
+        lo = start.date() if start is not None else None
+        hi = day_ceil(end).date() if end is not None else None
+    where, args = _bucket_where(username, lo, hi)
+    query = (f"SELECT `bucket`, `status`, SUM(`events`) AS `events`, SUM(`seconds`) AS `seconds` "
+             f"FROM `{table}`{where} GROUP BY `bucket`, `status` ORDER BY `bucket`")
+    async with db.cursor(aiomysql.DictCursor) as cursor:
+        await cursor.execute(query, args)
+        return await cursor.fetchall()
+
+
+def pivot_by_driver(rows: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """把 driver_totals 的结果整理为 {username: {"events": {等级: n}, "seconds": {等级: s}}}"""
+    drivers: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        entry = drivers.setdefault(row["username"], {
+            "events": {level: 0 for level in FATIGUE_LEVELS},
+            "seconds": {level: 0.0 for level in FATIGUE_LEVELS},
+        })
+        entry["events"][row["status"]] = int(row["events"] or 0)
+        entry["seconds"][row["status"]] = float(row["seconds"] or 0.0)
+    return drivers
+
+
+# ---------------- 历史数据回填 ----------------
+
+async def rebuild_events(since: date):
+    """根据 fatigue 表重新计算 since 之后各桶的事件数（持续秒数保持不变）"""
+    since_dt = datetime.combine(since, time())
+    conn = await aiomysql.connect(
+        host=settings.DB_HOST,
+        port=settings.DB_PORT,
+        user=settings.DB_USER,
+        password=settings.DB_PASSWORD,
+        db=settings.DB_NAME,
+        autocommit=False
+    )
+    try:
+        async with conn.cursor() as cursor:
+            for table, bucket_expr, lo in (
+                    (HOURLY_TABLE, "DATE_FORMAT(`time`, '%%Y-%%m-%%d %%H:00:00')", since_dt),
+                    (DAILY_TABLE, "DATE(`time`)", since)):
+                await cursor.execute(f"UPDATE `{table}` SET `events` = 0 WHERE `bucket` >= %s", (lo,))
+                await cursor.execute(
+                    f"INSERT INTO `{table}` (`username`, `bucket`, `status`, `events`) "
+                    f"SELECT `username`, {bucket_expr}, `status`, COUNT(*) FROM `fatigue` "
+                    f"WHERE `time` >= %s GROUP BY 1, 2, 3 "
+                    f"ON DUPLICATE KEY UPDATE `events` = VALUES(`events`)", (since_dt,))
+                print(f"{table}: rebuilt event counts since {since}")
+        await conn.commit()
+    except Exception:
+        await conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain fatigue rollup tables")
+    parser.add_argument("--rebuild-events", action="store_true", help="recount events from the fatigue table")
+    parser.add_argument("--since", type=date.fromisoformat, default=date(1970, 1, 1))
+    args = parser.parse_args(argv)
+    if args.rebuild_events:
+        asyncio.run(rebuild_events(args.since))
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
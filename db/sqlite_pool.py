@@ -0,0 +1,285 @@
+# =======================================================================
+# sqlite_pool.py: 本地 SQLite 替身连接池
+# =======================================================================
+# 提供与 aiomysql 连接池相同用法的最小子集（pool.acquire() / conn.cursor(DictCursor) /
+# execute / executemany / fetch* / begin / commit / rollback），
+# 设置 DB_BACKEND="sqlite" 后无需 MySQL 即可运行（离线基准测试、本地开发）。
+#
+# - SQL 在执行前做少量方言转换：%s 占位符 → ?，
+#   ON DUPLICATE KEY UPDATE ... VALUES(col) → ON CONFLICT DO UPDATE SET ... excluded.col；
+# - 表结构见 SCHEMA，与 db/migrations 中的 MySQL 表对应；
+# - sqlite3 是同步接口，每次调用都放到线程中执行，不阻塞事件循环；
+# - 与 aiomysql 一样，连接数达到 maxsize 后 acquire() 会等待。
+#   数据库只支持单写者，写事务之间按 busy_timeout 等待。
+
+import asyncio
+import os
+import re
+import sqlite3
+from datetime import date, datetime
+from typing import Any, List, Optional, Sequence
+
+from aiomysql.cursors import _DictCursorMixin
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS `users` (
+    `id`        INTEGER PRIMARY KEY AUTOINCREMENT,
+    `username`  VARCHAR(255) NOT NULL UNIQUE,
+    `password`  VARCHAR(255) NOT NULL,
+    `role`      VARCHAR(50),
+    `carnumber` VARCHAR(50)
+);
+CREATE TABLE IF NOT EXISTS `userinfo` (
+    `username` VARCHAR(255) NOT NULL PRIMARY KEY,
+    `gender`   VARCHAR(10),
+    `age`      INTEGER,
+    `work`     VARCHAR(255),
+    `folk`     VARCHAR(50),
+    `location` VARCHAR(255)
+);
+CREATE TABLE IF NOT EXISTS `fatigue` (
+    `id`       INTEGER PRIMARY KEY AUTOINCREMENT,
+    `username` VARCHAR(255) NOT NULL,
+    `status`   VARCHAR(50)  NOT NULL,
+    `time`     DATETIME     NOT NULL
+);
+CREATE INDEX IF NOT EXISTS `idx_fatigue_username_time` ON `fatigue` (`username`, `time`);
+CREATE INDEX IF NOT EXISTS `idx_fatigue_time` ON `fatigue` (`time`);
+CREATE TABLE IF NOT EXISTS `fatigue_rollup_hourly` (
+    `username` VARCHAR(255) NOT NULL,
+    `bucket`   DATETIME     NOT NULL,
+    `status`   VARCHAR(50)  NOT NULL,
+    `events`   INTEGER      NOT NULL DEFAULT 0,
+    `seconds`  DOUBLE       NOT NULL DEFAULT 0,
+    PRIMARY KEY (`username`, `bucket`, `status`)
+);
+CREATE INDEX IF NOT EXISTS `idx_rollup_hourly_bucket` ON `fatigue_rollup_hourly` (`bucket`);
+CREATE TABLE IF NOT EXISTS `fatigue_rollup_daily` (
+    `username` VARCHAR(255) NOT NULL,
+    `bucket`   DATE         NOT NULL,
+    `status`   VARCHAR(50)  NOT NULL,
+    `events`   INTEGER      NOT NULL DEFAULT 0,
+    `seconds`  DOUBLE       NOT NULL DEFAULT 0,
+    PRIMARY KEY (`username`, `bucket`, `status`)
+);
+CREATE INDEX IF NOT EXISTS `idx_rollup_daily_bucket` ON `fatigue_rollup_daily` (`bucket`);
+"""
+
+_UPSERT = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.IGNORECASE)
+_VALUES_REF = re.compile(r"\bVALUES\s*\(\s*(`?\w+`?)\s*\)", re.IGNORECASE)
+
+# DATETIME / DATE 列与 Python 对象互转，和 aiomysql 返回的类型一致
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_converter("DATETIME", lambda raw: datetime.fromisoformat(raw.decode()))
+sqlite3.register_converter("DATE", lambda raw: date.fromisoformat(raw.decode()))
+
+
+def translate(query: str) -> str:
+    """把本项目用到的 MySQL 写法转换为 SQLite 写法"""
+    query = query.replace("%s", "?").replace("%%", "%")
+    match = _UPSERT.search(query)
+    if match:
+        head, tail = query[:match.start()], query[match.end():]
+        query = head + "ON CONFLICT DO UPDATE SET" + _VALUES_REF.sub(r"excluded.\1", tail)
+    return query
+
+
+def _normalize_args(args) -> Sequence[Any]:
+    # aiomysql 允许直接传单个值
+    if args is None:
+        return ()
+    if isinstance(args, (list, tuple)):
+        return tuple(args)
+    return (args,)
+
+
+class SQLiteCursor:
+
+    def __init__(self, conn: "SQLiteConnection", as_dict: bool):
+        self._conn = conn
+        self._as_dict = as_dict
+        self._cursor: Optional[sqlite3.Cursor] = None
+        self.rowcount = -1
+        self.lastrowid = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def execute(self, query: str, args=None) -> int:
+        sql = translate(query)
+        params = _normalize_args(args)
+
+        def run():
+            cursor = self._conn.raw.execute(sql, params)
+            return cursor, cursor.rowcount, cursor.lastrowid
+        self._cursor, self.rowcount, self.lastrowid = await self._conn.run(run)
+        return self.rowcount
+
+    async def executemany(self, query: str, args) -> int:
+        sql = translate(query)
+        rows = [_normalize_args(a) for a in args]
+        if not rows:
+            return 0
+
+        def run():
+            cursor = self._conn.raw.executemany(sql, rows)
+            return cursor, cursor.rowcount
+        self._cursor, self.rowcount = await self._conn.run(run)
+        return self.rowcount
+
+    def _rows(self, rows: List[tuple]) -> list:
+        if not self._as_dict or self._cursor is None or self._cursor.description is None:
+            return rows
+        names = [d[0] for d in self._cursor.description]
+        return [dict(zip(names, row)) for row in rows]
+
+    async def fetchone(self):
+        if self._cursor is None:
+            return None
+        row = await self._conn.run(self._cursor.fetchone)
+        return None if row is None else self._rows([row])[0]
+
+    async def fetchmany(self, size: int = 1) -> list:
+        if self._cursor is None:
+            return []
+        return self._rows(await self._conn.run(self._cursor.fetchmany, size))
+
+    async def fetchall(self) -> list:
+        if self._cursor is None:
+            return []
+        return self._rows(await self._conn.run(self._cursor.fetchall))
+
+    async def close(self):
+        if self._cursor is not None:
+            self._cursor.close()
+            self._cursor = None
+
+
+class SQLiteConnection:
+
+    def __init__(self, raw: sqlite3.Connection):
+        self.raw = raw
+
+    async def run(self, fn, *args):
+        return await asyncio.to_thread(fn, *args)
+
+    def cursor(self, cursor_class=None) -> SQLiteCursor:
+        as_dict = cursor_class is not None and issubclass(cursor_class, _DictCursorMixin)
+        return SQLiteCursor(self, as_dict)
+
+    async def begin(self):
+        await self.run(self.raw.execute, "BEGIN IMMEDIATE")
+
+    async def commit(self):
+        await self.run(self.raw.commit)
+
+    async def rollback(self):
+        await self.run(self.raw.rollback)
+
+    def close(self):
+        self.raw.close()
+
+
+class SQLitePool:
+
+    def __init__(self, path: str, maxsize: int = 10, busy_timeout: float = 30.0):
+        self.path = path
+        self.maxsize = maxsize
+        self.busy_timeout = busy_timeout
+        self._idle: List[SQLiteConnection] = []
+        self._size = 0
+        self._semaphore = asyncio.Semaphore(maxsize)
+        self._closed = False
+
+    def _connect(self) -> SQLiteConnection:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        raw = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                              detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        raw.execute("PRAGMA journal_mode=WAL")
+        raw.execute("PRAGMA synchronous=NORMAL")
+        return SQLiteConnection(raw)
+
+    async def init_schema(self):
+        conn = await asyncio.to_thread(self._connect)
+        try:
+            await conn.run(conn.raw.executescript, SCHEMA)
+        finally:
+            conn.close()
+
+    def acquire(self) -> "_AcquireContext":
+        """与 aiomysql 一致：既可 await pool.acquire() 后手动 release，也可 async with pool.acquire()"""
+        return _AcquireContext(self)
+
+    async def _acquire(self) -> SQLiteConnection:
+        if self._closed:
+            raise RuntimeError("SQLite pool is closed")
+        await self._semaphore.acquire()
+        try:
+            if self._idle:
+                return self._idle.pop()
+            conn = await asyncio.to_thread(self._connect)
+            self._size += 1
+            return conn
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    async def release(self, conn: SQLiteConnection):
+        try:
+            # 回滚未结束的事务后再放回池，避免下一个使用者继承半个事务
+            if conn.raw.in_transaction and not self._closed:
+                await conn.rollback()
+        finally:
+            if self._closed:
+                conn.close()
+                self._size -= 1
+            else:
+                self._idle.append(conn)
+            self._semaphore.release()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def freesize(self) -> int:
+        return len(self._idle)
+
+    def close(self):
+        self._closed = True
+        for conn in self._idle:
+            conn.close()
+        self._idle.clear()
+
+    async def wait_closed(self):
+        return None
+
+
+class _AcquireContext:
+
+    def __init__(self, pool: SQLitePool):
+        self._pool = pool
+        self._conn: Optional[SQLiteConnection] = None
+
+    def __await__(self):
+        return self._pool._acquire().__await__()
+
+    async def __aenter__(self) -> SQLiteConnection:
+        self._conn = await self._pool._acquire()
+        return self._conn
+
+    async def __aexit__(self, exc_type, exc, tb):
+        conn, self._conn = self._conn, None
+        await self._pool.release(conn)
+
+
+async def create_pool(path: str, maxsize: int = 10) -> SQLitePool:
+    pool = SQLitePool(path, maxsize=maxsize)
+    await pool.init_schema()
+    return pool
@@ -0,0 +1,83 @@
+# db/user_cache.py
+# users / userinfo 的读穿透缓存。登录、个人信息、管理员用户列表等页面反复读取这些很少变化的行，
+# 命中时不再借用数据库连接；修改、删除用户的接口写库后调用 invalidate_user() 失效相关键。
+#
+# 缓存的键：
+#   userinfo:<username>  userinfo 行
+#   profile:<username>   users JOIN userinfo 的整行（showchangeuser），不含 password 列
+#
+# 登录用的 users 行（含密码）不缓存，每次读库：Redis 后端会把所有人的密码复制到共享缓存里，
+# 内存后端下 invalidate_user() 只能失效处理修改请求的那个进程，其他工作进程在 CACHE_TTL 内仍接受旧密码。
+#   all:                 全部用户的 (username, role) 列表（showuserinfo 在内存中排除自己）
+
+from typing import Dict, List, Optional
+
+import aiomysql
+
+from config.config import settings
+from db.database import acquire
+from services.cache import ReadThroughCache, create_backend
+
+backend = create_backend(settings.CACHE_BACKEND, settings.CACHE_MAX_ENTRIES, settings.CACHE_REDIS_URL)
+cache = ReadThroughCache("users", backend, settings.CACHE_TTL, enabled=settings.CACHE_ENABLED)
+
+_ALL_USERS = "all:"
+
+
+async def _fetchone(query: str, username: str) -> Optional[Dict]:
+    async with acquire() as conn, conn.cursor(aiomysql.DictCursor) as cursor:
+        await cursor.execute(query, (username,))
+        return await cursor.fetchone()
+
+
+async def get_login_user(username: str) -> Optional[Dict]:
+    """登录校验用的 users 行，直接读库（见文件头）"""
+    return await _fetchone("SELECT `username`, `password`, `role`, `id` FROM `users` WHERE `username` = %s", username)
+
+
+async def get_userinfo(username: str) -> Optional[Dict]:
+    return await cache.get_or_load(f"userinfo:{username}", lambda: _fetchone(
+        "SELECT * FROM `userinfo` WHERE `username` = %s", username))
+
+
+async def _load_profile(username: str) -> Optional[Dict]:
+    row = await _fetchone(
+        "SELECT u.*, ui.* FROM users u INNER JOIN userinfo ui ON u.username = ui.username WHERE u.username = %s;",
+        username)
+    if row is not None:
+        row.pop("password", None)
+    return row
+
+
+async def get_profile(username: str) -> Optional[Dict]:
+    return await cache.get_or_load(f"profile:{username}", lambda: _load_profile(username))
+
+
+async def _load_all_users() -> List[Dict]:
+    async with acquire() as conn, conn.cursor(aiomysql.DictCursor) as cursor:
+        await cursor.execute("SELECT username ,role FROM `users`")
+        return list(await cursor.fetchall())
+
+
+async def list_users_except(username: str) -> List[Dict]:
+    users = await cache.get_or_load(_ALL_USERS, _load_all_users)
+    return [user for user in users if user["username"] != username]
+
+
+async def invalidate_user(username: str, user_list: bool = False):
+    """
+    写入 users / userinfo 后调用。user_list=True 表示用户名或角色发生变化（注册、删除、改角色），
+    同时失效管理员看到的用户列表。
+    """
+    keys = [f"userinfo:{username}", f"profile:{username}"]
+    if user_list:
+        keys.append(_ALL_USERS)
+    await cache.invalidate(*keys)
+
+
+def stats() -> Dict:
+    return {**cache.stats(), **backend.stats()}
+
+
+async def close():
+    await backend.close()
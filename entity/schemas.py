@@ -1,5 +1,6 @@
 # 定义所有用于数据交换的 Pydantic 模型。
 from datetime import datetime
+from typing import Optional
 
 from pydantic import BaseModel
 
@@ -62,7 +63,22 @@ class FatigueCreate(BaseModel):
     status: str
     event_time: datetime
 
+class FatigueStateSpan(BaseModel):
+    """驾驶员处于某个疲劳等级的一段时间，用于累计各等级的持续时长"""
+    username: str
+    status: str
+    start_time: datetime
+    end_time: datetime
+
 class FatigueJsonRequest(BaseModel):
     """用于 /detect_fatigue/ 接口的JSON请求体模型"""
     username: str
     image: str  # 接收Base64编码的图像字符串
+
+class VideoJobRequest(BaseModel):
+    """离线视频批处理任务：path 为 OFFLINE_VIDEO_DIR 下的相对路径"""
+    username: str
+    path: str
+    start_time: Optional[datetime] = None  # 视频第一帧的时间，默认按文件修改时间推算
+    sample_fps: float = 0.0  # 抽帧帧率，0 表示使用配置的默认值
+    write: bool = True  # 是否把 High 事件和各等级时长写入数据库
@@ -261,35 +261,29 @@ const system = {
    */
   async getFatigueStats() {
     try {
-      // 使用已有的疲劳监控API
-      const response = await fetch('http://192.168.70.167:8000/api/v2/showfatigue', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json'
-        },
-        body: JSON.stringify({})
-      });
+      // 使用统计接口（服务端预聚合），不再拉取全部疲劳记录
+      const response = await fetch('http://192.168.70.167:8000/api/v5/analytics/drivers');
       
       const result = await response.json();
-      console.log('[API] 疲劳监控API响应:', result);
+      console.log('[API] 疲劳统计API响应:', result);
       
       if (result.code === 200 && result.data) {
-        // 统计疲劳事件数量和活跃监控数
-        const fatigueEvents = result.data;
-        
-        // 获取唯一的活跃驾驶员数量
-        const activeDrivers = new Set();
-        fatigueEvents.forEach(event => {
-          if (event.username) {
-            activeDrivers.add(event.username);
+        // 统计疲劳事件数量和出现过疲劳事件的驾驶员数
+        let fatigueEventCount = 0;
+        let activeFatigueCount = 0;
+        result.data.forEach(driver => {
+          const count = Object.values(driver.events).reduce((sum, n) => sum + n, 0);
+          fatigueEventCount += count;
+          if (count > 0) {
+            activeFatigueCount += 1;
           }
         });
         
         return {
           code: 200,
           data: {
-            fatigueEventCount: fatigueEvents.length,
-            activeFatigueCount: activeDrivers.size
+            fatigueEventCount,
+            activeFatigueCount
           }
         };
       } else {
@@ -388,6 +388,9 @@ function initFatigueDetection() {
   let totalResponseTime = 0;
   let lastResponseTime = 0;
   let lastRequestTime = 0;
+  let frameSeq = 0;
+  // 二进制帧头: uint32 序号 + float64 发送时间(毫秒)，小端，与后端 services/frame_codec.py 保持一致
+  const FRAME_HEADER_SIZE = 12;
   
   // 初始化摄像头
   initCamera();
@@ -431,6 +434,7 @@ function initFatigueDetection() {
     // 使用当前登录用户名
     const dynamicWsUrl = `${WS_URL_BASE}/${encodeURIComponent(currentUser.username)}`;
     socket = new WebSocket(dynamicWsUrl);
+    socket.binaryType = 'arraybuffer';
     
     socket.onopen = function() {
       updateConnectionStatus('connected');
@@ -442,13 +446,15 @@ function initFatigueDetection() {
     socket.onmessage = function(event) {
       try {
         const endTime = performance.now();
-        lastResponseTime = Math.round(endTime - lastRequestTime);
+        const result = JSON.parse(event.data);
+        // 服务端会回传帧头中的发送时间，据此计算每一帧的真实往返时间
+        const sentAt = typeof result.client_ts === 'number' ? result.client_ts : lastRequestTime;
+        lastResponseTime = Math.round(endTime - sentAt);
         totalResponseTime += lastResponseTime;
         requestCount++;
         requestCountElement.textContent = requestCount;
         avgResponseTimeElement.textContent = `${Math.round(totalResponseTime / requestCount)} ms`;
         lastResponseTimeElement.textContent = `${lastResponseTime} ms`;
-        const result = JSON.parse(event.data);
         if (result.error) {
           addLog(`错误: ${result.error}`, 'error');
         } else {
@@ -524,7 +530,7 @@ function initFatigueDetection() {
   async function resetBuffer() {
     try {
       addLog('重置缓冲区...');
-      const response = await fetch('http://192.168.70.167:8000/api/v4/reset_buffer', {
+      const response = await fetch(`http://192.168.70.167:8000/api/v4/reset_buffer?username=${encodeURIComponent(currentUser.username)}`, {
         method: 'POST'
       });
       const result = await response.json();
@@ -546,14 +552,23 @@ function initFatigueDetection() {
     context.drawImage(video, 0, 0, canvas.width, canvas.height);
     try {
       lastRequestTime = performance.now();
-      const imageData = canvas.toDataURL('image/jpeg', 0.7);
-      
-      const payload = {
-        username: currentUser.username, // 使用当前用户名
-        image: imageData
-      };
-      
-      socket.send(JSON.stringify(payload));
+      const sentAt = lastRequestTime;
+      const seq = frameSeq++ >>> 0;
+      // 以二进制消息发送原始JPEG，省去Base64膨胀和服务端的JSON/Base64解码
+      canvas.toBlob(async (blob) => {
+        try {
+          if (!blob || !socket || socket.readyState !== WebSocket.OPEN) return;
+          const jpeg = new Uint8Array(await blob.arrayBuffer());
+          const message = new Uint8Array(FRAME_HEADER_SIZE + jpeg.length);
+          const header = new DataView(message.buffer);
+          header.setUint32(0, seq, true);
+          header.setFloat64(4, sentAt, true);
+          message.set(jpeg, FRAME_HEADER_SIZE);
+          socket.send(message.buffer);
+        } catch (err) {
+          addLog('发送帧失败: ' + err.message, 'error');
+        }
+      }, 'image/jpeg', 0.7);
     } catch (err) {
       addLog('发送帧失败: ' + err.message, 'error');
     }
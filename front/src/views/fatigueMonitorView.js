@@ -7,8 +7,9 @@ let currentUser = {
   username: '',
   role: ''
 };
-let fatigueData = []; // 保存原始疲劳日志数据
-let filteredData = []; // 保存筛选后的数据
+let fatigueData = []; // 已加载的疲劳日志数据（筛选在服务端完成）
+let nextCursor = null; // 下一页游标，为 null 表示已加载完
+const PAGE_SIZE = 100; // 每页加载的日志条数
 
 /**
  * 初始化疲劳监测视图
@@ -112,6 +113,9 @@ function init(user) {
           <div class="fatigue-logs" id="fatigue-logs">
             <!-- 这里将动态添加日志条目 -->
           </div>
+          <div class="load-more" id="load-more" style="display:none;">
+            <button id="load-more-btn" class="secondary-btn">加载更多</button>
+          </div>
           <div class="no-data-message" id="no-data-message" style="display:none;">
             <i class="ri-file-search-line"></i>
             <p>没有找到匹配的疲劳日志</p>
@@ -367,6 +371,11 @@ function init(user) {
         color: #666;
       }
       
+      .load-more {
+        text-align: center;
+        padding: 15px 0 0;
+      }
+      
       .no-data-message {
         text-align: center;
         padding: 30px;
@@ -407,42 +416,25 @@ function addEventListeners(viewElement) {
   
   // 重新加载按钮
   eventHandlers.reloadBtn = viewElement.querySelector('#reload-btn');
-  eventHandlers.reloadBtn.addEventListener('click', loadFatigueMonitorData);
+  eventHandlers.reloadBtn.addEventListener('click', handleReload);
+  
+  // 加载更多按钮
+  eventHandlers.loadMoreBtn = viewElement.querySelector('#load-more-btn');
+  eventHandlers.loadMoreBtn.addEventListener('click', handleLoadMore);
 }
 
 /**
  * 处理应用筛选按钮点击事件
  */
 function handleApplyFilter() {
-  const usernameFilter = document.getElementById('username-filter').value.trim().toLowerCase();
+  const usernameFilter = document.getElementById('username-filter').value.trim();
   const startDate = document.getElementById('start-date').value;
   const endDate = document.getElementById('end-date').value;
   
   console.log(`[fatigueMonitorView] 应用筛选: 用户名=${usernameFilter}, 开始时间=${startDate}, 结束时间=${endDate}`);
   
-  // 筛选数据
-  filteredData = fatigueData.filter(item => {
-    // 用户名筛选
-    if (usernameFilter && !item.username.toLowerCase().includes(usernameFilter)) {
-      return false;
-    }
-    
-    // 时间段筛选
-    const itemTime = new Date(item.time);
-    
-    if (startDate && new Date(startDate) > itemTime) {
-      return false;
-    }
-    
-    if (endDate && new Date(endDate) < itemTime) {
-      return false;
-    }
-    
-    return true;
-  });
-  
-  // 更新界面
-  renderFatigueData(filteredData);
+  // 筛选在服务端执行，从第一页重新加载
+  loadFatigueMonitorData();
 }
 
 /**
@@ -453,38 +445,74 @@ function handleResetFilter() {
   document.getElementById('start-date').value = '';
   document.getElementById('end-date').value = '';
   
-  filteredData = [...fatigueData];
-  renderFatigueData(filteredData);
-  
   console.log('[fatigueMonitorView] 筛选条件已重置');
+  loadFatigueMonitorData();
+}
+
+/**
+ * 处理重新加载按钮点击事件
+ */
+function handleReload() {
+  loadFatigueMonitorData();
+}
+
+/**
+ * 处理加载更多按钮点击事件
+ */
+function handleLoadMore() {
+  if (nextCursor) {
+    loadFatigueMonitorData(true);
+  }
+}
+
+/**
+ * 根据筛选条件构造查询参数
+ * @param {string|null} cursor - 分页游标
+ * @returns {URLSearchParams} 查询参数
+ */
+function buildQueryParams(cursor) {
+  const params = new URLSearchParams();
+  const usernameFilter = document.getElementById('username-filter').value.trim();
+  const startDate = document.getElementById('start-date').value;
+  const endDate = document.getElementById('end-date').value;
+  
+  if (usernameFilter) params.set('username', usernameFilter);
+  if (startDate) params.set('start', startDate);
+  if (endDate) params.set('end', endDate);
+  params.set('fields', 'username,status,time');
+  params.set('limit', PAGE_SIZE);
+  if (cursor) params.set('cursor', cursor);
+  return params;
 }
 
 /**
  * 加载疲劳监测数据
+ * @param {boolean} append - 为 true 时加载下一页并追加到已有数据之后
  */
-async function loadFatigueMonitorData() {
+async function loadFatigueMonitorData(append = false) {
   // 显示加载中状态
   const loadingIndicator = document.getElementById('loading-indicator');
   const errorDisplay = document.getElementById('error-display');
   const noDataMessage = document.getElementById('no-data-message');
   const fatigueLogs = document.getElementById('fatigue-logs');
+  const loadMore = document.getElementById('load-more');
   
   loadingIndicator.style.display = 'flex';
   errorDisplay.style.display = 'none';
   noDataMessage.style.display = 'none';
-  fatigueLogs.innerHTML = '';
+  loadMore.style.display = 'none';
+  if (!append) {
+    fatigueData = [];
+    nextCursor = null;
+    fatigueLogs.innerHTML = '';
+  }
   
   try {
     console.log('[fatigueMonitorView] 开始加载疲劳监测数据');
     
-    // 调用API获取疲劳监测数据
-    const response = await fetch('http://192.168.70.167:8000/api/v2/showfatigue', {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json'
-      },
-      body: JSON.stringify({}) // 无需传递参数
-    });
+    // 调用分页查询API获取疲劳监测数据
+    const params = buildQueryParams(append ? nextCursor : null);
+    const response = await fetch(`http://192.168.70.167:8000/api/v2/fatigue?${params}`);
     
     if (!response.ok) {
       throw new Error(`HTTP 错误: ${response.status}`);
@@ -498,11 +526,12 @@ async function loadFatigueMonitorData() {
     }
     
     // 保存数据
-    fatigueData = result.data;
-    filteredData = [...fatigueData];
+    fatigueData = fatigueData.concat(result.data);
+    nextCursor = result.next_cursor;
     
     // 渲染数据
-    renderFatigueData(filteredData);
+    renderFatigueData(fatigueData);
+    loadMore.style.display = nextCursor ? 'block' : 'none';
     
   } catch (error) {
     console.error('[fatigueMonitorView] 加载疲劳监测数据失败:', error);
@@ -649,7 +678,11 @@ function removeAllEventListeners() {
   }
   
   if (eventHandlers.reloadBtn) {
-    eventHandlers.reloadBtn.removeEventListener('click', loadFatigueMonitorData);
+    eventHandlers.reloadBtn.removeEventListener('click', handleReload);
+  }
+  
+  if (eventHandlers.loadMoreBtn) {
+    eventHandlers.loadMoreBtn.removeEventListener('click', handleLoadMore);
   }
   
   // 重置事件处理器对象
@@ -1,13 +1,35 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 # 导入在其他“文件”中定义的组件
 from fastapi.middleware.cors import CORSMiddleware
-from db.database import lifespan  # 从 database.py 导入
+from fastapi.responses import PlainTextResponse
+from config.config import settings
+from services.log import setup_logging
+from services.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from db.database import lifespan as db_lifespan  # 从 database.py 导入
+from db import user_cache
 from routers.auth import router as auth_router # 从 routers/auth.py 导入
 from routers.driver import router as driver_router
 from routers.controller import router as controller_router
-from routers.fatigue_api import router as model_router
+from routers.fatigue_api import router as model_router, lifespan as model_lifespan, render_metrics
+from routers.analytics import router as analytics_router
+from routers.video_jobs import router as video_jobs_router, lifespan as video_jobs_lifespan
+
+# 分级、限流的结构化日志，取代原先的 print
+setup_logging(settings.LOG_LEVEL, settings.LOG_FORMAT,
+              settings.LOG_RATE_LIMIT_INTERVAL, settings.LOG_RATE_LIMIT_BURST)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 数据库连接池先于模型启动、后于模型关闭；模型在后台加载，不阻塞启动
+    async with db_lifespan(app), model_lifespan(app), video_jobs_lifespan(app):
+        yield
+    await user_cache.close()
+
+
 # 创建 FastAPI 应用实例
-# 将 lifespan 函数关联到 FastAPI 应用，用于管理数据库连接池
+# 将 lifespan 函数关联到 FastAPI 应用，用于管理数据库连接池和模型
 app = FastAPI(lifespan=lifespan)
 
 # --- 2. 配置 CORS (跨域资源共享) ---
@@ -29,6 +51,15 @@ app.include_router(auth_router, prefix="/api/v1", tags=["Authentication"])
 app.include_router(driver_router, prefix="/api/v2", tags=["Authentication"])
 app.include_router(controller_router, prefix="/api/v3", tags=["Authentication"])
 app.include_router(model_router, prefix="/api/v4", tags=["Authentication"])
+app.include_router(analytics_router, prefix="/api/v5", tags=["Analytics"])
+app.include_router(video_jobs_router, prefix="/api/v4", tags=["Video Jobs"])
+if settings.METRICS_ENABLED:
+    # Prometheus 抓取接口：各推理阶段耗时直方图、队列深度、会话帧率、各疲劳等级计数
+    @app.get("/metrics", include_in_schema=False)
+    def metrics_endpoint():
+        return PlainTextResponse(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the FastAPI application!"}
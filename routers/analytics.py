@@ -0,0 +1,154 @@
+# routers/analytics.py
+# 车队疲劳统计接口：只查询预聚合表 (db/rollup.py)，不扫描 fatigue 明细表。
+from datetime import datetime
+from typing import Dict, Optional
+
+import aiomysql
+from fastapi import APIRouter, HTTPException, Query, status
+
+from db import rollup
+from db.database import acquire
+from services.log import get_logger
+
+router = APIRouter()
+log = get_logger(__name__)
+
+
+def _check_range(start: Optional[datetime], end: Optional[datetime]):
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(status_code=422, detail="start 必须早于 end")
+
+
+def _range(start: Optional[datetime], end: Optional[datetime]) -> Dict:
+    # 统计按小时对齐，返回实际覆盖的范围
+    return {
+        "start": rollup.hour_floor(start) if start is not None else None,
+        "end": rollup.hour_ceil(end) if end is not None else None,
+    }
+
+
+async def _load_drivers(start, end, username=None):
+    try:
+        async with acquire() as conn:
+            rows = await rollup.driver_totals(conn, start, end, username)
+    except HTTPException:
+        raise
+    except Exception as e:
+        log.exception("数据库或服务器内部错误")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="服务器内部错误，请稍后重试"
+        )
+    return rollup.pivot_by_driver(rows)
+
+
+@router.get("/analytics/drivers")
+async def driver_analytics_endpoint(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    username: Optional[str] = None
+) -> Dict:
+    """
+    各驾驶员在时间范围内每个疲劳等级的事件数和持续秒数。
+    """
+    _check_range(start, end)
+    drivers = await _load_drivers(start, end, username)
+    return {
+        "code": 200,
+        "message": "查询成功",
+        "range": _range(start, end),
+        "data": [{"username": name, **totals} for name, totals in sorted(drivers.items())]
+    }
+
+
+@router.get("/analytics/fleet")
+async def fleet_analytics_endpoint(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+) -> Dict:
+    """
+    全车队在时间范围内的汇总：有记录的驾驶员数、每个疲劳等级的事件数和持续秒数。
+    """
+    _check_range(start, end)
+    drivers = await _load_drivers(start, end)
+    events = {level: 0 for level in rollup.FATIGUE_LEVELS}
+    seconds = {level: 0.0 for level in rollup.FATIGUE_LEVELS}
+    for totals in drivers.values():
+        for level, n in totals["events"].items():
+            events[level] = events.get(level, 0) + n
+        for level, s in totals["seconds"].items():
+            seconds[level] = seconds.get(level, 0.0) + s
+    return {
+        "code": 200,
+        "message": "查询成功",
+        "range": _range(start, end),
+        "data": {"drivers": len(drivers), "events": events, "seconds": seconds}
+    }
+
+
+@router.get("/analytics/timeseries")
+async def timeseries_analytics_endpoint(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    granularity: str = Query("hour", pattern="^(hour|day)$"),
+    username: Optional[str] = None
+) -> Dict:
+    """
+    按小时或按天分桶的事件数和持续秒数；不指定 username 时为全车队汇总。
+    """
+    _check_range(start, end)
+    try:
+        async with acquire() as conn:
+            rows = await rollup.time_series(conn, start, end, granularity, username)
+    except HTTPException:
+        raise
+    except Exception as e:
+        log.exception("数据库或服务器内部错误")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="服务器内部错误，请稍后重试"
+        )
+    series: Dict = {}
+    for row in rows:
+        bucket = series.setdefault(row["bucket"], {"events": {}, "seconds": {}})
+        bucket["events"][row["status"]] = int(row["events"] or 0)
+        bucket["seconds"][row["status"]] = float(row["seconds"] or 0.0)
+    return {
+        "code": 200,
+        "message": "查询成功",
+        "granularity": granularity,
+        "data": [{"bucket": bucket, **values} for bucket, values in series.items()]
+    }
+
+
+@router.get("/analytics/top")
+async def top_drivers_endpoint(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    n: int = Query(10, ge=1, le=100),
+    metric: str = Query("high_events", pattern="^(high_events|high_seconds|high_ratio)$")
+) -> Dict:
+    """
+    风险最高的 N 名驾驶员。metric 可选:
+    high_events（High 事件数）、high_seconds（处于 High 的秒数）、high_ratio（High 时长占比）。
+    """
+    _check_range(start, end)
+    drivers = await _load_drivers(start, end)
+    ranked = []
+    for name, totals in drivers.items():
+        total_seconds = sum(totals["seconds"].values())
+        high_ratio = totals["seconds"]["High"] / total_seconds if total_seconds else 0.0
+        ranked.append({
+            "username": name,
+            "high_events": totals["events"]["High"],
+            "high_seconds": totals["seconds"]["High"],
+            "high_ratio": high_ratio,
+        })
+    ranked.sort(key=lambda d: (d[metric], d["high_events"]), reverse=True)
+    return {
+        "code": 200,
+        "message": "查询成功",
+        "range": _range(start, end),
+        "metric": metric,
+        "data": ranked[:n]
+    }
@@ -1,16 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, HTTPException, status
 import aiomysql
 from typing import Dict
 import entity.schemas
-from db.database import get_db_connection
+from db import user_cache
+from db.database import acquire
+from services.log import get_logger
 
 # 创建一个路由实例
 router = APIRouter()
+log = get_logger(__name__)
 
 @router.post("/login")
 async def login_endpoint(
-    request_data: entity.schemas.LoginRequest,
-    conn: aiomysql.Connection = Depends(get_db_connection)
+    request_data: entity.schemas.LoginRequest
 ) -> Dict:
     """
     处理用户登录请求的 API 端点。
@@ -21,22 +23,22 @@ async def login_endpoint(
     4. 返回简单的 HTTP 响应。
     """
     try:
-        # 在路由函数内部直接执行数据库操作
-        async with conn.cursor(aiomysql.DictCursor) as cursor:
-            query = "SELECT `username`, `password`, `role`, `id` FROM `users` WHERE `username` = %s"
-            await cursor.execute(query, (request_data.username,))
-            user_in_db = await cursor.fetchone()
-            if user_in_db and user_in_db['password'] == request_data.password and user_in_db['role'] == request_data.role:
-                # 如果成功，返回一个简单的成功消息
-                return {"code": 200, "message": "登录成功!" , "role":user_in_db['role'], "id":user_in_db['id']}
+        # 含密码的用户行不经缓存，每次读库校验（见 db/user_cache.py）
+        user_in_db = await user_cache.get_login_user(request_data.username)
+        if user_in_db and user_in_db['password'] == request_data.password and user_in_db['role'] == request_data.role:
+            # 如果成功，返回一个简单的成功消息
+            return {"code": 200, "message": "登录成功!" , "role":user_in_db['role'], "id":user_in_db['id']}
 
-            else:
-                # 如果用户不存在或密码错误，抛出401未授权错误
-                return {"code": 401, "message": "登录失败!", "role":None, "id":None}
+        else:
+            # 如果用户不存在或密码错误，抛出401未授权错误
+            return {"code": 401, "message": "登录失败!", "role":None, "id":None}
 
+    except HTTPException as http_exc:
+        # 重新抛出已知的HTTP异常（如数据库繁忙 503），避免被下面的通用异常捕获
+        raise http_exc
     except Exception as e:
         # 如果数据库操作过程中出现任何其他错误，返回500服务器内部错误
-        print(f"数据库或服务器内部错误: {e}")
+        log.exception("数据库或服务器内部错误")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="服务器内部错误，请稍后重试"
@@ -44,19 +46,17 @@ async def login_endpoint(
 
 @router.post("/register")
 async def register_endpoint(
-    request_data: entity.schemas.RegisterRequest,
-    conn: aiomysql.Connection = Depends(get_db_connection)
+    request_data: entity.schemas.RegisterRequest
 ) -> Dict:
     """
     处理用户注册请求的 API 端点。
     """
-    print(request_data)
     # 1. 二次密码确认
     if request_data.password != request_data.confirm_password:
         return {"code": 202, "message": "两次密码不一致!"}
 
     try:
-        async with conn.cursor(aiomysql.DictCursor) as cursor:
+        async with acquire() as conn, conn.cursor(aiomysql.DictCursor) as cursor:
             # 2. 检查用户名是否已存在
             check_query = "SELECT `username` FROM `users` WHERE `username` = %s"
             await cursor.execute(check_query, (request_data.username,))
@@ -72,13 +72,14 @@ async def register_endpoint(
             insert_query2 = "INSERT INTO `userinfo` (`username`) VALUES (%s)"
             await cursor.execute(insert_query, (request_data.username, request_data.password,"驾驶员",request_data.carnumber))
             await cursor.execute(insert_query2, request_data.username)
-            return {"code": 201, "message": "注册成功!"}
+        await user_cache.invalidate_user(request_data.username, user_list=True)
+        return {"code": 201, "message": "注册成功!"}
 
     except HTTPException as http_exc:
         # 重新抛出已知的HTTP异常，避免被下面的通用异常捕获
         raise http_exc
     except Exception as e:
-        print(f"数据库或服务器内部错误: {e}")
+        log.exception("数据库或服务器内部错误")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="服务器内部错误，请稍后重试"
@@ -1,50 +1,53 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import json
+from contextlib import AsyncExitStack
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 import aiomysql
-from typing import Dict
+from typing import Dict, List, Optional
 import entity.schemas
-from db.database import get_db_connection
+from db import crud, user_cache
+from db.database import acquire
+from services.log import get_logger
 from entity.schemas import ChangeInfoRequest
 
 # 创建一个路由实例
 router = APIRouter()
+log = get_logger(__name__)
 
 @router.post("/userinfo")
 async def userinfo_endpoint(
-    request_data: entity.schemas.QueryRequest,
-    conn: aiomysql.Connection = Depends(get_db_connection)
+    request_data: entity.schemas.QueryRequest
 ) -> Dict:
     """
     处理用户个人信息展示请求的 API 端点。
     """
     try:
-        async with conn.cursor(aiomysql.DictCursor) as cursor:
-            # 2. 检查用户名是否已存在
-            check_query = "SELECT * FROM `userinfo` WHERE `username` = %s"
-            await cursor.execute(check_query, (request_data.username,))
-            # 2. 获取查询结果
-            user_info = await cursor.fetchone()
-
-            # 3. 判断结果并返回不同的JSON响应
-            if user_info:
-                # 如果找到了数据
-                # FastAPI 会自动将这个字典转换为 JSON
-                return {
-                    "code": 200,
-                    "message": "查询成功",
-                    "data": user_info  # 这里是您从数据库查出的整行数据
-                }
-            else:
-                # 如果没有找到数据，返回404错误
-                # 使用 HTTPException 是 FastAPI 处理标准 HTTP 错误的最佳方式
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"未找到用户 '{request_data.username}' 的信息"
-                )
+        # 1. 经缓存查询 userinfo 行，未命中时读库
+        user_info = await user_cache.get_userinfo(request_data.username)
+
+        # 2. 判断结果并返回不同的JSON响应
+        if user_info:
+            # 如果找到了数据
+            # FastAPI 会自动将这个字典转换为 JSON
+            return {
+                "code": 200,
+                "message": "查询成功",
+                "data": user_info  # 这里是您从数据库查出的整行数据
+            }
+        else:
+            # 如果没有找到数据，返回404错误
+            # 使用 HTTPException 是 FastAPI 处理标准 HTTP 错误的最佳方式
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"未找到用户 '{request_data.username}' 的信息"
+            )
     except HTTPException as http_exc:
         # 重新抛出已知的HTTP异常，避免被下面的通用异常捕获
         raise http_exc
     except Exception as e:
-        print(f"数据库或服务器内部错误: {e}")
+        log.exception("数据库或服务器内部错误")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="服务器内部错误，请稍后重试"
@@ -53,25 +56,24 @@ async def userinfo_endpoint(
 
 @router.post("/changeuserinfo")
 async def changeuserinfo_endpoint(
-    request_data: entity.schemas.ChangeInfoRequest,
-    conn: aiomysql.Connection = Depends(get_db_connection)
+    request_data: entity.schemas.ChangeInfoRequest
 ) -> Dict:
     """
     处理用户修改密码请求的 API 端点。
     """
     try:
-        async with conn.cursor(aiomysql.DictCursor) as cursor:
+        async with acquire() as conn, conn.cursor(aiomysql.DictCursor) as cursor:
             # 2. 检查用户名是否已存在
             check_query = "UPDATE userinfo SET gender = %s, age = %s, work = %s, folk = %s, location = %s WHERE username = %s; "
             await cursor.execute(check_query, (request_data.gender,request_data.age,request_data.work,request_data.folk,request_data.location,request_data.username))
-            return {"code": 200, "message": "个人信息修改成功!"}
+        await user_cache.invalidate_user(request_data.username)
+        return {"code": 200, "message": "个人信息修改成功!"}
 
     except HTTPException as http_exc:
         # 重新抛出已知的HTTP异常，避免被下面的通用异常捕获
         raise http_exc
     except Exception as e:
-        print(request_data)
-        print(f"数据库或服务器内部错误: {e}")
+        log.exception("数据库或服务器内部错误")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="服务器内部错误，请稍后重试"
@@ -79,8 +81,7 @@ async def changeuserinfo_endpoint(
 
 @router.post("/changepassword")
 async def ChangePassword_endpoint(
-    request_data: entity.schemas.ChangePassword,
-    conn: aiomysql.Connection = Depends(get_db_connection)
+    request_data: entity.schemas.ChangePassword
 ) -> Dict:
     """
     处理用户修改个人信息请求的 API 端点。
@@ -100,7 +101,7 @@ async def ChangePassword_endpoint(
         )
 
     try:
-        async with conn.cursor(aiomysql.DictCursor) as cursor:
+        async with acquire() as conn, conn.cursor(aiomysql.DictCursor) as cursor:
             # 安全警告: 在真实应用中，用户身份(username)应该从认证令牌(Token)中获取，
             # 而不是由前端直接传递，以防止恶意用户修改他人密码。
 
@@ -120,27 +121,25 @@ async def ChangePassword_endpoint(
             # 警告: 密码应该被哈希处理后再存储！例如: hashed_new_password = pwd_context.hash(request_data.newpassword)
             update_query = "UPDATE `users` SET `password` = %s WHERE `username` = %s"
             await cursor.execute(update_query, (request_data.new_password, request_data.username))
-
-            return {"code": 200, "message": "密码修改成功"}
+        await user_cache.invalidate_user(request_data.username)
+        return {"code": 200, "message": "密码修改成功"}
 
     except HTTPException as http_exc:
         raise http_exc
     except Exception as e:
-        print(f"数据库或服务器内部错误: {e}")
+        log.exception("数据库或服务器内部错误")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="服务器内部错误，请稍后重试"
         )
 
 @router.post("/showfatigue")
-async def showfatigue_endpoint(
-    conn: aiomysql.Connection = Depends(get_db_connection)
-) -> Dict:
+async def showfatigue_endpoint() -> Dict:
     """
     处理用户个人信息展示请求的 API 端点。
     """
     try:
-        async with conn.cursor(aiomysql.DictCursor) as cursor:
+        async with acquire() as conn, conn.cursor(aiomysql.DictCursor) as cursor:
             # 2. 检查用户名是否已存在
             check_query = "SELECT * FROM `fatigue` "
             await cursor.execute(check_query)
@@ -167,8 +166,84 @@ async def showfatigue_endpoint(
         # 重新抛出已知的HTTP异常，避免被下面的通用异常捕获
         raise http_exc
     except Exception as e:
-        print(f"数据库或服务器内部错误: {e}")
+        log.exception("数据库或服务器内部错误")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="服务器内部错误，请稍后重试"
+        )
+
+
+# 单页最多返回的记录数
+FATIGUE_PAGE_MAX = 1000
+
+
+def _ndjson_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+@router.get("/fatigue")
+async def fatigue_query_endpoint(
+    username: Optional[str] = None,
+    status_filter: Optional[List[str]] = Query(None, alias="status"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    fields: Optional[str] = Query(None, description="逗号分隔的返回列，默认全部：id,username,status,time"),
+    limit: Optional[int] = Query(None, ge=1, description=f"json 默认 100、最大 {FATIGUE_PAGE_MAX}；ndjson 不填表示全部"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    output: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+):
+    """
+    按条件分页查询疲劳记录（按时间倒序）。
+
+    - 过滤条件在数据库端执行：username 精确匹配，status 可重复传多个，start/end 为闭区间；
+    - 键集分页：响应中的 next_cursor 原样作为下一次请求的 cursor 参数，为 null 表示没有下一页；
+    - format=ndjson 时以流的形式逐行返回（每行一个 JSON 对象），适合导出大量记录。
+    """
+    columns = [c.strip() for c in fields.split(",") if c.strip()] if fields else list(crud.FATIGUE_COLUMNS)
+    unknown = set(columns) - set(crud.FATIGUE_COLUMNS)
+    if not columns or unknown:
+        raise HTTPException(
+            status_code=422,
+            detail=f"fields 只能包含 {', '.join(crud.FATIGUE_COLUMNS)}"
+        )
+    try:
+        after = crud.decode_fatigue_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=422, detail="cursor 无效")
+    filters = dict(username=username, statuses=status_filter, start=start, end=end, after=after)
+
+    if output == "ndjson":
+        # 在开始响应之前借用连接：连接池耗尽时按 acquire() 的超时返回 503，而不是在流中途失败。
+        # 连接在整个流式响应期间持有，响应结束（或客户端断开）后归还连接池；
+        # 生成器没有开始迭代时由后台任务归还（AsyncExitStack 重复关闭无副作用）
+        stack = AsyncExitStack()
+        conn = await stack.enter_async_context(acquire())
+
+        async def generate():
+            async with stack:
+                async for row in crud.stream_fatigue_records(conn, columns, limit=limit, **filters):
+                    yield json.dumps(row, ensure_ascii=False, default=_ndjson_default) + "\n"
+
+        return StreamingResponse(generate(), media_type="application/x-ndjson",
+                                 background=BackgroundTask(stack.aclose))
+
+    try:
+        async with acquire() as conn:
+            rows, next_cursor = await crud.query_fatigue_page(
+                conn, columns, min(limit or 100, FATIGUE_PAGE_MAX), **filters)
+    except HTTPException:
+        raise
+    except Exception as e:
+        log.exception("数据库或服务器内部错误")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="服务器内部错误，请稍后重试"
         )
+    return {
+        "code": 200,
+        "message": "查询成功",
+        "data": rows,
+        "next_cursor": next_cursor
+    }
@@ -1,40 +1,101 @@
 # routers/fatigue_api.py
 from fastapi import (
     APIRouter, WebSocket, WebSocketDisconnect, HTTPException,
-    File, UploadFile, Depends, BackgroundTasks, Form
+    File, UploadFile, BackgroundTasks, Form, Header, Response
 )
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
 import numpy as np
 import cv2
 import os
-import tensorflow as tf
 import time
+from collections import namedtuple
+from contextlib import asynccontextmanager
 from typing import List, Optional
 from datetime import datetime
 import base64
 import json
-import aiomysql
+import struct
+import asyncio
 
 # 从您的项目结构中导入依赖
-from db.database import get_db_connection
 from entity import schemas
-from db import database, crud # [1]
+from db import database, crud, rollup, user_cache # [1]
+from config.config import settings
+from services.session import SessionRegistry
+from services.live_hub import LiveEvent, LiveHub
+from services.snapshot_store import SnapshotStore
+from services.ring_buffer import FeatureRing
+from services.batcher import MicroBatcher
+from services.executor import InferenceExecutor, ExecutorBusy
+from services.lstm_backend import load_backend, stack_windows
+from services.model_registry import ModelRegistry, ModelNotReady
+from services.prediction_cache import EyeLookupTable, PredictionLRU, load_eye_table, pack_window
+from services.yolo_backend import blob_buffer, create_backend as create_yolo_backend
+from services.yolo_decode import decode_yolo_outputs
+from services.roi_tracker import RoiTracker, offset_detections
+from services.frame_codec import decode_base64_image, decode_binary_frame, decode_ws_message
+from services.result_codec import LEVELS, EncodingUnavailable, ResultEncoder, negotiate
+from services.worker_pool import WorkerPool, RecordCollector
+from services import metrics
+from services.log import get_logger, setup_logging
+import threading
 # 创建路由实例
 router = APIRouter()
+log = get_logger(__name__)
 
-# 模型变量和WebSocket连接列表 (与之前相同)
-yolo_net, yolo_layers, yolo_labels = None, None, None
-lstm_fatigue, lstm_eye, lstm_yawn = None, None, None
-active_connections = []
+# 模型注册表：YOLO 和三个 LSTM 头在后台并发加载，通过 models.get(name) 获取
+# （LSTM 头为 tf.function / TFLite 推理后端，TensorFlow 在加载时才导入）
+models = ModelRegistry(max_workers=settings.MODEL_LOAD_WORKERS)
+YoloModel = namedtuple("YoloModel", ["backend", "labels"])
+# 三个 LSTM 头的时间窗口长度；疲劳模型输入为闭眼/张嘴计数交替排列，长度为 LAG_VAL*2
+LAG_VAL, EYE_LAG_VAL, YAWN_LAG_VAL = 200, 6, 10
+# config/obj.names 中用到的类别下标
+CLASS_MOUTH_OPENED, CLASS_EYES_CLOSED, CLASS_FACE = 0, 3, 4
+LABELS_PATH = os.path.sep.join(["config", "obj.names"])
+_yolo_lock = threading.Lock()
+
+# ---------------- 指标 ----------------
+# 各阶段耗时（工作进程 / 推理线程中记录），热路径上直接使用预先取好的子指标
+_stage = {stage: metrics.stage_seconds.labels(stage)
+          for stage in ("decode", "blob", "yolo_forward", "nms", "lstm_fatigue", "lstm_eye", "lstm_yawn")}
+frame_seconds = metrics.registry.histogram(
+    "fatigue_frame_seconds", "End-to-end latency of one frame from decoded image to result in seconds")
+state_frames = metrics.registry.counter(
+    "fatigue_frames_total", "Frames processed, by displayed fatigue level", ["state"])
+state_transitions = metrics.registry.counter(
+    "fatigue_state_transitions_total", "Transitions into each fatigue level", ["state"])
+high_events = metrics.registry.counter(
+    "fatigue_high_events_total", "High fatigue events logged to the database")
+_state_frames = {state: state_frames.labels(state) for state in ("Initializing",) + rollup.FATIGUE_LEVELS}
+# 每个驾驶员的帧率，在 API 进程中按收到的帧统计
+frame_rates = metrics.RateTracker(max_keys=settings.SESSION_MAX_COUNT)
+
+
+async def _driver_group(username: str) -> Optional[str]:
+    info = await user_cache.get_userinfo(username)
+    return info.get(settings.LIVE_GROUP_FIELD) if info else None
+
+
+# 监控端实时推送 (/live)：驾驶员会话在疲劳等级变化、High 事件和上下线时发布
+live_hub = LiveHub(
+    max_queued=settings.LIVE_QUEUE_SIZE,
+    max_pending=settings.LIVE_SUBSCRIBER_MAX_PENDING,
+    min_interval=settings.LIVE_MIN_INTERVAL,
+    max_drivers=settings.SESSION_MAX_COUNT,
+    resolve_group=_driver_group,
+    group_ttl=settings.LIVE_GROUP_TTL,
+)
 
 
 class ModelBuffer:
     def __init__(self):
-        print("Initializing new stateful ModelBuffer...")
+        log.debug("model_buffer_created")
         self.is_ready = False
-        self.lstm_input = []
-        self.eye_input = []
-        self.yawn_input = []
+        # 预分配的定长窗口，push 为 O(1)，view() 直接作为模型输入
+        self.lstm_input = FeatureRing(LAG_VAL * 2)
+        self.eye_input = FeatureRing(EYE_LAG_VAL)
+        self.yawn_input = FeatureRing(YAWN_LAG_VAL)
         self.frame_counter = 0
         self.eye_closed_accumulator = 0
         self.mouth_open_accumulator = 0
@@ -55,21 +116,121 @@ class ModelBuffer:
         self.high_fatigue_event_logged = False
         self.current_state = "Initializing"
         self.state_start_time = time.time()
+        # 当前等级尚未写入统计表的时长起点，以及已结束、待写入的时长 [(等级, 开始, 结束), ...]
+        self.span_start = datetime.now()
+        self.closed_spans = []
+        # 最近一次发布到 live_hub 的等级，不写入快照：新建、恢复或重置后的会话会重新发布一次当前等级
+        self.live_state = None
 
-    def update_state(self, new_state):
+    def update_state(self, new_state, username: Optional[str] = None):
         if new_state != self.current_state:
             if self.current_state == "High" and new_state != "High":
-                print("Fatigue level changed from High. Ready to log next High event.")
                 self.high_fatigue_event_logged = False
             duration = time.time() - self.state_start_time
-            print(f"[STATE_CHANGE] From '{self.current_state}' to '{new_state}'. Duration: {duration:.2f}s")
+            log.info("state_change", username=username, from_state=self.current_state, to_state=new_state,
+                     duration=duration)
+            state_transitions.labels(new_state).inc()
+            now = datetime.now()
+            if self.current_state in rollup.FATIGUE_LEVELS:
+                self.closed_spans.append((self.current_state, self.span_start, now))
             self.current_state = new_state
             self.state_start_time = time.time()
+            self.span_start = now
             return True
         return False
 
+    def take_state_spans(self, checkpoint_interval: float):
+        """取出待写入的等级时长；当前等级持续超过 checkpoint_interval 秒时先截断一段"""
+        now = datetime.now()
+        if self.current_state in rollup.FATIGUE_LEVELS and \
+                (now - self.span_start).total_seconds() >= checkpoint_interval:
+            self.closed_spans.append((self.current_state, self.span_start, now))
+            self.span_start = now
+        spans, self.closed_spans = self.closed_spans, []
+        return spans
+
+    # 快照只包含恢复预测所需的状态：三个特征窗口（计数 0~5，按 uint8 存储）+ 确认计数器和当前状态
+    _SNAPSHOT_FIELDS = (
+        "is_ready", "frame_counter", "eye_closed_accumulator", "mouth_open_accumulator",
+        "fatigue_level_raw", "eye_closure_raw", "yawn_raw",
+        "high_fatigue_confirm_counter", "eye_closure_confirm_counter", "yawn_confirm_counter",
+        "low_fatigue_confirm_counter", "displayed_fatigue_level", "displayed_eye_closure", "displayed_yawn",
+        "high_fatigue_event_logged", "current_state", "state_start_time",
+    )
+    _SNAPSHOT_VERSION = 1
+    _SNAPSHOT_HEADER = struct.Struct("<H")
+
+    def _rings(self):
+        return self.lstm_input, self.eye_input, self.yawn_input
+
+    def snapshot(self) -> bytes:
+        """序列化为紧凑的字节串：2 字节头长度 + JSON 状态 + 三个窗口的 uint8 数据（不到 1KB）"""
+        state = {name: getattr(self, name) for name in self._SNAPSHOT_FIELDS}
+        state["v"] = self._SNAPSHOT_VERSION
+        state["lengths"] = [len(ring) for ring in self._rings()]
+        header = json.dumps(state, separators=(",", ":")).encode()
+        windows = np.concatenate([ring.view() for ring in self._rings()]).astype(np.uint8)
+        return self._SNAPSHOT_HEADER.pack(len(header)) + header + windows.tobytes()
+
+    @classmethod
+    def from_snapshot(cls, data: bytes) -> Optional["ModelBuffer"]:
+        """从 snapshot() 的结果恢复；版本不符时返回 None。离线期间不计入等级时长，统计从恢复时刻重新开始"""
+        (size,) = cls._SNAPSHOT_HEADER.unpack_from(data, 0)
+        offset = cls._SNAPSHOT_HEADER.size
+        state = json.loads(data[offset:offset + size])
+        if state.get("v") != cls._SNAPSHOT_VERSION:
+            return None
+        windows = np.frombuffer(data, dtype=np.uint8, offset=offset + size)
+        buffer = cls()
+        start = 0
+        for ring, count in zip(buffer._rings(), state["lengths"]):
+            ring.load(windows[start:start + ring.capacity], count)
+            start += ring.capacity
+        for name in cls._SNAPSHOT_FIELDS:
+            setattr(buffer, name, state[name])
+        return buffer
+
 
-buffer = ModelBuffer()
+def carry_windows(old: ModelBuffer, new: ModelBuffer):
+    """reset_buffer?keep_windows=true：保留特征窗口，预测立即继续；确认计数器和显示状态重新开始"""
+    new.lstm_input, new.eye_input, new.yawn_input = old.lstm_input, old.eye_input, old.yawn_input
+    if old.is_ready:
+        new.is_ready = True
+        new.fatigue_level_raw = new.displayed_fatigue_level = "Low"
+        new.update_state("Low")
+
+
+snapshots = SnapshotStore(
+    settings.SESSION_SNAPSHOT_PATH,
+    ttl=settings.SESSION_SNAPSHOT_TTL,
+    flush_interval=settings.SESSION_SNAPSHOT_FLUSH_INTERVAL,
+    enabled=settings.SESSION_SNAPSHOT_ENABLED,
+)
+
+
+def _restore_buffer(username):
+    data = snapshots.load(username)
+    if data is None:
+        return None
+    try:
+        buffer = ModelBuffer.from_snapshot(data)
+    except Exception:
+        log.warning("snapshot_restore_failed", username=username, exc_info=True)
+        return None
+    if buffer is not None:
+        log.info("session_restored", username=username, is_ready=buffer.is_ready, state=buffer.current_state)
+    return buffer
+
+
+# 每个驾驶员(用户名)一个独立的 ModelBuffer，新建会话时先尝试从快照恢复
+sessions = SessionRegistry(
+    ModelBuffer,
+    idle_ttl=settings.SESSION_IDLE_TTL,
+    max_sessions=settings.SESSION_MAX_COUNT,
+    restore=_restore_buffer,
+    discard=snapshots.discard,
+    on_restored=snapshots.mark_restored,
+)
 
 
 class FatigueResponse(BaseModel):
@@ -80,84 +241,301 @@ class FatigueResponse(BaseModel):
     detection_boxes: Optional[List] = None
 
 
-@router.on_event("startup")
-async def startup_event():
-    # 1. 加载机器学习模型
-    await load_models()
+@asynccontextmanager
+async def lifespan(app):
+    """
+    由 main.py 与数据库的 lifespan 组合使用。
+    模型在后台并发加载，不阻塞启动：加载完成前其他路由正常服务，检测接口返回“模型加载中”。
+    启用多进程工作池时模型只在工作进程中加载。
+    """
+    if worker_pool.enabled:
+        worker_pool.start()
+    else:
+        models.start()
+    # 启动推理线程池（以及可选的进程池）
+    inference.start()
+    await live_hub.start()
+    yield
+    await live_hub.stop()
+    inference.shutdown()
+    worker_pool.shutdown()
+    snapshots.close()
+    models.shutdown()
+
+
+def read_labels() -> List[str]:
+    with open(LABELS_PATH) as f:
+        return f.read().strip().split("\n")
 
-async def load_models():
-    global yolo_net, yolo_layers, yolo_labels, lstm_fatigue, lstm_eye, lstm_yawn
-    try:
-        print("Loading YOLO model...")
-        labelsPath = os.path.sep.join(["config", "obj.names"])
-        yolo_labels = open(labelsPath).read().strip().split("\n")
-        weightsPath = os.path.sep.join(["config", "yolov4-tiny_obj_best.weights"])
-        configPath = os.path.sep.join(["config", "yolov4-tiny_obj.cfg"])
-        yolo_net = cv2.dnn.readNetFromDarknet(configPath, weightsPath)
-        yolo_layers = yolo_net.getLayerNames()
-        try:
-            yolo_layers = [yolo_layers[i - 1] for i in yolo_net.getUnconnectedOutLayers()]
-        except TypeError:
-            yolo_layers = [yolo_layers[i[0] - 1] for i in yolo_net.getUnconnectedOutLayers()]
-        print("YOLO model loaded successfully!")
-    except Exception as e:
-        print(f"Error loading YOLO model: {e}")
-        # 在真实应用中可能需要更优雅地处理
 
-    try:
-        print("Loading LSTM models...")
-        lstm_fatigue = tf.keras.models.load_model('./model_dense300')
-        lstm_eye = tf.keras.models.load_model('./model_eye')
-        lstm_yawn = tf.keras.models.load_model('./model_yawn4')
-        print("LSTM models loaded successfully!")
-    except Exception as e:
-        print(f"Error loading LSTM models: {e}")
+# 紧凑编码中的类别 id 即 obj.names 的行号，模型未加载完成时也需要
+CLASS_LABELS = read_labels()
+
+
+def load_yolo():
+    labels = CLASS_LABELS
+    weightsPath = os.path.sep.join(["config", "yolov4-tiny_obj_best.weights"])
+    configPath = os.path.sep.join(["config", "yolov4-tiny_obj.cfg"])
+    backend = create_yolo_backend(
+        settings.YOLO_BACKEND, configPath, weightsPath,
+        input_size=settings.YOLO_INPUT_SIZE,
+        dnn_backend=settings.YOLO_DNN_BACKEND,
+        dnn_target=settings.YOLO_DNN_TARGET,
+        onnx_path=settings.YOLO_ONNX_PATH,
+        calibration_list=settings.YOLO_CALIBRATION_LIST,
+        image_root=settings.YOLO_IMAGE_ROOT,
+        calibration_images=settings.YOLO_CALIBRATION_IMAGES,
+    )
+    log.info("yolo_backend", backend=backend.description, input_size=settings.YOLO_INPUT_SIZE)
+    return YoloModel(backend, labels)
+
+
+def _lstm_loader(model_dir, input_dim):
+    cache_dir = settings.MODEL_CACHE_DIR if settings.MODEL_CACHE_ENABLED else None
+    return lambda: load_backend(settings.LSTM_BACKEND, model_dir, input_dim, cache_dir)
+
+
+models.register("yolo", load_yolo)
+models.register("fatigue", _lstm_loader("./model_dense300", LAG_VAL * 2))
+def _eye_loader():
+    # 闭眼头的输入只有 6^6 种，加载模型后算出（或从磁盘缓存读出）全部输出，之后查表代替模型调用
+    load = _lstm_loader("./model_eye", EYE_LAG_VAL)
+    def loader():
+        backend = load()
+        if not settings.LSTM_EYE_TABLE_ENABLED:
+            return backend
+        cache_dir = settings.MODEL_CACHE_DIR if settings.MODEL_CACHE_ENABLED else None
+        return load_eye_table(backend, "./model_eye", settings.LSTM_BACKEND, cache_dir,
+                              build_batch=settings.LSTM_EYE_TABLE_BUILD_BATCH)
+    return loader
+
+
+models.register("eye", _eye_loader())
+models.register("yawn", _lstm_loader("./model_yawn4", YAWN_LAG_VAL))
+
+
+def load_models_sync():
+    """推理工作进程的 initializer：阻塞加载全部模型（磁盘缓存命中时很快）"""
+    models.load_all()
+
+# 推理执行器：事件循环只做 I/O，解码和模型推理都在这里执行。
+# 配置了进程池时，每个工作进程启动时用 load_models_sync 预加载一份模型
+inference = InferenceExecutor(
+    max_workers=settings.INFERENCE_THREADS,
+    max_pending=settings.INFERENCE_MAX_PENDING,
+    process_workers=settings.INFERENCE_PROCESS_WORKERS,
+    process_initializer=load_models_sync,
+)
+
 
 async def log_fatigue_to_db(fatigue_data: schemas.FatigueCreate):
     """
     一个独立的后台任务函数，用于记录疲劳数据。
-    它会自己从全局连接池获取连接。
+    只把事件放入异步写入队列，由 event_writer 批量写入数据库，不会阻塞帧处理。
     """
-    if not database.db_pool:
-        print("Database pool is not available for background task.")
-        return
+    database.event_writer.enqueue(fatigue_data)
 
-    try:
-        # 在任务内部获取一个新的连接
-        async with database.db_pool.acquire() as conn:
-            await crud.create_fatigue_record(conn, fatigue_data)
-    except Exception as e:
-        # 建议使用日志库，而不是print
-        print(f"Error in background task log_fatigue_to_db: {e}")
-
-def detect(frame, W, H):
-    # (此函数与之前完全相同)
-    global yolo_net, yolo_layers
-    blob = cv2.dnn.blobFromImage(frame, 1 / 255.0, (416, 416), swapRB=True, crop=False)
-    yolo_net.setInput(blob)
-    layerOutputs = yolo_net.forward(yolo_layers)
-    boxes, confidences, classIDs = [], [], []
-    for output in layerOutputs:
-        for detection in output:
-            scores = detection[5:]
-            classID = np.argmax(scores)
-            confidence = scores[classID]
-            if confidence > 0.4:
-                box = detection[0:4] * np.array([W, H, W, H])
-                (centerX, centerY, width, height) = box.astype("int")
-                x = int(centerX - (width / 2))
-                y = int(centerY - (height / 2))
-                boxes.append([x, y, int(width), int(height)])
-                confidences.append(float(confidence))
-                classIDs.append(classID)
-    idxs = cv2.dnn.NMSBoxes(boxes, confidences, 0.5, 0.5)
-    return classIDs, boxes, idxs, confidences
+
+def log_state_spans(buffer: ModelBuffer, username: str):
+    """把各疲劳等级的持续时长放入写入队列，计入统计预聚合表"""
+    for status, start_time, end_time in buffer.take_state_spans(settings.STATE_SPAN_CHECKPOINT_INTERVAL):
+        database.event_writer.enqueue(schemas.FatigueStateSpan(
+            username=username,
+            status=status,
+            start_time=start_time,
+            end_time=end_time,
+        ))
+
+def _decode_timed(decoder, data):
+    # 缩小解码时短边不小于网络输入；返回值里带原图尺寸，用于把检测框映射回原图坐标
+    min_side = int(settings.YOLO_INPUT_SIZE * settings.FRAME_DECODE_MIN_SCALE) if settings.FRAME_DECODE_REDUCED else 0
+    with _stage["decode"].time():
+        return decoder(data, min_side)
+
+
+def _yolo_forward(blob):
+    # cv2.dnn.Net 不是线程安全的，setInput/forward 必须成对串行执行
+    yolo = models.get("yolo")
+    with _yolo_lock:
+        return yolo.backend.forward(blob)
+
+
+def _lstm_forward(head, batch):
+    return models.get(head).predict(batch)
+
+
+def _lstm_batch_runner(head):
+    timer = _stage[f"lstm_{head}"]
+    def run(windows):
+        batch = stack_windows(windows)
+        with timer.time():
+            outputs = inference.run_model(_lstm_forward, head, batch)
+        return [outputs[i:i + 1] for i in range(len(windows))]
+    return run
+
+
+# 每个 LSTM 头一个微批调度器，把同一时刻不同会话的窗口合并成一个 (B, 1, N) 张量
+lstm_batchers = {
+    head: MicroBatcher(
+        _lstm_batch_runner(head),
+        max_batch_size=settings.LSTM_BATCH_MAX_SIZE,
+        max_wait_ms=settings.LSTM_BATCH_MAX_WAIT_MS,
+        name=f"lstm-{head}-batcher",
+    )
+    for head in ("fatigue", "eye", "yawn")
+}
+
+
+# 打哈欠 / 疲劳头的输出按窗口缓存（全零窗口等重复输入很多），闭眼头由 EyeLookupTable 查表
+prediction_caches = {head: PredictionLRU(head, settings.LSTM_PREDICTION_CACHE_SIZE) for head in ("fatigue", "yawn")}
+
+
+def _predict_cached(head, input_arr):
+    cache = prediction_caches[head]
+    key = pack_window(input_arr) if cache.enabled else None
+    if key is not None:
+        output = cache.get(key)
+        if output is not None:
+            return output
+    output = _predict_lstm(head, input_arr)
+    if key is not None:
+        cache.put(key, output)
+    return output
+
+
+def _predict_lstm(head, input_arr):
+    model = models.get(head)
+    if isinstance(model, EyeLookupTable):
+        # 查表比凑批还快，不经过微批调度器
+        return model.predict(input_arr)
+    if settings.LSTM_BATCH_ENABLED:
+        return lstm_batchers[head].submit(input_arr).result()
+    with _stage[f"lstm_{head}"].time():
+        return inference.run_model(_lstm_forward, head, np.asarray(input_arr, dtype=np.float32))
+
+
+def detect(frame, W, H, input_size=None):
+    input_size = input_size or settings.YOLO_INPUT_SIZE
+    with _stage["blob"].time():
+        # 复用本线程预分配的 blob，forward 返回前不会被覆盖
+        blob = blob_buffer().fill([frame], input_size)
+    with _stage["yolo_forward"].time():
+        layerOutputs = inference.run_model(_yolo_forward, blob)
+    return decode_detections(layerOutputs, W, H)
+
+
+def decode_detections(layerOutputs, W, H):
+    # 框解码 + 置信度过滤 + NMS
+    with _stage["nms"].time():
+        return decode_yolo_outputs(layerOutputs, W, H, len(models.get("yolo").labels))
+
+
+def _slice_batch_output(output, index, batch_size):
+    # OpenCV 的 Region 层在 batch>1 时输出 (N, rows, cols)，batch=1 时输出 (rows, cols)
+    if output.ndim == 3:
+        return output[index]
+    rows = output.shape[0] // batch_size
+    return output[index * rows:(index + 1) * rows]
+
+
+def detect_batch(items):
+    """
+    items 为 (frame, input_size) 列表。相同输入尺寸的帧合并为一次前向推理，
+    返回与 items 顺序一致的检测结果列表。
+    """
+    results = [None] * len(items)
+    groups = {}
+    for index, (frame, input_size) in enumerate(items):
+        groups.setdefault(input_size, []).append(index)
+    for input_size, indices in groups.items():
+        frames = [items[i][0] for i in indices]
+        if len(frames) == 1:
+            H, W = frames[0].shape[:2]
+            results[indices[0]] = detect(frames[0], W, H, input_size)
+            continue
+        with _stage["blob"].time():
+            blob = blob_buffer().fill(frames, input_size)
+        with _stage["yolo_forward"].time():
+            layerOutputs = inference.run_model(_yolo_forward, blob)
+        for i, frame in enumerate(frames):
+            H, W = frame.shape[:2]
+            outputs = [_slice_batch_output(output, i, len(frames)) for output in layerOutputs]
+            results[indices[i]] = decode_detections(outputs, W, H)
+    return results
+
+
+# 所有会话共享的 YOLO 微批调度器，单个工作线程负责前向推理
+yolo_batcher = MicroBatcher(
+    detect_batch,
+    max_batch_size=settings.YOLO_BATCH_MAX_SIZE,
+    max_wait_ms=settings.YOLO_BATCH_MAX_WAIT_MS,
+    name="yolo-batcher",
+)
+
+
+async def detect_async(frame, input_size=None):
+    """供 WebSocket / HTTP 接口使用：开启微批时交给调度器，与其他会话的帧合并推理"""
+    input_size = input_size or settings.YOLO_INPUT_SIZE
+    if settings.YOLO_BATCH_ENABLED:
+        return await asyncio.wrap_future(yolo_batcher.submit((frame, input_size)))
+    H, W = frame.shape[:2]
+    return await inference.run(detect, frame, W, H, input_size)
+
+
+def _session_tracker(username):
+    session = sessions.get(username)
+    if session.tracker is None:
+        session.tracker = RoiTracker(
+            CLASS_FACE,
+            min_interval=settings.ROI_MIN_INTERVAL,
+            max_interval=settings.ROI_MAX_INTERVAL,
+            margin=settings.ROI_MARGIN,
+            motion_threshold=settings.ROI_MOTION_THRESHOLD,
+            min_track_score=settings.ROI_MIN_TRACK_SCORE,
+            min_face_confidence=settings.ROI_MIN_FACE_CONFIDENCE,
+        )
+    return session.tracker
+
+
+async def detect_for_session(username, frame):
+    """
+    自适应检测：每 K 帧做一次全图检测，其余帧跟踪人脸框并只在 ROI 上以较小尺寸检测。
+    未开启 ROI_TRACKING_ENABLED 时每帧都做全图检测。
+    """
+    if not settings.ROI_TRACKING_ENABLED:
+        return await detect_async(frame)
+    tracker = _session_tracker(username)
+    roi = await inference.run(tracker.plan, frame)
+    if roi is None:
+        detections = await detect_async(frame)
+        await inference.run(tracker.observe_full, frame, detections)
+        return detections
+    x0, y0, x1, y1 = roi
+    detections = offset_detections(await detect_async(frame[y0:y1, x0:x1], settings.ROI_INPUT_SIZE), x0, y0)
+    tracker.observe_roi(detections)
+    return detections
+
+
+def detect_for_session_sync(username, frame):
+    """detect_for_session 的同步版本，在推理工作进程中逐帧调用"""
+    H, W = frame.shape[:2]
+    if not settings.ROI_TRACKING_ENABLED:
+        return detect(frame, W, H)
+    tracker = _session_tracker(username)
+    roi = tracker.plan(frame)
+    if roi is None:
+        detections = detect(frame, W, H)
+        tracker.observe_full(frame, detections)
+        return detections
+    x0, y0, x1, y1 = roi
+    detections = offset_detections(detect(frame[y0:y1, x0:x1], x1 - x0, y1 - y0, settings.ROI_INPUT_SIZE), x0, y0)
+    tracker.observe_roi(detections)
+    return detections
 
 
 def predict_fatigue(input_data, lag_val):
-    # (此函数与之前完全相同)
-    input_arr = np.array(input_data).reshape((1, 1, lag_val * 2))
-    output = lstm_fatigue.predict(input_arr, verbose=0)
+    input_arr = np.asarray(input_data, dtype=np.float32).reshape((1, 1, lag_val * 2))
+    output = _predict_cached("fatigue", input_arr)
     prediction = np.argmax(output)
     if prediction == 0:
         return "Low"
@@ -168,157 +546,371 @@ def predict_fatigue(input_data, lag_val):
 
 
 def predict_eye_closure(input_data, lag_val):
-    # (此函数与之前完全相同)
-    input_arr = np.array(input_data).reshape((1, 1, lag_val))
-    output = lstm_eye.predict(input_arr, verbose=0)
+    input_arr = np.asarray(input_data, dtype=np.float32).reshape((1, 1, lag_val))
+    output = _predict_lstm("eye", input_arr)
     return output >= 0.5
 
 
 def predict_yawn(input_data, lag_val):
-    # (此函数与之前完全相同)
-    input_arr = np.array(input_data).reshape((1, 1, lag_val))
-    output = lstm_yawn.predict(input_arr, verbose=0)
+    input_arr = np.asarray(input_data, dtype=np.float32).reshape((1, 1, lag_val))
+    output = _predict_cached("yawn", input_arr)
     return output >= 0.5
 
 
-def process_image(frame, background_tasks: BackgroundTasks, username: str):
-    # (此函数与之前完全相同)
-    global buffer
-    H, W = frame.shape[:2]
-    classIDs, boxes, idxs, confidences = detect(frame, W, H)
+def process_image(frame, background_tasks: BackgroundTasks, username: str, detections=None):
+    session = sessions.get(username)
+    if detections is None:
+        H, W = frame.shape[:2]
+        detections = detect(frame, W, H)
+
+    # 检测不依赖会话状态，放在锁外；只有累加器和LSTM窗口的更新需要串行
+    with session.lock:
+        result = update_buffer(session.buffer, detections.present, background_tasks, username)
+        if session.buffer.frame_counter % 5 == 0:
+            # 每次推入窗口后记录快照，写盘由后台线程合并完成
+            snapshots.save(username, session.buffer.snapshot())
+
+    labels = models.get("yolo").labels
+    detection_boxes_data = []
+    for i in detections.keep:
+        detection_boxes_data.append({
+            "class": labels[detections.class_ids[i]],
+            "confidence": float(detections.confidences[i]),
+            "box": detections.boxes[i].tolist(),
+        })
+    result["detection_boxes"] = detection_boxes_data
+    return result
+
+
+def push_window_step(buffer: ModelBuffer, username: str) -> bool:
+    """
+    每 5 帧一次：把累加的闭眼/张嘴帧数推入三个 LSTM 窗口并清零累加器。
+    返回本次是否刚好填满全部窗口（此后 buffer.is_ready 为 True，开始预测）。
+    """
+    buffer.lstm_input.push(buffer.eye_closed_accumulator)
+    buffer.lstm_input.push(buffer.mouth_open_accumulator)
+    buffer.eye_input.push(buffer.eye_closed_accumulator)
+    buffer.yawn_input.push(buffer.mouth_open_accumulator)
+    buffer.eye_closed_accumulator = 0
+    buffer.mouth_open_accumulator = 0
+    log.debug("window_pushed", username=username, filled=len(buffer.lstm_input))
+    if buffer.is_ready:
+        return False
+    if (len(buffer.lstm_input) >= LAG_VAL * 2 and
+            len(buffer.eye_input) >= EYE_LAG_VAL and
+            len(buffer.yawn_input) >= YAWN_LAG_VAL):
+        log.info("buffers_ready", username=username)
+        buffer.is_ready = True
+        buffer.fatigue_level_raw = "Low"
+        buffer.displayed_fatigue_level = "Low"
+        return True
+    return False
+
+
+def apply_predictions(buffer: ModelBuffer, fatigue_level_raw: str, eye_closure_raw: bool, yawn_raw: bool,
+                      username: str) -> bool:
+    """
+    用三个 LSTM 头的原始输出更新确认计数器和显示状态（不含 update_state）。
+    返回是否产生了一次新的 High 事件；连续确认为 Low 时清零窗口，重新累积。
+    离线视频批处理 (services/offline_video.py) 复用同一套规则。
+    """
+    buffer.fatigue_level_raw = fatigue_level_raw
+    buffer.eye_closure_raw = eye_closure_raw
+    buffer.yawn_raw = yawn_raw
+    if buffer.fatigue_level_raw == "High":
+        buffer.high_fatigue_confirm_counter += 1
+    else:
+        buffer.high_fatigue_confirm_counter = max(0, buffer.high_fatigue_confirm_counter - 20)
+    if buffer.high_fatigue_confirm_counter >= buffer.CONFIRMATION_THRESHOLD_FATIGUE:
+        buffer.displayed_fatigue_level = "High"
+    elif buffer.fatigue_level_raw == "Medium":
+        buffer.displayed_fatigue_level = "Medium"
+    else:
+        buffer.displayed_fatigue_level = "Low"
+
+    new_high_event = False
+    if buffer.displayed_fatigue_level == "High" and not buffer.high_fatigue_event_logged:
+        buffer.high_fatigue_event_logged = True
+        new_high_event = True
+
+    if buffer.eye_closure_raw:
+        buffer.eye_closure_confirm_counter += 1
+    else:
+        buffer.eye_closure_confirm_counter = max(0, buffer.eye_closure_confirm_counter - 1)
+    buffer.displayed_eye_closure = buffer.eye_closure_confirm_counter >= buffer.CONFIRMATION_THRESHOLD_EYE
+    if buffer.yawn_raw:
+        buffer.yawn_confirm_counter += 1
+    else:
+        buffer.yawn_confirm_counter = max(0, buffer.yawn_confirm_counter - 1)
+    buffer.displayed_yawn = buffer.yawn_confirm_counter >= buffer.CONFIRMATION_THRESHOLD_YAWN
+    if buffer.fatigue_level_raw == "Low":
+        buffer.low_fatigue_confirm_counter += 1
+    else:
+        buffer.low_fatigue_confirm_counter = 0
+    if buffer.low_fatigue_confirm_counter >= buffer.CONFIRMATION_THRESHOLD_LOW_RESET:
+        log.debug("low_state_confirmed", username=username)
+        buffer.lstm_input.zero()
+        buffer.eye_input.zero()
+        buffer.yawn_input.zero()
+        buffer.high_fatigue_confirm_counter, buffer.eye_closure_confirm_counter, buffer.yawn_confirm_counter, buffer.low_fatigue_confirm_counter = 0, 0, 0, 0
+        buffer.fatigue_level_raw = "Low"
+        buffer.displayed_fatigue_level, buffer.displayed_eye_closure, buffer.displayed_yawn = "Low", False, False
+    return new_high_event
 
-    if 3 in classIDs: buffer.eye_closed_accumulator += 1
-    if 0 in classIDs: buffer.mouth_open_accumulator += 1
+
+def update_buffer(buffer: ModelBuffer, present, background_tasks: BackgroundTasks, username: str):
+    # present: 每个类别是否在本帧出现（NMS 之前、通过置信度阈值的候选框）
+    if present[CLASS_EYES_CLOSED]: buffer.eye_closed_accumulator += 1
+    if present[CLASS_MOUTH_OPENED]: buffer.mouth_open_accumulator += 1
     buffer.frame_counter += 1
 
     if buffer.frame_counter % 5 == 0:
-        buffer.lstm_input.append(float(buffer.eye_closed_accumulator))
-        buffer.lstm_input.append(float(buffer.mouth_open_accumulator))
-        buffer.eye_input.append(float(buffer.eye_closed_accumulator))
-        buffer.yawn_input.append(float(buffer.mouth_open_accumulator))
-        buffer.eye_closed_accumulator = 0
-        buffer.mouth_open_accumulator = 0
-        print(len(buffer.lstm_input))
-        lag_val, eye_lag_val, yawn_lag_val = 200, 6, 10
-        if not buffer.is_ready:
-            if (len(buffer.lstm_input) >= lag_val * 2 and
-                    len(buffer.eye_input) >= eye_lag_val and
-                    len(buffer.yawn_input) >= yawn_lag_val):
-                print("All buffers are full. System is now ready for prediction.")
-                buffer.is_ready = True
-                buffer.update_state("Low")
-                buffer.fatigue_level_raw = "Low"
-                buffer.displayed_fatigue_level = "Low"
+        if push_window_step(buffer, username):
+            buffer.update_state("Low", username)
 
         if buffer.is_ready:
-            buffer.lstm_input = buffer.lstm_input[-(lag_val * 2):]
-            buffer.fatigue_level_raw = predict_fatigue(buffer.lstm_input, lag_val)
-            buffer.eye_input = buffer.eye_input[-eye_lag_val:]
-            buffer.eye_closure_raw = bool(predict_eye_closure(buffer.eye_input, eye_lag_val))
-            buffer.yawn_input = buffer.yawn_input[-yawn_lag_val:]
-            buffer.yawn_raw = bool(predict_yawn(buffer.yawn_input, yawn_lag_val))
-            if buffer.fatigue_level_raw == "High":
-                buffer.high_fatigue_confirm_counter += 1
-            else:
-                buffer.high_fatigue_confirm_counter = max(0, buffer.high_fatigue_confirm_counter - 20)
-            if buffer.high_fatigue_confirm_counter >= buffer.CONFIRMATION_THRESHOLD_FATIGUE:
-                buffer.displayed_fatigue_level = "High"
-            elif buffer.fatigue_level_raw == "Medium":
-                buffer.displayed_fatigue_level = "Medium"
-            else:
-                buffer.displayed_fatigue_level = "Low"
-
-            if buffer.displayed_fatigue_level == "High" and not buffer.high_fatigue_event_logged:
-                print(f"High fatigue detected for user '{username}'! Logging to database.")
+            fatigue_level_raw = predict_fatigue(buffer.lstm_input.view(), LAG_VAL)
+            eye_closure_raw = bool(predict_eye_closure(buffer.eye_input.view(), EYE_LAG_VAL))
+            yawn_raw = bool(predict_yawn(buffer.yawn_input.view(), YAWN_LAG_VAL))
+            if apply_predictions(buffer, fatigue_level_raw, eye_closure_raw, yawn_raw, username):
+                log.warning("high_fatigue_detected", username=username)
+                high_events.inc()
                 fatigue_data = schemas.FatigueCreate(
                     username=username,
-                    status=buffer.displayed_fatigue_level,
+                    status="High",
                     event_time=datetime.now()
                 )
                 background_tasks.add_task(log_fatigue_to_db, fatigue_data)
-                buffer.high_fatigue_event_logged = True
-
-            if buffer.eye_closure_raw:
-                buffer.eye_closure_confirm_counter += 1
-            else:
-                buffer.eye_closure_confirm_counter = max(0, buffer.eye_closure_confirm_counter - 1)
-            buffer.displayed_eye_closure = buffer.eye_closure_confirm_counter >= buffer.CONFIRMATION_THRESHOLD_EYE
-            if buffer.yawn_raw:
-                buffer.yawn_confirm_counter += 1
-            else:
-                buffer.yawn_confirm_counter = max(0, buffer.yawn_confirm_counter - 1)
-            buffer.displayed_yawn = buffer.yawn_confirm_counter >= buffer.CONFIRMATION_THRESHOLD_YAWN
-            if buffer.fatigue_level_raw == "Low":
-                buffer.low_fatigue_confirm_counter += 1
-            else:
-                buffer.low_fatigue_confirm_counter = 0
-            if buffer.low_fatigue_confirm_counter >= buffer.CONFIRMATION_THRESHOLD_LOW_RESET:
-                print("Driver state confirmed as Low. Resetting all buffers and counters.")
-                if len(buffer.lstm_input) > 0: buffer.lstm_input[:] = [0.0] * len(buffer.lstm_input)
-                if len(buffer.eye_input) > 0: buffer.eye_input[:] = [0.0] * len(buffer.eye_input)
-                if len(buffer.yawn_input) > 0: buffer.yawn_input[:] = [0.0] * len(buffer.yawn_input)
-                buffer.high_fatigue_confirm_counter, buffer.eye_closure_confirm_counter, buffer.yawn_confirm_counter, buffer.low_fatigue_confirm_counter = 0, 0, 0, 0
-                buffer.fatigue_level_raw = "Low"
-                buffer.displayed_fatigue_level, buffer.displayed_eye_closure, buffer.displayed_yawn = "Low", False, False
-
-            buffer.update_state(buffer.displayed_fatigue_level)
+                live_hub.publish(LiveEvent("high", username, ts=time.time()))
 
-    current_duration = time.time() - buffer.state_start_time
-    detection_boxes_data = []
-    if len(idxs) > 0:
-        for i in idxs.flatten():
-            detection_boxes_data.append(
-                {"class": yolo_labels[classIDs[i]], "confidence": confidences[i], "box": boxes[i]})
+            buffer.update_state(buffer.displayed_fatigue_level, username)
 
+        log_state_spans(buffer, username)
+        if buffer.current_state != buffer.live_state:
+            live_hub.publish(LiveEvent("state", username, buffer.current_state, buffer.live_state,
+                                       buffer.state_start_time, time.time()))
+            buffer.live_state = buffer.current_state
+
+    _state_frames[buffer.displayed_fatigue_level].inc()
+    current_duration = time.time() - buffer.state_start_time
     return {
         "fatigue_level": buffer.displayed_fatigue_level,
         "eye_closure": buffer.displayed_eye_closure,
         "yawn_detected": buffer.displayed_yawn,
         "current_state_duration": current_duration,
-        "detection_boxes": detection_boxes_data
     }
 
 
+# ---------------- 多进程推理工作池 ----------------
+# 以下几个函数在工作进程中执行：每个进程有自己的 models / sessions，
+# 驾驶员固定在某个进程上，其 ModelBuffer 只存在于该进程内。
+
+def _worker_init(index, num_workers):
+    setup_logging(settings.LOG_LEVEL, settings.LOG_FORMAT,
+                  settings.LOG_RATE_LIMIT_INTERVAL, settings.LOG_RATE_LIMIT_BURST)
+    # 按工作进程数平分 CPU，避免每个进程的 OpenCV / TensorFlow 都占满所有核
+    threads = max(1, (os.cpu_count() or 1) // num_workers)
+    os.environ.setdefault("TF_NUM_INTRAOP_THREADS", str(threads))
+    os.environ.setdefault("TF_NUM_INTEROP_THREADS", "1")
+    cv2.setNumThreads(threads)
+    # 工作进程内不再嵌套工作池；进程内逐帧串行处理，微批只会增加等待
+    worker_pool.num_workers = 0
+    settings.LSTM_BATCH_ENABLED = False
+    # 疲劳事件和状态时长随结果交回 API 进程写库；live_hub 的事件同样随结果交回，由 _enqueue_records 发布
+    database.event_writer = RecordCollector()
+    live_hub.relay = database.event_writer.enqueue
+    models.load_all()
+    if not models.ready():
+        raise RuntimeError(f"models failed to load: {models.status()}")
+
+
+def _worker_process_frame(username, frame):
+    background_tasks = BackgroundTasks()
+    detections = detect_for_session_sync(username, frame)
+    result = process_image(frame, background_tasks, username, detections)
+    if background_tasks.tasks:
+        # 只有 log_fatigue_to_db（放入 RecordCollector），偶发于 High 事件
+        asyncio.run(background_tasks())
+    return result, database.event_writer.drain()
+
+
+def _worker_finish():
+    # 工作进程退出或被重启前写出尚未落盘的会话快照，新进程可从快照恢复
+    snapshots.close()
+
+
+def _worker_reset(username, keep=False):
+    carry = carry_windows if keep else None
+    if username:
+        sessions.reset(username, carry)
+    else:
+        sessions.reset_all(carry)
+
+
+def _enqueue_records(records):
+    for record in records:
+        if isinstance(record, LiveEvent):
+            live_hub.publish(record)
+        else:
+            database.event_writer.enqueue(record)
+
+
+worker_pool = WorkerPool(
+    settings.INFERENCE_WORKERS,
+    initializer=_worker_init,
+    frame_handler=_worker_process_frame,
+    reset_handler=_worker_reset,
+    finalizer=_worker_finish,
+    on_records=_enqueue_records,
+    slots=settings.INFERENCE_WORKER_SLOTS,
+    slot_bytes=settings.INFERENCE_WORKER_SLOT_BYTES,
+    policy=settings.INFERENCE_WORKER_POLICY,
+    health_interval=settings.INFERENCE_WORKER_HEALTH_INTERVAL,
+    timeout=settings.INFERENCE_WORKER_TIMEOUT,
+    startup_timeout=settings.INFERENCE_WORKER_STARTUP_TIMEOUT,
+    session_ttl=settings.SESSION_IDLE_TTL,
+)
+
+
+def scale_boxes(result, frame, source_size):
+    """帧是缩小解码的时，把检测框从解码尺寸映射回原图坐标"""
+    H, W = frame.shape[:2]
+    if not source_size or source_size == (W, H):
+        return result
+    sx, sy = source_size[0] / W, source_size[1] / H
+    for item in result.get("detection_boxes") or ():
+        x, y, w, h = item["box"]
+        item["box"] = [int(round(x * sx)), int(round(y * sy)), int(round(w * sx)), int(round(h * sy))]
+    return result
+
+
+async def run_pipeline(username, frame, background_tasks: BackgroundTasks, source_size=None):
+    """检测 + 状态更新。启用工作池时整帧交给该驾驶员绑定的工作进程处理"""
+    frame_rates.mark(username)
+    started = time.perf_counter()
+    if worker_pool.enabled:
+        future = await inference.run(worker_pool.submit, username, frame)
+        result = await asyncio.wrap_future(future)
+    else:
+        detections = await detect_for_session(username, frame)
+        result = await inference.run(process_image, frame, background_tasks, username, detections)
+    frame_seconds.observe(time.perf_counter() - started)
+    return scale_boxes(result, frame, source_size)
+
+
+async def _send_result(websocket: WebSocket, encoder: ResultEncoder, result: dict):
+    payload = encoder.encode(result)
+    if encoder.binary:
+        await websocket.send_bytes(payload)
+    else:
+        await websocket.send_text(payload)
+
+
 @router.websocket("/ws/{username}")
-async def websocket_endpoint(
-        websocket: WebSocket,
-        username: str,
-        db: aiomysql.Connection = Depends(get_db_connection)
-):
+async def websocket_endpoint(websocket: WebSocket, username: str, encoding: str = "json",
+                             compact: bool = False, delta: bool = False):
+    # 整个驾驶过程都不占用数据库连接：事件经 event_writer 队列批量写库，写入时才短暂借用连接
+    # 结果编码由查询参数协商（见 services/result_codec.py），默认与旧客户端一致
     await websocket.accept()
-    active_connections.append(websocket)
-    print(f"WebSocket connection established for user: {username}")
+    try:
+        encoder = ResultEncoder(encoding.lower(), compact, delta, CLASS_LABELS, header=True)
+    except EncodingUnavailable as e:
+        await websocket.send_json({"error": str(e)})
+        await websocket.close(code=1003)
+        return
+    sessions.attach(username)
+    live_hub.connect(username)
+    log.info("websocket_connected", username=username)
     try:
         while True:
-            data = await websocket.receive_text()
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
             try:
-                json_data = json.loads(data)
-                img_data = json_data.get("image", "")
-                if "base64," in img_data:
-                    img_data = img_data.split("base64,")[1]
-
-                img_bytes = base64.b64decode(img_data)
-                nparr = np.frombuffer(img_bytes, np.uint8)
-                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-                if frame is not None:
-                    background_tasks = BackgroundTasks()
-                    result = process_image(frame, background_tasks, username)
-                    await websocket.send_json(result)
-                    await background_tasks()  # 在WebSocket中需要手动调用
-                else:
-                    await websocket.send_json({"error": "无法解码图像"})
+                background_tasks = BackgroundTasks()
+                frame_meta = {}
+                # 解码和推理都在执行器中完成，事件循环只负责收发
+                async with inference.admit():
+                    if message.get("bytes") is not None:
+                        # 二进制帧：帧头 + 原始 JPEG
+                        seq, client_ts, frame, source_size = await inference.run(
+                            _decode_timed, decode_binary_frame, message["bytes"])
+                        frame_meta = {"seq": seq, "client_ts": client_ts}
+                    else:
+                        # 兼容旧客户端：JSON + Base64
+                        frame, source_size = await inference.run(_decode_timed, decode_ws_message, message["text"])
+                    if frame is not None:
+                        result = await run_pipeline(username, frame, background_tasks, source_size)
+                    else:
+                        result = {"error": "无法解码图像"}
+                result.update(frame_meta)
+                await _send_result(websocket, encoder, result)
+                await background_tasks()  # 在WebSocket中需要手动调用
+            except ExecutorBusy:
+                await _send_result(websocket, encoder, {"error": "服务器繁忙，该帧已丢弃", "busy": True})
+            except ModelNotReady:
+                await _send_result(websocket, encoder, {"error": "模型正在加载，请稍候", "loading": True})
             except Exception as e:
-                await websocket.send_json({"error": str(e)})
+                await _send_result(websocket, encoder, {"error": str(e)})
+    except WebSocketDisconnect:
+        log.info("websocket_disconnected", username=username)
+    finally:
+        sessions.detach(username)
+        live_hub.disconnect(username)
+
+
+async def _send_live(websocket: WebSocket, subscription):
+    while True:
+        events = await subscription.next_batch()
+        await websocket.send_json({"type": "events", "events": events})
+
+
+@router.websocket("/live")
+async def live_endpoint(websocket: WebSocket, drivers: Optional[str] = None, group: Optional[str] = None,
+                        interval: Optional[float] = None):
+    """
+    监控端实时订阅，代替轮询 /api/v2/showfatigue。
+    drivers=a,b 只订阅指定驾驶员；group 按 userinfo 的 LIVE_GROUP_FIELD 列过滤；interval 为推送间隔（秒）。
+    连接后先收到 {"type": "snapshot", "drivers": [...]}，之后是合并后的 {"type": "events", "events": [...]}。
+    """
+    await websocket.accept()
+    subscription = live_hub.subscribe(
+        [d for d in drivers.split(",") if d] if drivers else None, group, interval)
+    sender = None
+    try:
+        await websocket.send_json({"type": "snapshot", "drivers": await live_hub.snapshot(subscription)})
+        sender = asyncio.create_task(_send_live(websocket, subscription))
+        # 监控端不发送数据，这里只用于及时发现断开；推送在独立的任务中进行
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
     except WebSocketDisconnect:
-        active_connections.remove(websocket)
-        print(f"WebSocket connection closed for user: {username}")
+        pass
+    finally:
+        live_hub.unsubscribe(subscription)
+        if sender is not None:
+            sender.cancel()
+            try:
+                await sender
+            except (asyncio.CancelledError, Exception):
+                pass
+
+
+@router.get("/live/stats")
+async def live_stats():
+    return live_hub.stats()
 
 
 @router.post("/reset_buffer")
-async def reset_buffer():
-    global buffer
-    buffer = ModelBuffer()
+async def reset_buffer(username: Optional[str] = None, keep_windows: bool = False):
+    # 指定 username 时只重置该驾驶员；不带参数时保持旧行为，重置全部会话。
+    # keep_windows=true 时保留特征窗口，只重置确认计数器和状态，不需要重新积累 1000 帧。
+    # 重置要等 process_image 释放会话锁（一整帧推理），并同步删除 SQLite 快照，放到推理线程中执行，不阻塞事件循环
+    if worker_pool.enabled:
+        await asyncio.gather(*map(asyncio.wrap_future, worker_pool.reset(username, keep_windows)),
+                             return_exceptions=True)
+    await inference.run(_worker_reset, username, keep_windows)
+    if username:
+        return {"status": "ok", "message": f"Stateful buffer of '{username}' has been reset"}
     return {"status": "ok", "message": "Stateful buffer has been reset"}
 
 
@@ -326,28 +918,128 @@ async def reset_buffer():
 async def detect_fatigue(
         request: schemas.FatigueJsonRequest,  # 接收我们新定义的JSON模型
         background_tasks: BackgroundTasks,
-        db: aiomysql.Connection = Depends(get_db_connection)
+        encoding: Optional[str] = None,
+        compact: bool = False,
+        accept: Optional[str] = Header(None),
 ):
+    # 默认仍按 FatigueResponse 返回 JSON；encoding=orjson|msgpack、compact=true 或 Accept: application/msgpack
+    # 时直接返回编码后的响应体（单次请求没有上一帧可比较，不支持 delta）
+    encoder = None
+    encoding = negotiate(encoding, accept)
+    if encoding != "json" or compact:
+        try:
+            encoder = ResultEncoder(encoding, compact, labels=CLASS_LABELS)
+        except EncodingUnavailable as e:
+            raise HTTPException(status_code=406, detail=str(e))
     try:
-        # 从请求体中获取Base64图像数据
-        img_data = request.image
-        if "base64," in img_data:
-            img_data = img_data.split("base64,")[1]
-
-        # 解码图像
-        img_bytes = base64.b64decode(img_data)
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        if frame is None:
-            raise HTTPException(status_code=400, detail="无法解码图像数据，请检查Base64字符串")
-    except (base64.binascii.Error, Exception) as e:
-        raise HTTPException(status_code=400, detail=f"图像解码失败: {e}")
-
-    # 从请求体中获取username并传递给处理函数
-    result = process_image(frame, background_tasks, request.username)
+        async with inference.admit():
+            try:
+                # 从请求体中获取Base64图像数据并解码
+                frame, source_size = await inference.run(_decode_timed, decode_base64_image, request.image)
+                if frame is None:
+                    raise HTTPException(status_code=400, detail="无法解码图像数据，请检查Base64字符串")
+            except (base64.binascii.Error, Exception) as e:
+                raise HTTPException(status_code=400, detail=f"图像解码失败: {e}")
+
+            # 从请求体中获取username并传递给处理函数
+            result = await run_pipeline(request.username, frame, background_tasks, source_size)
+    except ExecutorBusy:
+        raise HTTPException(status_code=503, detail="推理队列已满，请稍后重试")
+    except ModelNotReady:
+        raise HTTPException(status_code=503, detail="模型正在加载，请稍后重试")
+    if encoder is not None:
+        return Response(content=encoder.encode(jsonable_encoder(FatigueResponse(**result))), media_type=encoder.media_type)
     return FatigueResponse(**result)
 
 
+@router.get("/labels")
+async def result_labels():
+    """紧凑编码中等级下标与类别 id 的对照表"""
+    return {"levels": LEVELS, "labels": CLASS_LABELS}
+
+
+@router.get("/batcher/stats")
+async def batcher_stats():
+    return {
+        "enabled": settings.YOLO_BATCH_ENABLED,
+        "yolo": yolo_batcher.stats(),
+        "lstm_enabled": settings.LSTM_BATCH_ENABLED,
+        "lstm": {head: batcher.stats() for head, batcher in lstm_batchers.items()},
+        "executor": inference.stats(),
+        "workers": worker_pool.stats() if worker_pool.enabled else None,
+    }
+
+
+@router.get("/prediction_cache/stats")
+async def prediction_cache_stats():
+    # 启用推理工作进程池时预测在各工作进程内完成，这里只反映本进程
+    eye = models.get("eye") if models.ready("eye") else None
+    return {
+        "eye": eye.stats() if isinstance(eye, EyeLookupTable) else {"kind": "model"},
+        **{head: cache.stats() for head, cache in prediction_caches.items()},
+    }
+
+
+@router.get("/events/stats")
+async def event_writer_stats():
+    return database.event_writer.stats()
+
+
 @router.get("/health")
 async def health_check():
-    return {"status": "ok", "models_loaded": all([yolo_net, lstm_fatigue, lstm_eye, lstm_yawn])}
+    if worker_pool.enabled:
+        # 模型在工作进程中加载，以各工作进程的状态为准
+        workers = worker_pool.stats()
+        states = [w["state"] for w in workers["per_worker"]]
+        loaded = all(state == "ready" for state in states)
+        return {
+            "status": "ok" if loaded else ("degraded" if "failed" in states else "loading"),
+            "models_loaded": loaded,
+            "workers": workers,
+        }
+    model_status = models.status()
+    if models.ready():
+        state = "ok"
+    elif any(m["state"] == "failed" for m in model_status.values()):
+        state = "degraded"
+    else:
+        state = "loading"
+    return {
+        "status": state,
+        "models_loaded": models.ready(),
+        "models": model_status,
+        "sessions": sessions.stats(),
+        "snapshots": snapshots.stats(),
+    }
+
+
+# ---------------- /metrics ----------------
+
+def _queue_depths():
+    depths = {
+        "event_writer": database.event_writer.stats()["queue_depth"],
+        "inference_pending": inference.stats()["pending"],
+        "yolo_batcher": yolo_batcher.stats()["queue_depth"],
+    }
+    for head, batcher in lstm_batchers.items():
+        depths[f"lstm_{head}_batcher"] = batcher.stats()["queue_depth"]
+    if worker_pool.enabled:
+        for worker in worker_pool.stats()["per_worker"]:
+            depths[f"worker_{worker['index']}_inflight"] = worker["inflight"]
+    return depths
+
+
+# 会话数：工作进程模式下由各工作进程各自上报（带 worker 标签），API 进程不重复统计
+metrics.registry.gauge("fatigue_active_sessions", "Driver sessions held in memory").set_function(
+    lambda: {} if worker_pool.enabled else len(sessions))
+metrics.registry.gauge("fatigue_websocket_connections", "Open WebSocket connections").set_function(
+    live_hub.connections)
+metrics.registry.gauge("fatigue_queue_depth", "Items waiting in each internal queue", ["queue"]).set_function(
+    _queue_depths)
+metrics.registry.gauge("fatigue_session_fps", "Frames per second received per driver", ["username"]).set_function(
+    frame_rates.rates)
+
+
+def render_metrics() -> str:
+    """本进程及各推理工作进程的指标，Prometheus 文本格式"""
+    return metrics.registry.render(worker_pool.metrics_snapshots() if worker_pool.enabled else ())
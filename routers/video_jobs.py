@@ -0,0 +1,167 @@
+# routers/video_jobs.py
+# 离线视频批处理任务接口。每个任务在独立子进程中运行 python -m services.offline_video，
+# 解码和推理不占用 API 进程的事件循环与推理线程；结果 JSON 保存在 OFFLINE_VIDEO_RESULT_DIR。
+import asyncio
+import json
+import os
+import sys
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Dict, Optional, Set
+
+from fastapi import APIRouter, HTTPException, status
+
+from config.config import settings
+from entity import schemas
+from services.log import get_logger
+
+router = APIRouter()
+log = get_logger(__name__)
+
+# 内存中保留的任务数（含已结束的），超出后丢弃最早结束的任务记录，结果文件保留
+MAX_TRACKED_JOBS = 100
+
+jobs: Dict[str, Dict] = {}
+_processes: Dict[str, asyncio.subprocess.Process] = {}
+# 运行中和排队中的任务协程：事件循环只保留任务的弱引用，这里持有强引用，结束后自动移除
+_tasks: Set[asyncio.Task] = set()
+_slots: Optional[asyncio.Semaphore] = None
+
+
+def _resolve_video(path: str) -> str:
+    root = os.path.realpath(settings.OFFLINE_VIDEO_DIR)
+    full = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, full]) != root:
+        raise HTTPException(status_code=422, detail="path 必须位于视频目录内")
+    if not os.path.isfile(full):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"未找到视频 '{path}'")
+    return full
+
+
+def _public(job: Dict) -> Dict:
+    return {key: value for key, value in job.items() if key != "args"}
+
+
+def _prune():
+    finished = [job for job in jobs.values() if job["finished_at"] is not None]
+    finished.sort(key=lambda job: job["finished_at"])
+    for job in finished[:max(0, len(jobs) - MAX_TRACKED_JOBS)]:
+        jobs.pop(job["id"], None)
+
+
+async def _run_job(job: Dict):
+    # 整个任务都在 try 内：任何异常（包括取消）都会把任务标记为结束，不会一直停留在 queued / running
+    global _slots
+    try:
+        if _slots is None:
+            _slots = asyncio.Semaphore(settings.OFFLINE_VIDEO_MAX_JOBS)
+        async with _slots:
+            job["status"] = "running"
+            job["started_at"] = datetime.now()
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "services.offline_video", *job["args"],
+                stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE)
+            _processes[job["id"]] = process
+            _, stderr = await process.communicate()
+            if process.returncode == 0:
+                job["status"] = "done"
+            else:
+                job["status"] = "failed"
+                job["error"] = stderr.decode(errors="replace")[-2000:]
+    except asyncio.CancelledError:
+        job["status"] = "failed"
+        job["error"] = "服务关闭，任务已取消"
+        raise
+    except Exception as e:
+        log.exception("video_job_failed", job=job["id"])
+        job["status"] = "failed"
+        job["error"] = str(e)
+    finally:
+        _processes.pop(job["id"], None)
+        job["finished_at"] = datetime.now()
+        log.info("video_job_finished", job=job["id"], status=job["status"])
+        _prune()
+
+
+def _load_result(path: str, timeline: bool) -> Dict:
+    with open(path, encoding="utf-8") as f:
+        result = json.load(f)
+    if not timeline:
+        result.pop("timeline", None)
+    return result
+
+
+@router.post("/video_jobs")
+async def create_video_job(request_data: schemas.VideoJobRequest) -> Dict:
+    """
+    提交一个离线视频批处理任务，立即返回任务 id；同时最多运行 OFFLINE_VIDEO_MAX_JOBS 个，其余排队。
+    """
+    video = _resolve_video(request_data.path)
+    job_id = uuid.uuid4().hex[:12]
+    output = os.path.join(settings.OFFLINE_VIDEO_RESULT_DIR, f"{job_id}.json")
+    args = [video, "--username", request_data.username, "--output", output]
+    if request_data.start_time is not None:
+        args += ["--start", request_data.start_time.isoformat()]
+    if request_data.sample_fps > 0:
+        args += ["--fps", str(request_data.sample_fps)]
+    if not request_data.write:
+        args.append("--no-write")
+    job = {
+        "id": job_id,
+        "username": request_data.username,
+        "video": request_data.path,
+        "status": "queued",
+        "created_at": datetime.now(),
+        "started_at": None,
+        "finished_at": None,
+        "error": None,
+        "args": args,
+        "output": output,
+    }
+    jobs[job_id] = job
+    task = asyncio.create_task(_run_job(job))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return {"code": 200, "message": "任务已创建", "data": _public(job)}
+
+
+@router.get("/video_jobs")
+async def list_video_jobs() -> Dict:
+    return {"code": 200, "message": "查询成功", "data": [_public(job) for job in jobs.values()]}
+
+
+@router.get("/video_jobs/{job_id}")
+async def get_video_job(job_id: str, timeline: bool = False) -> Dict:
+    """
+    任务状态；完成后附带结果（High 事件、各等级时长、耗时），timeline=true 时包含每秒时间线。
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"未找到任务 '{job_id}'")
+    data = _public(job)
+    if job["status"] == "done":
+        try:
+            data["result"] = await asyncio.to_thread(_load_result, job["output"], timeline)
+        except Exception as e:
+            log.exception("读取任务结果失败")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="服务器内部错误，请稍后重试"
+            )
+    return {"code": 200, "message": "查询成功", "data": data}
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """应用关闭时终止仍在运行的批处理子进程，并取消排队中的任务"""
+    yield
+    for job_id, process in list(_processes.items()):
+        log.warning("video_job_terminated", job=job_id)
+        process.terminate()
+    for process in list(_processes.values()):
+        await process.wait()
+    tasks = list(_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,127 @@
+# services/batcher.py
+# 跨会话微批调度器：把短时间窗口内来自不同驾驶员的请求合并成一批，
+# 由单个工作线程一次性执行（例如一次 YOLO 前向推理），再把结果分发回各个调用方。
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Sequence
+
+
+class _Pending:
+    __slots__ = ("item", "future", "enqueued_at")
+
+    def __init__(self, item):
+        self.item = item
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    通用微批调度器。
+
+    run_batch 接收一个 item 列表，必须按相同顺序返回等长的结果列表。
+    第一个请求入队后最多等待 max_wait_ms 毫秒或凑满 max_batch_size 个就立即执行。
+    submit() 返回 concurrent.futures.Future，同步代码可直接 .result()，
+    协程中使用 asyncio.wrap_future() 等待。
+    """
+
+    def __init__(self, run_batch: Callable[[List[Any]], Sequence[Any]],
+                 max_batch_size: int = 8, max_wait_ms: float = 5.0, name: str = "batcher"):
+        self._run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+        self._queue: "queue.Queue[_Pending]" = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._errors = 0
+        self._max_seen = 0
+        self._wait_total = 0.0
+        self._run_total = 0.0
+        self._last_run = 0.0
+        self._size_histogram: Dict[int, int] = {}
+
+    def submit(self, item) -> Future:
+        self._ensure_started()
+        pending = _Pending(item)
+        self._queue.put(pending)
+        return pending.future
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _collect(self, first: _Pending) -> List[_Pending]:
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                if timeout <= 0:
+                    # 预算已用完，只捞取已经在排队的请求
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect(self._queue.get())
+            started = time.perf_counter()
+            try:
+                results = self._run_batch([p.item for p in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{self.name}: expected {len(batch)} results, got {len(results)}")
+            except Exception as e:
+                for p in batch:
+                    p.future.set_exception(e)
+                self._record(batch, started, failed=True)
+                continue
+            for p, result in zip(batch, results):
+                p.future.set_result(result)
+            self._record(batch, started)
+
+    def _record(self, batch: List[_Pending], started: float, failed: bool = False):
+        finished = time.perf_counter()
+        size = len(batch)
+        with self._stats_lock:
+            self._batches += 1
+            self._items += size
+            self._errors += int(failed)
+            self._max_seen = max(self._max_seen, size)
+            self._wait_total += sum(started - p.enqueued_at for p in batch)
+            self._last_run = finished - started
+            self._run_total += self._last_run
+            self._size_histogram[size] = self._size_histogram.get(size, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            batches = self._batches or 1
+            items = self._items or 1
+            return {
+                "name": self.name,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "items": self._items,
+                "errors": self._errors,
+                "avg_batch_size": self._items / batches,
+                "max_batch_seen": self._max_seen,
+                "avg_queue_wait_ms": self._wait_total / items * 1000.0,
+                "avg_run_ms": self._run_total / batches * 1000.0,
+                "last_run_ms": self._last_run * 1000.0,
+                "batch_size_histogram": dict(sorted(self._size_histogram.items())),
+            }
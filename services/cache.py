@@ -0,0 +1,212 @@
+# services/cache.py
+# 读穿透缓存：先查缓存，未命中再调用 loader 读库并回填；写操作后由调用方显式失效。
+#
+# 后端可插拔：
+# - MemoryBackend：进程内 TTL + LRU，单进程部署的默认选择；
+# - RedisBackend：多个 uvicorn 工作进程共享同一份缓存，某个进程失效后其他进程立即可见
+#   （需要安装 redis 包，值以 JSON 存储）。
+# 命中/未命中次数见 /metrics 的 fatigue_cache_requests_total 和各缓存的 stats()。
+
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from services import metrics
+from services.log import get_logger
+
+log = get_logger(__name__)
+
+cache_requests = metrics.registry.counter(
+    "fatigue_cache_requests_total", "Read-through cache lookups by result", ["cache", "result"])
+cache_invalidations = metrics.registry.counter(
+    "fatigue_cache_invalidations_total", "Keys explicitly invalidated after writes", ["cache"])
+
+# loader 返回 None（记录不存在）时不缓存，注册等写入后无需额外失效“不存在”的结果
+_MISSING = object()
+
+
+class MemoryBackend:
+    """进程内 TTL + LRU，条目数超过 max_entries 时淘汰最久未使用的"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    async def get(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return _MISSING
+            expires, value = item
+            if expires <= now:
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    async def set(self, key: str, value, ttl: float):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    async def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    async def close(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict:
+        return {"backend": "memory", "entries": len(self._data),
+                "max_entries": self.max_entries, "evictions": self.evictions}
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class RedisBackend:
+    """多进程共享的 Redis 后端，键带统一前缀，过期交给 Redis 处理"""
+
+    def __init__(self, url: str, prefix: str = "fatigue:"):
+        try:
+            import redis.asyncio as aioredis
+        except ImportError as e:
+            raise RuntimeError("CACHE_BACKEND=redis 需要安装 redis 包 (pip install redis)") from e
+        self.url = url
+        self.prefix = prefix
+        self._client = aioredis.from_url(url)
+
+    async def get(self, key: str):
+        raw = await self._client.get(self.prefix + key)
+        return _MISSING if raw is None else json.loads(raw)
+
+    async def set(self, key: str, value, ttl: float):
+        raw = json.dumps(value, ensure_ascii=False, default=_json_default)
+        await self._client.set(self.prefix + key, raw, px=max(1, int(ttl * 1000)))
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self._client.delete(*(self.prefix + key for key in keys))
+
+    async def close(self):
+        await self._client.close()
+
+    def stats(self) -> Dict:
+        return {"backend": "redis", "url": self.url, "prefix": self.prefix}
+
+
+def create_backend(kind: str, max_entries: int = 10000, redis_url: str = ""):
+    if kind == "memory":
+        return MemoryBackend(max_entries)
+    if kind == "redis":
+        return RedisBackend(redis_url)
+    raise ValueError(f"unknown cache backend: {kind}")
+
+
+class ReadThroughCache:
+    """
+    按 name 区分的一组缓存键（"<name>:<key>"），共享同一个后端。
+    后端出错时直接读库，缓存不可用不影响接口本身。
+    """
+
+    def __init__(self, name: str, backend, ttl: float, enabled: bool = True):
+        self.name = name
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.coalesced = 0  # 未命中但与同键的在途查询合并、没有再读库的次数
+        self._hit = cache_requests.labels(name, "hit")
+        self._miss = cache_requests.labels(name, "miss")
+        self._invalidated = cache_invalidations.labels(name)
+        # 同一个键同时未命中时只读一次库，其余请求等待同一个结果
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _key(self, key: str) -> str:
+        return f"{self.name}:{key}"
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]]):
+        if not self.enabled:
+            return await loader()
+        full_key = self._key(key)
+        try:
+            value = await self.backend.get(full_key)
+        except Exception:
+            self.errors += 1
+            log.warning("cache_get_failed", cache=self.name, exc_info=True)
+            return await loader()
+        if value is not _MISSING:
+            self.hits += 1
+            self._hit.inc()
+            return value
+        self.misses += 1
+        self._miss.inc()
+
+        pending = self._inflight.get(full_key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[full_key] = future
+        try:
+            value = await loader()
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # 没有其他等待者时避免 "exception was never retrieved"
+            raise
+        else:
+            future.set_result(value)
+        finally:
+            # 读库期间该键被 invalidate() 过时，读到的可能是写入前的旧值，不回填
+            fresh = self._inflight.get(full_key) is future
+            if fresh:
+                del self._inflight[full_key]
+        if value is not None and fresh:
+            try:
+                await self.backend.set(full_key, value, self.ttl)
+            except Exception:
+                self.errors += 1
+                log.warning("cache_set_failed", cache=self.name, exc_info=True)
+        return value
+
+    async def invalidate(self, *keys: str):
+        if not keys:
+            return
+        full_keys = [self._key(key) for key in keys]
+        for full_key in full_keys:
+            self._inflight.pop(full_key, None)
+        self._invalidated.inc(len(full_keys))
+        try:
+            await self.backend.delete(*full_keys)
+        except Exception:
+            self.errors += 1
+            log.warning("cache_invalidate_failed", cache=self.name, exc_info=True)
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+        }
@@ -0,0 +1,99 @@
+# services/executor.py
+# 推理执行器：把 CPU 密集的解码 / 前向推理从 asyncio 事件循环中移走，
+# 事件循环只负责网络 I/O。
+
+import asyncio
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Optional
+
+
+class ExecutorBusy(Exception):
+    """在途帧数已达上限，新帧被拒绝（由调用方决定丢帧或返回 503）"""
+
+
+class InferenceExecutor:
+    """
+    - 线程池：OpenCV / TensorFlow 的算子执行时会释放 GIL，线程池即可并行；
+    - 进程池（可选）：每个工作进程通过 initializer 预加载一份模型，
+      run_model() 把纯模型调用转发过去，绕开 GIL；
+    - 背压：admit() 限制同时在途的帧数，超出时立即抛出 ExecutorBusy，
+      而不是让过期的帧在队列里越积越多。
+    """
+
+    def __init__(self, max_workers: int = 4, max_pending: int = 32,
+                 process_workers: int = 0, process_initializer: Optional[Callable] = None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.process_workers = process_workers
+        self._process_initializer = process_initializer
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.rejected = 0
+
+    def start(self):
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+        if self.process_workers > 0 and self._processes is None:
+            # spawn：避免 fork 带着已加载的 TensorFlow 运行时和事件循环进入子进程
+            self._processes = ProcessPoolExecutor(
+                max_workers=self.process_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=self._process_initializer,
+            )
+
+    def shutdown(self):
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+            self._processes = None
+        if self._threads is not None:
+            self._threads.shutdown(wait=False, cancel_futures=True)
+            self._threads = None
+
+    @asynccontextmanager
+    async def admit(self):
+        """为一帧占用一个在途名额，帧处理结束（含异常）后释放"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise ExecutorBusy(f"inference queue is full ({self.max_pending} frames pending)")
+            self._pending += 1
+            self.admitted += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """在线程池中执行 fn，协程等待结果"""
+        if self._threads is None:
+            self.start()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._threads, functools.partial(fn, *args, **kwargs))
+
+    def run_model(self, fn: Callable, *args):
+        """
+        同步执行一次纯模型调用（在推理线程中调用）。
+        配置了进程池时转发给预加载模型的工作进程，fn 和参数必须可 pickle。
+        """
+        if self._processes is None:
+            return fn(*args)
+        return self._processes.submit(fn, *args).result()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "threads": self.max_workers,
+                "process_workers": self.process_workers if self._processes is not None else 0,
+                "pending": self._pending,
+                "max_pending": self.max_pending,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+            }
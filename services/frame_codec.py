@@ -0,0 +1,109 @@
+# services/frame_codec.py
+# 帧解码：WebSocket 二进制帧 (头部 + 原始 JPEG) 与旧的 JSON + Base64 两种格式。
+#
+# 二进制帧格式（小端）:
+#   uint32  seq        客户端帧序号
+#   float64 timestamp  客户端发送时间 (毫秒，performance.now() 或 Date.now())
+#   bytes   jpeg       原始 JPEG 数据
+# JPEG 部分直接以 np.frombuffer 映射到收到的 bytes 上，不做任何拷贝。
+# 源图远大于网络输入时可缩小解码 (decode_image 的 min_side)，解码函数都同时返回原始尺寸。
+
+import base64
+import json
+import struct
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+FRAME_HEADER = struct.Struct("<Id")
+
+
+class FrameFormatError(ValueError):
+    """二进制帧长度不足或格式错误"""
+
+
+def parse_binary_frame(data: bytes) -> Tuple[int, float, np.ndarray]:
+    """解析二进制帧头，返回 (seq, timestamp, 指向 JPEG 数据的 uint8 视图)"""
+    if len(data) <= FRAME_HEADER.size:
+        raise FrameFormatError(f"binary frame too short: {len(data)} bytes")
+    seq, timestamp = FRAME_HEADER.unpack_from(data, 0)
+    jpeg = np.frombuffer(data, dtype=np.uint8, offset=FRAME_HEADER.size)
+    return seq, timestamp, jpeg
+
+
+# JPEG 可以在解码阶段直接按 1/2、1/4、1/8 缩小（在 IDCT 中完成），比先全尺寸解码再缩放少处理大量像素
+_REDUCED_DECODE = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+# 带宽高信息的 SOF 段（排除 DHT=C4、JPG=C8、DAC=CC）
+_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def jpeg_size(buf) -> Optional[Tuple[int, int]]:
+    """只解析 JPEG 段头得到 (宽, 高)，不是 JPEG 或格式不完整时返回 None"""
+    data = memoryview(buf).cast("B")
+    n = len(data)
+    if n < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+    pos = 2
+    while pos + 4 <= n:
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:  # 填充字节
+            pos += 1
+            continue
+        if 0xD0 <= marker <= 0xD9 or marker == 0x01:  # 无长度字段的标记
+            pos += 2
+            continue
+        length = (data[pos + 2] << 8) | data[pos + 3]
+        if marker in _SOF_MARKERS:
+            if pos + 9 > n:
+                return None
+            height = (data[pos + 5] << 8) | data[pos + 6]
+            width = (data[pos + 7] << 8) | data[pos + 8]
+            return width, height
+        pos += 2 + length
+    return None
+
+
+def decode_image(buf, min_side: int = 0) -> Tuple[Optional[np.ndarray], Optional[Tuple[int, int]]]:
+    """
+    解码为 BGR 图像，返回 (图像, 原始尺寸 (宽, 高))，解码失败时图像为 None。
+    min_side > 0 且源图为 JPEG 时，按能保证宽高都不小于 min_side 的最大倍数缩小解码；
+    调用方用原始尺寸把检测框映射回原图坐标。
+    """
+    size = jpeg_size(buf) if min_side > 0 else None
+    if size is not None:
+        width, height = size
+        for factor, flag in _REDUCED_DECODE:
+            if -(-width // factor) >= min_side and -(-height // factor) >= min_side:
+                image = cv2.imdecode(buf, flag)
+                if image is None:
+                    return None, None
+                # EXIF 方向旋转 90° 时宽高互换
+                if (image.shape[1] > image.shape[0]) != (width > height) and width != height:
+                    size = (height, width)
+                return image, size
+    image = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+    if image is None:
+        return None, None
+    return image, (image.shape[1], image.shape[0])
+
+
+def decode_binary_frame(data: bytes, min_side: int = 0) -> Tuple[int, float, Optional[np.ndarray], Optional[Tuple[int, int]]]:
+    seq, timestamp, jpeg = parse_binary_frame(data)
+    return (seq, timestamp) + decode_image(jpeg, min_side)
+
+
+def decode_base64_image(img_data: str, min_side: int = 0):
+    """Base64（可带 data URL 前缀）→ (BGR 图像, 原始尺寸)，解码失败时图像为 None"""
+    if "base64," in img_data:
+        img_data = img_data.split("base64,")[1]
+    img_bytes = base64.b64decode(img_data)
+    nparr = np.frombuffer(img_bytes, np.uint8)
+    return decode_image(nparr, min_side)
+
+
+def decode_ws_message(data: str, min_side: int = 0):
+    json_data = json.loads(data)
+    return decode_base64_image(json_data.get("image", ""), min_side)
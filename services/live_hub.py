@@ -0,0 +1,308 @@
+# services/live_hub.py
+# 监控端实时推送：驾驶员会话发布疲劳等级变化、High 事件和上下线，监控端通过 WebSocket 订阅，
+# 取代反复轮询 /api/v2/showfatigue（每次都全表扫描 fatigue 表）。
+#
+# - publish() 非阻塞，可在推理线程或事件循环中调用：事件放入有界队列，由分发协程交给匹配的订阅者；
+#   队列满时丢弃最旧的事件，推理路径不会被任何监控端拖慢。
+# - 每个订阅者有自己的待发送表，按 (驾驶员, 事件类型) 合并，只保留最新一条，表的大小有上限；
+#   发送协程每 min_interval 秒最多推送一次。慢的监控端只会收到合并后的结果，不会积压。
+# - 订阅后先收到所有驾驶员的当前状态 (snapshot)，之后是增量事件。
+# - 可按驾驶员列表或分组过滤，分组由 resolve_group(username) 异步查询并缓存。
+# - 推理工作进程中没有订阅者：设置 relay 后事件随帧结果交回 API 进程再发布（与 RecordCollector 相同）。
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, Iterable, List, NamedTuple, Optional, Set
+
+from services import metrics
+from services.log import get_logger
+
+log = get_logger(__name__)
+
+live_events = metrics.registry.counter(
+    "fatigue_live_events_total", "Live feed events by outcome", ["outcome"])
+_outcome = {outcome: live_events.labels(outcome)
+            for outcome in ("published", "dropped", "delivered", "coalesced", "evicted")}
+
+
+class LiveEvent(NamedTuple):
+    type: str                    # "state" / "high" / "online" / "offline"
+    username: str
+    state: Optional[str] = None  # type=state 时为新的疲劳等级
+    previous: Optional[str] = None
+    since: Optional[float] = None  # 新等级开始的时间 (time.time())
+    ts: float = 0.0
+
+    def to_dict(self) -> Dict:
+        event = {"type": self.type, "username": self.username, "ts": self.ts}
+        if self.type == "state":
+            event.update(state=self.state, previous=self.previous, since=self.since)
+        return event
+
+
+class Subscription:
+    """一个监控端连接的订阅：过滤条件 + 有界的合并待发送表，只在事件循环中使用"""
+
+    def __init__(self, drivers: Optional[Set[str]], group: Optional[str], max_pending: int, min_interval: float):
+        self.drivers = drivers
+        self.group = group
+        self.max_pending = max_pending
+        self.min_interval = min_interval
+        self._pending: "OrderedDict[tuple, LiveEvent]" = OrderedDict()
+        self._wake = asyncio.Event()
+        self._last_sent = 0.0
+        self.closed = False
+        self.delivered = 0
+        self.coalesced = 0
+        self.evicted = 0
+
+    def offer(self, event: LiveEvent) -> Optional[str]:
+        """放入待发送表，返回 "coalesced" / "evicted" / None（指标由 LiveHub 按批累加）"""
+        key = (event.username, event.type)
+        outcome = None
+        if key in self._pending:
+            self.coalesced += 1
+            outcome = "coalesced"
+            del self._pending[key]
+        elif len(self._pending) >= self.max_pending:
+            # 待发送表已满：丢弃最久未发送的一条
+            self._pending.popitem(last=False)
+            self.evicted += 1
+            outcome = "evicted"
+        self._pending[key] = event
+        self._wake.set()
+        return outcome
+
+    async def next_batch(self) -> List[Dict]:
+        """等待下一批事件；距上次推送不足 min_interval 时先等待，期间到达的事件继续合并"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wake.wait()
+            delay = self._last_sent + self.min_interval - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._wake.clear()
+            if self._pending:
+                break
+        batch = [event.to_dict() for event in self._pending.values()]
+        self._pending.clear()
+        self._last_sent = loop.time()
+        self.delivered += len(batch)
+        _outcome["delivered"].inc(len(batch))
+        return batch
+
+    def stats(self) -> Dict:
+        return {
+            "drivers": sorted(self.drivers) if self.drivers is not None else None,
+            "group": self.group,
+            "pending": len(self._pending),
+            "delivered": self.delivered,
+            "coalesced": self.coalesced,
+            "evicted": self.evicted,
+        }
+
+
+class LiveHub:
+
+    def __init__(self, max_queued: int = 10000, max_pending: int = 1024, min_interval: float = 0.5,
+                 max_drivers: int = 256, resolve_group: Optional[Callable[[str], Awaitable[Optional[str]]]] = None,
+                 group_ttl: float = 300.0):
+        self.max_queued = max_queued
+        self.max_pending = max_pending
+        self.min_interval = min_interval
+        self.max_drivers = max_drivers
+        self.group_ttl = group_ttl
+        self.relay: Optional[Callable[[LiveEvent], None]] = None
+        self._resolve_group = resolve_group
+        self._queue: Deque[LiveEvent] = deque()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._subscriptions: List[Subscription] = []
+        # 各驾驶员的当前状态，供新订阅者的 snapshot 使用（按最近更新的顺序，超出 max_drivers 时淘汰最旧的）
+        self._drivers: "OrderedDict[str, Dict]" = OrderedDict()
+        self._connections: Dict[str, int] = {}
+        self._groups: Dict[str, tuple] = {}
+        self.published = 0
+        self.dropped = 0
+
+    # ---------------- 生产者（任意线程） ----------------
+
+    def publish(self, event: LiveEvent):
+        if self.relay is not None:
+            self.relay(event)
+            return
+        with self._lock:
+            self._queue.append(event)
+            self.published += 1
+            # 只有队列由空变为非空时才唤醒分发协程，其余事件由同一次唤醒一并取走
+            first = len(self._queue) == 1
+            if len(self._queue) > self.max_queued:
+                self._queue.popleft()
+                self.dropped += 1
+                _outcome["dropped"].inc()
+        _outcome["published"].inc()
+        if not first or self._loop is None or self._wake is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._wake.set)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+
+    def connect(self, username: str):
+        """驾驶员 WebSocket 建立时在事件循环中调用，第一条连接时发布 online"""
+        count = self._connections.get(username, 0) + 1
+        self._connections[username] = count
+        if count == 1:
+            self.publish(LiveEvent("online", username, ts=time.time()))
+
+    def disconnect(self, username: str):
+        """最后一条连接断开时发布 offline；没有对应的 connect 时忽略"""
+        if username not in self._connections:
+            return
+        count = self._connections[username] - 1
+        if count > 0:
+            self._connections[username] = count
+            return
+        self._connections.pop(username, None)
+        self.publish(LiveEvent("offline", username, ts=time.time()))
+
+    def connections(self) -> int:
+        return sum(self._connections.values())
+
+    # ---------------- 生命周期 ----------------
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._loop = None
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            with self._lock:
+                events, self._queue = self._queue, deque()
+            try:
+                await self._dispatch(events)
+            except Exception:
+                log.exception("live_dispatch_failed", events=len(events))
+
+    async def _dispatch(self, events: Iterable[LiveEvent]):
+        """一次唤醒取走的全部事件：先更新当前状态表，再按过滤条件交给各订阅者"""
+        for event in events:
+            self._remember(event)
+        subscriptions = list(self._subscriptions)
+        if not subscriptions:
+            return
+        groups: Dict[str, Optional[str]] = {}
+        if any(s.group is not None for s in subscriptions):
+            for username in {event.username for event in events}:
+                groups[username] = await self.group_of(username)
+        counts = {"coalesced": 0, "evicted": 0}
+        for event in events:
+            group = groups.get(event.username)
+            for subscription in subscriptions:
+                if self._matches(subscription, event.username, group):
+                    outcome = subscription.offer(event)
+                    if outcome is not None:
+                        counts[outcome] += 1
+        for outcome, n in counts.items():
+            if n:
+                _outcome[outcome].inc(n)
+
+    def _remember(self, event: LiveEvent):
+        driver = self._drivers.pop(event.username, None)
+        if driver is None:
+            driver = {"username": event.username, "state": None, "since": None, "online": False, "high_at": None}
+        if event.type == "state":
+            driver["state"], driver["since"] = event.state, event.since
+        elif event.type == "high":
+            driver["high_at"] = event.ts
+        else:
+            driver["online"] = event.type == "online"
+        self._drivers[event.username] = driver
+        while len(self._drivers) > self.max_drivers:
+            self._drivers.popitem(last=False)
+
+    # ---------------- 订阅者（事件循环） ----------------
+
+    @staticmethod
+    def _matches(subscription: Subscription, username: str, group: Optional[str]) -> bool:
+        if subscription.drivers is not None and username not in subscription.drivers:
+            return False
+        if subscription.group is not None and group != subscription.group:
+            return False
+        return True
+
+    async def group_of(self, username: str) -> Optional[str]:
+        if self._resolve_group is None:
+            return None
+        cached = self._groups.get(username)
+        now = time.monotonic()
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        try:
+            group = await self._resolve_group(username)
+        except Exception:
+            log.warning("live_group_lookup_failed", username=username, exc_info=True)
+            group = cached[0] if cached is not None else None
+        self._groups[username] = (group, now + self.group_ttl)
+        if len(self._groups) > self.max_drivers * 4:
+            self._groups = {k: v for k, v in self._groups.items() if v[1] > now}
+        return group
+
+    def subscribe(self, drivers: Optional[Iterable[str]] = None, group: Optional[str] = None,
+                  min_interval: Optional[float] = None) -> Subscription:
+        """min_interval 只能比服务端配置的更大"""
+        subscription = Subscription(
+            set(drivers) if drivers is not None else None, group, self.max_pending,
+            max(self.min_interval, min_interval or 0.0))
+        self._subscriptions.append(subscription)
+        log.info("live_subscribed", drivers=subscription.drivers and len(subscription.drivers), group=group,
+                 subscribers=len(self._subscriptions))
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscription.closed = True
+        try:
+            self._subscriptions.remove(subscription)
+        except ValueError:
+            return
+        log.info("live_unsubscribed", delivered=subscription.delivered, coalesced=subscription.coalesced,
+                 evicted=subscription.evicted, subscribers=len(self._subscriptions))
+
+    async def snapshot(self, subscription: Subscription) -> List[Dict]:
+        """订阅者可见的全部驾驶员的当前状态"""
+        drivers = []
+        for username, driver in list(self._drivers.items()):
+            group = await self.group_of(username) if subscription.group is not None else None
+            if self._matches(subscription, username, group):
+                drivers.append(dict(driver))
+        return drivers
+
+    def stats(self) -> Dict:
+        with self._lock:
+            queued = len(self._queue)
+        return {
+            "queued": queued,
+            "published": self.published,
+            "dropped": self.dropped,
+            "drivers": len(self._drivers),
+            "connections": self.connections(),
+            "subscribers": [s.stats() for s in self._subscriptions],
+        }
@@ -0,0 +1,118 @@
+# services/log.py
+# 分级、限流的结构化日志，替代散落在各处的 print。
+#
+#   log = get_logger(__name__)
+#   log.info("state_change", username=username, to_state="High")
+#
+# 关键字参数作为结构化字段输出（text 格式为 key=value，json 格式为一行一个 JSON 对象）。
+# 同一位置的同一条消息在 interval 秒内最多输出 burst 条，被丢弃的条数在下一次输出时以 suppressed 字段附带。
+# 带 username 字段的日志按驾驶员分别限流，一个驾驶员刷屏不会吞掉其他驾驶员的同一条日志。
+
+import json
+import logging
+import sys
+import threading
+import time
+from typing import Dict, Tuple
+
+_RESERVED_KWARGS = ("exc_info", "stack_info", "stacklevel", "extra")
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """把非 logging 保留字的关键字参数收集为结构化字段"""
+
+    def process(self, msg, kwargs):
+        fields = {k: kwargs.pop(k) for k in list(kwargs) if k not in _RESERVED_KWARGS}
+        extra = dict(kwargs.get("extra") or {})
+        extra["fields"] = fields
+        kwargs["extra"] = extra
+        return msg, kwargs
+
+
+class RateLimitFilter(logging.Filter):
+
+    def __init__(self, interval: float = 10.0, burst: int = 5):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        # (logger, 源文件行, 消息, username) -> [窗口开始时间, 窗口内已输出条数, 已丢弃条数]
+        self._windows: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.burst <= 0:
+            return True
+        fields = getattr(record, "fields", None) or {}
+        key = (record.name, record.pathname, record.lineno, record.msg, fields.get("username"))
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window is not None else 0
+                self._windows[key] = [now, 1, 0]
+                if len(self._windows) > 4096:
+                    # 消息模板带变量或驾驶员很多时 key 会不断增长，定期丢弃过期窗口
+                    self._windows = {k: w for k, w in self._windows.items() if now - w[0] < self.interval}
+            elif window[1] < self.burst:
+                window[1] += 1
+                suppressed = 0
+            else:
+                window[2] += 1
+                return False
+        if suppressed:
+            fields = dict(getattr(record, "fields", None) or {})
+            fields["suppressed"] = suppressed
+            record.fields = fields
+        return True
+
+
+class KeyValueFormatter(logging.Formatter):
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = f"{self.formatTime(record)} {record.levelname} {record.name} {record.getMessage()}"
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{k}={_kv_value(v)}" for k, v in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record: logging.LogRecord) -> str:
+        row = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        row.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            row["exc"] = self.formatException(record.exc_info)
+        return json.dumps(row, ensure_ascii=False, default=str)
+
+
+def _kv_value(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    text = str(value)
+    return json.dumps(text, ensure_ascii=False) if (" " in text or "=" in text or not text) else text
+
+
+def get_logger(name: str) -> StructuredLogger:
+    return StructuredLogger(logging.getLogger(name), {})
+
+
+def setup_logging(level: str = "INFO", fmt: str = "text", rate_limit_interval: float = 10.0,
+                  rate_limit_burst: int = 5):
+    """配置根日志器，可重复调用（工作进程启动时也会调用）"""
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else KeyValueFormatter())
+    handler.addFilter(RateLimitFilter(rate_limit_interval, rate_limit_burst))
+    root = logging.getLogger()
+    for existing in [h for h in root.handlers if getattr(h, "_fatigue_handler", False)]:
+        root.removeHandler(existing)
+    handler._fatigue_handler = True
+    root.addHandler(handler)
+    root.setLevel(level.upper())
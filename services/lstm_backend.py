@@ -0,0 +1,189 @@
+# services/lstm_backend.py
+# 三个 LSTM 头 (model_dense300 / model_eye / model_yawn4) 的推理后端。
+# Keras 的 model.predict 每次调用都会构建 tf.data 管道，单样本推理开销极大；
+# 这里改为固定输入签名的 tf.function 直接调用，或转换为 TFLite 解释器执行。
+# load_backend() 会把追踪好的 SavedModel / 转换好的 .tflite 缓存到磁盘，
+# 重启时直接加载缓存，跳过 Keras 模型重建、图追踪和 TFLite 转换。
+
+import hashlib
+import os
+import shutil
+import threading
+
+import numpy as np
+
+from services.log import get_logger
+
+log = get_logger(__name__)
+
+
+class KerasFunctionBackend:
+    """把 Keras 模型包装成输入签名为 (None, 1, input_dim) float32 的 tf.function"""
+    name = "function"
+    cache_suffix = ""
+    from_cache = False
+
+    def __init__(self, model, input_dim: int):
+        import tensorflow as tf
+        self._tf = tf
+        self.input_dim = input_dim
+        self._model = model
+        self._fn = tf.function(
+            lambda x: model(x, training=False),
+            input_signature=[tf.TensorSpec(shape=[None, 1, input_dim], dtype=tf.float32)],
+        )
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        """batch: (B, 1, input_dim)，返回 (B, 输出维度) 的 numpy 数组"""
+        return self._fn(self._tf.constant(batch, dtype=self._tf.float32)).numpy()
+
+    def save(self, path: str):
+        """只保存追踪好的推理函数及其变量，加载时不需要重建 Keras 模型"""
+        module = self._tf.Module()
+        module.model = self._model
+        module.predict = self._fn
+        self._tf.saved_model.save(module, path)
+
+    @classmethod
+    def load(cls, path: str, input_dim: int):
+        import tensorflow as tf
+        backend = cls.__new__(cls)
+        backend._tf = tf
+        backend.input_dim = input_dim
+        backend._model = tf.saved_model.load(path)
+        backend._fn = backend._model.predict
+        return backend
+
+
+class TFLiteBackend:
+    """转换为 TFLite 模型在 CPU 上执行；LSTM 算子需要 SELECT_TF_OPS 兜底"""
+    name = "tflite"
+    cache_suffix = ".tflite"
+    from_cache = False
+
+    def __init__(self, model, input_dim: int, num_threads: int = 1, model_content: bytes = None):
+        import tensorflow as tf
+        self.input_dim = input_dim
+        if model_content is None:
+            fn = tf.function(
+                lambda x: model(x, training=False),
+                input_signature=[tf.TensorSpec(shape=[None, 1, input_dim], dtype=tf.float32)],
+            )
+            converter = tf.lite.TFLiteConverter.from_concrete_functions([fn.get_concrete_function()], model)
+            converter.target_spec.supported_ops = [
+                tf.lite.OpsSet.TFLITE_BUILTINS,
+                tf.lite.OpsSet.SELECT_TF_OPS,
+            ]
+            converter._experimental_lower_tensor_list_ops = False
+            model_content = converter.convert()
+        self.model_content = model_content
+        self._interpreter = tf.lite.Interpreter(model_content=self.model_content, num_threads=num_threads)
+        self._input_index = self._interpreter.get_input_details()[0]["index"]
+        self._output_index = self._interpreter.get_output_details()[0]["index"]
+        self._batch_size = None
+        # 解释器不是线程安全的
+        self._lock = threading.Lock()
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        with self._lock:
+            if batch.shape[0] != self._batch_size:
+                self._interpreter.resize_tensor_input(self._input_index, list(batch.shape))
+                self._interpreter.allocate_tensors()
+                self._batch_size = batch.shape[0]
+            self._interpreter.set_tensor(self._input_index, batch)
+            self._interpreter.invoke()
+            return self._interpreter.get_tensor(self._output_index).copy()
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            f.write(self.model_content)
+
+    @classmethod
+    def load(cls, path: str, input_dim: int):
+        with open(path, "rb") as f:
+            return cls(None, input_dim, model_content=f.read())
+
+
+_BACKENDS = {
+    KerasFunctionBackend.name: KerasFunctionBackend,
+    TFLiteBackend.name: TFLiteBackend,
+}
+
+
+def _backend_class(kind: str):
+    try:
+        return _BACKENDS[kind]
+    except KeyError:
+        raise ValueError(f"Unknown LSTM backend '{kind}', expected one of {sorted(_BACKENDS)}")
+
+
+def _warm_up(backend):
+    backend.predict(np.zeros((1, 1, backend.input_dim), dtype=np.float32))
+    return backend
+
+
+def create_backend(kind: str, model, input_dim: int):
+    """按配置创建后端，并用一次全零输入完成图追踪/张量分配"""
+    return _warm_up(_backend_class(kind)(model, input_dim))
+
+
+def model_fingerprint(model_dir: str, *extra) -> str:
+    """根据模型目录下文件的路径、大小和修改时间生成指纹，模型文件更新后缓存自动失效"""
+    digest = hashlib.sha1()
+    for root, dirs, files in os.walk(model_dir):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            st = os.stat(path)
+            digest.update(f"{os.path.relpath(path, model_dir)}:{st.st_size}:{int(st.st_mtime)};".encode())
+    digest.update(":".join(str(e) for e in extra).encode())
+    return digest.hexdigest()[:16]
+
+
+def _save_atomic(backend, path: str):
+    # 先写临时路径再改名，多个进程同时写缓存时不会读到半个文件
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    backend.save(tmp)
+    try:
+        os.replace(tmp, path)
+    except OSError:
+        # 目标已被其他进程写好（目录无法覆盖），丢弃本次结果
+        if os.path.isdir(tmp):
+            shutil.rmtree(tmp, ignore_errors=True)
+        elif os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def load_backend(kind: str, model_dir: str, input_dim: int, cache_dir: str = None):
+    """
+    从 SavedModel 目录创建后端。指定 cache_dir 时优先加载缓存的推理产物，
+    没有缓存（或缓存损坏）时从原模型构建，并写入缓存供下次启动使用。
+    """
+    backend_cls = _backend_class(kind)
+    import tensorflow as tf
+    path = None
+    if cache_dir:
+        key = model_fingerprint(model_dir, kind, input_dim, tf.__version__)
+        name = os.path.basename(os.path.normpath(model_dir))
+        path = os.path.join(cache_dir, f"{name}-{kind}-{key}{backend_cls.cache_suffix}")
+        if os.path.exists(path):
+            try:
+                backend = _warm_up(backend_cls.load(path, input_dim))
+                backend.from_cache = True
+                return backend
+            except Exception as e:
+                log.warning("model_cache_unreadable", path=path, error=str(e))
+    backend = create_backend(kind, tf.keras.models.load_model(model_dir), input_dim)
+    if path:
+        try:
+            _save_atomic(backend, path)
+        except Exception as e:
+            log.warning("model_cache_write_failed", path=path, error=str(e))
+    return backend
+
+
+def stack_windows(windows) -> np.ndarray:
+    """把若干 (1, 1, N) 的单样本输入拼成 (B, 1, N) 的批"""
+    return np.concatenate([np.asarray(w, dtype=np.float32).reshape(1, 1, -1) for w in windows], axis=0)
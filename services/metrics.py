@@ -0,0 +1,329 @@
+# services/metrics.py
+# 轻量的 Prometheus 指标：计数器、仪表盘和直方图，按文本格式 (0.0.4) 输出给 /metrics。
+# 不依赖 prometheus_client；热路径上一次 observe 只是一次二分查找加一次加锁累加。
+#
+# 多进程推理工作池模式下，工作进程中的指标通过 snapshot() 导出为可 pickle 的快照，
+# 随心跳交回 API 进程，输出时附加 worker 标签。
+
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 默认延迟桶（秒），覆盖 0.1ms 到 5s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = [f'{k}="{_escape(v)}"' for k, v in (extra or {}).items()]
+    pairs += [f'{k}="{_escape(v)}"' for k, v in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labelvalues, labelkw) -> Tuple[str, ...]:
+        if labelkw:
+            labelvalues = tuple(labelkw[name] for name in self.labelnames)
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labelvalues}")
+        return tuple(str(v) for v in labelvalues)
+
+    def labels(self, *labelvalues, **labelkw):
+        """取（不存在则创建）某组标签值对应的子指标，热路径上应预先取好并复用"""
+        key = self._key(labelvalues, labelkw)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _init_unlabeled(self):
+        # 没有标签的指标从一开始就输出 0
+        if not self.labelnames:
+            self.labels()
+
+    def remove(self, *labelvalues):
+        with self._lock:
+            self._children.pop(tuple(str(v) for v in labelvalues), None)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self) -> Dict[Tuple[str, ...], object]:
+        with self._lock:
+            children = list(self._children.items())
+        return {key: child.get() for key, child in children}
+
+
+class _CounterChild:
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def get(self) -> float:
+        return self._value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def set(self, value: float):
+        self._value = float(value)
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+
+class Gauge(_Metric):
+    """
+    仪表盘。除了 set/inc，也可以 set_function(fn) 在输出时现取值：
+    fn 返回单个数值（无标签），或 {标签值元组: 数值}。
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function: Optional[Callable] = None
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def set_function(self, function: Callable):
+        self._function = function
+
+    def samples(self):
+        if self._function is None:
+            return super().samples()
+        value = self._function()
+        if isinstance(value, dict):
+            return {tuple(str(v) for v in (k if isinstance(k, tuple) else (k,))): float(v)
+                    for k, v in value.items()}
+        return {(): float(value)}
+
+
+class _HistogramChild:
+    __slots__ = ("_upper_bounds", "_counts", "_sum", "_lock")
+
+    def __init__(self, upper_bounds: Sequence[float]):
+        self._upper_bounds = upper_bounds
+        self._counts = [0] * (len(upper_bounds) + 1)  # 最后一个为 +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self._upper_bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def get(self):
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._metrics: "OrderedDict[str, _Metric]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # 模块被重复导入（如工作进程）时返回已有指标
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    @staticmethod
+    def _initialized(metric: _Metric) -> _Metric:
+        metric._init_unlabeled()
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(self._initialized(Counter(name, documentation, labelnames)))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(self._initialized(Histogram(name, documentation, labelnames, buckets)))
+
+    def snapshot(self) -> Dict[str, dict]:
+        """当前所有指标的取值，可 pickle，用于从工作进程传回 API 进程"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        snapshot = {}
+        for metric in metrics:
+            try:
+                samples = metric.samples()
+            except Exception:
+                # 取值函数出错时跳过该指标，不影响其他指标输出
+                continue
+            snapshot[metric.name] = {
+                "kind": metric.kind,
+                "help": metric.documentation,
+                "labelnames": metric.labelnames,
+                "buckets": getattr(metric, "buckets", None),
+                "samples": samples,
+            }
+        return snapshot
+
+    def render(self, extra: Iterable[Tuple[Dict[str, str], Dict[str, dict]]] = ()) -> str:
+        """
+        输出 Prometheus 文本格式。extra 为 [(附加标签, snapshot), ...]，
+        同名指标与本进程的指标合并在同一个指标族下输出。
+        """
+        sources: List[Tuple[Dict[str, str], Dict[str, dict]]] = [({}, self.snapshot())] + list(extra)
+        families: "OrderedDict[str, list]" = OrderedDict()
+        for const_labels, snapshot in sources:
+            for name, family in snapshot.items():
+                families.setdefault(name, []).append((const_labels, family))
+        lines = []
+        for name, parts in families.items():
+            lines.append(f"# HELP {name} {parts[0][1]['help']}")
+            lines.append(f"# TYPE {name} {parts[0][1]['kind']}")
+            for const_labels, family in parts:
+                labelnames = family["labelnames"]
+                for labelvalues, value in family["samples"].items():
+                    if family["kind"] == "histogram":
+                        lines.extend(self._render_histogram(name, family["buckets"], labelnames,
+                                                            labelvalues, value, const_labels))
+                    else:
+                        labels = _format_labels(labelnames, labelvalues, const_labels)
+                        lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_histogram(name, buckets, labelnames, labelvalues, value, const_labels):
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for upper_bound, count in zip(list(buckets) + [float("inf")], counts):
+            cumulative += count
+            labels = _format_labels(labelnames + ("le",), labelvalues + (_format_value(upper_bound),), const_labels)
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        labels = _format_labels(labelnames, labelvalues, const_labels)
+        lines.append(f"{name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{name}_count{labels} {cumulative}")
+        return lines
+
+
+class RateTracker:
+    """
+    按 key（驾驶员）统计帧率：帧间隔的指数滑动平均。
+    超过 idle_ttl 秒没有新帧的 key 被移除，最多保留 max_keys 个，避免标签无限增长。
+    """
+
+    def __init__(self, alpha: float = 0.2, idle_ttl: float = 30.0, max_keys: int = 256):
+        self.alpha = alpha
+        self.idle_ttl = idle_ttl
+        self.max_keys = max_keys
+        # key -> [上一帧时间, 平均帧间隔]
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def mark(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = [now, None]
+                if len(self._entries) > self.max_keys:
+                    self._entries.popitem(last=False)
+                return
+            self._entries.move_to_end(key)
+            interval = now - entry[0]
+            entry[0] = now
+            entry[1] = interval if entry[1] is None else entry[1] + self.alpha * (interval - entry[1])
+
+    def rates(self) -> Dict[str, float]:
+        now = time.monotonic()
+        rates = {}
+        with self._lock:
+            for key in [k for k, (last, _) in self._entries.items() if now - last > self.idle_ttl]:
+                del self._entries[key]
+            for key, (last, interval) in self._entries.items():
+                if interval:
+                    # 停止发帧后帧率随等待时间下降，而不是停在最后的值
+                    rates[key] = 1.0 / max(interval, now - last)
+        return rates
+
+
+# 进程内默认的指标注册表
+registry = MetricsRegistry()
+
+# ---------------- 推理流水线的公共指标 ----------------
+# 各阶段耗时：decode / blob / yolo_forward / nms / lstm_fatigue / lstm_eye / lstm_yawn / db_write
+stage_seconds = registry.histogram(
+    "fatigue_stage_seconds", "Latency of each inference pipeline stage in seconds", ["stage"])
@@ -0,0 +1,113 @@
+# services/model_registry.py
+# 模型注册表：各模型的加载函数在后台线程池中并发执行，应用无需等模型加载完即可提供服务。
+# 推理代码通过 get() 取模型，尚未加载完成时抛出 ModelNotReady，由接口返回“加载中”。
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from services.log import get_logger
+
+log = get_logger(__name__)
+
+PENDING, LOADING, READY, FAILED = "pending", "loading", "ready", "failed"
+
+
+class ModelNotReady(Exception):
+    """模型尚在加载或加载失败"""
+
+
+class _Entry:
+    __slots__ = ("name", "loader", "state", "value", "error", "seconds", "done")
+
+    def __init__(self, name: str, loader: Callable[[], Any]):
+        self.name = name
+        self.loader = loader
+        self.state = PENDING
+        self.value = None
+        self.error: Optional[str] = None
+        self.seconds: Optional[float] = None
+        self.done = threading.Event()
+
+
+class ModelRegistry:
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self._entries: Dict[str, _Entry] = {}
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.started_at: Optional[float] = None
+
+    def register(self, name: str, loader: Callable[[], Any]):
+        """注册加载函数；加载函数返回的对象即 get(name) 的结果"""
+        self._entries[name] = _Entry(name, loader)
+
+    def start(self):
+        """在后台并发加载所有尚未加载的模型，立即返回"""
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="model-loader")
+                self.started_at = time.perf_counter()
+            for entry in self._entries.values():
+                if entry.state == PENDING:
+                    entry.state = LOADING
+                    self._pool.submit(self._load, entry)
+
+    def load_all(self, timeout: Optional[float] = None) -> bool:
+        """阻塞直到全部加载结束（用于推理工作进程的 initializer），返回是否全部成功"""
+        self.start()
+        return self.wait(timeout)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for entry in self._entries.values():
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not entry.done.wait(remaining):
+                return False
+        return self.ready()
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def _load(self, entry: _Entry):
+        started = time.perf_counter()
+        log.info("model_loading", model=entry.name)
+        try:
+            entry.value = entry.loader()
+            entry.state = READY
+            log.info("model_loaded", model=entry.name, seconds=time.perf_counter() - started,
+                     from_cache=bool(getattr(entry.value, "from_cache", False)))
+        except Exception as e:
+            entry.error = f"{type(e).__name__}: {e}"
+            entry.state = FAILED
+            log.error("model_load_failed", model=entry.name, error=entry.error)
+        finally:
+            entry.seconds = time.perf_counter() - started
+            entry.done.set()
+
+    def get(self, name: str):
+        entry = self._entries[name]
+        if entry.state != READY:
+            raise ModelNotReady(f"model '{name}' is {entry.state}")
+        return entry.value
+
+    def ready(self, *names: str) -> bool:
+        """指定的模型（不指定时为全部）是否都已加载完成"""
+        entries = [self._entries[n] for n in names] if names else self._entries.values()
+        return all(entry.state == READY for entry in entries)
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {
+                "state": entry.state,
+                "load_seconds": round(entry.seconds, 3) if entry.seconds is not None else None,
+                "from_cache": bool(getattr(entry.value, "from_cache", False)),
+                "error": entry.error,
+            }
+            for name, entry in self._entries.items()
+        }
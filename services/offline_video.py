@@ -0,0 +1,412 @@
+# services/offline_video.py
+# 离线批处理录制的行车视频：与实时接口相同的 detect → 累加器 → LSTM 规则，但不按实时节奏逐帧处理。
+#
+# - 视频在生产者线程中解码（只 retrieve 抽中的帧），按块放入有界队列，与推理重叠；
+# - YOLO 按 OFFLINE_YOLO_BATCH_SIZE 帧一批做前向推理 (fatigue_api.detect_batch)；
+# - 整段视频的闭眼/张嘴计数算出后，LSTM 窗口直接从计数序列上切片，一次推理一整块窗口。
+#   只有“连续确认 Low 后清零窗口”会让后续窗口与切片不同，所以每块只采用到第一次清零为止的结果，
+#   从清零后的状态重新切下一块——结果与逐帧调用 update_buffer 完全一致；
+# - 输出每秒的疲劳时间线和检测到的 High 事件（时间为视频开始时间 + 帧偏移），
+#   High 事件和各等级持续时长批量写入 fatigue 表和统计预聚合表。
+#
+#   python -m services.offline_video clip.mp4 --username zhang --start 2024-05-01T08:00:00 --output result.json
+#
+# ROI 跟踪不在离线模式中使用，每帧都做全图检测。
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import cv2
+
+from config.config import settings
+from db import crud, database, rollup
+from entity import schemas
+from routers import fatigue_api as pipeline
+from services.log import get_logger, setup_logging
+
+log = get_logger(__name__)
+
+# update_buffer 每 5 帧把累加的计数推入一次窗口
+STEP_FRAMES = 5
+_FATIGUE_CLASSES = np.array(["Low", "Medium", "High"])
+
+
+class FrameReader:
+    """在生产者线程中解码视频，按块 (帧列表, 时间戳列表) 放入有界队列"""
+
+    def __init__(self, path: str, sample_fps: float = 0.0, chunk_frames: int = 64, prefetch_chunks: int = 4):
+        self.path = path
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise ValueError(f"cannot open video: {path}")
+        # 部分容器不记录帧率，按实时接口的典型帧率处理
+        self.source_fps = self.capture.get(cv2.CAP_PROP_FPS) or 15.0
+        self.fps = min(sample_fps, self.source_fps) if sample_fps > 0 else self.source_fps
+        self.total_frames = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        self.chunk_frames = chunk_frames
+        self.frames_read = 0
+        self.wait_seconds = 0.0  # 消费者等待解码的总时间，接近 0 说明解码不是瓶颈
+        self.error: Optional[BaseException] = None
+        self._queue: "queue.Queue" = queue.Queue(maxsize=prefetch_chunks)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="video-decoder", daemon=True)
+
+    def __iter__(self):
+        self._thread.start()
+        while True:
+            started = time.perf_counter()
+            item = self._queue.get()
+            self.wait_seconds += time.perf_counter() - started
+            if item is None:
+                break
+            yield item
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        self._stop.set()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        frames, stamps = [], []
+        index = 0
+        try:
+            while not self._stop.is_set():
+                if not self.capture.grab():
+                    break
+                # 按目标帧率抽帧：源第 index 帧的时间到达第 frames_read 个输出帧时才解码
+                if index * self.fps / self.source_fps + 1e-9 >= self.frames_read:
+                    ok, frame = self.capture.retrieve()
+                    if ok:
+                        frames.append(frame)
+                        stamps.append(index / self.source_fps)
+                        self.frames_read += 1
+                        if len(frames) >= self.chunk_frames:
+                            if not self._put((frames, stamps)):
+                                return
+                            frames, stamps = [], []
+                index += 1
+            if frames:
+                self._put((frames, stamps))
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.capture.release()
+            self._put(None)
+
+
+def detect_flags(frames: List[np.ndarray], batch_size: int, input_size: int = None) -> Tuple[np.ndarray, np.ndarray]:
+    """逐批检测，返回每帧是否检测到闭眼、张嘴（与 update_buffer 使用的 present 相同）"""
+    input_size = input_size or settings.YOLO_INPUT_SIZE
+    eyes = np.zeros(len(frames), dtype=bool)
+    mouths = np.zeros(len(frames), dtype=bool)
+    for start in range(0, len(frames), batch_size):
+        batch = frames[start:start + batch_size]
+        for offset, detections in enumerate(pipeline.detect_batch([(f, input_size) for f in batch])):
+            eyes[start + offset] = detections.present[pipeline.CLASS_EYES_CLOSED]
+            mouths[start + offset] = detections.present[pipeline.CLASS_MOUTH_OPENED]
+    return eyes, mouths
+
+
+def _windows(current: np.ndarray, new_values: np.ndarray, stride: int, include_current: bool) -> np.ndarray:
+    """
+    从当前窗口和之后依次推入的值切出每一步的窗口 (B, 1, 窗口长度)。
+    stride 为每步推入的值个数（疲劳头每步推入闭眼、张嘴两个值）。
+    """
+    seq = np.concatenate([current, new_values.astype(np.float32)])
+    windows = sliding_window_view(seq, len(current))[::stride]
+    if not include_current:
+        windows = windows[1:]
+    return np.ascontiguousarray(windows, dtype=np.float32)[:, None, :]
+
+
+class ClipReplay:
+    """
+    在视频时间上重放 update_buffer：窗口推入、就绪判断和确认计数器都直接调用 fatigue_api 中的同一套函数，
+    只有三个 LSTM 头的推理按块批量进行。
+    """
+
+    def __init__(self, username: str, min_chunk: int = 16, max_chunk: int = 512):
+        self.username = username
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+        self.buffer = pipeline.ModelBuffer()
+        self.state = "Initializing"
+        self.state_start = 0.0
+        self.spans: List[Tuple[str, float, float]] = []
+        self.high_events: List[float] = []
+        self.lstm_seconds = 0.0
+        self.lstm_batches = 0
+
+    def _set_state(self, new_state: str, t: float):
+        # 与 ModelBuffer.update_state 相同的规则，时间取视频内偏移而不是墙钟
+        if new_state == self.state:
+            return
+        if self.state == "High":
+            self.buffer.high_fatigue_event_logged = False
+        if self.state in rollup.FATIGUE_LEVELS:
+            self.spans.append((self.state, self.state_start, t))
+        self.state, self.state_start = new_state, t
+
+    def _push(self, eye_count: int, mouth_count: int) -> bool:
+        self.buffer.eye_closed_accumulator = int(eye_count)
+        self.buffer.mouth_open_accumulator = int(mouth_count)
+        return pipeline.push_window_step(self.buffer, self.username)
+
+    def _predict(self, head: str, batch: np.ndarray) -> np.ndarray:
+        started = time.perf_counter()
+        output = pipeline.inference.run_model(pipeline._lstm_forward, head, batch)
+        self.lstm_seconds += time.perf_counter() - started
+        self.lstm_batches += 1
+        return output
+
+    def _predict_chunk(self, eye_counts: np.ndarray, mouth_counts: np.ndarray, include_current: bool):
+        buffer = self.buffer
+        pairs = np.empty(2 * len(eye_counts), dtype=np.float32)
+        pairs[0::2] = eye_counts
+        pairs[1::2] = mouth_counts
+        fatigue = self._predict("fatigue", _windows(buffer.lstm_input.view(), pairs, 2, include_current))
+        eye = self._predict("eye", _windows(buffer.eye_input.view(), eye_counts, 1, include_current))
+        yawn = self._predict("yawn", _windows(buffer.yawn_input.view(), mouth_counts, 1, include_current))
+        levels = _FATIGUE_CLASSES[np.minimum(np.argmax(fatigue.reshape(len(fatigue), -1), axis=1), 2)]
+        return levels, eye.reshape(len(eye), -1)[:, 0] >= 0.5, yawn.reshape(len(yawn), -1)[:, 0] >= 0.5
+
+    def run(self, eye_counts: np.ndarray, mouth_counts: np.ndarray, step_times: np.ndarray):
+        """返回每一步之后的 (显示等级, 闭眼, 哈欠) 三个数组"""
+        n = len(eye_counts)
+        levels = np.full(n, "Initializing", dtype=object)
+        eyes = np.zeros(n, dtype=bool)
+        yawns = np.zeros(n, dtype=bool)
+        buffer = self.buffer
+        chunk = self.max_chunk
+        i = 0
+        while i < n:
+            pushed = False
+            if not buffer.is_ready:
+                became_ready = self._push(eye_counts[i], mouth_counts[i])
+                if not became_ready:
+                    i += 1
+                    continue
+                self._set_state("Low", step_times[i])
+                pushed = True
+            # 本步已推入窗口时，第一扇窗口就是当前窗口
+            k = min(chunk, n - i)
+            first_new = i + 1 if pushed else i
+            raw_levels, raw_eyes, raw_yawns = self._predict_chunk(
+                eye_counts[first_new:i + k], mouth_counts[first_new:i + k], include_current=pushed)
+            consumed, reset = 0, False
+            for j in range(k):
+                step = i + j
+                if j > 0 or not pushed:
+                    self._push(eye_counts[step], mouth_counts[step])
+                if pipeline.apply_predictions(buffer, str(raw_levels[j]), bool(raw_eyes[j]), bool(raw_yawns[j]),
+                                              self.username):
+                    self.high_events.append(float(step_times[step]))
+                self._set_state(buffer.displayed_fatigue_level, step_times[step])
+                levels[step] = buffer.displayed_fatigue_level
+                eyes[step] = buffer.displayed_eye_closure
+                yawns[step] = buffer.displayed_yawn
+                consumed = j + 1
+                # 原始等级为 Low 而计数器归零，说明刚刚清零了窗口，之后的切片窗口不再成立
+                if buffer.fatigue_level_raw == "Low" and buffer.low_fatigue_confirm_counter == 0:
+                    reset = True
+                    break
+            i += consumed
+            # 频繁清零时缩小块，避免推理大量作废的窗口；长时间未清零时逐步放大
+            chunk = max(self.min_chunk, min(self.max_chunk, consumed * 2 if reset else chunk * 2))
+        return levels, eyes, yawns
+
+    def finish(self, end: float):
+        if self.state in rollup.FATIGUE_LEVELS and end > self.state_start:
+            self.spans.append((self.state, self.state_start, end))
+            self.state_start = end
+
+
+def per_second_timeline(step_times: np.ndarray, levels: np.ndarray, eyes: np.ndarray, yawns: np.ndarray,
+                        duration: float) -> List[Dict]:
+    """每秒一条：该秒结束时显示的疲劳等级，以及该秒内是否出现过闭眼 / 哈欠提示"""
+    seconds = int(math.ceil(duration))
+    timeline = []
+    # 每秒最后一步的下标，以及每秒包含的步范围
+    ends = np.searchsorted(step_times, np.arange(1, seconds + 1), side="right")
+    starts = np.searchsorted(step_times, np.arange(0, seconds), side="left")
+    eye_prefix = np.concatenate([[0], np.cumsum(eyes)])
+    yawn_prefix = np.concatenate([[0], np.cumsum(yawns)])
+    for second in range(seconds):
+        lo, hi = starts[second], ends[second]
+        timeline.append({
+            "second": second,
+            "fatigue_level": levels[hi - 1] if hi > 0 else "Initializing",
+            "eye_closure": bool(eye_prefix[hi] - eye_prefix[lo] > 0) if hi > lo else False,
+            "yawn_detected": bool(yawn_prefix[hi] - yawn_prefix[lo] > 0) if hi > lo else False,
+        })
+    return timeline
+
+
+def process_video(path: str, username: str, start_time: Optional[datetime] = None, sample_fps: float = 0.0,
+                  batch_size: int = 16, chunk_frames: int = 64, max_lstm_chunk: int = 512) -> Dict:
+    """处理一段视频，返回时间线、High 事件和各等级持续时长（不写库）"""
+    started = time.perf_counter()
+    reader = FrameReader(path, sample_fps, chunk_frames)
+    eye_chunks, mouth_chunks, stamp_chunks = [], [], []
+    detect_seconds = 0.0
+    last_progress = started
+    try:
+        for frames, stamps in reader:
+            detect_started = time.perf_counter()
+            eyes, mouths = detect_flags(frames, batch_size)
+            detect_seconds += time.perf_counter() - detect_started
+            eye_chunks.append(eyes)
+            mouth_chunks.append(mouths)
+            stamp_chunks.append(np.asarray(stamps))
+            if time.perf_counter() - last_progress >= 10.0:
+                last_progress = time.perf_counter()
+                log.info("video_progress", video=path, frames=reader.frames_read,
+                         fps=reader.frames_read / (last_progress - started))
+    finally:
+        reader.close()
+
+    eye_flags = np.concatenate(eye_chunks) if eye_chunks else np.zeros(0, dtype=bool)
+    mouth_flags = np.concatenate(mouth_chunks) if mouth_chunks else np.zeros(0, dtype=bool)
+    stamps = np.concatenate(stamp_chunks) if stamp_chunks else np.zeros(0)
+    frame_count = len(stamps)
+    duration = float(stamps[-1] + 1.0 / reader.fps) if frame_count else 0.0
+
+    # 每 5 帧一步：末尾不足 5 帧的部分与实时接口一样留在累加器中，不产生预测
+    steps = frame_count // STEP_FRAMES
+    eye_counts = eye_flags[:steps * STEP_FRAMES].reshape(steps, STEP_FRAMES).sum(axis=1)
+    mouth_counts = mouth_flags[:steps * STEP_FRAMES].reshape(steps, STEP_FRAMES).sum(axis=1)
+    step_times = stamps[STEP_FRAMES - 1::STEP_FRAMES][:steps]
+
+    replay = ClipReplay(username, max_chunk=max_lstm_chunk)
+    levels, eyes, yawns = replay.run(eye_counts, mouth_counts, step_times)
+    replay.finish(duration)
+
+    if start_time is None:
+        # 行车记录仪一般在录制结束时写完文件，修改时间约等于结束时间
+        start_time = datetime.fromtimestamp(os.path.getmtime(path)) - timedelta(seconds=duration)
+    elapsed = time.perf_counter() - started
+    seconds_by_level = {level: 0.0 for level in rollup.FATIGUE_LEVELS}
+    for level, t0, t1 in replay.spans:
+        seconds_by_level[level] += t1 - t0
+    return {
+        "video": os.path.abspath(path),
+        "username": username,
+        "start_time": start_time,
+        "source_fps": reader.source_fps,
+        "fps": reader.fps,
+        "frames": frame_count,
+        "duration": duration,
+        "steps": steps,
+        "high_events": [{"time": start_time + timedelta(seconds=t), "offset": t} for t in replay.high_events],
+        "spans": [{"status": level, "start_time": start_time + timedelta(seconds=t0),
+                   "end_time": start_time + timedelta(seconds=t1)} for level, t0, t1 in replay.spans],
+        "seconds_by_level": seconds_by_level,
+        "timeline": per_second_timeline(step_times, levels, eyes, yawns, duration),
+        "timings": {
+            "total_seconds": elapsed,
+            "detect_seconds": detect_seconds,
+            "decode_wait_seconds": reader.wait_seconds,
+            "lstm_seconds": replay.lstm_seconds,
+            "lstm_batches": replay.lstm_batches,
+            "frames_per_second": frame_count / elapsed if elapsed else 0.0,
+            "realtime_factor": duration / elapsed if elapsed else 0.0,
+        },
+    }
+
+
+async def write_results(result: Dict) -> int:
+    """High 事件写入 fatigue 表，事件和各等级时长在同一事务中计入预聚合表"""
+    username = result["username"]
+    events = [schemas.FatigueCreate(username=username, status="High", event_time=e["time"])
+              for e in result["high_events"]]
+    spans = [schemas.FatigueStateSpan(username=username, **span) for span in result["spans"]]
+    pool = await database.create_pool(minsize=1, maxsize=1)
+    try:
+        async with pool.acquire() as conn:
+            await conn.begin()
+            try:
+                written = await crud.create_fatigue_records(conn, events)
+                await rollup.apply_rollups(conn, events, spans)
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+    finally:
+        pool.close()
+        await pool.wait_closed()
+    return written
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score recorded dashcam footage offline")
+    parser.add_argument("video", help="video file readable by OpenCV")
+    parser.add_argument("--username", required=True, help="driver the footage belongs to")
+    parser.add_argument("--start", type=datetime.fromisoformat, default=None,
+                        help="wall-clock time of the first frame (default: file mtime minus duration)")
+    parser.add_argument("--fps", type=float, default=settings.OFFLINE_VIDEO_SAMPLE_FPS,
+                        help="sample the video down to this frame rate (0 keeps the source rate)")
+    parser.add_argument("--batch-size", type=int, default=settings.OFFLINE_YOLO_BATCH_SIZE)
+    parser.add_argument("--lstm-chunk", type=int, default=settings.OFFLINE_LSTM_MAX_CHUNK)
+    parser.add_argument("--output", help="write the full result (timeline included) as JSON to this path")
+    parser.add_argument("--no-write", action="store_true", help="do not insert events into the database")
+    args = parser.parse_args(argv)
+
+    setup_logging(settings.LOG_LEVEL, settings.LOG_FORMAT,
+                  settings.LOG_RATE_LIMIT_INTERVAL, settings.LOG_RATE_LIMIT_BURST)
+    pipeline.models.load_all()
+    if not pipeline.models.ready():
+        raise SystemExit(f"models failed to load: {pipeline.models.status()}")
+
+    result = process_video(args.video, args.username, args.start, args.fps, args.batch_size,
+                           max_lstm_chunk=args.lstm_chunk)
+    result["written"] = 0 if args.no_write else asyncio.run(write_results(result))
+    if args.output:
+        directory = os.path.dirname(args.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, default=_json_default)
+
+    timings = result["timings"]
+    print(f"{result['frames']} frames ({result['duration']:.1f}s of video) in {timings['total_seconds']:.1f}s "
+          f"= {timings['realtime_factor']:.1f}x realtime")
+    print(f"high events: {len(result['high_events'])}, written: {result['written']}, "
+          f"seconds by level: " + ", ".join(f"{k}={v:.0f}" for k, v in result["seconds_by_level"].items()))
+
+
+if __name__ == "__main__":
+    main()
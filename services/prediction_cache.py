@@ -0,0 +1,189 @@
+# services/prediction_cache.py
+# LSTM 预测结果缓存。三个头的输入窗口都是 5 帧内闭眼 / 张嘴的帧数 (0~5)，取值空间很小且高度重复：
+# - 闭眼头 (6 维) 只有 6^6 = 46656 种输入，启动时把全部输出算成一张表 (EyeLookupTable)，之后查表代替模型调用；
+#   表按模型指纹缓存到 MODEL_CACHE_DIR，模型文件不变时重启直接加载；
+# - 打哈欠 (10 维) / 疲劳 (400 维) 头用有界 LRU (PredictionLRU)，键为压缩成 uint8 的窗口。
+# 缓存的都是模型对同一输入的原始输出，逐位一致性用 python -m bench.prediction_cache_parity 校验。
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+from services import metrics
+from services.log import get_logger
+from services.lstm_backend import model_fingerprint
+
+log = get_logger(__name__)
+
+prediction_cache_requests = metrics.registry.counter(
+    "fatigue_prediction_cache_requests_total", "LSTM prediction cache lookups by head and result", ["head", "result"])
+
+COUNT_LEVELS = 6  # 每个窗口元素是 5 帧内的计数，取值 0~5
+
+
+def pack_window(window) -> Optional[bytes]:
+    """把计数窗口压缩成 uint8 字节串作为缓存键；含非整数或越界值时返回 None（不缓存）"""
+    values = np.asarray(window).reshape(-1)
+    # 先检查范围再转换：越界或 NaN 直接转 uint8 会回绕或触发 RuntimeWarning
+    if not np.all((values >= 0) & (values <= 255)):
+        return None
+    packed = values.astype(np.uint8)
+    if not np.array_equal(packed, values):
+        return None
+    return packed.tobytes()
+
+
+class PredictionLRU:
+    """按窗口缓存单样本预测输出的有界 LRU，线程安全"""
+
+    def __init__(self, head: str, max_entries: int = 4096):
+        self.head = head
+        self.max_entries = max_entries
+        self.enabled = max_entries > 0
+        self._data: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._hit = prediction_cache_requests.labels(head, "hit")
+        self._miss = prediction_cache_requests.labels(head, "miss")
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self._data.move_to_end(key)
+                self.hits += 1
+        (self._miss if value is None else self._hit).inc()
+        return value
+
+    def put(self, key: bytes, value: np.ndarray):
+        # 调用方只读取输出，缓存的数组设为只读，防止被意外修改
+        value = np.array(value, copy=True)
+        value.flags.writeable = False
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "kind": "lru",
+            "enabled": self.enabled,
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+def all_windows(input_dim: int, levels: int = COUNT_LEVELS) -> np.ndarray:
+    """按表下标顺序枚举全部输入窗口，形状 (levels**input_dim, 1, input_dim)"""
+    digits = np.unravel_index(np.arange(levels ** input_dim), (levels,) * input_dim)
+    return np.stack(digits, axis=-1).astype(np.float32)[:, None, :]
+
+
+class EyeLookupTable:
+    """
+    用预先算好的输出表代替模型调用，接口与 LSTM 后端相同 (predict(batch) -> (B, 输出维度))。
+    窗口元素不是 0~levels-1 的整数时回退到原模型。
+    """
+
+    def __init__(self, backend, table: np.ndarray, levels: int = COUNT_LEVELS, from_cache: bool = False):
+        self.backend = backend
+        self.input_dim = backend.input_dim
+        self.levels = levels
+        self.table = table
+        self.from_cache = from_cache
+        self._weights = levels ** np.arange(self.input_dim - 1, -1, -1, dtype=np.int64)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.fallbacks = 0
+        self._hit = prediction_cache_requests.labels("eye", "hit")
+        self._miss = prediction_cache_requests.labels("eye", "miss")
+
+    @classmethod
+    def build(cls, backend, levels: int = COUNT_LEVELS, batch_size: int = 1) -> np.ndarray:
+        """
+        逐块调用模型算出全部输出。batch_size=1 与线上单样本调用逐位一致；
+        更大的批构建更快，但批量矩阵乘法的末位可能有 1ulp 差异（判定结果不变）。
+        """
+        windows = all_windows(backend.input_dim, levels)
+        chunks = [backend.predict(windows[i:i + batch_size]) for i in range(0, len(windows), batch_size)]
+        return np.ascontiguousarray(np.concatenate(chunks, axis=0), dtype=np.float32)
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        values = np.asarray(batch, dtype=np.float32).reshape(-1, self.input_dim)
+        digits = values.astype(np.int64)
+        valid = np.all((digits == values) & (digits >= 0) & (digits < self.levels), axis=1)
+        if valid.all():
+            output = self.table[digits @ self._weights]
+        else:
+            output = np.empty((len(values),) + self.table.shape[1:], dtype=self.table.dtype)
+            output[valid] = self.table[digits[valid] @ self._weights]
+            output[~valid] = self.backend.predict(values[~valid].reshape(-1, 1, self.input_dim))
+        found = int(valid.sum())
+        with self._lock:
+            self.hits += found
+            self.fallbacks += len(values) - found
+        if found:
+            self._hit.inc(found)
+        if found < len(values):
+            self._miss.inc(len(values) - found)
+        return output
+
+    def stats(self) -> Dict:
+        total = self.hits + self.fallbacks
+        return {
+            "kind": "table",
+            "entries": len(self.table),
+            "from_cache": self.from_cache,
+            "hits": self.hits,
+            "fallbacks": self.fallbacks,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+def load_eye_table(backend, model_dir: str, kind: str, cache_dir: Optional[str] = None,
+                   levels: int = COUNT_LEVELS, build_batch: int = 1) -> EyeLookupTable:
+    """从磁盘缓存加载输出表，没有缓存时用 backend 构建并写入缓存"""
+    path = None
+    if cache_dir:
+        import tensorflow as tf
+        key = model_fingerprint(model_dir, kind, backend.input_dim, tf.__version__, "table", levels, build_batch)
+        name = os.path.basename(os.path.normpath(model_dir))
+        path = os.path.join(cache_dir, f"{name}-{kind}-{key}.table.npy")
+        if os.path.exists(path):
+            try:
+                table = np.load(path)
+                if len(table) == levels ** backend.input_dim:
+                    return EyeLookupTable(backend, table, levels, from_cache=True)
+                log.warning("prediction_table_size_mismatch", path=path, rows=len(table))
+            except Exception as e:
+                log.warning("prediction_table_unreadable", path=path, error=str(e))
+    table = EyeLookupTable.build(backend, levels, build_batch)
+    log.info("prediction_table_built", model=model_dir, rows=len(table), build_batch=build_batch)
+    if path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            # 先写临时文件再改名，多个进程同时写缓存时不会读到半个文件
+            tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}.npy"
+            np.save(tmp, table)
+            os.replace(tmp, path)
+        except Exception as e:
+            log.warning("prediction_table_write_failed", path=path, error=str(e))
+    return EyeLookupTable(backend, table, levels)
@@ -0,0 +1,127 @@
+# services/result_codec.py
+# 逐帧检测结果的响应编码，由客户端协商（/ws/{username} 与 /detect_fatigue/ 的查询参数，后者也看 Accept 头）：
+#   encoding = json（默认，与旧客户端完全一致） / orjson（需要 orjson 包） / msgpack（需要 msgpack 包，二进制）
+#   compact  = 紧凑结构：短键名、等级用下标、检测框打包为整数数组
+#   delta    = 仅 WebSocket，在 compact 的基础上只发送变化的部分
+#
+# 紧凑结构:
+#   {"f": 等级下标, "e": 是否闭眼 0/1, "y": 是否打哈欠 0/1, "t": 当前状态持续秒数 (0.01 精度),
+#    "b": [类别id, 置信度千分比, x, y, w, h, 类别id, ...],   # 原图坐标
+#    "seq": ..., "client_ts": ...}                              # 二进制帧时原样带回
+# 等级下标对应 LEVELS，类别 id 为 config/obj.names 的行号（GET /api/v4/labels）；
+# WebSocket 的第一条紧凑消息附带 "levels" 和 "labels"。
+# delta 模式下 f/e/y/t 只在 f/e/y 任一变化时出现（t 为变化时的持续时间，之后由客户端自行累加），
+# b 只在检测框变化时出现（框消失时发送一次空数组）；每帧仍回复一条消息，客户端的流控和延迟统计不受影响。
+# 错误消息 ({"error": ...}) 在任何模式下都原样编码。
+
+import json
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+LEVELS = ("Initializing", "Low", "Medium", "High")
+_LEVEL_IDS = {level: i for i, level in enumerate(LEVELS)}
+ENCODINGS = ("json", "orjson", "msgpack")
+_MEDIA_TYPES = {"json": "application/json", "orjson": "application/json", "msgpack": "application/msgpack"}
+
+
+class EncodingUnavailable(ValueError):
+    """未知的编码，或所需的包没有安装"""
+
+
+def _json_dumps(obj) -> str:
+    # 与 Starlette 的 send_json 相同
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
+def _serializer(encoding: str):
+    if encoding == "json":
+        return _json_dumps
+    if encoding == "orjson":
+        try:
+            import orjson
+        except ImportError as e:
+            raise EncodingUnavailable("encoding=orjson 需要安装 orjson 包 (pip install orjson)") from e
+        # WebSocket 仍以文本帧发送，与 json 客户端的解析方式一致
+        return lambda obj: orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    if encoding == "msgpack":
+        try:
+            import msgpack
+        except ImportError as e:
+            raise EncodingUnavailable("encoding=msgpack 需要安装 msgpack 包 (pip install msgpack)") from e
+        return lambda obj: msgpack.packb(obj, use_bin_type=True)
+    raise EncodingUnavailable(f"unknown encoding '{encoding}', expected one of {list(ENCODINGS)}")
+
+
+def available(encoding: str) -> bool:
+    try:
+        _serializer(encoding)
+    except EncodingUnavailable:
+        return False
+    return True
+
+
+def negotiate(encoding: Optional[str], accept: Optional[str] = None) -> str:
+    """
+    查询参数优先（所需的包未安装时由 ResultEncoder 报错）；
+    未指定时 Accept 头含 msgpack 且已安装 msgpack 则用 msgpack，否则回退为 json。
+    """
+    if encoding:
+        return encoding.lower()
+    if accept and "msgpack" in accept.lower() and available("msgpack"):
+        return "msgpack"
+    return "json"
+
+
+def pack_boxes(boxes: Iterable[Dict], label_ids: Dict[str, int]) -> List[int]:
+    """[{"class", "confidence", "box": [x, y, w, h]}, ...] -> [类别id, 置信度千分比, x, y, w, h, ...]"""
+    packed = []
+    for item in boxes:
+        x, y, w, h = item["box"]
+        packed += (label_ids.get(item["class"], -1), int(round(item["confidence"] * 1000)),
+                   int(x), int(y), int(w), int(h))
+    return packed
+
+
+class ResultEncoder:
+    """
+    一个连接（或一次请求）一个实例；delta 模式需要记住上一次发送的状态和检测框，
+    因此同一实例只能用于同一个客户端的有序结果。
+    """
+
+    def __init__(self, encoding: str = "json", compact: bool = False, delta: bool = False,
+                 labels: Sequence[str] = (), header: bool = False):
+        self.encoding = encoding
+        self._dumps = _serializer(encoding)
+        self.compact = compact or delta
+        self.delta = delta
+        self.binary = encoding == "msgpack"
+        self.media_type = _MEDIA_TYPES[encoding]
+        self._labels = list(labels)
+        self._label_ids = {label: i for i, label in enumerate(self._labels)}
+        self._header = header
+        self._state = None
+        self._boxes = None
+
+    def encode(self, result: Dict) -> Union[str, bytes]:
+        if self.compact and "fatigue_level" in result:
+            result = self._compact(result)
+        return self._dumps(result)
+
+    def _compact(self, result: Dict) -> Dict:
+        state = (_LEVEL_IDS.get(result["fatigue_level"], 0),
+                 int(bool(result["eye_closure"])), int(bool(result["yawn_detected"])))
+        boxes = pack_boxes(result.get("detection_boxes") or (), self._label_ids)
+        out = {}
+        if not self.delta or state != self._state:
+            out["f"], out["e"], out["y"] = state
+            out["t"] = round(float(result["current_state_duration"]), 2)
+        if not self.delta or boxes != self._boxes:
+            out["b"] = boxes
+        self._state, self._boxes = state, boxes
+        for key in ("seq", "client_ts"):
+            if key in result:
+                out[key] = result[key]
+        if self._header:
+            out["levels"] = LEVELS
+            out["labels"] = self._labels
+            self._header = False
+        return out
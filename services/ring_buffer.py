@@ -0,0 +1,53 @@
+# services/ring_buffer.py
+# 定长特征窗口：预分配的 NumPy 环形缓冲区。
+# 底层数组长度为 2*capacity，每个值同时写入 i 和 i+capacity 两个位置，
+# 因此任何时刻“最近 capacity 个值”都是一段连续内存，view() 无需拷贝即可作为模型输入。
+
+import numpy as np
+
+
+class FeatureRing:
+    __slots__ = ("capacity", "_data", "_pos", "_count")
+
+    def __init__(self, capacity: int, dtype=np.float32):
+        self.capacity = capacity
+        self._data = np.zeros(2 * capacity, dtype=dtype)
+        self._pos = 0    # 下一次写入的槽位，同时也是窗口中最旧元素的位置
+        self._count = 0  # 已写入的元素个数（上限为 capacity）
+
+    def push(self, value):
+        """O(1) 追加一个值，窗口满后覆盖最旧的值"""
+        self._data[self._pos] = value
+        self._data[self._pos + self.capacity] = value
+        self._pos += 1
+        if self._pos == self.capacity:
+            self._pos = 0
+        if self._count < self.capacity:
+            self._count += 1
+
+    def view(self) -> np.ndarray:
+        """按时间顺序（旧→新）排列的最近 capacity 个值，零拷贝的连续视图；未写满的部分为 0"""
+        return self._data[self._pos:self._pos + self.capacity]
+
+    def load(self, values, count: int):
+        """用按时间顺序（旧→新）排列的 capacity 个值恢复窗口，count 为已写入的元素个数（快照恢复用）"""
+        self._data[:self.capacity] = values
+        self._data[self.capacity:] = values
+        self._pos = 0
+        self._count = min(count, self.capacity)
+
+    def zero(self):
+        """把窗口内的值全部清零，但保留已写入的长度（与原先 list[:] = [0.0] * len 的语义一致）"""
+        self._data.fill(0)
+
+    def clear(self):
+        self._data.fill(0)
+        self._pos = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes
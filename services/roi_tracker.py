@@ -0,0 +1,159 @@
+# services/roi_tracker.py
+# 自适应检测模式：每 K 帧做一次 416x416 全图检测，中间帧用模板匹配跟踪人脸框，
+# 只在人脸区域 (ROI) 上以更小的输入尺寸做检测。
+# K 根据人脸置信度和运动幅度在 [min_interval, max_interval] 之间自适应。
+
+import threading
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from services.yolo_decode import Detections
+
+# 模板匹配在缩小后的灰度图上进行
+_TRACK_SCALE = 0.5
+
+
+def offset_detections(dets: Detections, x0: int, y0: int) -> Detections:
+    """把 ROI 内的检测框平移回原图坐标"""
+    if x0 == 0 and y0 == 0:
+        return dets
+    boxes = dets.boxes + np.array([x0, y0, 0, 0], dtype=dets.boxes.dtype)
+    return dets._replace(boxes=boxes)
+
+
+def best_box(dets: Detections, class_id: int) -> Tuple[Optional[np.ndarray], float]:
+    """返回某个类别置信度最高的候选框及其置信度"""
+    mask = dets.class_ids == class_id
+    if not mask.any():
+        return None, 0.0
+    candidates = np.flatnonzero(mask)
+    i = candidates[np.argmax(dets.confidences[candidates])]
+    return dets.boxes[i], float(dets.confidences[i])
+
+
+class RoiTracker:
+    """单个会话的检测调度状态，plan() 决定本帧做全图检测还是 ROI 检测"""
+
+    def __init__(self, face_class: int, min_interval: int = 2, max_interval: int = 10,
+                 margin: float = 0.25, motion_threshold: float = 0.15,
+                 min_track_score: float = 0.5, min_face_confidence: float = 0.6):
+        self.face_class = face_class
+        self.min_interval = max(1, min_interval)
+        self.max_interval = max(self.min_interval, max_interval)
+        self.margin = margin
+        self.motion_threshold = motion_threshold
+        self.min_track_score = min_track_score
+        self.min_face_confidence = min_face_confidence
+        self.interval = self.min_interval
+        self.face_box: Optional[np.ndarray] = None  # 原图坐标 [x, y, w, h]
+        self._template: Optional[np.ndarray] = None
+        self._frames_since_full = 0
+        self._force_full = True
+        self._lock = threading.Lock()
+        self.full_detections = 0
+        self.roi_detections = 0
+
+    def plan(self, frame) -> Optional[Tuple[int, int, int, int]]:
+        """返回 None 表示做全图检测，否则返回 ROI (x0, y0, x1, y1)"""
+        with self._lock:
+            if self._force_full or self.face_box is None or self._frames_since_full >= self.interval:
+                return None
+            tracked = self._track(frame)
+            if tracked is None:
+                return None
+            return self._roi(tracked, frame.shape[1], frame.shape[0])
+
+    def observe_full(self, frame, dets: Detections):
+        with self._lock:
+            self.full_detections += 1
+            self._frames_since_full = 0
+            box, confidence = best_box(dets, self.face_class)
+            if box is None or box[2] <= 0 or box[3] <= 0:
+                self._lose_face()
+                return
+            self.face_box = box.copy()
+            self._template = self._crop_gray(frame, box)
+            self._force_full = self._template is None
+            if confidence >= self.min_face_confidence:
+                self.interval = min(self.interval + 1, self.max_interval)
+            else:
+                self.interval = self.min_interval
+
+    def observe_roi(self, dets: Detections):
+        with self._lock:
+            self.roi_detections += 1
+            self._frames_since_full += 1
+            box, confidence = best_box(dets, self.face_class)
+            if len(dets.class_ids) == 0 or (box is not None and confidence < self.min_face_confidence):
+                # ROI 内什么都没检测到或人脸置信度偏低：下一帧回到全图检测
+                self.interval = self.min_interval
+                self._force_full = True
+            elif box is not None:
+                self.face_box = box.copy()
+
+    def _lose_face(self):
+        self.face_box = None
+        self._template = None
+        self.interval = self.min_interval
+        self._force_full = True
+
+    def _track(self, frame) -> Optional[np.ndarray]:
+        x, y, w, h = (int(v) for v in self.face_box)
+        frame_h, frame_w = frame.shape[:2]
+        # 在人脸框四周扩展半个框的范围内搜索
+        sx0, sy0 = max(0, x - w // 2), max(0, y - h // 2)
+        sx1, sy1 = min(frame_w, x + w + w // 2), min(frame_h, y + h + h // 2)
+        search = self._gray(frame[sy0:sy1, sx0:sx1])
+        template = self._template
+        if search is None or template is None or \
+                search.shape[0] < template.shape[0] or search.shape[1] < template.shape[1]:
+            self._force_full = True
+            return None
+        scores = cv2.matchTemplate(search, template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, loc = cv2.minMaxLoc(scores)
+        if score < self.min_track_score:
+            self._force_full = True
+            return None
+        new_x = sx0 + int(round(loc[0] / _TRACK_SCALE))
+        new_y = sy0 + int(round(loc[1] / _TRACK_SCALE))
+        motion = max(abs(new_x - x), abs(new_y - y)) / max(w, h)
+        if motion > self.motion_threshold:
+            # 运动较大时缩短全图检测间隔
+            self.interval = self.min_interval
+        self.face_box = np.array([new_x, new_y, w, h], dtype=self.face_box.dtype)
+        return self.face_box
+
+    def _roi(self, box, frame_w, frame_h) -> Optional[Tuple[int, int, int, int]]:
+        x, y, w, h = (int(v) for v in box)
+        mx, my = int(w * self.margin), int(h * self.margin)
+        x0, y0 = max(0, x - mx), max(0, y - my)
+        x1, y1 = min(frame_w, x + w + mx), min(frame_h, y + h + my)
+        if x1 - x0 < 16 or y1 - y0 < 16:
+            self._force_full = True
+            return None
+        return x0, y0, x1, y1
+
+    def _crop_gray(self, frame, box) -> Optional[np.ndarray]:
+        x, y, w, h = (int(v) for v in box)
+        frame_h, frame_w = frame.shape[:2]
+        x0, y0, x1, y1 = max(0, x), max(0, y), min(frame_w, x + w), min(frame_h, y + h)
+        if x1 - x0 < 8 or y1 - y0 < 8:
+            return None
+        return self._gray(frame[y0:y1, x0:x1])
+
+    @staticmethod
+    def _gray(image) -> Optional[np.ndarray]:
+        if image.size == 0:
+            return None
+        small = cv2.resize(image, None, fx=_TRACK_SCALE, fy=_TRACK_SCALE, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "interval": self.interval,
+                "full_detections": self.full_detections,
+                "roi_detections": self.roi_detections,
+            }
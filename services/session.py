@@ -0,0 +1,209 @@
+# services/session.py
+# 驾驶员会话注册表：为每个用户名维护独立的状态缓冲区 (ModelBuffer)，
+# 避免多个驾驶员同时检测时互相污染累加器和特征窗口。
+# 可选的 restore / discard 回调接入快照存储 (services/snapshot_store.py)：新建会话时先尝试从快照恢复，
+# 完全重置时删除快照；恢复的缓冲区真正用于新建会话后调用 on_restored。
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from services.log import get_logger
+
+log = get_logger(__name__)
+
+
+class Session:
+    """单个驾驶员的会话：状态缓冲区 + 会话锁 + 访问时间"""
+    __slots__ = ("key", "buffer", "lock", "created_at", "last_seen", "connections", "tracker")
+
+    def __init__(self, key: str, buffer):
+        self.key = key
+        self.buffer = buffer
+        # 同一驾驶员的帧可能同时来自 WebSocket 和 /detect_fatigue/，
+        # 处理一帧期间必须持有该锁，保证累加器按帧顺序更新
+        self.lock = threading.Lock()
+        self.created_at = time.monotonic()
+        self.last_seen = self.created_at
+        # 当前挂在该会话上的 WebSocket 连接数，大于0时不会因空闲被淘汰
+        self.connections = 0
+        # 自适应检测模式下的人脸跟踪状态 (services.roi_tracker.RoiTracker)，按需创建
+        self.tracker = None
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+
+class SessionRegistry:
+    """
+    按用户名索引的会话表，线程安全。
+
+    - 空闲超过 idle_ttl 秒且没有活动连接的会话会被清除；
+    - 会话总数超过 max_sessions 时按最近最少使用 (LRU) 顺序淘汰没有活动连接的会话；
+      有连接的会话不淘汰，连接数超过上限时会话数可以暂时超出 max_sessions。
+    """
+
+    def __init__(self, factory: Callable[[], object], idle_ttl: float = 600.0,
+                 max_sessions: int = 256, sweep_interval: float = 30.0,
+                 restore: Optional[Callable[[str], Optional[object]]] = None,
+                 discard: Optional[Callable[[Optional[str]], None]] = None,
+                 on_restored: Optional[Callable[[str], None]] = None):
+        self._factory = factory
+        self._restore = restore
+        self._on_restored = on_restored
+        self._discard = discard
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self._sweep_interval = sweep_interval
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self.evicted_idle = 0
+        self.evicted_capacity = 0
+        self.over_capacity = 0
+        self.restored = 0
+
+    def _new_buffer(self, key: str):
+        """返回 (缓冲区, 是否来自快照)；读取 SQLite 并反序列化，调用时不能持有 _lock"""
+        if self._restore is not None:
+            buffer = self._restore(key)
+            if buffer is not None:
+                return buffer, True
+        return self._factory(), False
+
+    def get(self, key: str) -> Session:
+        """获取（不存在则创建）会话，并刷新其访问时间"""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_sweep >= self._sweep_interval:
+                self._sweep_locked(now)
+            session = self._sessions.get(key)
+            if session is not None:
+                self._sessions.move_to_end(key)
+                session.last_seen = now
+                return session
+        # 快照恢复在注册表锁外进行，不阻塞其他驾驶员的帧；完成后重新检查，
+        # 期间若已有其他线程插入了同一会话则使用已有的，丢弃这里恢复的缓冲区
+        buffer, restored = self._new_buffer(key)
+        with self._lock:
+            session = self._sessions.get(key)
+            inserted = session is None
+            if inserted:
+                session = Session(key, buffer)
+                self._sessions[key] = session
+                if restored:
+                    self.restored += 1
+                self._enforce_capacity_locked(key)
+            else:
+                self._sessions.move_to_end(key)
+            session.last_seen = time.monotonic()
+        if inserted and restored and self._on_restored is not None:
+            self._on_restored(key)
+        return session
+
+    def peek(self, key: str) -> Optional[Session]:
+        """只查询，不创建也不刷新访问时间"""
+        with self._lock:
+            return self._sessions.get(key)
+
+    def attach(self, key: str) -> Session:
+        """WebSocket 连接建立时调用，连接期间会话不会因空闲被清除"""
+        session = self.get(key)
+        with self._lock:
+            session.connections += 1
+        return session
+
+    def detach(self, key: str):
+        """WebSocket 连接断开时调用，会话保留到空闲超时，便于断线重连"""
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                session.connections = max(0, session.connections - 1)
+                session.last_seen = time.monotonic()
+
+    def reset(self, key: str, carry: Optional[Callable[[object, object], None]] = None) -> Session:
+        """
+        用全新的缓冲区替换指定会话的状态。carry(旧, 新) 用于把部分状态（如特征窗口）带到新缓冲区，
+        不指定时为完全重置，同时删除该会话的快照。
+        """
+        if carry is None and self._discard is not None:
+            self._discard(key)
+        session = self.get(key)
+        with session.lock:
+            buffer = self._factory()
+            if carry is not None:
+                carry(session.buffer, buffer)
+            session.buffer = buffer
+            session.tracker = None
+        return session
+
+    def reset_all(self, carry: Optional[Callable[[object, object], None]] = None):
+        if carry is None and self._discard is not None:
+            self._discard(None)
+        with self._lock:
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            with session.lock:
+                buffer = self._factory()
+                if carry is not None:
+                    carry(session.buffer, buffer)
+                session.buffer = buffer
+                session.tracker = None
+
+    def remove(self, key: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(key, None) is not None
+
+    def sweep(self) -> int:
+        """立即清理空闲会话，返回清理数量"""
+        with self._lock:
+            return self._sweep_locked(time.monotonic())
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return list(self._sessions.keys())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "connected": sum(1 for s in self._sessions.values() if s.connections > 0),
+                "max_sessions": self.max_sessions,
+                "evicted_idle": self.evicted_idle,
+                "evicted_capacity": self.evicted_capacity,
+                "over_capacity": self.over_capacity,
+                "restored": self.restored,
+            }
+
+    def _sweep_locked(self, now: float) -> int:
+        self._last_sweep = now
+        expired = [key for key, s in self._sessions.items()
+                   if s.connections == 0 and now - s.last_seen > self.idle_ttl]
+        for key in expired:
+            del self._sessions[key]
+        self.evicted_idle += len(expired)
+        return len(expired)
+
+    def _enforce_capacity_locked(self, inserted: str):
+        """
+        超出容量时按 LRU 淘汰没有活动连接的会话，但不淘汰刚插入的 inserted：新会话在 attach() 之前连接数为 0，
+        否则在其他会话都有连接时它总是唯一的候选，每一帧都会拿到新的缓冲区、永远无法就绪。
+        有连接的会话不淘汰——连接数超过 max_sessions 时淘汰它们只会让所有驾驶员轮流丢失状态，
+        因此此时允许会话数暂时超过上限，并记录告警。
+        """
+        if len(self._sessions) <= self.max_sessions:
+            return
+        # 淘汰没有活动连接的最久未使用会话
+        for key in [k for k, s in self._sessions.items() if s.connections == 0 and k != inserted]:
+            if len(self._sessions) <= self.max_sessions:
+                return
+            del self._sessions[key]
+            self.evicted_capacity += 1
+        if len(self._sessions) > self.max_sessions:
+            self.over_capacity += 1
+            log.warning("sessions_over_capacity", sessions=len(self._sessions), max_sessions=self.max_sessions)
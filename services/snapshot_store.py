@@ -0,0 +1,182 @@
+# services/snapshot_store.py
+# 会话快照：把每个驾驶员的 ModelBuffer（特征窗口、确认计数器、当前状态）定期写入本地 SQLite 文件，
+# 断线重连、会话因空闲被清除、服务或推理工作进程重启后，在 ttl 内新建会话时直接从快照恢复，
+# 不必重新积累 1000 帧才能开始预测。
+#
+# save() 只把最新快照放进待写字典（同一驾驶员只保留最新一份），后台线程每 flush_interval 秒
+# 在一个事务里批量 upsert，推理线程不做磁盘 I/O。快照文件用 WAL 模式，多个工作进程可同时读写。
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from services.log import get_logger
+
+log = get_logger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS session_snapshots (
+    username TEXT PRIMARY KEY,
+    saved_at REAL NOT NULL,
+    data BLOB NOT NULL
+)
+"""
+
+
+class SnapshotStore:
+
+    def __init__(self, path: str, ttl: float = 900.0, flush_interval: float = 1.0, enabled: bool = True):
+        self.path = path
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.enabled = enabled
+        self._pending: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+        self._local = threading.local()
+        self.saves = 0
+        self.writes = 0
+        self.loads = 0  # load() 返回了有效快照的次数
+        self.restores = 0  # 其中真正用于新建会话的次数（见 mark_restored）
+        self.misses = 0
+        self.expired = 0
+        self.errors = 0
+        self.bytes_written = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def save(self, key: str, data: bytes):
+        """记录最新快照，由后台线程写盘"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._pending[key] = (time.time(), data)
+            self.saves += 1
+            if self._thread is None and not self._stopped:
+                # 首次保存时才启动写线程，推理工作进程中同样适用
+                self._thread = threading.Thread(target=self._run, name="snapshot-writer", daemon=True)
+                self._thread.start()
+
+    def load(self, key: str) -> Optional[bytes]:
+        """返回 ttl 内的最新快照，没有或已过期时返回 None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            item = self._pending.get(key)
+        try:
+            if item is None:
+                item = self._connection().execute(
+                    "SELECT saved_at, data FROM session_snapshots WHERE username = ?", (key,)).fetchone()
+        except sqlite3.Error:
+            self.errors += 1
+            log.warning("snapshot_load_failed", username=key, exc_info=True)
+            return None
+        if item is None:
+            self.misses += 1
+            return None
+        saved_at, data = item
+        if time.time() - saved_at > self.ttl:
+            self.expired += 1
+            return None
+        self.loads += 1
+        return bytes(data)
+
+    def mark_restored(self, key: str):
+        """快照被反序列化并用于新建会话后调用；解析失败或并发时被丢弃的不计入"""
+        with self._lock:
+            self.restores += 1
+
+    def discard(self, key: Optional[str] = None):
+        """删除指定驾驶员（key 为 None 时为全部）的快照，用于完全重置"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if key is None:
+                self._pending.clear()
+            else:
+                self._pending.pop(key, None)
+            try:
+                if key is None:
+                    self._connection().execute("DELETE FROM session_snapshots")
+                else:
+                    self._connection().execute("DELETE FROM session_snapshots WHERE username = ?", (key,))
+            except sqlite3.Error:
+                self.errors += 1
+                log.warning("snapshot_discard_failed", username=key, exc_info=True)
+
+    def flush(self) -> int:
+        """把待写快照写入磁盘，返回写入条数"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            # 持锁写入，保证与 discard() 的先后顺序
+            rows = [(key, saved_at, data) for key, (saved_at, data) in pending.items()]
+            try:
+                conn = self._connection()
+                conn.execute("BEGIN")
+                conn.executemany(
+                    "INSERT INTO session_snapshots (username, saved_at, data) VALUES (?, ?, ?) "
+                    "ON CONFLICT(username) DO UPDATE SET saved_at = excluded.saved_at, data = excluded.data",
+                    rows)
+                # 顺带清理早已过期的快照
+                conn.execute("DELETE FROM session_snapshots WHERE saved_at < ?", (time.time() - self.ttl,))
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                self.errors += 1
+                log.warning("snapshot_flush_failed", rows=len(rows), exc_info=True)
+                try:
+                    self._connection().execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+                return 0
+        self.writes += len(rows)
+        self.bytes_written += sum(len(row[2]) for row in rows)
+        return len(rows)
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self):
+        """停止写线程并写出剩余快照"""
+        with self._lock:
+            self._stopped = True
+            thread = self._thread
+        self._wakeup.set()
+        if thread is not None:
+            thread.join(timeout=5.0)
+        self.flush()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "enabled": self.enabled,
+            "path": self.path,
+            "ttl": self.ttl,
+            "pending": pending,
+            "saves": self.saves,
+            "writes": self.writes,
+            "bytes_written": self.bytes_written,
+            "loads": self.loads,
+            "restores": self.restores,
+            "misses": self.misses,
+            "expired": self.expired,
+            "errors": self.errors,
+        }
@@ -0,0 +1,541 @@
+# services/worker_pool.py
+# 多进程推理工作池：N 个工作进程各自加载一份模型，API 进程只负责收发和解码。
+#
+# - 帧传递：每个工作进程有一块共享内存，划分为若干定长槽位。API 进程把解码后的帧
+#   拷进空闲槽位，通过管道只发送 (槽位号, 形状) 等少量元数据，不再 pickle 整帧；
+#   超过槽位大小的帧退化为直接随消息发送。
+# - 会话绑定：同一驾驶员的帧总是交给同一个工作进程，时间窗口等状态只保存在该进程内。
+#   新会话按负载均衡策略分配："least_sessions"（绑定会话最少）或 "hash"（用户名哈希）。
+# - 健康检查：监控线程定期 ping，工作进程退出或超时无响应时自动重启，
+#   其在途请求以 WorkerCrashed 失败，槽位回收。
+# - 指标：工作进程回复心跳时附带本进程的指标快照，API 进程在 /metrics 中按 worker 标签输出。
+
+import signal
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from multiprocessing import get_context
+from multiprocessing.connection import wait as wait_connections
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from services import metrics
+from services.executor import ExecutorBusy
+from services.log import get_logger
+from services.model_registry import ModelNotReady
+
+log = get_logger(__name__)
+
+STARTING, READY, FAILED, STOPPED = "starting", "ready", "failed", "stopped"
+
+
+class WorkerCrashed(Exception):
+    """处理该帧的工作进程退出或无响应，已被重启"""
+
+
+class RecordCollector:
+    """
+    工作进程中代替 event_writer：只收集待写入的记录，随结果一起交回 API 进程，
+    由 API 进程的写入器统一批量写库。
+    """
+
+    def __init__(self):
+        self._records = []
+        self._lock = threading.Lock()
+
+    def enqueue(self, record):
+        with self._lock:
+            self._records.append(record)
+
+    def drain(self) -> list:
+        with self._lock:
+            records, self._records = self._records, []
+        return records
+
+    def stats(self):
+        with self._lock:
+            return {"queue_depth": len(self._records)}
+
+
+# ---------------- 工作进程 ----------------
+
+def _send_result(conn, req_id, ok, payload):
+    try:
+        conn.send(("result", req_id, ok, payload))
+    except Exception as e:
+        # 异常对象或结果无法序列化时降级为字符串
+        conn.send(("result", req_id, False, RuntimeError(f"{type(e).__name__}: {e}")))
+
+
+def _exit_on_sigterm(signum, frame):
+    raise SystemExit(0)
+
+
+def _worker_main(index: int, num_workers: int, initializer: Callable, frame_handler: Callable,
+                 reset_handler: Callable, finalizer: Optional[Callable], shm_name: str, slot_bytes: int,
+                 conn_in, conn_out):
+    shm = SharedMemory(name=shm_name)
+    try:
+        initializer(index, num_workers)
+    except Exception as e:
+        conn_out.send(("failed", None, False, f"{type(e).__name__}: {e}"))
+        shm.close()
+        return
+    # 重启时 API 进程先 terminate() (SIGTERM)：转换为 SystemExit，下面的 finally 仍会执行 finalizer
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    conn_out.send(("ready", None, True, None))
+    try:
+        _serve(frame_handler, reset_handler, shm, slot_bytes, conn_in, conn_out)
+    finally:
+        if finalizer is not None:
+            try:
+                finalizer()
+            except Exception:
+                log.exception("worker_finalizer_failed", worker=index)
+        try:
+            shm.close()
+        except BufferError:
+            # SIGTERM 打断了一帧，帧视图仍引用共享内存；进程随即退出，由系统回收
+            pass
+
+
+def _serve(frame_handler: Callable, reset_handler: Callable, shm: SharedMemory, slot_bytes: int, conn_in, conn_out):
+    while True:
+        try:
+            message = conn_in.recv()
+        except EOFError:
+            # API 进程已退出
+            break
+        op = message[0]
+        if op == "frame":
+            _, req_id, username, slot, shape, inline = message
+            if inline is None:
+                frame = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=slot * slot_bytes)
+            else:
+                frame = inline
+            try:
+                payload, ok = frame_handler(username, frame), True
+            except Exception as e:
+                payload, ok = e, False
+            # 释放对共享内存的引用后再回复，回复后该槽位可能立刻被复用
+            del frame
+            _send_result(conn_out, req_id, ok, payload)
+        elif op == "reset":
+            _, req_id, username, keep = message
+            try:
+                reset_handler(username, keep)
+                _send_result(conn_out, req_id, True, None)
+            except Exception as e:
+                _send_result(conn_out, req_id, False, e)
+        elif op == "ping":
+            conn_out.send(("pong", message[1], True, metrics.registry.snapshot()))
+        elif op == "stop":
+            break
+
+
+# ---------------- API 进程 ----------------
+
+class _Worker:
+    __slots__ = ("index", "process", "conn_in", "conn_out", "send_lock", "shm", "state", "error",
+                 "generation", "free_slots", "inflight", "started_at", "last_seen", "restarts",
+                 "processed", "failed", "latency_ms_total", "metrics")
+
+    def __init__(self, index: int, shm: SharedMemory, slots: int):
+        self.index = index
+        self.shm = shm
+        self.process = None
+        self.conn_in = None   # API 进程 -> 工作进程
+        self.conn_out = None  # 工作进程 -> API 进程
+        self.send_lock = threading.Lock()
+        self.state = STOPPED
+        self.error: Optional[str] = None
+        self.generation = 0
+        self.free_slots = deque(range(slots))
+        # req_id -> (future, 槽位号或 None, 提交时间, 是否为帧请求)
+        self.inflight: Dict[int, tuple] = {}
+        self.started_at = 0.0
+        self.last_seen = 0.0
+        self.restarts = 0
+        self.processed = 0
+        self.failed = 0
+        self.latency_ms_total = 0.0
+        # 最近一次心跳带回的指标快照
+        self.metrics: Optional[dict] = None
+
+
+class WorkerPool:
+
+    def __init__(self, num_workers: int, initializer: Callable, frame_handler: Callable,
+                 reset_handler: Callable, on_records: Optional[Callable[[list], None]] = None,
+                 slots: int = 4, slot_bytes: int = 1280 * 720 * 3, policy: str = "least_sessions",
+                 health_interval: float = 2.0, timeout: float = 15.0, startup_timeout: float = 300.0,
+                 session_ttl: float = 600.0, finalizer: Optional[Callable[[], None]] = None):
+        """
+        :param initializer: initializer(index, num_workers)，在工作进程中加载模型
+        :param frame_handler: frame_handler(username, frame) -> (结果, 待写入记录列表)，在工作进程中执行
+        :param reset_handler: reset_handler(username 或 None, keep_windows)，在工作进程中重置会话
+        :param finalizer: finalizer()，工作进程正常退出或被重启 (SIGTERM) 前执行，用于写出未落盘的状态
+        :param on_records: 在 API 进程中处理工作进程交回的记录（写入数据库队列）
+        以上函数都必须是模块级函数，以便 spawn 方式的子进程按名称导入。
+        """
+        if policy not in ("least_sessions", "hash"):
+            raise ValueError(f"Unknown worker policy '{policy}', expected 'least_sessions' or 'hash'")
+        self.num_workers = num_workers
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.policy = policy
+        self.health_interval = health_interval
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        self.session_ttl = session_ttl
+        self._initializer = initializer
+        self._frame_handler = frame_handler
+        self._reset_handler = reset_handler
+        self._finalizer = finalizer
+        self._on_records = on_records
+        self._ctx = get_context("spawn")
+        self._workers: List[_Worker] = []
+        # 用户名 -> [工作进程下标, 最近访问时间]，按访问顺序排列
+        self._pins: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._running = False
+        self._collector: Optional[threading.Thread] = None
+        self._monitor: Optional[threading.Thread] = None
+        self.inline_frames = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.num_workers > 0
+
+    # ---------------- 生命周期 ----------------
+
+    def start(self):
+        if not self.enabled or self._running:
+            return
+        self._running = True
+        for index in range(self.num_workers):
+            shm = SharedMemory(create=True, size=max(1, self.slots * self.slot_bytes))
+            worker = _Worker(index, shm, self.slots)
+            self._workers.append(worker)
+            self._spawn(worker)
+        self._collector = threading.Thread(target=self._collect, name="worker-pool-collector", daemon=True)
+        self._collector.start()
+        self._monitor = threading.Thread(target=self._watch, name="worker-pool-monitor", daemon=True)
+        self._monitor.start()
+
+    def shutdown(self, timeout: float = 5.0):
+        if not self._running:
+            return
+        self._running = False
+        for worker in self._workers:
+            try:
+                with worker.send_lock:
+                    worker.conn_in.send(("stop",))
+            except (OSError, ValueError):
+                pass
+        for worker in self._workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join(1.0)
+            with self._lock:
+                self._fail_inflight_locked(worker, WorkerCrashed("worker pool is shutting down"))
+                worker.state = STOPPED
+            worker.shm.close()
+            worker.shm.unlink()
+        self._workers = []
+
+    def _spawn(self, worker: _Worker):
+        """（重新）启动一个工作进程，调用方保证旧进程已退出"""
+        conn_in_recv, conn_in_send = self._ctx.Pipe(duplex=False)
+        conn_out_recv, conn_out_send = self._ctx.Pipe(duplex=False)
+        process = self._ctx.Process(
+            target=_worker_main,
+            name=f"inference-worker-{worker.index}",
+            args=(worker.index, self.num_workers, self._initializer, self._frame_handler,
+                  self._reset_handler, self._finalizer, worker.shm.name, self.slot_bytes, conn_in_recv, conn_out_send),
+            daemon=True,
+        )
+        process.start()
+        # 子进程持有的一端在父进程中关闭，子进程退出时 recv 才能收到 EOF
+        conn_in_recv.close()
+        conn_out_send.close()
+        with self._lock:
+            worker.process = process
+            worker.conn_in = conn_in_send
+            worker.conn_out = conn_out_recv
+            worker.generation += 1
+            worker.state = STARTING
+            worker.error = None
+            worker.metrics = None
+            worker.started_at = worker.last_seen = time.monotonic()
+
+    def _restart(self, worker: _Worker, reason: str):
+        log.warning("worker_restarting", worker=worker.index, pid=worker.process.pid, reason=reason)
+        with self._lock:
+            worker.state = STARTING
+            self._fail_inflight_locked(worker, WorkerCrashed(f"inference worker {worker.index} {reason}"))
+        if worker.process.is_alive():
+            worker.process.terminate()
+        worker.process.join(5.0)
+        if worker.process.is_alive():
+            worker.process.kill()
+            worker.process.join()
+        for conn in (worker.conn_in, worker.conn_out):
+            if conn is not None:
+                conn.close()
+        worker.restarts += 1
+        self._spawn(worker)
+
+    def _fail_inflight_locked(self, worker: _Worker, error: Exception):
+        for future, slot, _, _ in worker.inflight.values():
+            if slot is not None:
+                worker.free_slots.append(slot)
+            if not future.done():
+                future.set_exception(error)
+        worker.inflight.clear()
+
+    # ---------------- 提交 ----------------
+
+    def _pin_locked(self, username: str) -> _Worker:
+        now = time.monotonic()
+        pin = self._pins.get(username)
+        if pin is not None:
+            pin[1] = now
+            self._pins.move_to_end(username)
+            return self._workers[pin[0]]
+        if self.policy == "hash":
+            index = zlib.crc32(username.encode()) % self.num_workers
+        else:
+            counts = [0] * self.num_workers
+            for worker_index, _ in self._pins.values():
+                counts[worker_index] += 1
+            # 优先选择已就绪的进程，其次绑定会话最少、在途请求最少的
+            index = min(range(self.num_workers), key=lambda i: (
+                self._workers[i].state != READY, counts[i], len(self._workers[i].inflight)))
+        self._pins[username] = [index, now]
+        return self._workers[index]
+
+    def submit(self, username: str, frame: np.ndarray) -> Future:
+        """
+        把一帧交给该驾驶员绑定的工作进程（在推理线程中调用，拷贝帧数据）。
+        返回的 Future 结果为 frame_handler 在工作进程中的返回值。
+        """
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        future: Future = Future()
+        with self._lock:
+            worker = self._pin_locked(username)
+            if worker.state != READY:
+                raise ModelNotReady(f"inference worker {worker.index} is {worker.state}")
+            inline = None
+            slot = None
+            if frame.nbytes <= self.slot_bytes:
+                if not worker.free_slots:
+                    raise ExecutorBusy(f"inference worker {worker.index} has no free frame slot")
+                slot = worker.free_slots.popleft()
+            else:
+                inline = frame
+                self.inline_frames += 1
+            req_id = self._next_id
+            self._next_id += 1
+            worker.inflight[req_id] = (future, slot, time.monotonic(), True)
+            generation = worker.generation
+        if slot is not None:
+            view = np.ndarray(frame.shape, dtype=np.uint8, buffer=worker.shm.buf, offset=slot * self.slot_bytes)
+            view[...] = frame
+            del view
+        self._send(worker, generation, req_id, ("frame", req_id, username, slot, frame.shape, inline))
+        return future
+
+    def reset(self, username: Optional[str] = None, keep_windows: bool = False) -> List[Future]:
+        """
+        重置工作进程中的会话；不指定 username 时重置所有工作进程的全部会话。
+        keep_windows 原样传给 reset_handler(username, keep_windows)
+        """
+        with self._lock:
+            if username:
+                pin = self._pins.get(username)
+                targets = [self._workers[pin[0]]] if pin is not None else []
+            else:
+                targets = list(self._workers)
+            requests = []
+            for worker in targets:
+                if worker.state != READY:
+                    continue
+                future: Future = Future()
+                req_id = self._next_id
+                self._next_id += 1
+                worker.inflight[req_id] = (future, None, time.monotonic(), False)
+                requests.append((worker, worker.generation, req_id, future))
+        for worker, generation, req_id, _ in requests:
+            self._send(worker, generation, req_id, ("reset", req_id, username, keep_windows))
+        return [future for *_, future in requests]
+
+    def _send(self, worker: _Worker, generation: int, req_id: int, message):
+        try:
+            with worker.send_lock:
+                if worker.generation != generation:
+                    raise OSError("worker restarted")
+                worker.conn_in.send(message)
+        except (OSError, ValueError) as e:
+            with self._lock:
+                entry = worker.inflight.pop(req_id, None)
+                if entry is not None and entry[1] is not None:
+                    worker.free_slots.append(entry[1])
+            if entry is not None and not entry[0].done():
+                entry[0].set_exception(WorkerCrashed(f"inference worker {worker.index} is unavailable: {e}"))
+
+    # ---------------- 结果收集与健康检查 ----------------
+
+    def _collect(self):
+        while self._running:
+            with self._lock:
+                conns = {w.conn_out: (w, w.generation) for w in self._workers if w.conn_out is not None}
+            try:
+                ready = wait_connections(list(conns), timeout=0.5)
+            except (OSError, ValueError):
+                # 连接在重启时被关闭，重新获取
+                continue
+            for conn in ready:
+                worker, generation = conns[conn]
+                try:
+                    kind, req_id, ok, payload = conn.recv()
+                except (EOFError, OSError, ValueError):
+                    self._lost(worker, generation, conn)
+                    continue
+                self._handle(worker, generation, kind, req_id, ok, payload)
+
+    def _lost(self, worker: _Worker, generation: int, conn):
+        """
+        工作进程已退出（管道 EOF）：把连接移出等待集合，否则 wait_connections 会一直立即返回、空转占满 CPU；
+        在途请求立即失败，由监控线程负责重启（启动失败时按 timeout 间隔重试）。
+        """
+        with self._lock:
+            if worker.generation != generation or worker.conn_out is not conn:
+                return
+            worker.conn_out = None
+            self._fail_inflight_locked(worker, WorkerCrashed(f"inference worker {worker.index} exited"))
+        try:
+            conn.close()
+        except OSError:
+            pass
+
+    def _handle(self, worker: _Worker, generation: int, kind: str, req_id, ok: bool, payload):
+        records = None
+        with self._lock:
+            if worker.generation != generation:
+                return
+            worker.last_seen = time.monotonic()
+            if kind == "ready":
+                worker.state = READY
+                log.info("worker_ready", worker=worker.index, pid=worker.process.pid,
+                         seconds=worker.last_seen - worker.started_at)
+                return
+            if kind == "failed":
+                worker.state = FAILED
+                worker.error = payload
+                log.error("worker_start_failed", worker=worker.index, error=payload)
+                return
+            if kind == "pong":
+                worker.metrics = payload
+                return
+            if kind != "result":
+                return
+            entry = worker.inflight.pop(req_id, None)
+            if entry is None:
+                return
+            future, slot, submitted, is_frame = entry
+            if slot is not None:
+                worker.free_slots.append(slot)
+            if is_frame:
+                worker.processed += 1
+                worker.latency_ms_total += (worker.last_seen - submitted) * 1000.0
+            if not ok:
+                worker.failed += 1
+        if ok:
+            if is_frame:
+                result, records = payload
+                future.set_result(result)
+            else:
+                future.set_result(payload)
+        else:
+            future.set_exception(payload if isinstance(payload, BaseException) else RuntimeError(str(payload)))
+        if records and self._on_records is not None:
+            try:
+                self._on_records(records)
+            except Exception as e:
+                log.error("worker_records_handover_failed", worker=worker.index, error=str(e))
+
+    def _watch(self):
+        while self._running:
+            time.sleep(self.health_interval)
+            if not self._running:
+                break
+            now = time.monotonic()
+            for worker in self._workers:
+                if not worker.process.is_alive():
+                    if worker.state == FAILED and now - worker.last_seen < self.timeout:
+                        # 启动失败（如模型文件缺失）时间隔一段时间再重试，避免频繁重启
+                        continue
+                    self._restart(worker, f"exited with code {worker.process.exitcode}")
+                    continue
+                limit = self.startup_timeout if worker.state == STARTING else self.timeout
+                if now - worker.last_seen > limit:
+                    self._restart(worker, f"did not respond for {now - worker.last_seen:.1f}s")
+                    continue
+                if worker.state == READY:
+                    with self._lock:
+                        generation = worker.generation
+                    try:
+                        with worker.send_lock:
+                            if worker.generation == generation:
+                                worker.conn_in.send(("ping", None))
+                    except (OSError, ValueError):
+                        pass
+            self._sweep_pins(now)
+
+    def _sweep_pins(self, now: float):
+        with self._lock:
+            while self._pins:
+                username, (_, last_seen) = next(iter(self._pins.items()))
+                if now - last_seen <= self.session_ttl:
+                    break
+                del self._pins[username]
+
+    def metrics_snapshots(self) -> List[tuple]:
+        """各工作进程最近一次上报的指标快照，[({"worker": 下标}, snapshot), ...]"""
+        with self._lock:
+            return [({"worker": str(w.index)}, w.metrics) for w in self._workers if w.metrics]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            sessions = [0] * len(self._workers)
+            for index, _ in self._pins.values():
+                sessions[index] += 1
+            now = time.monotonic()
+            return {
+                "workers": self.num_workers,
+                "policy": self.policy,
+                "slots_per_worker": self.slots,
+                "slot_bytes": self.slot_bytes,
+                "inline_frames": self.inline_frames,
+                "per_worker": [{
+                    "index": w.index,
+                    "pid": w.process.pid if w.process is not None else None,
+                    "state": w.state,
+                    "error": w.error,
+                    "restarts": w.restarts,
+                    "sessions": sessions[w.index],
+                    "inflight": len(w.inflight),
+                    "free_slots": len(w.free_slots),
+                    "processed": w.processed,
+                    "failed": w.failed,
+                    "avg_latency_ms": w.latency_ms_total / w.processed if w.processed else 0.0,
+                    "last_seen_seconds_ago": round(now - w.last_seen, 3),
+                } for w in self._workers],
+            }
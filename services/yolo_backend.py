@@ -0,0 +1,200 @@
+# services/yolo_backend.py
+# YOLO 推理后端，启动时按 YOLO_BACKEND 选择。所有后端的 forward(blob) 都返回与 OpenCV Region 层
+# 相同布局的输出列表 [(rows, 5 + 类别数), ...]，之后的解码 / NMS (services/yolo_decode.py) 不变。
+#
+# - "opencv"：OpenCV DNN FP32，可通过 YOLO_DNN_BACKEND / YOLO_DNN_TARGET 指定计算后端和设备
+#   （如 target="cpu_fp16"、"opencl"、"cuda"）；
+# - "opencv_int8"：OpenCV DNN 训练后静态 INT8 量化 (Net.quantize)，用校准图片统计各层的量化范围；
+# - "onnx"：onnxruntime 运行导出的 ONNX 模型（可用 python -m bench.yolo_eval --quantize-onnx 量化为 INT8），
+#   需要安装 onnxruntime，且模型输出须与 Region 层布局一致。
+#
+# 各变体的精度 (mAP) 和单帧延迟用 python -m bench.yolo_eval 对比。
+
+import os
+import threading
+from typing import List, Optional, Sequence
+
+import cv2
+import numpy as np
+
+from services.log import get_logger
+
+log = get_logger(__name__)
+
+BACKENDS = ("opencv", "opencv_int8", "onnx")
+
+_DNN_BACKENDS = {
+    "default": cv2.dnn.DNN_BACKEND_DEFAULT,
+    "opencv": cv2.dnn.DNN_BACKEND_OPENCV,
+    "inference_engine": cv2.dnn.DNN_BACKEND_INFERENCE_ENGINE,
+    "cuda": cv2.dnn.DNN_BACKEND_CUDA,
+}
+_DNN_TARGETS = {
+    "cpu": cv2.dnn.DNN_TARGET_CPU,
+    "cpu_fp16": getattr(cv2.dnn, "DNN_TARGET_CPU_FP16", cv2.dnn.DNN_TARGET_CPU),
+    "opencl": cv2.dnn.DNN_TARGET_OPENCL,
+    "opencl_fp16": cv2.dnn.DNN_TARGET_OPENCL_FP16,
+    "cuda": cv2.dnn.DNN_TARGET_CUDA,
+    "cuda_fp16": cv2.dnn.DNN_TARGET_CUDA_FP16,
+}
+
+
+def make_blob(frames: Sequence[np.ndarray], input_size: int) -> np.ndarray:
+    """与 detect() 相同的预处理：缩放到 input_size×input_size、归一化到 [0,1]、BGR→RGB"""
+    return cv2.dnn.blobFromImages(list(frames), 1 / 255.0, (input_size, input_size), swapRB=True, crop=False)
+
+
+class BlobBuffer:
+    """
+    预分配的输入 blob，结果与 make_blob 逐位相同：先在复用的 uint8 缓冲区里缩放，
+    再把三个通道按 RGB 顺序乘 1/255 直接写入 float32 blob，不再每帧分配新的 blob 和中间图像。
+    fill() 返回的数组会在下一次 fill() 时被覆盖，必须在此之前用完（forward 是同步的）。
+    """
+
+    def __init__(self):
+        self._blob = np.empty((0, 3, 0, 0), np.float32)
+        self._resized = np.empty((0, 0, 3), np.uint8)
+
+    def fill(self, frames: Sequence[np.ndarray], input_size: int) -> np.ndarray:
+        count = len(frames)
+        if self._blob.shape[0] < count or self._blob.shape[2] != input_size:
+            self._blob = np.empty((count, 3, input_size, input_size), np.float32)
+            self._resized = np.empty((input_size, input_size, 3), np.uint8)
+        scale = np.float32(1 / 255.0)
+        for i, frame in enumerate(frames):
+            if frame.shape[:2] == (input_size, input_size):
+                resized = frame
+            else:
+                resized = cv2.resize(frame, (input_size, input_size), dst=self._resized)
+            for c in range(3):
+                np.multiply(resized[:, :, 2 - c], scale, out=self._blob[i, c], casting="unsafe")
+        return self._blob[:count]
+
+
+_local = threading.local()
+
+
+def blob_buffer() -> BlobBuffer:
+    """当前线程的 BlobBuffer；预处理和推理都在同一个线程里同步完成，按线程复用即可"""
+    buffer = getattr(_local, "blob_buffer", None)
+    if buffer is None:
+        buffer = _local.blob_buffer = BlobBuffer()
+    return buffer
+
+
+def read_image_list(list_path: str, image_root: str = "") -> List[str]:
+    """
+    读取 darknet 格式的图片列表（每行一个路径）。列表中的路径在本机不存在时（例如训练时的 /content/obj/...），
+    改为在 image_root 下按文件名查找。
+    """
+    paths = []
+    with open(list_path, encoding="utf-8") as f:
+        for line in f:
+            path = line.strip()
+            if not path:
+                continue
+            if not os.path.exists(path) and image_root:
+                path = os.path.join(image_root, os.path.basename(path))
+            if os.path.exists(path):
+                paths.append(path)
+    return paths
+
+
+class OpenCVYolo:
+    """OpenCV DNN 推理，可指定计算后端和设备"""
+
+    def __init__(self, cfg: str, weights: str, backend: str = "default", target: str = "cpu"):
+        if backend not in _DNN_BACKENDS:
+            raise ValueError(f"unknown OpenCV DNN backend: {backend}")
+        if target not in _DNN_TARGETS:
+            raise ValueError(f"unknown OpenCV DNN target: {target}")
+        self.net = cv2.dnn.readNetFromDarknet(cfg, weights)
+        self.net.setPreferableBackend(_DNN_BACKENDS[backend])
+        self.net.setPreferableTarget(_DNN_TARGETS[target])
+        names = self.net.getLayerNames()
+        self.layers = [names[i - 1] for i in np.asarray(self.net.getUnconnectedOutLayers()).reshape(-1)]
+        self.description = f"opencv backend={backend} target={target}"
+
+    def forward(self, blob: np.ndarray):
+        # cv2.dnn.Net 不是线程安全的，调用方负责串行化 (fatigue_api._yolo_lock)
+        self.net.setInput(blob)
+        return self.net.forward(self.layers)
+
+
+class OpenCVInt8Yolo(OpenCVYolo):
+    """
+    训练后静态 INT8 量化：用校准 blob 跑一遍 FP32 网络，按各层激活范围量化权重和激活。
+    量化后的网络只能在 OpenCV 自带的 CPU 后端上运行，输入输出仍为 FP32。
+    """
+
+    def __init__(self, cfg: str, weights: str, calibration_blob: np.ndarray):
+        super().__init__(cfg, weights, "opencv", "cpu")
+        self.net = self.net.quantize([calibration_blob], cv2.CV_32F, cv2.CV_32F)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.description = f"opencv_int8 calibration_images={len(calibration_blob)}"
+
+
+class OnnxYolo:
+    """onnxruntime 推理导出的 ONNX 模型（FP32 或 INT8 QDQ）"""
+
+    def __init__(self, path: str, threads: int = 0):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise RuntimeError("YOLO_BACKEND=onnx 需要安装 onnxruntime 包 (pip install onnxruntime)") from e
+        options = ort.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.description = f"onnx {os.path.basename(path)}"
+
+    def forward(self, blob: np.ndarray):
+        outputs = self.session.run(None, {self.input_name: blob})
+        # 与 OpenCV 一致：batch=1 时每个输出为 (rows, cols)
+        if len(blob) == 1:
+            outputs = [o.reshape(-1, o.shape[-1]) for o in outputs]
+        return outputs
+
+
+def calibration_blob(list_path: str, image_root: str, count: int, input_size: int) -> np.ndarray:
+    paths = read_image_list(list_path, image_root)[:count]
+    images = [img for img in (cv2.imread(p, cv2.IMREAD_COLOR) for p in paths) if img is not None]
+    if not images:
+        raise RuntimeError(f"INT8 量化需要校准图片，未能从 {list_path} 读取到任何图片（可设置 YOLO_IMAGE_ROOT）")
+    return make_blob(images, input_size)
+
+
+def create_backend(kind: str, cfg: str, weights: str, input_size: int = 416, dnn_backend: str = "default",
+                   dnn_target: str = "cpu", onnx_path: str = "", calibration_list: str = "",
+                   image_root: str = "", calibration_images: int = 32, threads: int = 0):
+    if kind == "opencv":
+        return OpenCVYolo(cfg, weights, dnn_backend, dnn_target)
+    if kind == "opencv_int8":
+        blob = calibration_blob(calibration_list, image_root, calibration_images, input_size)
+        return OpenCVInt8Yolo(cfg, weights, blob)
+    if kind == "onnx":
+        return OnnxYolo(onnx_path, threads)
+    raise ValueError(f"unknown YOLO backend: {kind}")
+
+
+def quantize_onnx(model_in: str, model_out: str, calibration_list: str, image_root: str = "",
+                  calibration_images: int = 32, input_size: int = 416, per_channel: bool = False):
+    """用 onnxruntime 的静态量化把 FP32 ONNX 模型转换为 INT8 (QDQ)"""
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    import onnxruntime as ort
+
+    input_name = ort.InferenceSession(model_in, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    blob = calibration_blob(calibration_list, image_root, calibration_images, input_size)
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self._items = iter([{input_name: blob[i:i + 1]} for i in range(len(blob))])
+
+        def get_next(self) -> Optional[dict]:
+            return next(self._items, None)
+
+    quantize_static(model_in, model_out, Reader(), quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, per_channel=per_channel)
+    log.info("onnx_quantized", model_in=model_in, model_out=model_out, calibration_images=len(blob))
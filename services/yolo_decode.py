@@ -0,0 +1,55 @@
+# services/yolo_decode.py
+# YOLO 输出解码（NumPy 向量化版本）。
+# 所有输出层先拼接成一个 (rows, 5 + 类别数) 的数组，一次性完成 argmax、阈值筛选和坐标换算，
+# 然后只对通过阈值的候选框按类别分别做 NMS。
+
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# class_ids / confidences / boxes 为通过置信度阈值的全部候选框（NMS 之前），
+# keep 为 NMS 后保留的下标，present[c] 表示类别 c 是否出现在候选框中
+Detections = namedtuple("Detections", ["class_ids", "boxes", "confidences", "keep", "present"])
+
+
+def decode_yolo_outputs(layer_outputs, W, H, num_classes,
+                        conf_threshold=0.4, score_threshold=0.5, nms_threshold=0.5) -> Detections:
+    rows = np.concatenate([np.asarray(o).reshape(-1, o.shape[-1]) for o in layer_outputs], axis=0)
+    scores = rows[:, 5:]
+    class_ids = scores.argmax(axis=1)
+    confidences = scores[np.arange(len(scores)), class_ids]
+
+    mask = confidences > conf_threshold
+    rows, class_ids, confidences = rows[mask], class_ids[mask], confidences[mask]
+
+    # 与逐行实现保持一致：先把中心点/宽高截断为整数，再计算左上角并向零取整
+    scaled = (rows[:, 0:4] * np.array([W, H, W, H])).astype("int")
+    center_x, center_y, width, height = scaled.T
+    x = np.trunc(center_x - width / 2).astype("int")
+    y = np.trunc(center_y - height / 2).astype("int")
+    boxes = np.stack([x, y, width, height], axis=1)
+
+    present = np.zeros(num_classes, dtype=bool)
+    present[class_ids] = True
+
+    keep = nms_per_class(boxes, confidences, class_ids, score_threshold, nms_threshold)
+    return Detections(class_ids, boxes, confidences.astype(np.float32), keep, present)
+
+
+def nms_per_class(boxes, confidences, class_ids, score_threshold, nms_threshold):
+    """按类别分别做 NMS，返回保留框的下标数组"""
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+    box_list = boxes.tolist()
+    score_list = confidences.astype(float).tolist()
+    if hasattr(cv2.dnn, "NMSBoxesBatched"):
+        idxs = cv2.dnn.NMSBoxesBatched(box_list, score_list, class_ids.astype(int).tolist(),
+                                       score_threshold, nms_threshold)
+    else:
+        # 旧版 OpenCV：把不同类别的框平移到互不重叠的区域，再做一次普通 NMS
+        offset = boxes[:, :2].max() - boxes[:, :2].min() + boxes[:, 2:].max() + 1
+        shifted = boxes.copy()
+        shifted[:, :2] += class_ids[:, None] * offset
+        idxs = cv2.dnn.NMSBoxes(shifted.tolist(), score_list, score_threshold, nms_threshold)
+    return np.asarray(idxs, dtype=np.int64).reshape(-1)
@@ -0,0 +1,29 @@
+# tests/conftest.py
+# 共用的 fixture。数据库相关的测试使用 SQLite 替身 (db/sqlite_pool.py)，不需要 MySQL。
+
+from contextlib import asynccontextmanager
+
+import pytest
+
+from db import database, sqlite_pool
+
+
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    """
+    返回一个 async 上下文管理器：在当前事件循环中创建 SQLite 替身连接池并设为 database.db_pool，
+    用法 async with sqlite_db() as pool: ...（连接池绑定事件循环，需在 asyncio.run 内部创建）
+    """
+    path = str(tmp_path / "fatigue.sqlite3")
+
+    @asynccontextmanager
+    async def open_db():
+        pool = await sqlite_pool.create_pool(path)
+        monkeypatch.setattr(database, "db_pool", pool)
+        try:
+            yield pool
+        finally:
+            pool.close()
+            await pool.wait_closed()
+
+    return open_db
@@ -0,0 +1,163 @@
+# tests/test_cache.py
+# services/cache.py 的读穿透缓存（失效、并发未命中合并、后端出错）与 db/user_cache.py 的缓存范围。
+
+import asyncio
+
+import pytest
+
+from db import user_cache
+from services.cache import MemoryBackend, ReadThroughCache
+
+
+class Loader:
+    """记录调用次数的 loader，release 之前一直挂起"""
+
+    def __init__(self, *values):
+        self.values = list(values)
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        return self.values.pop(0)
+
+
+def _released(loader):
+    loader.release.set()
+    return loader
+
+
+class BrokenBackend(MemoryBackend):
+
+    async def get(self, key):
+        raise ConnectionError("cache down")
+
+
+def test_hit_after_load():
+    async def main():
+        cache = ReadThroughCache("t", MemoryBackend(), ttl=60)
+        loader = _released(Loader({"v": 1}))
+        assert await cache.get_or_load("k", loader) == {"v": 1}
+        assert await cache.get_or_load("k", loader) == {"v": 1}
+        assert loader.calls == 1
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    asyncio.run(main())
+
+
+def test_none_is_not_cached():
+    async def main():
+        cache = ReadThroughCache("t", MemoryBackend(), ttl=60)
+        loader = _released(Loader(None, {"v": 1}))
+        assert await cache.get_or_load("k", loader) is None
+        assert await cache.get_or_load("k", loader) == {"v": 1}
+        assert loader.calls == 2
+
+    asyncio.run(main())
+
+
+def test_invalidate_forces_reload():
+    async def main():
+        cache = ReadThroughCache("t", MemoryBackend(), ttl=60)
+        loader = _released(Loader("old", "new"))
+        assert await cache.get_or_load("k", loader) == "old"
+        await cache.invalidate("k", "other")
+        assert await cache.get_or_load("k", loader) == "new"
+        assert loader.calls == 2
+
+    asyncio.run(main())
+
+
+def test_concurrent_misses_are_coalesced():
+    async def main():
+        cache = ReadThroughCache("t", MemoryBackend(), ttl=60)
+        loader = Loader("v")
+        tasks = [asyncio.create_task(cache.get_or_load("k", loader)) for _ in range(5)]
+        await asyncio.sleep(0)
+        loader.release.set()
+        assert await asyncio.gather(*tasks) == ["v"] * 5
+        assert loader.calls == 1
+        assert cache.coalesced == 4
+
+    asyncio.run(main())
+
+
+def test_coalesced_waiters_see_loader_error():
+    async def main():
+        cache = ReadThroughCache("t", MemoryBackend(), ttl=60)
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("db down")
+
+        tasks = [asyncio.create_task(cache.get_or_load("k", failing)) for _ in range(3)]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        # 失败不缓存，下一次重新读库
+        assert await cache.get_or_load("k", _released(Loader("v"))) == "v"
+
+    asyncio.run(main())
+
+
+def test_invalidate_during_load_does_not_backfill_stale_value():
+    async def main():
+        cache = ReadThroughCache("t", MemoryBackend(), ttl=60)
+        stale = Loader("before-write")
+        task = asyncio.create_task(cache.get_or_load("k", stale))
+        await asyncio.sleep(0)
+        # 读库期间发生写入并失效
+        await cache.invalidate("k")
+        stale.release.set()
+        assert await task == "before-write"
+        assert await cache.get_or_load("k", _released(Loader("after-write"))) == "after-write"
+
+    asyncio.run(main())
+
+
+def test_backend_error_falls_back_to_loader():
+    async def main():
+        cache = ReadThroughCache("t", BrokenBackend(), ttl=60)
+        assert await cache.get_or_load("k", _released(Loader("v"))) == "v"
+        assert cache.errors == 1
+
+    asyncio.run(main())
+
+
+def test_disabled_cache_always_loads():
+    async def main():
+        cache = ReadThroughCache("t", MemoryBackend(), ttl=60, enabled=False)
+        loader = _released(Loader("a", "b"))
+        assert await cache.get_or_load("k", loader) == "a"
+        assert await cache.get_or_load("k", loader) == "b"
+
+    asyncio.run(main())
+
+
+@pytest.fixture
+def users_cache(monkeypatch):
+    backend = MemoryBackend()
+    monkeypatch.setattr(user_cache, "cache", ReadThroughCache("users", backend, ttl=60))
+    return backend
+
+
+def test_credentials_are_never_cached(sqlite_db, users_cache):
+    async def main():
+        async with sqlite_db() as pool:
+            async with pool.acquire() as conn, conn.cursor() as cursor:
+                await cursor.execute("INSERT INTO users (username, password, role) VALUES ('a', 'old', 'driver')")
+                await cursor.execute("INSERT INTO userinfo (username, age) VALUES ('a', 30)")
+
+            assert (await user_cache.get_login_user("a"))["password"] == "old"
+            profile = await user_cache.get_profile("a")
+            assert profile["age"] == 30 and "password" not in profile
+
+            # 其他进程改了密码、没有失效本进程的缓存：登录仍读到新密码
+            async with pool.acquire() as conn, conn.cursor() as cursor:
+                await cursor.execute("UPDATE users SET password = 'new' WHERE username = 'a'")
+            assert (await user_cache.get_login_user("a"))["password"] == "new"
+
+        assert all("password" not in value for _, value in users_cache._data.values())
+        assert not any(key.startswith("users:user:") for key in users_cache._data)
+
+    asyncio.run(main())
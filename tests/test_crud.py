@@ -0,0 +1,182 @@
+# tests/test_crud.py
+# db/crud.py 的疲劳记录键集分页：(time, id) 相同时间的排序、过滤条件组合、游标校验，
+# 以及 db/migrate.py 对已存在索引的跳过。数据库为 SQLite 替身。
+
+import asyncio
+import base64
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from db import crud, migrate
+from routers import driver
+
+T0 = datetime(2026, 3, 1, 12, 0, 0)
+
+# (username, status, 相对 T0 的秒数)；多行共用同一时间，用 id 区分先后
+ROWS = [
+    ("a", "High", 0), ("b", "Low", 0), ("a", "Medium", 0),
+    ("a", "High", 10), ("b", "High", 10),
+    ("a", "Low", 20),
+    ("b", "Medium", 30), ("a", "High", 30), ("a", "High", 30), ("b", "High", 30),
+    ("a", "Medium", 40),
+]
+
+
+async def _seed(pool):
+    async with pool.acquire() as conn, conn.cursor() as cursor:
+        await cursor.executemany("INSERT INTO fatigue (username, status, time) VALUES (%s, %s, %s)",
+                                 [(u, s, T0 + timedelta(seconds=t)) for u, s, t in ROWS])
+
+
+def _expected(username=None, statuses=None, start=None, end=None):
+    rows = [{"id": i + 1, "username": u, "status": s, "time": T0 + timedelta(seconds=t)}
+            for i, (u, s, t) in enumerate(ROWS)]
+    rows = [r for r in rows
+            if (username is None or r["username"] == username)
+            and (not statuses or r["status"] in statuses)
+            and (start is None or r["time"] >= start)
+            and (end is None or r["time"] <= end)]
+    return sorted(rows, key=lambda r: (r["time"], r["id"]), reverse=True)
+
+
+async def _all_pages(conn, limit, columns=crud.FATIGUE_COLUMNS, **filters):
+    rows, pages, after = [], 0, None
+    while True:
+        page, cursor = await crud.query_fatigue_page(conn, columns, limit, after=after, **filters)
+        rows.extend(page)
+        pages += 1
+        assert len(page) <= limit
+        if cursor is None:
+            return rows, pages
+        assert len(page) == limit
+        after = crud.decode_fatigue_cursor(cursor)
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 4, len(ROWS), len(ROWS) + 5])
+def test_pages_cover_ties_without_gaps_or_duplicates(sqlite_db, limit):
+    async def main():
+        async with sqlite_db() as pool:
+            await _seed(pool)
+            async with pool.acquire() as conn:
+                rows, pages = await _all_pages(conn, limit)
+        assert rows == _expected()
+        # 多取一行判断是否有下一页，最后一页恰好满时不会多出一个空页
+        assert pages == -(-len(ROWS) // limit)
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("filters", [
+    {"username": "a"},
+    {"statuses": ["High"]},
+    {"statuses": ["High", "Medium"], "username": "b"},
+    {"start": T0 + timedelta(seconds=10), "end": T0 + timedelta(seconds=30)},
+    {"username": "a", "statuses": ["High"], "start": T0 + timedelta(seconds=10)},
+    {"end": T0},
+    {"username": "nobody"},
+])
+def test_filter_combinations(sqlite_db, filters):
+    async def main():
+        async with sqlite_db() as pool:
+            await _seed(pool)
+            async with pool.acquire() as conn:
+                rows, _ = await _all_pages(conn, 2, **filters)
+                streamed = [row async for row in crud.stream_fatigue_records(conn, crud.FATIGUE_COLUMNS,
+                                                                            chunk_size=3, **filters)]
+        assert rows == _expected(**filters)
+        assert streamed == rows
+
+    asyncio.run(main())
+
+
+def test_projection_and_stream_limit(sqlite_db):
+    async def main():
+        async with sqlite_db() as pool:
+            await _seed(pool)
+            async with pool.acquire() as conn:
+                page, cursor = await crud.query_fatigue_page(conn, ["status"], 3)
+                streamed = [row async for row in crud.stream_fatigue_records(conn, ["username"], limit=4)]
+        assert page == [{"status": r["status"]} for r in _expected()[:3]]
+        # 游标仍由 (time, id) 生成，即使没有投影这两列
+        assert crud.decode_fatigue_cursor(cursor) == (_expected()[2]["time"], _expected()[2]["id"])
+        assert streamed == [{"username": r["username"]} for r in _expected()[:4]]
+
+    asyncio.run(main())
+
+
+def test_build_query_rejects_unknown_columns():
+    with pytest.raises(ValueError):
+        crud.build_fatigue_query(["id", "password"])
+
+
+def test_cursor_round_trip():
+    row = {"time": datetime(2026, 3, 1, 12, 0, 30, 123456), "id": 42}
+    cursor = crud.encode_fatigue_cursor(row)
+    assert "=" not in cursor
+    assert crud.decode_fatigue_cursor(cursor) == (row["time"], 42)
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not base64!",
+    _b64(b"2026-03-01T12:00:00"),        # 没有 id
+    _b64(b"2026-03-01T12:00:00|abc"),    # id 不是整数
+    _b64(b"yesterday|42"),               # 时间无法解析
+    _b64(b"\xff\xfe|42"),                # 不是 UTF-8
+    crud.encode_fatigue_cursor({"time": T0, "id": 1})[:-3],  # 被截断
+])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        crud.decode_fatigue_cursor(cursor)
+
+
+def test_endpoint_returns_422_for_tampered_cursor():
+    app = FastAPI()
+    app.include_router(driver.router)
+    with TestClient(app) as client:
+        response = client.get("/fatigue", params={"cursor": _b64(b"2026-03-01T12:00:00|abc")})
+    assert response.status_code == 422
+
+
+class FakeCursor:
+    """记录执行的语句；information_schema 查询按 existing 返回"""
+
+    def __init__(self, existing):
+        self.existing = set(existing)
+        self.executed = []
+        self._row = None
+
+    async def execute(self, query, args=None):
+        if "information_schema" in query:
+            self._row = (1,) if tuple(args) in self.existing else None
+            return
+        self.executed.append(query)
+
+    async def fetchone(self):
+        return self._row
+
+
+def test_migration_skips_existing_indexes():
+    statements = dict(migrate.load_migrations())["002_fatigue_username_time_index"]
+    assert [migrate.created_index(s) for s in statements] == [
+        ("fatigue", "idx_fatigue_username_time"), ("fatigue", "idx_fatigue_time")]
+
+    async def main():
+        # 上次执行到一半：第一个索引已建好
+        cursor = FakeCursor({("fatigue", "idx_fatigue_username_time")})
+        results = [await migrate.run_statement(cursor, s) for s in statements]
+        assert results == [False, True]
+        assert cursor.executed == [statements[1]]
+
+        cursor = FakeCursor(())
+        await migrate.run_statement(cursor, "CREATE TABLE IF NOT EXISTS t (id INT)")
+        assert cursor.executed == ["CREATE TABLE IF NOT EXISTS t (id INT)"]
+
+    asyncio.run(main())
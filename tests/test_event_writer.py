@@ -0,0 +1,179 @@
+# tests/test_event_writer.py
+# db/event_writer.py：数据库不可用时落盘，恢复后补写（不重复、不丢失），落盘文件中的坏行隔离到 .bad。
+# 数据库为 SQLite 替身，pool_getter 返回 None 即模拟数据库不可用。
+
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+
+from db.event_writer import FatigueEventWriter, _to_line
+from entity.schemas import FatigueCreate
+
+T0 = datetime(2026, 1, 1, 8, 0, 0)
+
+
+def _event(i: int) -> FatigueCreate:
+    return FatigueCreate(username=f"driver{i % 3}", status="High", event_time=T0 + timedelta(seconds=i))
+
+
+class Switch:
+    """pool_getter：down=True 时数据库不可用；fail_after 次调用后自动变为不可用"""
+
+    def __init__(self, pool=None, fail_after=None):
+        self.pool = pool
+        self.down = pool is None
+        self.fail_after = fail_after
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.fail_after is not None and self.calls > self.fail_after:
+            return None
+        return None if self.down else self.pool
+
+
+async def _rows(pool):
+    async with pool.acquire() as conn, conn.cursor() as cursor:
+        await cursor.execute("SELECT username, status, time FROM fatigue ORDER BY time")
+        return [(row[0], row[1], row[2]) for row in await cursor.fetchall()]
+
+
+def _expected(events):
+    return [(e.username, e.status, e.event_time) for e in events]
+
+
+def _spilled(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["event_time"] for line in f]
+
+
+def test_spills_when_database_is_down(tmp_path):
+    spill = str(tmp_path / "spill.jsonl")
+
+    async def main():
+        writer = FatigueEventWriter(Switch(), batch_size=2, max_buffered=3, spill_path=spill)
+        events = [_event(i) for i in range(5)]
+        for event in events:
+            writer.enqueue(event)
+        # 超出 max_buffered 的最旧事件立即落盘
+        assert _spilled(spill) == [e.event_time.isoformat() for e in events[:2]]
+
+        assert await writer.flush(drain=True) is False
+        assert writer.stats()["queue_depth"] == 3
+        assert writer.failed_flushes == 1
+
+        # 关闭时仍写不进去：剩余事件按顺序全部落盘
+        await writer.stop()
+        assert _spilled(spill) == [e.event_time.isoformat() for e in events]
+        assert writer.spilled == 5
+        assert writer.stats()["queue_depth"] == 0
+
+    asyncio.run(main())
+
+
+def test_replay_after_recovery_without_duplicates_or_loss(tmp_path, sqlite_db):
+    spill = str(tmp_path / "spill.jsonl")
+
+    async def main():
+        async with sqlite_db() as pool:
+            switch = Switch()
+            writer = FatigueEventWriter(switch, batch_size=2, max_buffered=2, spill_path=spill)
+            events = [_event(i) for i in range(7)]
+            for event in events:
+                writer.enqueue(event)
+            await writer.stop()  # 5 条溢出 + 2 条关闭时落盘
+
+            # 数据库恢复，但补写第二批时再次断开：已写入的部分从 .replay 文件中去掉
+            switch.pool, switch.down, switch.fail_after = pool, False, switch.calls + 1
+            writer = FatigueEventWriter(switch, batch_size=2, spill_path=spill)
+            await writer._replay_spill()
+            assert await _rows(pool) == _expected(events[:2])
+            assert writer.replayed == 2
+            assert os.path.exists(spill + ".replay")
+
+            # 断开期间又落盘了新事件，恢复后两个文件都补写
+            late = _event(100)
+            writer._spill([late])
+            switch.fail_after = None
+            await writer._replay_spill()
+            await writer._replay_spill()
+            assert await _rows(pool) == _expected(events + [late])
+            assert not os.path.exists(spill) and not os.path.exists(spill + ".replay")
+            assert writer.replayed == 8
+
+            # 再补写一次不会重复
+            await writer._replay_spill()
+            assert len(await _rows(pool)) == 8
+
+    asyncio.run(main())
+
+
+def test_corrupt_spill_line_is_quarantined_and_writer_keeps_running(tmp_path, sqlite_db):
+    spill = str(tmp_path / "spill.jsonl")
+    good = [_event(1), _event(2), _event(3)]
+    torn = _to_line(_event(4))[:20] + "\n"
+    with open(spill, "w", encoding="utf-8") as f:
+        f.write(_to_line(good[0]) + torn + _to_line(good[1]) + '{"username": "x"}\n' + _to_line(good[2]))
+
+    async def main():
+        async with sqlite_db() as pool:
+            writer = FatigueEventWriter(lambda: pool, batch_size=10, flush_interval=0.01, spill_path=spill)
+            await writer.start()
+            try:
+                for _ in range(200):
+                    if writer.replayed:
+                        break
+                    await asyncio.sleep(0.01)
+                assert await _rows(pool) == _expected(good)
+                assert writer.stats()["bad_spill_lines"] == 2
+                with open(spill + ".replay.bad", encoding="utf-8") as f:
+                    assert f.read() == torn + '{"username": "x"}\n'
+
+                # 写入协程仍在运行，之后的事件照常写库
+                assert not writer._task.done()
+                writer.enqueue(_event(5))
+                for _ in range(200):
+                    if writer.written == 1:
+                        break
+                    await asyncio.sleep(0.01)
+                assert len(await _rows(pool)) == 4
+            finally:
+                await writer.stop()
+
+    asyncio.run(main())
+
+
+def test_unexpected_error_does_not_stop_run_loop(tmp_path, sqlite_db, monkeypatch):
+    async def main():
+        async with sqlite_db() as pool:
+            writer = FatigueEventWriter(lambda: pool, flush_interval=0.01, spill_path=str(tmp_path / "spill.jsonl"))
+            calls = []
+
+            async def broken_replay():
+                calls.append(1)
+                if len(calls) == 1:
+                    raise OSError("disk gone")
+
+            monkeypatch.setattr(writer, "_replay_spill", broken_replay)
+            await writer.start()
+            try:
+                for _ in range(200):
+                    if len(calls) >= 2:
+                        break
+                    await asyncio.sleep(0.01)
+                assert len(calls) >= 2
+                assert not writer._task.done()
+            finally:
+                await writer.stop()
+
+    asyncio.run(main())
+
+
+def test_spill_disk_error_is_counted_not_raised(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    writer = FatigueEventWriter(Switch(), spill_path=str(blocker / "spill.jsonl"))
+    writer._spill([_event(1), _event(2)])
+    assert writer.stats()["spill_errors"] == 2
+    assert writer.spilled == 0
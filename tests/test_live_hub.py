@@ -0,0 +1,225 @@
+# tests/test_live_hub.py
+# services/live_hub.py：待发送表按 (驾驶员, 事件类型) 合并、超出 max_pending 时淘汰最旧的一条、
+# min_interval 限流、按驾驶员 / 分组过滤、snapshot，以及驾驶员连接数的计数。
+
+import asyncio
+import threading
+
+from services.live_hub import LiveEvent, LiveHub, Subscription
+
+
+def _state(username, state, ts=0.0):
+    return LiveEvent("state", username, state=state, previous="Low", since=ts, ts=ts)
+
+
+def _keys(batch):
+    return [(event["username"], event["type"]) for event in batch]
+
+
+async def _batch(subscription, timeout=1.0):
+    return await asyncio.wait_for(subscription.next_batch(), timeout)
+
+
+# ---------------- Subscription ----------------
+
+def test_offer_coalesces_per_driver_and_type():
+    async def main():
+        subscription = Subscription(None, None, max_pending=10, min_interval=0.0)
+        assert subscription.offer(_state("a", "Medium", 1.0)) is None
+        assert subscription.offer(LiveEvent("high", "a", ts=2.0)) is None
+        assert subscription.offer(_state("b", "Low", 3.0)) is None
+        assert subscription.offer(_state("a", "High", 4.0)) == "coalesced"
+
+        batch = await _batch(subscription)
+        # 合并后只保留最新的一条，并移到末尾
+        assert _keys(batch) == [("a", "high"), ("b", "state"), ("a", "state")]
+        assert batch[-1]["state"] == "High" and batch[-1]["since"] == 4.0
+        assert subscription.stats()["coalesced"] == 1
+        assert subscription.delivered == 3
+
+    asyncio.run(main())
+
+
+def test_offer_evicts_oldest_when_full():
+    async def main():
+        subscription = Subscription(None, None, max_pending=3, min_interval=0.0)
+        outcomes = [subscription.offer(_state(name, "High")) for name in "abcde"]
+        assert outcomes == [None, None, None, "evicted", "evicted"]
+        # 已在表中的键只合并，不淘汰
+        assert subscription.offer(_state("e", "Low")) == "coalesced"
+        assert subscription.stats()["pending"] == 3
+        assert _keys(await _batch(subscription)) == [("c", "state"), ("d", "state"), ("e", "state")]
+        assert subscription.evicted == 2
+
+    asyncio.run(main())
+
+
+def test_next_batch_is_throttled_and_coalesces_meanwhile():
+    async def main():
+        loop = asyncio.get_running_loop()
+        subscription = Subscription(None, None, max_pending=10, min_interval=0.2)
+        subscription.offer(_state("a", "Low"))
+        began = loop.time()
+        assert _keys(await _batch(subscription)) == [("a", "state")]
+        assert loop.time() - began < 0.1
+
+        # 限流等待期间到达的事件继续合并
+        waiter = asyncio.create_task(subscription.next_batch())
+        subscription.offer(_state("a", "Medium"))
+        await asyncio.sleep(0.05)
+        subscription.offer(_state("a", "High"))
+        batch = await asyncio.wait_for(waiter, 1.0)
+        assert loop.time() - began >= 0.2
+        assert [event["state"] for event in batch] == ["High"]
+
+        # 超过 min_interval 之后立即推送
+        await asyncio.sleep(0.25)
+        subscription.offer(_state("b", "Low"))
+        began = loop.time()
+        await _batch(subscription)
+        assert loop.time() - began < 0.1
+
+    asyncio.run(main())
+
+
+# ---------------- LiveHub ----------------
+
+def test_hub_filters_by_driver_and_group():
+    groups = {"a": "north", "b": "south", "c": "north"}
+    lookups = []
+
+    async def resolve(username):
+        lookups.append(username)
+        return groups.get(username)
+
+    async def main():
+        hub = LiveHub(min_interval=0.0, resolve_group=resolve)
+        await hub.start()
+        try:
+            everyone = hub.subscribe()
+            only_b = hub.subscribe(drivers=["b"])
+            north = hub.subscribe(group="north")
+            north_c = hub.subscribe(drivers=["b", "c"], group="north")
+            for username in "abcd":
+                hub.publish(_state(username, "High"))
+
+            assert [e["username"] for e in await _batch(everyone)] == list("abcd")
+            assert [e["username"] for e in await _batch(only_b)] == ["b"]
+            assert [e["username"] for e in await _batch(north)] == ["a", "c"]
+            assert [e["username"] for e in await _batch(north_c)] == ["c"]
+
+            # 分组查询结果在 group_ttl 内缓存
+            hub.publish(LiveEvent("high", "a", ts=1.0))
+            assert _keys(await _batch(north)) == [("a", "high")]
+            assert sorted(lookups) == list("abcd")
+
+            assert sorted(d["username"] for d in await hub.snapshot(north)) == ["a", "c"]
+            assert [d["username"] for d in await hub.snapshot(only_b)] == ["b"]
+
+            hub.unsubscribe(everyone)
+            hub.unsubscribe(everyone)
+            assert len(hub.stats()["subscribers"]) == 3 and everyone.closed
+        finally:
+            await hub.stop()
+
+    asyncio.run(main())
+
+
+def test_hub_coalesces_for_slow_subscriber():
+    async def main():
+        hub = LiveHub(min_interval=0.05, max_pending=2)
+        assert hub.subscribe(min_interval=0.01).min_interval == 0.05
+        await hub.start()
+        try:
+            subscription = hub.subscribe(min_interval=0.3)
+            assert subscription.min_interval == 0.3
+
+            # 推理线程连续发布：同一驾驶员的状态只保留最新，超出 max_pending 的驾驶员被淘汰
+            def produce():
+                for i, state in enumerate(["Low", "Medium", "High"] * 5):
+                    hub.publish(_state("a", state, ts=float(i)))
+                hub.publish(_state("b", "Low"))
+                hub.publish(_state("c", "Low"))
+            thread = threading.Thread(target=produce)
+            thread.start()
+            thread.join()
+
+            batch = await _batch(subscription)
+            assert _keys(batch) == [("b", "state"), ("c", "state")]
+            stats = subscription.stats()
+            assert stats["coalesced"] == 14 and stats["evicted"] == 1
+            # snapshot 不受订阅者待发送表的影响
+            snapshot = {d["username"]: d["state"] for d in await hub.snapshot(subscription)}
+            assert snapshot == {"a": "High", "b": "Low", "c": "Low"}
+            assert hub.stats()["published"] == 17
+        finally:
+            await hub.stop()
+
+    asyncio.run(main())
+
+
+def test_publish_drops_oldest_when_queue_is_full():
+    hub = LiveHub(max_queued=3)
+    for username in "abcde":
+        hub.publish(_state(username, "Low"))
+    stats = hub.stats()
+    assert stats["queued"] == 3 and stats["dropped"] == 2 and stats["published"] == 5
+    assert [event.username for event in hub._queue] == list("cde")
+
+
+def test_relay_bypasses_queue():
+    hub = LiveHub()
+    relayed = []
+    hub.relay = relayed.append
+    hub.publish(_state("a", "High"))
+    assert [event.username for event in relayed] == ["a"]
+    assert hub.stats()["queued"] == 0
+
+
+def test_connect_and_disconnect_are_counted():
+    hub = LiveHub()
+    published = []
+    hub.publish = published.append
+
+    hub.connect("a")
+    hub.connect("a")
+    hub.connect("b")
+    assert hub.connections() == 3
+    assert [(e.type, e.username) for e in published] == [("online", "a"), ("online", "b")]
+
+    # 同一驾驶员还有连接时不发布 offline
+    hub.disconnect("a")
+    assert hub.connections() == 2 and len(published) == 2
+    hub.disconnect("a")
+    hub.disconnect("b")
+    assert hub.connections() == 0
+    assert [(e.type, e.username) for e in published[2:]] == [("offline", "a"), ("offline", "b")]
+
+    # 多余的 disconnect 不重复发布 offline，计数不会变成负数
+    hub.disconnect("a")
+    hub.disconnect("nobody")
+    assert hub.connections() == 0 and len(published) == 4
+
+    hub.connect("a")
+    assert published[-1].type == "online"
+
+
+def test_online_state_in_snapshot():
+    async def main():
+        hub = LiveHub(min_interval=0.0)
+        await hub.start()
+        try:
+            subscription = hub.subscribe()
+            hub.connect("a")
+            hub.connect("b")
+            hub.publish(_state("a", "Medium", ts=5.0))
+            hub.disconnect("b")
+            assert _keys(await _batch(subscription)) == [
+                ("a", "online"), ("b", "online"), ("a", "state"), ("b", "offline")]
+            snapshot = {d["username"]: d for d in await hub.snapshot(subscription)}
+            assert snapshot["a"]["online"] and snapshot["a"]["state"] == "Medium" and snapshot["a"]["since"] == 5.0
+            assert not snapshot["b"]["online"]
+        finally:
+            await hub.stop()
+
+    asyncio.run(main())
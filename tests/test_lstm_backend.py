@@ -0,0 +1,99 @@
+# tests/test_lstm_backend.py
+# services/lstm_backend.py 的推理后端与 model.predict 的一致性。用一个很小的合成 LSTM 模型，
+# 不依赖仓库里的模型文件；没有安装 TensorFlow 时跳过。三个真实模型的校验见 python -m bench.lstm_parity。
+
+import os
+
+import numpy as np
+import pytest
+
+from services.lstm_backend import (KerasFunctionBackend, TFLiteBackend, create_backend, load_backend,
+                                   model_fingerprint, stack_windows)
+
+INPUT_DIM = 10
+
+
+@pytest.fixture(scope="module")
+def tf():
+    return pytest.importorskip("tensorflow")
+
+
+@pytest.fixture(scope="module")
+def model(tf):
+    tf.keras.utils.set_random_seed(0)
+    model = tf.keras.Sequential([
+        tf.keras.Input(shape=(1, INPUT_DIM)),
+        tf.keras.layers.LSTM(8),
+        tf.keras.layers.Dense(3, activation="softmax"),
+    ])
+    return model
+
+
+@pytest.fixture(scope="module")
+def windows():
+    # 与线上一致：每个元素是 5 帧内的计数 0~5，第一条为全零窗口
+    rng = np.random.default_rng(0)
+    windows = rng.integers(0, 6, size=(32, 1, INPUT_DIM)).astype(np.float32)
+    windows[0] = 0.0
+    return windows
+
+
+def _expected(model, windows):
+    return np.concatenate([model.predict(w[None], verbose=0) for w in windows], axis=0)
+
+
+@pytest.mark.parametrize("kind,atol", [("function", 1e-6), ("tflite", 1e-5)])
+def test_single_sample_matches_model_predict(model, windows, kind, atol):
+    backend = create_backend(kind, model, INPUT_DIM)
+    actual = np.concatenate([backend.predict(w[None]) for w in windows], axis=0)
+    np.testing.assert_allclose(actual, _expected(model, windows), rtol=0, atol=atol)
+
+
+@pytest.mark.parametrize("kind", ["function", "tflite"])
+def test_batch_matches_model_predict(model, windows, kind):
+    backend = create_backend(kind, model, INPUT_DIM)
+    expected = _expected(model, windows)
+    actual = backend.predict(windows)
+    assert actual.shape == expected.shape
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=1e-5)
+    np.testing.assert_array_equal(np.argmax(actual, axis=-1), np.argmax(expected, axis=-1))
+    # 批大小变化后（TFLite 需要重新分配张量）结果不变
+    np.testing.assert_allclose(backend.predict(windows[:3]), expected[:3], rtol=0, atol=1e-5)
+
+
+@pytest.mark.parametrize("backend_cls", [KerasFunctionBackend, TFLiteBackend])
+def test_saved_backend_matches_original(model, windows, tmp_path, backend_cls):
+    backend = backend_cls(model, INPUT_DIM)
+    path = str(tmp_path / f"backend{backend_cls.cache_suffix}")
+    backend.save(path)
+    loaded = backend_cls.load(path, INPUT_DIM)
+    np.testing.assert_allclose(loaded.predict(windows), backend.predict(windows), rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize("kind", ["function", "tflite"])
+def test_load_backend_uses_disk_cache(model, windows, tmp_path, kind):
+    # 与仓库中的模型一样保存为 SavedModel 目录
+    model_dir = str(tmp_path / "model")
+    model.save(model_dir)
+    cache_dir = str(tmp_path / "cache")
+    first = load_backend(kind, model_dir, INPUT_DIM, cache_dir)
+    second = load_backend(kind, model_dir, INPUT_DIM, cache_dir)
+    assert not first.from_cache and second.from_cache
+    np.testing.assert_allclose(second.predict(windows), first.predict(windows), rtol=0, atol=1e-6)
+
+
+def test_stack_windows():
+    windows = [np.full((1, 1, 4), i) for i in range(3)]
+    batch = stack_windows(windows)
+    assert batch.shape == (3, 1, 4) and batch.dtype == np.float32
+    np.testing.assert_array_equal(batch[:, 0, 0], [0, 1, 2])
+
+
+def test_model_fingerprint_changes_with_files(tmp_path):
+    (tmp_path / "saved_model.pb").write_bytes(b"a")
+    before = model_fingerprint(str(tmp_path), "function", 6)
+    assert model_fingerprint(str(tmp_path), "function", 6) == before
+    assert model_fingerprint(str(tmp_path), "tflite", 6) != before
+    (tmp_path / "saved_model.pb").write_bytes(b"ab")
+    os.utime(tmp_path / "saved_model.pb", (0, 0))
+    assert model_fingerprint(str(tmp_path), "function", 6) != before
@@ -0,0 +1,110 @@
+# tests/test_prediction_cache.py
+# services/prediction_cache.py 的查表 / 缓存逻辑。模型换成确定性的 numpy 函数，只校验下标顺序和回退路径；
+# 与真实模型的逐位一致性仍由 python -m bench.prediction_cache_parity 校验。
+
+import numpy as np
+import pytest
+
+from services.model_registry import ModelRegistry
+from services.prediction_cache import EyeLookupTable, PredictionLRU, all_windows, pack_window
+
+
+class FakeBackend:
+    """确定性的假 LSTM 后端：输出只取决于窗口本身，只用逐元素运算，与批大小无关"""
+
+    def __init__(self, input_dim: int):
+        self.input_dim = input_dim
+        self.calls = []
+        self._weights = np.arange(1, input_dim + 1, dtype=np.float32)
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        values = np.asarray(batch, dtype=np.float32).reshape(-1, self.input_dim)
+        self.calls.append(values.copy())
+        weighted = values * self._weights
+        return np.stack([np.sin(weighted).sum(axis=1), np.cos(weighted).sum(axis=1)], axis=1).astype(np.float32)
+
+
+@pytest.fixture(scope="module")
+def eye_table():
+    backend = FakeBackend(6)
+    table = EyeLookupTable(backend, EyeLookupTable.build(backend, batch_size=4096))
+    backend.calls.clear()
+    return table
+
+
+def test_table_rows_follow_all_windows(eye_table):
+    windows = all_windows(6)
+    assert len(eye_table.table) == len(windows) == 6 ** 6
+    np.testing.assert_array_equal(eye_table.table, FakeBackend(6).predict(windows))
+
+
+def test_single_lookup_matches_model(eye_table):
+    windows = all_windows(6)
+    reference = FakeBackend(6)
+    for index in (0, 1, 5, 6, 7, 215, 7776, 23333, len(windows) - 1):
+        window = windows[index:index + 1]
+        np.testing.assert_array_equal(eye_table.predict(window), reference.predict(window))
+    assert eye_table.backend.calls == []
+
+
+def test_batched_lookup_matches_model(eye_table):
+    windows = all_windows(6)
+    rng = np.random.default_rng(0)
+    batch = windows[rng.choice(len(windows), size=512, replace=False)]
+    np.testing.assert_array_equal(eye_table.predict(batch), FakeBackend(6).predict(batch))
+    assert eye_table.backend.calls == []
+
+
+def test_invalid_windows_fall_back_to_model(eye_table):
+    valid = [[0, 1, 2, 3, 4, 5], [5, 5, 5, 5, 5, 5]]
+    invalid = [[0, 0, 0, 0, 0, 2.5], [6, 0, 0, 0, 0, 0], [-1, 0, 0, 0, 0, 0]]
+    batch = np.asarray([valid[0], invalid[0], valid[1], invalid[1], invalid[2]], dtype=np.float32)[:, None, :]
+    before = eye_table.stats()
+
+    output = eye_table.predict(batch)
+
+    np.testing.assert_array_equal(output, FakeBackend(6).predict(batch))
+    # 只有无法查表的窗口交给模型
+    assert len(eye_table.backend.calls) == 1
+    np.testing.assert_array_equal(eye_table.backend.calls[0], np.asarray(invalid, dtype=np.float32))
+    eye_table.backend.calls.clear()
+    stats = eye_table.stats()
+    assert stats["hits"] - before["hits"] == 2
+    assert stats["fallbacks"] - before["fallbacks"] == 3
+
+
+@pytest.mark.parametrize("value", [256, -1, 0.5, np.nan])
+def test_pack_window_rejects_unpackable_values(value):
+    assert pack_window(np.asarray([0, 1, value], dtype=np.float32)) is None
+    assert pack_window([0, 1, value]) is None
+
+
+def test_pack_window_keys_distinct_windows():
+    windows = all_windows(3)
+    keys = {pack_window(window) for window in windows}
+    assert len(keys) == len(windows)
+    assert pack_window(np.asarray([[[0, 5, 255]]], dtype=np.float32)) == bytes([0, 5, 255])
+
+
+def test_predict_cached_matches_uncached_call(monkeypatch):
+    from routers import fatigue_api
+
+    backend = FakeBackend(10)
+    registry = ModelRegistry(max_workers=1)
+    registry.register("yawn", lambda: backend)
+    assert registry.load_all(timeout=10)
+    monkeypatch.setattr(fatigue_api, "models", registry)
+    monkeypatch.setattr(fatigue_api.settings, "LSTM_BATCH_ENABLED", False)
+    monkeypatch.setitem(fatigue_api.prediction_caches, "yawn", PredictionLRU("yawn", 16))
+    window = np.asarray([0, 1, 0, 2, 0, 0, 3, 0, 5, 0], dtype=np.float32).reshape(1, 1, 10)
+
+    uncached = fatigue_api._predict_lstm("yawn", window)
+    first = fatigue_api._predict_cached("yawn", window)
+    second = fatigue_api._predict_cached("yawn", window)
+
+    np.testing.assert_array_equal(first, uncached)
+    np.testing.assert_array_equal(second, uncached)
+    assert first.dtype == second.dtype == uncached.dtype
+    # 第二次命中缓存，不再调用模型
+    assert len(backend.calls) == 2
+    assert fatigue_api.prediction_caches["yawn"].stats()["hits"] == 1
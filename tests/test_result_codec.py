@@ -0,0 +1,186 @@
+# tests/test_result_codec.py
+# services/result_codec.py：按客户端的方式解码 delta 流能还原每一帧的完整结果，
+# 紧凑结构中的类别 id 能通过 CLASS_LABELS 还原，orjson / msgpack 未安装时的协商与报错。
+
+import json
+import sys
+
+import numpy as np
+import pytest
+
+from routers.fatigue_api import CLASS_LABELS
+from services import result_codec
+from services.result_codec import LEVELS, EncodingUnavailable, ResultEncoder, negotiate
+
+
+def _result(level="Low", eye=False, yawn=False, duration=0.0, boxes=(), seq=None):
+    result = {"fatigue_level": level, "eye_closure": eye, "yawn_detected": yawn,
+              "current_state_duration": duration, "detection_boxes": list(boxes)}
+    if seq is not None:
+        result["seq"] = seq
+    return result
+
+
+def _box(label, confidence, x, y, w=40, h=30):
+    return {"class": label, "confidence": confidence, "box": [x, y, w, h]}
+
+
+def _stream(n=60, seed=0):
+    """状态和检测框时而不变、时而变化的结果序列"""
+    rng = np.random.default_rng(seed)
+    results, level, boxes, since = [], "Initializing", [], 0.0
+    for i in range(n):
+        if rng.random() < 0.2:
+            level = LEVELS[int(rng.integers(len(LEVELS)))]
+            since = i * 0.1
+        if rng.random() < 0.3:
+            boxes = [_box(CLASS_LABELS[int(rng.integers(len(CLASS_LABELS)))], round(float(rng.random()), 3),
+                          int(rng.integers(0, 600)), int(rng.integers(0, 400)))
+                     for _ in range(int(rng.integers(0, 3)))]
+        results.append(_result(level, level == "High", level == "Medium", round(i * 0.1 - since, 2), boxes, seq=i))
+    return results
+
+
+def _loads(encoding, payload):
+    if encoding == "msgpack":
+        import msgpack
+        return msgpack.unpackb(payload, raw=False)
+    assert isinstance(payload, str)
+    return json.loads(payload)
+
+
+def _unpack_boxes(packed, labels):
+    return [{"class": labels[packed[i]], "confidence": packed[i + 1] / 1000, "box": packed[i + 2:i + 6]}
+            for i in range(0, len(packed), 6)]
+
+
+class DeltaClient:
+    """客户端的做法：记住最近一次收到的 f/e/y/t 和 b，缺失的字段沿用上一次的值"""
+
+    def __init__(self):
+        self.state = None
+        self.boxes = None
+        self.levels = None
+        self.labels = None
+
+    def receive(self, message):
+        if "levels" in message:
+            self.levels, self.labels = list(message["levels"]), message["labels"]
+        if "f" in message:
+            self.state = (message["f"], message["e"], message["y"], message["t"])
+        if "b" in message:
+            self.boxes = message["b"]
+        f, e, y, t = self.state
+        return {"fatigue_level": self.levels[f], "eye_closure": bool(e), "yawn_detected": bool(y),
+                "state_since": t, "detection_boxes": _unpack_boxes(self.boxes, self.labels),
+                "seq": message["seq"]}
+
+
+@pytest.mark.parametrize("encoding", ["json", "orjson", "msgpack"])
+def test_delta_stream_rebuilds_every_result(encoding):
+    if encoding != "json":
+        pytest.importorskip(encoding)
+    encoder = ResultEncoder(encoding, delta=True, labels=CLASS_LABELS, header=True)
+    client = DeltaClient()
+    results = _stream()
+    sizes, state_since = [], None
+    for result in results:
+        message = _loads(encoding, encoder.encode(result))
+        rebuilt = client.receive(message)
+        sizes.append(len(message))
+        # t 只在状态变化时发送，为变化时刻的持续时间
+        if "f" in message:
+            state_since = result["current_state_duration"]
+        assert rebuilt == {
+            "fatigue_level": result["fatigue_level"],
+            "eye_closure": result["eye_closure"],
+            "yawn_detected": result["yawn_detected"],
+            "state_since": state_since,
+            "detection_boxes": [{"class": b["class"], "confidence": b["confidence"], "box": b["box"]}
+                                for b in result["detection_boxes"]],
+            "seq": result["seq"],
+        }
+    # 状态和检测框都没变时只回 seq
+    assert min(sizes) == 1
+
+
+def test_delta_sends_empty_boxes_once_when_they_disappear():
+    encoder = ResultEncoder(delta=True, labels=CLASS_LABELS)
+    boxes = [_box(CLASS_LABELS[0], 0.9, 1, 2)]
+    messages = [json.loads(encoder.encode(_result(boxes=b))) for b in (boxes, boxes, (), ())]
+    assert [m.get("b") for m in messages] == [[0, 900, 1, 2, 40, 30], None, [], None]
+    assert "f" in messages[0] and all("f" not in m for m in messages[1:])
+
+
+def test_compact_label_ids_map_back_through_class_labels():
+    boxes = [_box(label, 0.5 + i / 10, 10 * i, 20 * i) for i, label in enumerate(CLASS_LABELS)]
+    encoder = ResultEncoder(compact=True, labels=CLASS_LABELS, header=True)
+    message = json.loads(encoder.encode(_result("High", True, False, 3.14159, boxes)))
+    assert message["labels"] == CLASS_LABELS
+    assert LEVELS[message["f"]] == "High" and message["t"] == 3.14
+    assert [CLASS_LABELS[i] for i in message["b"][0::6]] == CLASS_LABELS
+    assert _unpack_boxes(message["b"], CLASS_LABELS) == [
+        {"class": b["class"], "confidence": b["confidence"], "box": b["box"]} for b in boxes]
+    # 表头只在第一条消息中发送
+    assert "labels" not in json.loads(encoder.encode(_result()))
+
+
+def test_unknown_label_is_packed_as_minus_one():
+    label_ids = {label: i for i, label in enumerate(CLASS_LABELS)}
+    packed = result_codec.pack_boxes([_box("steering_wheel", 0.42, 1.7, 2.2)], label_ids)
+    assert packed == [-1, 420, 1, 2, 40, 30]
+
+
+def test_errors_are_not_compacted():
+    encoder = ResultEncoder(delta=True, labels=CLASS_LABELS)
+    assert json.loads(encoder.encode({"error": "bad frame"})) == {"error": "bad frame"}
+
+
+def test_default_json_matches_plain_encoding():
+    result = _result("Medium", boxes=[_box("face", 0.8, 1, 2)], seq=3)
+    assert ResultEncoder().encode(result) == json.dumps(result, separators=(",", ":"), ensure_ascii=False)
+
+
+# ---------------- 协商 ----------------
+
+@pytest.fixture
+def without(monkeypatch):
+    """让指定的包在 import 时抛出 ImportError"""
+    def hide(*names):
+        for name in names:
+            monkeypatch.setitem(sys.modules, name, None)
+    return hide
+
+
+def test_negotiate_prefers_query_parameter():
+    assert negotiate("MsgPack", "application/json") == "msgpack"
+    assert negotiate("orjson", "application/msgpack") == "orjson"
+    assert negotiate(None, None) == "json"
+    assert negotiate(None, "application/json") == "json"
+
+
+def test_negotiate_uses_accept_header_when_msgpack_is_installed():
+    pytest.importorskip("msgpack")
+    assert negotiate(None, "application/x-msgpack, application/json;q=0.5") == "msgpack"
+
+
+def test_negotiate_falls_back_to_json_without_msgpack(without):
+    without("msgpack")
+    assert not result_codec.available("msgpack")
+    assert negotiate(None, "application/msgpack") == "json"
+    assert ResultEncoder(negotiate(None, "application/msgpack")).media_type == "application/json"
+
+
+@pytest.mark.parametrize("encoding", ["orjson", "msgpack"])
+def test_explicit_encoding_without_package_is_rejected(without, encoding):
+    without(encoding)
+    # 显式指定的编码不回退，由调用方返回 406 / 关闭 WebSocket
+    assert negotiate(encoding, "application/msgpack") == encoding
+    with pytest.raises(EncodingUnavailable, match=f"pip install {encoding}"):
+        ResultEncoder(negotiate(encoding))
+
+
+def test_unknown_encoding_is_rejected():
+    assert not result_codec.available("xml")
+    with pytest.raises(EncodingUnavailable):
+        ResultEncoder("xml")
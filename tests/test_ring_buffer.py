@@ -0,0 +1,124 @@
+# tests/test_ring_buffer.py
+# services/ring_buffer.py 的 FeatureRing 与原先 list 实现（append 后取 list[-N:]）逐步对照，
+# 覆盖环绕写入、zero()、clear() 和快照恢复 load()。
+
+import numpy as np
+import pytest
+
+from services.ring_buffer import FeatureRing
+
+
+class ListWindow:
+    """原先 ModelBuffer 中的写法：list.append，推理前截取最近 N 个"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.values = []
+
+    def push(self, value):
+        self.values.append(float(value))
+        self.values = self.values[-self.capacity:]
+
+    def zero(self):
+        if len(self.values) > 0:
+            self.values[:] = [0.0] * len(self.values)
+
+    def clear(self):
+        self.values = []
+
+    def padded(self):
+        # 未写满时 FeatureRing 在前面补 0
+        return [0.0] * (self.capacity - len(self.values)) + self.values
+
+
+def assert_same(ring: FeatureRing, ref: ListWindow):
+    assert len(ring) == len(ref.values)
+    np.testing.assert_array_equal(ring.view(), ref.padded())
+    if len(ref.values) == ref.capacity:
+        np.testing.assert_array_equal(ring.view(), ref.values[-ref.capacity:])
+
+
+@pytest.mark.parametrize("capacity", [1, 2, 5, 12])
+def test_view_matches_list_tail_across_wraparound(capacity):
+    rng = np.random.default_rng(capacity)
+    ring, ref = FeatureRing(capacity), ListWindow(capacity)
+    assert_same(ring, ref)
+    for value in rng.integers(0, 6, size=3 * capacity + 1):
+        ring.push(value)
+        ref.push(value)
+        assert_same(ring, ref)
+
+
+def test_view_is_contiguous_zero_copy():
+    ring = FeatureRing(4)
+    for value in range(7):
+        ring.push(value)
+    view = ring.view()
+    assert view.flags["C_CONTIGUOUS"]
+    assert np.shares_memory(view, ring._data)
+    assert view.dtype == np.float32
+    np.testing.assert_array_equal(view, [3, 4, 5, 6])
+
+
+def test_zero_keeps_length():
+    ring, ref = FeatureRing(5), ListWindow(5)
+    for value in (1, 2, 3):
+        ring.push(value)
+        ref.push(value)
+    ring.zero()
+    ref.zero()
+    assert_same(ring, ref)
+    # 清零后继续写入，旧值不会“复活”
+    for value in range(4, 11):
+        ring.push(value)
+        ref.push(value)
+        assert_same(ring, ref)
+    ring.zero()
+    ref.zero()
+    assert_same(ring, ref)
+    assert len(ring) == 5
+
+
+def test_clear_resets_to_empty():
+    ring, ref = FeatureRing(3), ListWindow(3)
+    for value in range(5):
+        ring.push(value)
+        ref.push(value)
+    ring.clear()
+    ref.clear()
+    assert_same(ring, ref)
+    for value in (7, 8):
+        ring.push(value)
+        ref.push(value)
+        assert_same(ring, ref)
+
+
+@pytest.mark.parametrize("pushes", [0, 2, 4, 9])
+def test_load_round_trip(pushes):
+    original = FeatureRing(4)
+    for value in range(1, pushes + 1):
+        original.push(value)
+
+    restored = FeatureRing(4)
+    restored.load(original.view().copy(), len(original))
+    assert len(restored) == len(original)
+    np.testing.assert_array_equal(restored.view(), original.view())
+    # 恢复后两者继续写入的结果一致（包括再次环绕）
+    for value in range(20, 26):
+        original.push(value)
+        restored.push(value)
+        np.testing.assert_array_equal(restored.view(), original.view())
+        assert len(restored) == len(original)
+
+
+def test_load_clamps_count():
+    ring = FeatureRing(3)
+    ring.load([1, 2, 3], 10)
+    assert len(ring) == 3
+    np.testing.assert_array_equal(ring.view(), [1, 2, 3])
+
+
+def test_nbytes_and_dtype():
+    ring = FeatureRing(10, dtype=np.float64)
+    assert ring.nbytes == 2 * 10 * 8
+    assert ring.view().dtype == np.float64
@@ -0,0 +1,239 @@
+# tests/test_rollup.py
+# db/rollup.py：跨整点 / 跨零点的时长拆分和范围拆分，以及预聚合在 SQLite 替身上的事务语义
+# （回滚后重试只累计一次，分批写入与一次写入结果相同）。
+
+import asyncio
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from db import crud, rollup
+from db.event_writer import FatigueEventWriter
+from db.rollup import DAILY_TABLE, HOURLY_TABLE
+from entity.schemas import FatigueCreate, FatigueStateSpan
+
+D1 = date(2026, 3, 1)
+D2 = date(2026, 3, 2)
+D3 = date(2026, 3, 3)
+
+
+def at(day: date, hour: int, minute: int = 0, second: int = 0) -> datetime:
+    return datetime(day.year, day.month, day.day, hour, minute, second)
+
+
+def _event(when: datetime, username="a", status="High") -> FatigueCreate:
+    return FatigueCreate(username=username, status=status, event_time=when)
+
+
+def _span(start: datetime, end: datetime, username="a", status="High") -> FatigueStateSpan:
+    return FatigueStateSpan(username=username, status=status, start_time=start, end_time=end)
+
+
+def _seconds(deltas):
+    return {bucket: sec for (_, bucket, _), (_, sec) in deltas.items() if sec}
+
+
+# ---------------- rollup_deltas ----------------
+
+def test_span_across_midnight_is_split_by_hour_and_day():
+    deltas = rollup.rollup_deltas([], [_span(at(D1, 23, 50), at(D2, 1, 10))])
+    assert _seconds(deltas[HOURLY_TABLE]) == {
+        at(D1, 23): 600.0, at(D2, 0): 3600.0, at(D2, 1): 600.0}
+    assert _seconds(deltas[DAILY_TABLE]) == {D1: 600.0, D2: 4200.0}
+
+
+def test_span_ending_on_the_hour_does_not_touch_next_bucket():
+    deltas = rollup.rollup_deltas([], [_span(at(D1, 10, 30), at(D1, 11)),
+                                       _span(at(D1, 23), at(D2, 0))])
+    assert _seconds(deltas[HOURLY_TABLE]) == {at(D1, 10): 1800.0, at(D1, 23): 3600.0}
+    assert _seconds(deltas[DAILY_TABLE]) == {D1: 5400.0}
+
+
+def test_span_seconds_are_conserved():
+    start, end = at(D1, 22, 17, 3), at(D3, 2, 41, 59)
+    deltas = rollup.rollup_deltas([], [_span(start, end)])
+    total = (end - start).total_seconds()
+    for table in (HOURLY_TABLE, DAILY_TABLE):
+        assert sum(sec for _, sec in deltas[table].values()) == pytest.approx(total)
+    assert len(deltas[HOURLY_TABLE]) == 29
+    assert set(_seconds(deltas[DAILY_TABLE])) == {D1, D2, D3}
+
+
+def test_empty_span_adds_nothing():
+    deltas = rollup.rollup_deltas([], [_span(at(D1, 9), at(D1, 9))])
+    assert not deltas[HOURLY_TABLE] and not deltas[DAILY_TABLE]
+
+
+def test_events_around_midnight_go_to_separate_buckets():
+    events = [_event(at(D1, 23, 59, 59)), _event(at(D2, 0)), _event(at(D2, 0, 0, 1)),
+              _event(at(D2, 0, 30), status="Low")]
+    deltas = rollup.rollup_deltas(events, [])
+    assert deltas[HOURLY_TABLE] == {
+        ("a", at(D1, 23), "High"): [1, 0.0],
+        ("a", at(D2, 0), "High"): [2, 0.0],
+        ("a", at(D2, 0), "Low"): [1, 0.0],
+    }
+    assert deltas[DAILY_TABLE] == {
+        ("a", D1, "High"): [1, 0.0],
+        ("a", D2, "High"): [2, 0.0],
+        ("a", D2, "Low"): [1, 0.0],
+    }
+
+
+# ---------------- split_range ----------------
+
+@pytest.mark.parametrize("start,end,expected", [
+    # 同一小时内
+    (at(D1, 10, 5), at(D1, 10, 40), [(HOURLY_TABLE, at(D1, 10), at(D1, 11))]),
+    # 跨整点，start 向下取整、end 向上取整
+    (at(D1, 10, 59), at(D1, 11, 1), [(HOURLY_TABLE, at(D1, 10), at(D1, 12))]),
+    # 跨零点但不足一整天：只查小时表
+    (at(D1, 22, 30), at(D2, 1, 15), [(HOURLY_TABLE, at(D1, 22), at(D2, 2))]),
+    # 跨两个零点：首尾查小时表，中间整天查日表
+    (at(D1, 22, 30), at(D3, 1, 15), [(HOURLY_TABLE, at(D1, 22), at(D2, 0)),
+                                      (DAILY_TABLE, D2, D3),
+                                      (HOURLY_TABLE, at(D3, 0), at(D3, 2))]),
+    # 对齐到零点：只查日表
+    (at(D1, 0), at(D3, 0), [(DAILY_TABLE, D1, D3)]),
+    (at(D1, 0), at(D2, 5), [(DAILY_TABLE, D1, D2), (HOURLY_TABLE, at(D2, 0), at(D2, 5))]),
+    (at(D1, 19), at(D3, 0), [(HOURLY_TABLE, at(D1, 19), at(D2, 0)), (DAILY_TABLE, D2, D3)]),
+    # 开区间
+    (None, at(D2, 1, 15), [(DAILY_TABLE, None, D2), (HOURLY_TABLE, at(D2, 0), at(D2, 2))]),
+    (at(D1, 22, 30), None, [(HOURLY_TABLE, at(D1, 22), at(D2, 0)), (DAILY_TABLE, D2, None)]),
+    (None, None, [(DAILY_TABLE, None, None)]),
+    # 空范围
+    (at(D1, 10), at(D1, 10), []),
+    (at(D2, 0), at(D1, 0), []),
+])
+def test_split_range(start, end, expected):
+    assert rollup.split_range(start, end) == expected
+
+
+def test_split_range_parts_are_contiguous():
+    start, end = at(D1, 5, 20), at(D3, 17, 45)
+    parts = rollup.split_range(start, end)
+    bounds = [(lo if isinstance(lo, datetime) else datetime.combine(lo, datetime.min.time()),
+               hi if isinstance(hi, datetime) else datetime.combine(hi, datetime.min.time()))
+              for _, lo, hi in parts]
+    assert bounds[0][0] == rollup.hour_floor(start)
+    assert bounds[-1][1] == rollup.hour_ceil(end)
+    for (_, hi), (lo, _) in zip(bounds, bounds[1:]):
+        assert hi == lo
+
+
+# ---------------- apply_rollups（SQLite 替身） ----------------
+
+async def _table(pool, table):
+    async with pool.acquire() as conn, conn.cursor() as cursor:
+        await cursor.execute(f"SELECT username, bucket, status, events, seconds FROM {table} "
+                             f"ORDER BY username, bucket, status")
+        return [tuple(row) for row in await cursor.fetchall()]
+
+
+async def _apply(pool, events, spans, commit=True):
+    async with pool.acquire() as conn:
+        await conn.begin()
+        await rollup.apply_rollups(conn, events, spans)
+        if commit:
+            await conn.commit()
+        else:
+            await conn.rollback()
+
+
+EVENTS = [_event(at(D1, 23, 59, 59)), _event(at(D2, 0, 10)), _event(at(D2, 0, 20), username="b", status="Low")]
+SPANS = [_span(at(D1, 23, 50), at(D2, 1, 10)), _span(at(D2, 0, 5), at(D2, 0, 35), username="b", status="Low")]
+
+
+def test_rolled_back_batch_is_counted_once_on_retry(sqlite_db):
+    async def main():
+        async with sqlite_db() as pool:
+            await _apply(pool, EVENTS, SPANS, commit=False)
+            assert await _table(pool, HOURLY_TABLE) == []
+            assert await _table(pool, DAILY_TABLE) == []
+
+            await _apply(pool, EVENTS, SPANS)
+            assert await _table(pool, HOURLY_TABLE) == [
+                ("a", at(D1, 23), "High", 1, 600.0),
+                ("a", at(D2, 0), "High", 1, 3600.0),
+                ("a", at(D2, 1), "High", 0, 600.0),
+                ("b", at(D2, 0), "Low", 1, 1800.0),
+            ]
+            assert await _table(pool, DAILY_TABLE) == [
+                ("a", D1, "High", 1, 600.0),
+                ("a", D2, "High", 1, 4200.0),
+                ("b", D2, "Low", 1, 1800.0),
+            ]
+
+    asyncio.run(main())
+
+
+def test_split_batches_match_single_batch(sqlite_db, tmp_path):
+    async def main():
+        async with sqlite_db() as pool:
+            await _apply(pool, EVENTS, SPANS)
+            once = (await _table(pool, HOURLY_TABLE), await _table(pool, DAILY_TABLE))
+        return once
+
+    once = asyncio.run(main())
+    (tmp_path / "fatigue.sqlite3").unlink()
+
+    async def in_pieces():
+        async with sqlite_db() as pool:
+            for event in EVENTS:
+                await _apply(pool, [event], [])
+            for span in SPANS:
+                await _apply(pool, [], [span])
+            assert (await _table(pool, HOURLY_TABLE), await _table(pool, DAILY_TABLE)) == once
+
+    asyncio.run(in_pieces())
+
+
+def test_writer_retry_after_failed_commit_does_not_double_count(sqlite_db, tmp_path, monkeypatch):
+    real_apply = rollup.apply_rollups
+    calls = []
+
+    async def apply_then_fail(conn, events, spans):
+        updated = await real_apply(conn, events, spans)
+        calls.append(updated)
+        if len(calls) == 1:
+            raise RuntimeError("connection lost before commit")
+        return updated
+
+    monkeypatch.setattr(rollup, "apply_rollups", apply_then_fail)
+
+    async def main():
+        async with sqlite_db() as pool:
+            writer = FatigueEventWriter(lambda: pool, batch_size=10, spill_path=str(tmp_path / "spill.jsonl"))
+            for record in EVENTS + SPANS:
+                writer.enqueue(record)
+            assert await writer.flush(drain=True) is False
+            assert await _table(pool, HOURLY_TABLE) == []
+            assert await writer.flush(drain=True) is True
+            assert len(calls) == 2
+
+            async with pool.acquire() as conn:
+                totals = rollup.pivot_by_driver(await rollup.driver_totals(conn, at(D1, 0), at(D3, 0)))
+                page, _ = await crud.query_fatigue_page(conn, ["id"], 10)
+            assert len(page) == len(EVENTS)
+            assert totals["a"]["events"]["High"] == 2
+            assert totals["a"]["seconds"]["High"] == pytest.approx(4800.0)
+            assert totals["b"]["events"]["Low"] == 1
+            assert totals["b"]["seconds"]["Low"] == pytest.approx(1800.0)
+
+    asyncio.run(main())
+
+
+def test_driver_totals_matches_across_table_boundaries(sqlite_db):
+    async def main():
+        async with sqlite_db() as pool:
+            spans = [_span(at(D1, 20, 15), at(D3, 3, 45))]
+            await _apply(pool, [], spans)
+            async with pool.acquire() as conn:
+                # 查询范围跨两个零点：小时表 + 日表 + 小时表，结果与直接计算一致
+                for start, end in ((at(D1, 21), at(D3, 2)), (at(D1, 0), at(D3, 0)), (None, None)):
+                    rows = await rollup.driver_totals(conn, start, end)
+                    lo = max(spans[0].start_time, rollup.hour_floor(start) if start else spans[0].start_time)
+                    hi = min(spans[0].end_time, rollup.hour_ceil(end) if end else spans[0].end_time)
+                    assert float(rows[0]["seconds"]) == pytest.approx((hi - lo).total_seconds())
+
+    asyncio.run(main())
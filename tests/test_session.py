@@ -0,0 +1,155 @@
+# tests/test_session.py
+# services/session.py 的会话注册表：容量淘汰、空闲清理、连接计数和重置。
+
+import itertools
+
+import pytest
+
+from services import session as session_module
+from services.session import SessionRegistry
+
+
+class Buffer:
+    _ids = itertools.count()
+
+    def __init__(self):
+        self.id = next(self._ids)
+        self.window = []
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可手动推进的 time.monotonic"""
+    now = [1000.0]
+    monkeypatch.setattr(session_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_capacity_evicts_least_recently_used():
+    registry = SessionRegistry(Buffer, max_sessions=2)
+    registry.get("a")
+    registry.get("b")
+    registry.get("a")  # a 变为最近使用
+    registry.get("c")
+    assert registry.keys() == ["a", "c"]
+    assert registry.stats()["evicted_capacity"] == 1
+
+
+def test_capacity_skips_connected_sessions():
+    registry = SessionRegistry(Buffer, max_sessions=2)
+    registry.attach("a")
+    registry.get("b")
+    registry.get("c")
+    # a 最久未使用但有连接，淘汰的是 b
+    assert registry.keys() == ["a", "c"]
+
+
+def test_capacity_never_evicts_inserted_key():
+    registry = SessionRegistry(Buffer, max_sessions=2)
+    registry.attach("a")
+    registry.attach("b")
+    first = registry.attach("c")
+    # 其他会话都有连接时允许超出上限，新会话保留同一个缓冲区
+    assert registry.keys() == ["a", "b", "c"]
+    assert registry.get("c").buffer is first.buffer
+    stats = registry.stats()
+    assert stats["over_capacity"] == 1
+    assert stats["evicted_capacity"] == 0
+
+    registry.detach("a")
+    registry.get("d")
+    assert registry.keys() == ["b", "c", "d"]
+
+
+def test_sweep_removes_idle_sessions_without_connections(clock):
+    registry = SessionRegistry(Buffer, idle_ttl=60.0, sweep_interval=1e9)
+    registry.get("idle")
+    registry.attach("connected")
+    clock[0] += 30
+    registry.get("recent")
+    clock[0] += 45
+
+    assert registry.sweep() == 1
+    assert registry.keys() == ["connected", "recent"]
+    assert registry.stats()["evicted_idle"] == 1
+
+
+def test_get_sweeps_periodically(clock):
+    registry = SessionRegistry(Buffer, idle_ttl=60.0, sweep_interval=10.0)
+    registry.get("old")
+    clock[0] += 61
+    registry.get("new")
+    assert registry.keys() == ["new"]
+
+
+def test_attach_detach_counts(clock):
+    registry = SessionRegistry(Buffer, idle_ttl=60.0)
+    registry.attach("a")
+    registry.attach("a")
+    assert registry.peek("a").connections == 2
+    assert registry.stats()["connected"] == 1
+
+    registry.detach("a")
+    registry.detach("a")
+    registry.detach("a")  # 多余的 detach 不会变成负数
+    assert registry.peek("a").connections == 0
+    assert registry.stats()["connected"] == 0
+
+    # 断开后保留到空闲超时，便于重连
+    clock[0] += 30
+    assert registry.sweep() == 0
+    clock[0] += 31
+    assert registry.sweep() == 1
+    registry.detach("missing")
+
+
+def test_reset_replaces_buffer_and_discards_snapshot():
+    discarded = []
+    registry = SessionRegistry(Buffer, discard=discarded.append)
+    session = registry.get("a")
+    old = session.buffer
+    session.tracker = object()
+
+    assert registry.reset("a") is session
+    assert session.buffer is not old
+    assert session.tracker is None
+    assert discarded == ["a"]
+
+
+def test_reset_with_carry_keeps_snapshot():
+    discarded = []
+    registry = SessionRegistry(Buffer, discard=discarded.append)
+    session = registry.get("a")
+    session.buffer.window = [1, 2, 3]
+
+    def carry(old, new):
+        new.window = old.window
+
+    registry.reset("a", carry)
+    assert session.buffer.window == [1, 2, 3]
+    assert discarded == []
+
+
+def test_reset_all(clock):
+    discarded = []
+    registry = SessionRegistry(Buffer, discard=discarded.append)
+    a, b = registry.get("a"), registry.get("b")
+    old = {a.buffer.id, b.buffer.id}
+    a.buffer.window = [1]
+
+    registry.reset_all(lambda old_buffer, new: setattr(new, "window", old_buffer.window))
+    assert {a.buffer.id, b.buffer.id}.isdisjoint(old)
+    assert a.buffer.window == [1]
+    assert discarded == []
+
+    registry.reset_all()
+    assert a.buffer.window == []
+    assert discarded == [None]
+
+
+def test_restore_is_used_for_new_sessions():
+    snapshots = {"a": Buffer()}
+    registry = SessionRegistry(Buffer, restore=snapshots.get)
+    assert registry.get("a").buffer is snapshots["a"]
+    assert registry.get("b").buffer is not None
+    assert registry.stats()["restored"] == 1
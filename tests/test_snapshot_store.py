@@ -0,0 +1,161 @@
+# tests/test_snapshot_store.py
+# 会话快照：ModelBuffer.snapshot() / from_snapshot() 往返、SnapshotStore 的写盘与过期，
+# 以及 SessionRegistry 在注册表锁外恢复快照。
+
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from routers import fatigue_api
+from routers.fatigue_api import ModelBuffer
+from services.session import SessionRegistry
+from services.snapshot_store import SnapshotStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SnapshotStore(str(tmp_path / "snapshots.sqlite3"), ttl=60.0, flush_interval=0.05)
+    yield store
+    store.close()
+
+
+def _busy_buffer() -> ModelBuffer:
+    buffer = ModelBuffer()
+    rng = np.random.default_rng(0)
+    # 窗口写过一圈以上，环形缓冲区的起点不在 0
+    for ring in (buffer.lstm_input, buffer.eye_input, buffer.yawn_input):
+        for value in rng.integers(0, 6, size=ring.capacity + 3):
+            ring.push(value)
+    buffer.yawn_input.clear()
+    buffer.yawn_input.push(4)
+    buffer.is_ready = True
+    buffer.frame_counter = 1234
+    buffer.high_fatigue_confirm_counter = 17
+    buffer.displayed_fatigue_level = buffer.current_state = "Medium"
+    buffer.displayed_eye_closure = True
+    buffer.high_fatigue_event_logged = True
+    buffer.state_start_time = 1.7e9
+    return buffer
+
+
+def test_model_buffer_snapshot_round_trip():
+    original = _busy_buffer()
+    data = original.snapshot()
+    assert len(data) < 1024
+
+    restored = ModelBuffer.from_snapshot(data)
+    for name in ModelBuffer._SNAPSHOT_FIELDS:
+        assert getattr(restored, name) == getattr(original, name), name
+    for before, after in zip(original._rings(), restored._rings()):
+        np.testing.assert_array_equal(after.view(), before.view())
+        assert len(after) == len(before)
+    # 恢复后的窗口继续写入，行为与原窗口一致
+    original.eye_input.push(5)
+    restored.eye_input.push(5)
+    np.testing.assert_array_equal(restored.eye_input.view(), original.eye_input.view())
+
+
+def test_snapshot_of_other_version_is_ignored(monkeypatch):
+    data = ModelBuffer().snapshot()
+    monkeypatch.setattr(ModelBuffer, "_SNAPSHOT_VERSION", ModelBuffer._SNAPSHOT_VERSION + 1)
+    assert ModelBuffer.from_snapshot(data) is None
+
+
+def test_store_round_trip_across_restart(store, tmp_path):
+    store.save("a", b"first")
+    store.save("a", b"latest")
+    # 写盘之前也能读到待写的快照
+    assert store.load("a") == b"latest"
+    assert store.flush() == 1
+
+    reopened = SnapshotStore(store.path, ttl=60.0)
+    try:
+        assert reopened.load("a") == b"latest"
+        assert reopened.load("missing") is None
+        assert reopened.stats()["misses"] == 1
+    finally:
+        reopened.close()
+
+
+def test_close_writes_pending_snapshots(store):
+    store.flush_interval = 3600.0
+    store.save("a", b"data")
+    store.close()
+    reopened = SnapshotStore(store.path)
+    try:
+        assert reopened.load("a") == b"data"
+    finally:
+        reopened.close()
+
+
+def test_expired_snapshot_is_not_loaded(store, monkeypatch):
+    store.save("a", b"data")
+    store.flush()
+    now = time.time()
+    monkeypatch.setattr("services.snapshot_store.time.time", lambda: now + 61.0)
+    assert store.load("a") is None
+    assert store.stats()["expired"] == 1
+
+
+def test_discard(store):
+    for key in ("a", "b", "c"):
+        store.save(key, key.encode())
+    store.flush()
+    store.save("a", b"pending")
+    store.discard("a")
+    assert store.load("a") is None
+    assert store.load("b") == b"b"
+    store.discard()
+    assert store.load("b") is None and store.load("c") is None
+
+
+def test_only_applied_restores_are_counted(store, monkeypatch):
+    monkeypatch.setattr(fatigue_api, "snapshots", store)
+    store.save("good", _busy_buffer().snapshot())
+    store.save("corrupt", b"\x00\x10not a snapshot")
+    registry = SessionRegistry(ModelBuffer, restore=fatigue_api._restore_buffer, on_restored=store.mark_restored)
+
+    assert registry.get("good").buffer.frame_counter == 1234
+    assert registry.get("corrupt").buffer.frame_counter == 0
+    registry.get("good")
+    stats = store.stats()
+    assert stats["loads"] == 2
+    assert stats["restores"] == 1
+    assert registry.stats()["restored"] == 1
+
+
+def test_restore_runs_outside_registry_lock(store):
+    store.save("slow", _busy_buffer().snapshot())
+    started, release = threading.Event(), threading.Event()
+
+    def restore(key):
+        data = store.load(key)
+        if data is None:
+            return None
+        started.set()
+        assert release.wait(5)
+        return ModelBuffer.from_snapshot(data)
+
+    registry = SessionRegistry(ModelBuffer, restore=restore, on_restored=store.mark_restored)
+    results = []
+    racers = [threading.Thread(target=lambda: results.append(registry.get("slow"))) for _ in range(3)]
+    for thread in racers:
+        thread.start()
+    assert started.wait(5)
+
+    # 恢复进行中，其他驾驶员的会话不受影响
+    began = time.perf_counter()
+    registry.get("other")
+    assert registry.stats()["sessions"] == 1
+    assert time.perf_counter() - began < 1.0
+
+    release.set()
+    for thread in racers:
+        thread.join(5)
+    # 并发恢复同一驾驶员只有一个缓冲区被采用，只计一次
+    assert len({id(session) for session in results}) == 1
+    assert results[0].buffer.frame_counter == 1234
+    assert registry.stats()["restored"] == 1
+    assert store.stats()["restores"] == 1